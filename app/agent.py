@@ -15,27 +15,68 @@
 
 import datetime
 import os
+from typing import Any, Callable, List
 from zoneinfo import ZoneInfo
 
 from google.adk.agents import Agent
 from google.adk.apps.app import App
+from google.adk.models.base_llm import BaseLlm
+from google.adk.models.registry import LLMRegistry
+from google.adk.plugins.base_plugin import BasePlugin
 
-from .agents.config import AGENT_MODEL, API_KEY
+from .agents import async_tools
+from .agents.adaptive_model import AdaptiveRoutingLlm
+from .agents.budgets import BudgetPlugin, budget_policy
+from .agents.config import (
+    ADAPTIVE_ROUTING,
+    API_KEY,
+    BREAKER_COOLDOWN_S,
+    BREAKER_FAILURE_THRESHOLD,
+    CONTEXT_MAX_INPUT_TOKENS,
+    CONTEXT_MAX_TURNS,
+    CONTEXT_SUMMARY_TOKENS,
+    CONTEXT_WINDOW,
+    DETERMINISTIC_ROUTING,
+    LLM_BACKEND,
+    LLM_FIXTURES,
+    LLM_REPLAY_PROFILE,
+    MODEL_HEDGE_AFTER_S,
+    MODEL_MAX_ATTEMPTS,
+    MODEL_RESILIENCE,
+    MODEL_RETRY_BASE_S,
+    MODEL_RETRY_MAX_S,
+    MULTI_REPORT_FANOUT,
+    ROUTER_CONFIDENCE_THRESHOLD,
+    SCOPED_CONTEXT,
+    TOOL_BACKEND,
+    AgentModelSettings,
+    agent_settings,
+)
+from .agents.context_window import ContextPolicy, ContextWindowPlugin
 from .agents.entitlement_tools import check_entitlement
-from .agents.prompts import (
-    ACTION_INSTRUCTION,
-    GLOBAL_INSTRUCTION,
-    ORCHESTRATOR_INSTRUCTION,
-    RECOMMENDATION_INSTRUCTION,
-    SERVICE_INSTRUCTION,
+from .agents.fan_out import FanOutAgent
+from .agents.offline_model import (
+    DEFAULT_FIXTURES,
+    RecordingLlm,
+    ReplayLlm,
+    resolve_profile,
 )
+from .agents.prompt_variants import variant_instruction
+from .agents.resilience import ResilientLlm, RetryPolicy, breaker_for
+from .agents.router import FANOUT_AGENT, route_before_model
+from .agents.scoped_context import recall_conversation, scope_before_model
 from .agents.state import update_session_state
 from .agents.user_registry import set_user_plan
+from .app_utils.telemetry import traced_tool
 
 
 def _configure_platform() -> None:
     """Configure authentication depending on environment variables."""
 
+    if LLM_BACKEND == "replay":
+        # Offline fixtures; no credentials needed.
+        return
+
     api_key = API_KEY
     if api_key:
         # Allow overriding runtime API key without forcing Vertex AI defaults.
@@ -63,7 +104,20 @@ def _configure_platform() -> None:
 
 _configure_platform()
 
+if LLM_BACKEND == "record" and not LLM_FIXTURES:
+    # Recordings hold user prompts and profile data; never append them to the
+    # bundled fixtures by default.
+    raise RuntimeError(
+        "LLM_BACKEND=record needs LLM_FIXTURES set to the file recordings are "
+        "appended to."
+    )
+
+# Model-facing tools get a span per call; the router and pre-turn enrichment
+# keep calling the undecorated function.
+check_entitlement = traced_tool(check_entitlement)
+
 
+@traced_tool
 def update_user_dataplan(*, uid: str, plan: str, session_id: str | None = None) -> str:
     """Tool: Update a user's data plan to GOLD/SILVER/BRONZE.
 
@@ -78,36 +132,155 @@ def update_user_dataplan(*, uid: str, plan: str, session_id: str | None = None)
         update_session_state(session_id, current_plan=plan.upper())
     return f"Plan updated to {plan.upper()} for user {uid}."
 
+
+# The tools the agents get. With the sqlite backend they are the async tools
+# over the pooled stores, whose I/O overlaps on the runner's event loop
+# instead of blocking it.
+entitlement_tool: Callable[..., Any] = check_entitlement
+dataplan_tool: Callable[..., Any] = update_user_dataplan
+if TOOL_BACKEND == "sqlite":
+    entitlement_tool = traced_tool(async_tools.check_entitlement)
+    dataplan_tool = traced_tool(async_tools.update_user_dataplan)
+
+
+def _resilient(model: str | BaseLlm) -> str | BaseLlm:
+    if not MODEL_RESILIENCE:
+        return model
+    inner = LLMRegistry.new_llm(model) if isinstance(model, str) else model
+    return ResilientLlm(
+        model=inner.model,
+        inner=inner,
+        policy=RetryPolicy(
+            max_attempts=MODEL_MAX_ATTEMPTS,
+            base_delay_s=MODEL_RETRY_BASE_S,
+            max_delay_s=MODEL_RETRY_MAX_S,
+        ),
+        hedge_after_s=MODEL_HEDGE_AFTER_S,
+        breaker=breaker_for(
+            inner.model,
+            failure_threshold=BREAKER_FAILURE_THRESHOLD,
+            cooldown_s=BREAKER_COOLDOWN_S,
+        ),
+    )
+
+
+def _model_kwargs(agent_name: str, settings: AgentModelSettings) -> dict:
+    model: str | BaseLlm = settings.model
+    # Only replay falls back to the bundled fixtures; record requires a path.
+    fixtures = LLM_FIXTURES or str(DEFAULT_FIXTURES)
+    if LLM_BACKEND == "replay":
+        model = ReplayLlm(
+            model=settings.model,
+            agent_name=agent_name,
+            fixtures_path=fixtures,
+            profile=resolve_profile(LLM_REPLAY_PROFILE),
+        )
+    elif LLM_BACKEND == "record":
+        model = RecordingLlm(
+            model=settings.model,
+            agent_name=agent_name,
+            inner=LLMRegistry.new_llm(settings.model),
+            fixtures_path=fixtures,
+        )
+    return {
+        "model": _resilient(model),
+        "generate_content_config": settings.generate_content_config(),
+    }
+
+
+def _router_kwargs(settings: AgentModelSettings) -> dict:
+    kwargs = _model_kwargs("root_agent", settings)
+    if ADAPTIVE_ROUTING and LLM_BACKEND == "gemini":
+        escalation = agent_settings("router_escalation")
+        kwargs["model"] = _resilient(
+            AdaptiveRoutingLlm(
+                model=settings.model,
+                escalation_model=escalation.model,
+                escalation_config=escalation.generate_content_config(),
+                confidence_threshold=ROUTER_CONFIDENCE_THRESHOLD,
+            )
+        )
+    return kwargs
+
+
+def _scoped_kwargs(tools: list) -> dict:
+    """Context scoping for a sub-agent; history is available as a tool."""
+    if not SCOPED_CONTEXT:
+        return {"tools": tools}
+    return {
+        "tools": [*tools, recall_conversation],
+        "before_model_callback": scope_before_model,
+    }
+
+
 action_agent = Agent(
-    model=AGENT_MODEL,
-    global_instruction=GLOBAL_INSTRUCTION,
-    instruction=ACTION_INSTRUCTION,
+    **_model_kwargs("action_agent", agent_settings("action_agent")),
+    instruction=variant_instruction(
+        "ACTION_INSTRUCTION", turn_facts=True, scoped=SCOPED_CONTEXT
+    ),
     name="action_agent",
-    tools=[update_user_dataplan],
+    **_scoped_kwargs([dataplan_tool]),
 )
 
 recommendation_agent = Agent(
-    model=AGENT_MODEL,
-    global_instruction=GLOBAL_INSTRUCTION,
-    instruction=RECOMMENDATION_INSTRUCTION,
+    **_model_kwargs("recommendation_agent", agent_settings("recommendation_agent")),
+    instruction=variant_instruction(
+        "RECOMMENDATION_INSTRUCTION", turn_facts=True, scoped=SCOPED_CONTEXT
+    ),
     name="recommendation_agent",
-    tools=[check_entitlement],
+    **_scoped_kwargs([entitlement_tool]),
 )
 
 service_agent = Agent(
-    model=AGENT_MODEL,
-    global_instruction=GLOBAL_INSTRUCTION,
-    instruction=SERVICE_INSTRUCTION,
+    **_model_kwargs("service_agent", agent_settings("service_agent")),
+    instruction=variant_instruction(
+        "SERVICE_INSTRUCTION", turn_facts=True, scoped=SCOPED_CONTEXT
+    ),
     name="service_agent",
-    tools=[check_entitlement],
+    **_scoped_kwargs([entitlement_tool]),
+)
+# Multi-report questions: one concurrent branch per report, on the agent the
+# routing rules pick for it.
+fanout_agent = FanOutAgent(
+    name=FANOUT_AGENT,
+    description="Answers questions that name several reports at once.",
 )
+
 root_agent = Agent(
     name="root_agent",
-    model=AGENT_MODEL,
-    instruction=ORCHESTRATOR_INSTRUCTION,
-    global_instruction=GLOBAL_INSTRUCTION,
-    sub_agents=[action_agent, recommendation_agent, service_agent],
-    tools=[check_entitlement],
+    **_router_kwargs(agent_settings("root_agent")),
+    # Templates come from the session's prompt variant (see prompt_variants.py).
+    instruction=variant_instruction("ORCHESTRATOR_INSTRUCTION"),
+    # ADK applies the root's global instruction to every agent in the tree.
+    global_instruction=variant_instruction(
+        "GLOBAL_INSTRUCTION", is_global=True, scoped=SCOPED_CONTEXT
+    ),
+    sub_agents=[
+        action_agent,
+        recommendation_agent,
+        service_agent,
+        *([fanout_agent] if MULTI_REPORT_FANOUT else []),
+    ],
+    tools=[entitlement_tool],
+    before_model_callback=route_before_model if DETERMINISTIC_ROUTING else None,
 )
 
-app = App(root_agent=root_agent, name="app")
+# Token budgets; the web server reports against the same policy.
+token_budget = budget_policy()
+
+# Runner plugins; the web server passes the same list to its runners.
+plugins: List[BasePlugin] = []
+if token_budget.enabled:
+    plugins.append(BudgetPlugin(token_budget))
+if CONTEXT_WINDOW:
+    plugins.append(
+        ContextWindowPlugin(
+            ContextPolicy(
+                max_turns=CONTEXT_MAX_TURNS,
+                max_input_tokens=CONTEXT_MAX_INPUT_TOKENS,
+                summary_tokens=CONTEXT_SUMMARY_TOKENS,
+            )
+        )
+    )
+
+app = App(root_agent=root_agent, name="app", plugins=plugins)
@@ -0,0 +1,100 @@
+"""Router model that escalates to a larger model on low-confidence output."""
+
+from __future__ import annotations
+
+import copy
+import logging
+import math
+from typing import AsyncGenerator, Dict, List, Optional
+
+from google.adk.models.base_llm import BaseLlm
+from google.adk.models.llm_request import LlmRequest
+from google.adk.models.llm_response import LlmResponse
+from google.adk.models.registry import LLMRegistry
+from google.genai import types as genai_types
+from pydantic import PrivateAttr
+
+logger = logging.getLogger(__name__)
+
+# Generation settings that belong to a model (see AgentModelSettings); the rest
+# of the request config (instructions, tools) is shared by both models.
+_GENERATION_FIELDS = ("max_output_tokens", "temperature", "thinking_config")
+
+
+def is_low_confidence(response: Optional[LlmResponse], threshold: float) -> bool:
+    """Whether a router response should be retried on the escalation model.
+
+    A response is low-confidence when it is missing, carries an error, has no
+    content, or its mean token probability (``exp(avg_logprobs)``) falls below
+    ``threshold``. Responses without logprobs are trusted.
+    """
+    if response is None or response.error_code:
+        return True
+    content = response.content
+    if not content or not content.parts:
+        return True
+    if response.avg_logprobs is not None:
+        return math.exp(response.avg_logprobs) < threshold
+    return False
+
+
+class AdaptiveRoutingLlm(BaseLlm):
+    """Runs ``model`` first and replays the request on ``escalation_model``.
+
+    The primary response is buffered so that a low-confidence answer is never
+    streamed to the user; routing turns are short (mostly function calls), so
+    buffering costs little. The escalated request keeps the router's
+    instructions and tools but takes its generation settings from
+    ``escalation_config``: the router's budgets (e.g. a zero thinking budget)
+    are often invalid for the larger model.
+    """
+
+    escalation_model: str
+    escalation_config: Optional[genai_types.GenerateContentConfig] = None
+    confidence_threshold: float = 0.6
+
+    _llms: Dict[str, BaseLlm] = PrivateAttr(default_factory=dict)
+    _escalations: int = PrivateAttr(default=0)
+
+    @property
+    def escalations(self) -> int:
+        """Number of calls that were re-issued on the escalation model."""
+        return self._escalations
+
+    def _llm(self, name: str) -> BaseLlm:
+        if name not in self._llms:
+            self._llms[name] = LLMRegistry.new_llm(name)
+        return self._llms[name]
+
+    async def generate_content_async(
+        self, llm_request: LlmRequest, stream: bool = False
+    ) -> AsyncGenerator[LlmResponse, None]:
+        primary_request = llm_request.model_copy(deep=True)
+        primary_request.model = self.model
+        responses: List[LlmResponse] = [
+            r
+            async for r in self._llm(self.model).generate_content_async(
+                primary_request, stream=stream
+            )
+        ]
+        final = next((r for r in reversed(responses) if not r.partial), None)
+        if not is_low_confidence(final, self.confidence_threshold):
+            for response in responses:
+                yield response
+            return
+
+        self._escalations += 1
+        logger.info(
+            "Escalating routing call from %s to %s", self.model, self.escalation_model
+        )
+        escalated_request = llm_request.model_copy(deep=True)
+        escalated_request.model = self.escalation_model
+        config = escalated_request.config or genai_types.GenerateContentConfig()
+        for name in _GENERATION_FIELDS:
+            value = getattr(self.escalation_config, name, None)
+            setattr(config, name, copy.deepcopy(value))
+        escalated_request.config = config
+        async for response in self._llm(self.escalation_model).generate_content_async(
+            escalated_request, stream=stream
+        ):
+            yield response
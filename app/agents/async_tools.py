@@ -0,0 +1,66 @@
+"""Async variants of the agent tools over the pooled stores.
+
+Same names, arguments, docstrings and results as the synchronous tools, so
+prompts and recorded fixtures do not change. ADK awaits async tools on the
+runner's event loop, where a synchronous tool would block it; with these the
+store I/O of concurrent tool calls (e.g. fan-out branches) overlaps.
+"""
+
+from __future__ import annotations
+
+from typing import Any, Dict, Optional
+
+from .entitlement_tools import Plan, _normalize, entitlement_result
+from .state import update_session_state
+from .stores import get_backends
+
+
+async def check_entitlement(*, report: str, plan: Plan) -> Dict[str, object]:
+    """Tool: Check access for a report under a plan.
+
+    Returns a dict with fields:
+      - status: one of {included, optional, paid, not_found}
+      - current_plan: provided plan
+      - lowest_plan: if not included in current plan, the lowest plan that covers it (may equal current_plan)
+      - paid_only: bool
+      - canonical_report: normalized key used for comparison
+    """
+    key = _normalize(report)
+    lowest_plan, paid_only = await get_backends().catalog.lookup(key)
+    return entitlement_result(key, plan, lowest_plan, paid_only)  # type: ignore[arg-type]
+
+
+async def set_user_plan(
+    uid: str, plan: str, *, session_id: Optional[str] = None
+) -> bool:
+    """Update the user's data plan by uid and audit the change.
+
+    Returns True if updated, False if user not found or plan invalid.
+    """
+    backends = get_backends()
+    updated, previous = await backends.registry.set_plan(uid, plan)
+    if updated and previous != plan.upper():
+        await backends.audit.record(uid, "set_plan", previous, plan.upper(), session_id)
+    return updated
+
+
+async def update_user_dataplan(
+    *, uid: str, plan: str, session_id: str | None = None
+) -> str:
+    """Tool: Update a user's data plan to GOLD/SILVER/BRONZE.
+
+    Optionally updates the session state with the new current plan.
+    Returns a human-readable status string.
+    """
+    success = await set_user_plan(uid, plan, session_id=session_id)
+    if not success:
+        return "Unable to update plan. Verify UID and plan (GOLD/SILVER/BRONZE)."
+
+    if session_id:
+        update_session_state(session_id, current_plan=plan.upper())
+    return f"Plan updated to {plan.upper()} for user {uid}."
+
+
+async def get_user_profile(user_name: str) -> Optional[Dict[str, Any]]:
+    """Fetch a user's profile by username (case-insensitive). Returns dict or None."""
+    return await get_backends().registry.get_profile(user_name)
@@ -0,0 +1,322 @@
+"""Token accounting and per-user budgets.
+
+Every model response carries ``usage_metadata``. The web server adds each
+finished turn's prompt, candidate and thinking tokens to ``TOKEN_USAGE`` by
+session, user and agent; the turn's usage is also stored on the assistant
+message in ``/history``, and ``/usage`` reports the totals.
+
+Budgets cap what one user may spend per window (``USER_TOKEN_BUDGET``, with
+per-user overrides) and what one session may spend in total
+(``SESSION_TOKEN_BUDGET``). Once a user or session is over, ``BudgetPlugin``
+changes its model calls:
+
+* ``downgrade``: the call goes to ``BUDGET_MODEL`` with thinking off;
+* ``deterministic``: a sub-agent answering a known entitlement check replies
+  from a template without a model call; other calls are downgraded.
+
+Budgets are checked before each call against finished turns, so the turn
+that crosses a budget completes as usual.
+"""
+
+from __future__ import annotations
+
+import json
+import threading
+import time
+from collections import Counter
+from dataclasses import dataclass, field
+from typing import Any, Callable, Dict, List, Mapping, Optional
+
+from google.adk.agents.callback_context import CallbackContext
+from google.adk.models.llm_request import LlmRequest
+from google.adk.models.llm_response import LlmResponse
+from google.adk.plugins.base_plugin import BasePlugin
+from google.genai import types as genai_types
+
+from .config import (
+    BUDGET_ACTION,
+    BUDGET_MODEL,
+    SESSION_TOKEN_BUDGET,
+    USER_BUDGET_WINDOW_S,
+    USER_TOKEN_BUDGET,
+    USER_TOKEN_BUDGETS_FILE,
+)
+from .router import FANOUT_AGENT, STATUS_ROUTES
+from .state import get_session_state
+
+TOKEN_KINDS = ("prompt", "candidates", "thoughts")
+
+# Model calls made over budget: over_user, over_session, downgraded, deterministic.
+BUDGET_STATS: Counter[str] = Counter()
+
+
+def _zero() -> Dict[str, int]:
+    return dict.fromkeys(TOKEN_KINDS, 0)
+
+
+def _add(into: Dict[str, int], tokens: Mapping[str, int]) -> None:
+    for kind in TOKEN_KINDS:
+        into[kind] += tokens.get(kind, 0)
+
+
+def _with_total(tokens: Mapping[str, int]) -> Dict[str, int]:
+    return {**tokens, "total": sum(tokens[kind] for kind in TOKEN_KINDS)}
+
+
+class UsageLedger:
+    """Token counts by session, user and agent, plus per-user windows."""
+
+    def __init__(
+        self, window_s: float = 86400.0, clock: Callable[[], float] = time.time
+    ):
+        self.window_s = window_s
+        self._clock = clock
+        self._lock = threading.Lock()
+        self._sessions: Dict[str, Dict[str, Any]] = {}
+        self._users: Dict[str, Dict[str, Any]] = {}
+        self._agents: Dict[str, Dict[str, int]] = {}
+
+    def _window(self) -> int:
+        return int(self._clock() // self.window_s) if self.window_s > 0 else 0
+
+    def record(
+        self,
+        session_id: str,
+        user_id: str,
+        agent_tokens: Mapping[str, Mapping[str, int]],
+    ) -> Dict[str, Any]:
+        """Add one turn's per-agent tokens; returns the turn's usage."""
+        turn = _zero()
+        for tokens in agent_tokens.values():
+            _add(turn, tokens)
+        window = self._window()
+        with self._lock:
+            session = self._sessions.setdefault(
+                session_id,
+                {"user_id": user_id, "turns": 0, "tokens": _zero(), "agents": {}},
+            )
+            user = self._users.setdefault(
+                user_id,
+                {"turns": 0, "sessions": 0, "tokens": _zero(), "window": [window, 0]},
+            )
+            if session["turns"] == 0:
+                user["sessions"] += 1
+            session["turns"] += 1
+            user["turns"] += 1
+            _add(session["tokens"], turn)
+            _add(user["tokens"], turn)
+            if user["window"][0] != window:
+                user["window"] = [window, 0]
+            user["window"][1] += sum(turn.values())
+            for agent, tokens in agent_tokens.items():
+                _add(session["agents"].setdefault(agent, _zero()), tokens)
+                _add(self._agents.setdefault(agent, _zero()), tokens)
+        return {
+            **_with_total(turn),
+            "agents": {
+                agent: _with_total({**_zero(), **t})
+                for agent, t in agent_tokens.items()
+            },
+        }
+
+    def session_tokens(self, session_id: str) -> int:
+        with self._lock:
+            session = self._sessions.get(session_id)
+            return sum(session["tokens"].values()) if session else 0
+
+    def window_tokens(self, user_id: str) -> int:
+        """Tokens ``user_id`` spent in the current budget window."""
+        window = self._window()
+        with self._lock:
+            user = self._users.get(user_id)
+            return user["window"][1] if user and user["window"][0] == window else 0
+
+    def session(self, session_id: str) -> Optional[Dict[str, Any]]:
+        with self._lock:
+            session = self._sessions.get(session_id)
+            if session is None:
+                return None
+            return {
+                "session_id": session_id,
+                "user_id": session["user_id"],
+                "turns": session["turns"],
+                "tokens": _with_total(session["tokens"]),
+                "agents": {a: _with_total(t) for a, t in session["agents"].items()},
+            }
+
+    def user(self, user_id: str) -> Optional[Dict[str, Any]]:
+        with self._lock:
+            user = self._users.get(user_id)
+            if user is None:
+                return None
+            return {
+                "user_id": user_id,
+                "turns": user["turns"],
+                "sessions": user["sessions"],
+                "tokens": _with_total(user["tokens"]),
+            }
+
+    def agents(self) -> Dict[str, Dict[str, int]]:
+        with self._lock:
+            return {a: _with_total(t) for a, t in self._agents.items()}
+
+    def top_users(self, limit: int = 10) -> List[Dict[str, Any]]:
+        with self._lock:
+            ranked = sorted(
+                self._users, key=lambda u: -sum(self._users[u]["tokens"].values())
+            )
+        return [u for u in (self.user(uid) for uid in ranked[:limit]) if u]
+
+
+TOKEN_USAGE = UsageLedger(window_s=USER_BUDGET_WINDOW_S)
+
+
+def _load_user_budgets(path: Optional[str]) -> Dict[str, int]:
+    if not path:
+        return {}
+    with open(path, encoding="utf-8") as fh:
+        data = json.load(fh)
+    if not isinstance(data, dict):
+        raise ValueError(f"{path} must contain a JSON object of user -> token budget")
+    return {str(user): int(budget) for user, budget in data.items()}
+
+
+@dataclass(frozen=True)
+class BudgetPolicy:
+    """Token budgets and what happens to calls over them."""
+
+    user_budget: int = 0
+    user_budgets: Dict[str, int] = field(default_factory=dict)
+    session_budget: int = 0
+    action: str = "downgrade"
+    model: str = "gemini-2.5-flash-lite"
+
+    def __post_init__(self) -> None:
+        if self.action not in ("downgrade", "deterministic"):
+            raise ValueError(f"Unknown budget action {self.action!r}")
+
+    @property
+    def enabled(self) -> bool:
+        return bool(
+            self.user_budget or self.session_budget or any(self.user_budgets.values())
+        )
+
+    def budget_for(self, user_id: str) -> int:
+        return self.user_budgets.get(user_id, self.user_budget)
+
+    def status(
+        self, ledger: UsageLedger, *, user_id: str, session_id: Optional[str] = None
+    ) -> Dict[str, Any]:
+        """Budgets, spend and remaining tokens for a user (and session)."""
+        budget = self.budget_for(user_id)
+        spent = ledger.window_tokens(user_id)
+        status: Dict[str, Any] = {
+            "user_budget": budget or None,
+            "user_window_tokens": spent,
+            "user_remaining": max(0, budget - spent) if budget else None,
+        }
+        if session_id is not None:
+            session_spent = ledger.session_tokens(session_id)
+            status["session_budget"] = self.session_budget or None
+            status["session_remaining"] = (
+                max(0, self.session_budget - session_spent)
+                if self.session_budget
+                else None
+            )
+        status["over"] = self.exceeded(ledger, user_id=user_id, session_id=session_id)
+        return status
+
+    def exceeded(
+        self, ledger: UsageLedger, *, user_id: str, session_id: Optional[str] = None
+    ) -> Optional[str]:
+        """``"user"`` or ``"session"`` when that budget is spent, else None."""
+        budget = self.budget_for(user_id)
+        if budget and ledger.window_tokens(user_id) >= budget:
+            return "user"
+        if (
+            self.session_budget
+            and session_id
+            and ledger.session_tokens(session_id) >= self.session_budget
+        ):
+            return "session"
+        return None
+
+
+def budget_policy() -> BudgetPolicy:
+    """The policy configured by the ``*_TOKEN_BUDGET*`` and ``BUDGET_*`` settings."""
+    return BudgetPolicy(
+        user_budget=USER_TOKEN_BUDGET,
+        user_budgets=_load_user_budgets(USER_TOKEN_BUDGETS_FILE),
+        session_budget=SESSION_TOKEN_BUDGET,
+        action=BUDGET_ACTION,
+        model=BUDGET_MODEL,
+    )
+
+
+def _branch_check(
+    callback_context: CallbackContext, state: Mapping[str, Any]
+) -> Dict[str, Any]:
+    """The entitlement check a call answers; fan-out branches answer their own report."""
+    branch = callback_context._invocation_context.branch or ""
+    head, _, index = branch.rpartition(".")
+    checks = state.get("entitlement_checks") or []
+    if head.endswith(FANOUT_AGENT) and index.isdigit() and int(index) < len(checks):
+        return checks[int(index)]
+    return {
+        "report": state.get("report_name"),
+        **(state.get("entitlement_check") or {}),
+    }
+
+
+def deterministic_reply(agent_name: str, check: Mapping[str, Any]) -> Optional[str]:
+    """A templated answer for ``check``, or None when it needs the model."""
+    status, report = check.get("status"), check.get("report")
+    if not report or STATUS_ROUTES.get(str(status)) != agent_name:
+        return None
+    plan = check.get("current_plan")
+    if status == "included":
+        return f"{report} is included in your {plan} plan, so you already have access to it."
+    if status == "optional":
+        return (
+            f"{report} is not included in your {plan} plan. It is available with the "
+            f"{check.get('lowest_plan')} plan; I can upgrade your plan if you like."
+        )
+    return f"{report} is not part of any data plan; it is available as a paid add-on."
+
+
+class BudgetPlugin(BasePlugin):
+    """Runner plugin downgrading or short-circuiting model calls over budget."""
+
+    def __init__(self, policy: BudgetPolicy, ledger: UsageLedger = TOKEN_USAGE):
+        super().__init__(name="token_budget")
+        self.policy = policy
+        self.ledger = ledger
+
+    async def before_model_callback(
+        self, *, callback_context: CallbackContext, llm_request: LlmRequest
+    ) -> Optional[LlmResponse]:
+        session_id = callback_context.session.id
+        over = self.policy.exceeded(
+            self.ledger, user_id=callback_context.user_id, session_id=session_id
+        )
+        if over is None:
+            return None
+        BUDGET_STATS[f"over_{over}"] += 1
+        if self.policy.action == "deterministic":
+            state = get_session_state(session_id)
+            reply = deterministic_reply(
+                callback_context.agent_name, _branch_check(callback_context, state)
+            )
+            if reply:
+                BUDGET_STATS["deterministic"] += 1
+                return LlmResponse(
+                    content=genai_types.Content(
+                        role="model", parts=[genai_types.Part(text=reply)]
+                    )
+                )
+        if llm_request.model != self.policy.model:
+            llm_request.model = self.policy.model
+            if llm_request.config is not None:
+                llm_request.config.thinking_config = None
+            BUDGET_STATS["downgraded"] += 1
+        return None
@@ -2,7 +2,20 @@
 
 from __future__ import annotations
 
+import json
 import os
+from dataclasses import dataclass, fields, replace
+from typing import Any, Dict, Optional
+
+from google.genai import types as genai_types
+
+
+def _env_flag(name: str, default: bool) -> bool:
+    """Read a boolean setting: "1", "true" or "yes" (any case) turn it on."""
+    raw = os.environ.get(name)
+    if raw is None:
+        return default
+    return raw.lower() in ("1", "true", "yes")
 
 
 AGENT_MODEL = (
@@ -12,3 +25,229 @@ AGENT_MODEL = (
 )
 
 API_KEY = os.environ.get("API_KEY") or os.environ.get("GOOGLE_API_KEY")
+
+# Routing only has to pick a sub-agent, so the orchestrator defaults to a
+# smaller model than the agents that write the answer.
+ROUTER_MODEL = os.environ.get("ROUTER_MODEL") or "gemini-2.5-flash"
+
+# Adaptive routing: run the router on ROUTER_MODEL and re-issue the call on the
+# escalation model only when the router's answer looks unreliable.
+ADAPTIVE_ROUTING = _env_flag("ADAPTIVE_ROUTING", False)
+ROUTER_ESCALATION_MODEL = os.environ.get("ROUTER_ESCALATION_MODEL") or AGENT_MODEL
+ROUTER_CONFIDENCE_THRESHOLD = float(
+    os.environ.get("ROUTER_CONFIDENCE_THRESHOLD", "0.6")
+)
+
+# Route turns in code when the report and plan are unambiguous, skipping the
+# orchestrator LLM call (see app/agents/router.py).
+DETERMINISTIC_ROUTING = _env_flag("DETERMINISTIC_ROUTING", True)
+
+# Precompute entitlement checks in the web server before each turn (see
+# app/agents/enrichment.py).
+PRETURN_ENRICHMENT = _env_flag("PRETURN_ENRICHMENT", True)
+
+# Stream a personalized acknowledgement as soon as a /chat/stream turn starts;
+# the agents continue after it (see app/agents/preamble.py).
+SPECULATIVE_PREAMBLE = _env_flag("SPECULATIVE_PREAMBLE", False)
+
+# Answer questions about several reports with concurrent per-report branches
+# (see app/agents/fan_out.py); more than MULTI_REPORT_MAX go to the LLM.
+MULTI_REPORT_FANOUT = _env_flag("MULTI_REPORT_FANOUT", True)
+MULTI_REPORT_MAX = int(os.environ.get("MULTI_REPORT_MAX", "5"))
+
+# Retries, hedging and circuit breaking around every model call (see
+# app/agents/resilience.py). MODEL_HEDGE_AFTER_S unset disables hedging.
+MODEL_RESILIENCE = _env_flag("MODEL_RESILIENCE", True)
+MODEL_MAX_ATTEMPTS = int(os.environ.get("MODEL_MAX_ATTEMPTS", "3"))
+MODEL_RETRY_BASE_S = float(os.environ.get("MODEL_RETRY_BASE_S", "0.5"))
+MODEL_RETRY_MAX_S = float(os.environ.get("MODEL_RETRY_MAX_S", "8"))
+MODEL_HEDGE_AFTER_S = (
+    float(os.environ["MODEL_HEDGE_AFTER_S"])
+    if os.environ.get("MODEL_HEDGE_AFTER_S")
+    else None
+)
+BREAKER_FAILURE_THRESHOLD = int(os.environ.get("BREAKER_FAILURE_THRESHOLD", "5"))
+BREAKER_COOLDOWN_S = float(os.environ.get("BREAKER_COOLDOWN_S", "30"))
+
+# Sliding window over the conversation sent to the model (see
+# app/agents/context_window.py). Token counts are estimates (chars / 4) of the
+# conversation contents; system instructions are not included.
+CONTEXT_WINDOW = _env_flag("CONTEXT_WINDOW", True)
+CONTEXT_MAX_TURNS = int(os.environ.get("CONTEXT_MAX_TURNS", "4"))
+CONTEXT_MAX_INPUT_TOKENS = int(os.environ.get("CONTEXT_MAX_INPUT_TOKENS", "6000"))
+CONTEXT_SUMMARY_TOKENS = int(os.environ.get("CONTEXT_SUMMARY_TOKENS", "400"))
+
+# Give sub-agents only the previous exchange, the current request, their scoped
+# state fields and the latest tool result instead of the full conversation (see
+# app/agents/scoped_context.py).
+SCOPED_CONTEXT = _env_flag("SCOPED_CONTEXT", True)
+
+# Token budgets (see app/agents/budgets.py); 0 disables a budget. A user may
+# spend USER_TOKEN_BUDGET tokens per USER_BUDGET_WINDOW_S (per-user overrides
+# in the USER_TOKEN_BUDGETS_FILE JSON object), a session SESSION_TOKEN_BUDGET
+# in total. Over budget, calls are "downgrade"d to BUDGET_MODEL or, with
+# "deterministic", answered from the entitlement check where possible.
+USER_TOKEN_BUDGET = int(os.environ.get("USER_TOKEN_BUDGET", "0"))
+USER_TOKEN_BUDGETS_FILE = os.environ.get("USER_TOKEN_BUDGETS_FILE")
+USER_BUDGET_WINDOW_S = float(os.environ.get("USER_BUDGET_WINDOW_S", "86400"))
+SESSION_TOKEN_BUDGET = int(os.environ.get("SESSION_TOKEN_BUDGET", "0"))
+BUDGET_ACTION = os.environ.get("BUDGET_ACTION", "downgrade").lower()
+BUDGET_MODEL = os.environ.get("BUDGET_MODEL") or "gemini-2.5-flash-lite"
+
+# Prompt sets (see app/agents/prompt_sets.py) live traffic is split across,
+# with optional weights, e.g. "default:90,updated-1:10" (see
+# app/agents/prompt_variants.py). The first one is the baseline.
+PROMPT_VARIANTS = os.environ.get("PROMPT_VARIANTS", "default")
+
+# Agent tool backends: "memory" keeps the synchronous tools over the
+# in-process registry and catalog, which reset on restart; "sqlite" runs async
+# tools over pooled stores (see app/agents/stores.py) at TOOL_STORE, so plan
+# upgrades persist until that file is deleted. make serve-offline and
+# make deploy opt in to "sqlite".
+TOOL_BACKEND = os.environ.get("TOOL_BACKEND", "memory").lower()
+TOOL_STORE = os.environ.get("TOOL_STORE", ".data/tools.sqlite")
+TOOL_STORE_POOL_SIZE = int(os.environ.get("TOOL_STORE_POOL_SIZE", "4"))
+
+# Append-only conversation journal (see app/app_utils/journal.py). Set to ""
+# or "none" to keep history in memory only.
+CONVERSATION_JOURNAL = os.environ.get(
+    "CONVERSATION_JOURNAL", ".data/conversations.journal"
+)
+if CONVERSATION_JOURNAL.lower() in ("", "none"):
+    CONVERSATION_JOURNAL = ""
+JOURNAL_SYNC_INTERVAL_S = float(os.environ.get("JOURNAL_SYNC_INTERVAL_S", "0.05"))
+
+# Interaction log for feedback and turn summaries (see
+# app/app_utils/interaction_log.py): "jsonl" or "parquet" files under
+# INTERACTION_LOG_DIR, "gcp" (Cloud Logging), "package.module:factory" for a
+# custom sink, or "" / "none" to turn it off.
+INTERACTION_LOG = os.environ.get("INTERACTION_LOG", "jsonl")
+if INTERACTION_LOG.lower() == "none":
+    INTERACTION_LOG = ""
+INTERACTION_LOG_DIR = os.environ.get("INTERACTION_LOG_DIR", ".data/interactions")
+INTERACTION_LOG_MAX_QUEUE = int(os.environ.get("INTERACTION_LOG_MAX_QUEUE", "10000"))
+INTERACTION_LOG_BATCH_SIZE = int(os.environ.get("INTERACTION_LOG_BATCH_SIZE", "500"))
+INTERACTION_LOG_FLUSH_S = float(os.environ.get("INTERACTION_LOG_FLUSH_S", "1.0"))
+
+# Opt-in turn capture for replay (see app/app_utils/turn_capture.py): a
+# trace file path, or "" to leave it off. TURN_CAPTURE_SAMPLE is the fraction
+# of turns captured; TURN_CAPTURE_REDACT lists redaction hooks ("default",
+# "none" or package.module:function, comma-separated).
+TURN_CAPTURE = os.environ.get("TURN_CAPTURE", "")
+TURN_CAPTURE_SAMPLE = float(os.environ.get("TURN_CAPTURE_SAMPLE", "1.0"))
+TURN_CAPTURE_REDACT = os.environ.get("TURN_CAPTURE_REDACT", "default")
+
+# Opt-in turn profiling (see app/app_utils/profiling.py). Off by default; when
+# on, turns are only sampled once armed via /admin/profile or X-Profile: 1.
+PROFILING = _env_flag("PROFILING", False)
+PROFILING_INTERVAL_MS = float(os.environ.get("PROFILING_INTERVAL_MS", "5"))
+
+# How long a finished /chat/stream turn stays replayable for reconnects that
+# send Last-Event-ID (see app/app_utils/turn_streams.py).
+STREAM_REPLAY_TTL_S = float(os.environ.get("STREAM_REPLAY_TTL_S", "120"))
+
+# Where application spans go (see app/app_utils/telemetry.py): "" (nowhere
+# unless a provider is already installed), "console", "otlp" or "gcp".
+TRACE_EXPORTER = os.environ.get("TRACE_EXPORTER", "").lower()
+
+# Model backend: "gemini" (live API), "replay" (offline fixtures, see
+# app/agents/offline_model.py) or "record" (live API, calls appended to
+# LLM_FIXTURES, which record mode requires). Replay defaults to the bundled
+# tests/fixtures/offline_llm.jsonl.
+LLM_BACKEND = os.environ.get("LLM_BACKEND", "gemini").lower()
+LLM_FIXTURES = os.environ.get("LLM_FIXTURES")
+# Replay profile name or JSON, e.g. "flash" or 'flaky:{"error_rate": 0.5}'.
+LLM_REPLAY_PROFILE = os.environ.get("LLM_REPLAY_PROFILE")
+
+# Optional JSON file of per-agent overrides, e.g.
+# {"service_agent": {"model": "gemini-2.5-flash", "max_output_tokens": 2048}}
+AGENT_SETTINGS_FILE = os.environ.get("AGENT_SETTINGS_FILE")
+
+
+@dataclass(frozen=True)
+class AgentModelSettings:
+    """Model and generation budget for a single agent."""
+
+    model: str
+    max_output_tokens: Optional[int] = None
+    thinking_budget: Optional[int] = None
+    temperature: Optional[float] = None
+
+    def generate_content_config(self) -> Optional[genai_types.GenerateContentConfig]:
+        """Build the ADK generation config, or None when nothing is overridden."""
+        kwargs: Dict[str, Any] = {}
+        if self.max_output_tokens is not None:
+            kwargs["max_output_tokens"] = self.max_output_tokens
+        if self.temperature is not None:
+            kwargs["temperature"] = self.temperature
+        if self.thinking_budget is not None:
+            kwargs["thinking_config"] = genai_types.ThinkingConfig(
+                thinking_budget=self.thinking_budget
+            )
+        return genai_types.GenerateContentConfig(**kwargs) if kwargs else None
+
+
+DEFAULT_AGENT_SETTINGS: Dict[str, AgentModelSettings] = {
+    "root_agent": AgentModelSettings(
+        model=ROUTER_MODEL, max_output_tokens=1024, thinking_budget=0, temperature=0.0
+    ),
+    "action_agent": AgentModelSettings(model=AGENT_MODEL),
+    "recommendation_agent": AgentModelSettings(model=AGENT_MODEL),
+    "service_agent": AgentModelSettings(model=AGENT_MODEL),
+    # Not an agent: the model adaptive routing re-issues low-confidence router
+    # calls on, with its own budgets (ROUTER_ESCALATION_MAX_OUTPUT_TOKENS, ...).
+    "router_escalation": AgentModelSettings(model=ROUTER_ESCALATION_MODEL),
+}
+
+_CASTS = {
+    "model": str,
+    "max_output_tokens": int,
+    "thinking_budget": int,
+    "temperature": float,
+}
+
+
+def _load_settings_file(path: Optional[str]) -> Dict[str, Dict[str, Any]]:
+    if not path:
+        return {}
+    with open(path, encoding="utf-8") as fh:
+        data = json.load(fh)
+    if not isinstance(data, dict):
+        raise ValueError(f"{path} must contain a JSON object keyed by agent name")
+    return data
+
+
+def agent_settings(
+    agent_name: str,
+    *,
+    environ: Optional[Dict[str, str]] = None,
+    settings_file: Optional[str] = None,
+) -> AgentModelSettings:
+    """Resolve the model settings for ``agent_name``.
+
+    Precedence, highest first: ``<AGENT_NAME>_<FIELD>`` environment variables
+    (e.g. ``ROOT_AGENT_MODEL``, ``SERVICE_AGENT_MAX_OUTPUT_TOKENS``), the
+    ``AGENT_SETTINGS_FILE`` JSON entry, then the built-in defaults.
+    """
+    env = os.environ if environ is None else environ
+    settings = DEFAULT_AGENT_SETTINGS.get(agent_name, AgentModelSettings(AGENT_MODEL))
+
+    file_overrides = _load_settings_file(settings_file or AGENT_SETTINGS_FILE)
+    overrides: Dict[str, Any] = {}
+    for key, value in (file_overrides.get(agent_name) or {}).items():
+        if key not in _CASTS:
+            raise ValueError(f"Unknown setting {key!r} for {agent_name}")
+        overrides[key] = None if value is None else _CASTS[key](value)
+
+    prefix = agent_name.upper()
+    for field in fields(AgentModelSettings):
+        raw = env.get(f"{prefix}_{field.name.upper()}")
+        if raw is None or raw == "":
+            continue
+        # "none" clears a default, e.g. a thinking budget the model rejects.
+        if raw.lower() == "none" and field.name != "model":
+            overrides[field.name] = None
+        else:
+            overrides[field.name] = _CASTS[field.name](raw)
+
+    return replace(settings, **overrides)
@@ -0,0 +1,216 @@
+"""Context windowing for agent model calls.
+
+ADK rebuilds ``llm_request.contents`` from every event in the session, so
+each call re-sends the whole conversation: old user messages with their
+``{"session_state": ...}`` blobs, every ``transfer_to_agent`` hop and every
+tool payload. ``ContextWindowPlugin`` rewrites the contents before each model
+call:
+
+* the current turn is kept verbatim (the tool loop needs it);
+* the previous ``max_turns`` turns are kept as plain conversation, without
+  state blobs, function calls or tool results, which are stale by then;
+* older turns are folded into a rolling summary stored in session state as
+  ``conversation_summary`` and sent as one ``For context:`` message;
+* if the result is still over ``max_input_tokens``, more turns are folded.
+
+Summaries are built from the turns' text, not by a model call, and each
+turn is folded once, so the work per call stays bounded as the
+conversation grows.
+"""
+
+from __future__ import annotations
+
+import logging
+import re
+from collections import Counter
+from dataclasses import dataclass
+from typing import List, Optional, Sequence
+
+from google.adk.agents.callback_context import CallbackContext
+from google.adk.models.llm_request import LlmRequest
+from google.adk.models.llm_response import LlmResponse
+from google.adk.plugins.base_plugin import BasePlugin
+from google.genai import types as genai_types
+
+from .prompt_compiler import estimate_tokens
+from .state import get_session_state, update_session_state
+
+logger = logging.getLogger(__name__)
+
+_CONTEXT_PREFIX = "For context:"
+_STATE_PREFIX = '{"session_state"'
+_SUMMARY_HEADER = "Summary of earlier conversation:"
+# How ADK presents another agent's tool calls and results to the current agent.
+_TOOL_NARRATION = re.compile(
+    r"^\[[^\]]+\] (called tool `|`[^`]+` tool returned result:)"
+)
+
+# turns_summarized, tool_parts_dropped, calls_over_budget.
+CONTEXT_STATS: Counter[str] = Counter()
+
+Turn = List[genai_types.Content]
+
+
+@dataclass(frozen=True)
+class ContextPolicy:
+    """Token limits for the conversation part of a model request."""
+
+    max_turns: int = 4
+    max_input_tokens: int = 6000
+    summary_tokens: int = 400
+    line_chars: int = 160
+
+
+def _is_turn_start(content: genai_types.Content) -> bool:
+    if content.role != "user" or not content.parts:
+        return False
+    text = content.parts[0].text
+    return bool(text) and not str(text).startswith(_CONTEXT_PREFIX)
+
+
+def split_turns(contents: Sequence[genai_types.Content]) -> List[Turn]:
+    """Group contents into turns, each starting at a user message."""
+    turns: List[Turn] = []
+    for content in contents:
+        if _is_turn_start(content) or not turns:
+            turns.append([])
+        turns[-1].append(content)
+    return turns
+
+
+def content_tokens(contents: Sequence[genai_types.Content]) -> int:
+    """Approximate token count of ``contents``, tool payloads included."""
+    total = 0
+    for content in contents:
+        for part in content.parts or []:
+            if part.text:
+                total += estimate_tokens(part.text)
+            elif part.function_call or part.function_response:
+                total += estimate_tokens(part.model_dump_json(exclude_none=True))
+    return total
+
+
+def _conversational(part: genai_types.Part) -> bool:
+    """Whether a part of a finished turn is still worth sending."""
+    if not part.text or part.thought:
+        return False
+    text = part.text
+    if text.startswith(_STATE_PREFIX):
+        return False
+    return not _TOOL_NARRATION.match(text)
+
+
+def strip_turn(turn: Turn) -> Turn:
+    """A finished turn without state blobs, tool calls or tool results."""
+    stripped: Turn = []
+    for content in turn:
+        parts = [p for p in content.parts or [] if _conversational(p)]
+        CONTEXT_STATS["tool_parts_dropped"] += len(content.parts or []) - len(parts)
+        if parts and parts != [genai_types.Part(text=_CONTEXT_PREFIX)]:
+            stripped.append(genai_types.Content(role=content.role, parts=parts))
+    return stripped
+
+
+def _clip(text: str, limit: int) -> str:
+    text = " ".join(text.split())
+    return text if len(text) <= limit else text[: limit - 1] + "…"
+
+
+def summarize_turn(turn: Turn, line_chars: int = 160) -> str:
+    """One summary line: the user's message and the last reply to it."""
+    user = turn[0].parts[0].text if turn and turn[0].parts else ""
+    reply = ""
+    for content in turn[1:]:
+        for part in content.parts or []:
+            if not part.text or part.thought or not _conversational(part):
+                continue
+            text = part.text
+            if "] said: " in text:
+                text = text.split("] said: ", 1)[1]
+            if text != _CONTEXT_PREFIX:
+                reply = text
+    line = f"- User: {_clip(user or '', line_chars)}"
+    return line + (f" / Assistant: {_clip(reply, line_chars)}" if reply else "")
+
+
+def _trim_summary(lines: List[str], max_tokens: int) -> List[str]:
+    while len(lines) > 1 and estimate_tokens("\n".join(lines)) > max_tokens:
+        lines = lines[1:]
+    return lines
+
+
+def summary_content(summary: str) -> genai_types.Content:
+    return genai_types.Content(
+        role="user",
+        parts=[
+            genai_types.Part(text=_CONTEXT_PREFIX),
+            genai_types.Part(text=f"{_SUMMARY_HEADER}\n{summary}"),
+        ],
+    )
+
+
+def window_contents(
+    session_id: str, contents: Sequence[genai_types.Content], policy: ContextPolicy
+) -> List[genai_types.Content]:
+    """The windowed contents for one model call; updates the rolling summary."""
+    turns = split_turns(contents)
+    if len(turns) <= 1:
+        return list(contents)
+
+    state = get_session_state(session_id)
+    folded = min(int(state.get("summarized_turns", 0)), len(turns) - 1)
+    lines = [
+        line
+        for line in str(state.get("conversation_summary") or "").splitlines()
+        if line
+    ]
+    start = max(folded, len(turns) - 1 - policy.max_turns)
+
+    kept = [strip_turn(t) for t in turns[start:-1]]
+    current = turns[-1]
+
+    def assemble() -> List[genai_types.Content]:
+        head = [summary_content("\n".join(lines))] if lines else []
+        return head + [c for t in kept for c in t] + list(current)
+
+    for turn in turns[folded:start]:
+        lines.append(summarize_turn(turn, policy.line_chars))
+    windowed = assemble()
+    if content_tokens(windowed) > policy.max_input_tokens:
+        CONTEXT_STATS["calls_over_budget"] += 1
+    while kept and content_tokens(windowed) > policy.max_input_tokens:
+        lines.append(summarize_turn(turns[start], policy.line_chars))
+        kept.pop(0)
+        start += 1
+        windowed = assemble()
+
+    if start > folded:
+        lines = _trim_summary(lines, policy.summary_tokens)
+        CONTEXT_STATS["turns_summarized"] += start - folded
+        update_session_state(
+            session_id, conversation_summary="\n".join(lines), summarized_turns=start
+        )
+        windowed = assemble()
+        logger.debug(
+            "Session %s: folded turns %d-%d into the summary",
+            session_id,
+            folded,
+            start - 1,
+        )
+    return windowed
+
+
+class ContextWindowPlugin(BasePlugin):
+    """Runner plugin applying a ``ContextPolicy`` to every agent's model call."""
+
+    def __init__(self, policy: Optional[ContextPolicy] = None):
+        super().__init__(name="context_window")
+        self.policy = policy or ContextPolicy()
+
+    async def before_model_callback(
+        self, *, callback_context: CallbackContext, llm_request: LlmRequest
+    ) -> Optional[LlmResponse]:
+        llm_request.contents = window_contents(
+            callback_context.session.id, llm_request.contents, self.policy
+        )
+        return None
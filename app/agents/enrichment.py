@@ -0,0 +1,67 @@
+"""Pre-turn enrichment: precompute entitlement checks before the first model call.
+
+Without it the model's first move on most turns is a ``check_entitlement``
+function call, which costs a full round trip for a result the server can
+compute from the message and the user's profile. ``enrich_turn`` finds the
+catalog reports named in the message, resolves the plan, looks the reports
+up in the tools' catalog and writes the results to session state, so both
+the router and the model see them up front.
+"""
+
+from __future__ import annotations
+
+import asyncio
+from typing import Any, Dict, List
+
+from . import async_tools
+from .config import TOOL_BACKEND
+from .entitlement_tools import Plan, check_entitlement
+from .router import current_plan, find_reports
+from .state import get_session_state, update_session_state
+
+
+async def _lookups(reports: List[str], plan: Plan) -> List[Dict[str, object]]:
+    """Entitlement checks from the same catalog the agents' tools read.
+
+    The in-process catalog is a dict lookup, done inline; the SQLite catalog
+    goes through ``CatalogStore.lookup`` like the async tools.
+    """
+    if TOOL_BACKEND != "sqlite":
+        return [check_entitlement(report=report, plan=plan) for report in reports]
+    return list(
+        await asyncio.gather(
+            *(
+                async_tools.check_entitlement(report=report, plan=plan)
+                for report in reports
+            )
+        )
+    )
+
+
+async def enrich_turn(session_id: str, message: str) -> Dict[str, Any]:
+    """Precompute entitlement checks for ``message``; return the state updates.
+
+    ``entitlement_check`` holds the result for the first report named, which
+    is what the prompts and tools expect; ``entitlement_checks`` holds every
+    report when several are named. Turns that name no report leave the
+    previous facts in place.
+    """
+    state = get_session_state(session_id)
+    plan = current_plan(state)
+    reports = find_reports(message)
+    if plan is None or not reports:
+        return {}
+
+    checks = await _lookups(reports, plan)  # type: ignore[arg-type]
+    updates: Dict[str, Any] = {
+        "current_plan": plan,
+        "report_name": reports[0],
+        "product_name": reports[0],
+        "entitlement_check": checks[0],
+        "entitlement_checks": [
+            {"report": report, **check}
+            for report, check in zip(reports, checks, strict=True)
+        ],
+    }
+    update_session_state(session_id, **updates)
+    return updates
@@ -46,9 +46,13 @@ def check_entitlement(*, report: str, plan: Plan) -> Dict[str, object]:
       - canonical_report: normalized key used for comparison
     """
     key = _normalize(report)
-    paid_only = key in _PAID
-    lowest_plan: Optional[Plan] = _REVERSE_INDEX.get(key)
+    return entitlement_result(key, plan, _REVERSE_INDEX.get(key), key in _PAID)
 
+
+def entitlement_result(
+    key: str, plan: Plan, lowest_plan: Optional[Plan], paid_only: bool
+) -> Dict[str, object]:
+    """``check_entitlement``'s answer for a catalog lookup of normalized ``key``."""
     if paid_only:
         return {
             "status": "paid",
@@ -0,0 +1,162 @@
+"""Concurrent answers for questions that name several reports.
+
+The LLM orchestrator handles "do I get ACH Inbound detail, Wire tracking
+detail and Present Day?" by calling ``check_entitlement`` once per report,
+each call a model round trip, before handing off. When the router sees
+several reports it transfers to ``fanout_agent`` instead, which:
+
+* reuses the pre-turn entitlement checks (or runs them concurrently),
+* runs one branch per report on the agent ``STATUS_ROUTES`` picks for it,
+  all at once, each told to answer only about its report, and
+* streams branch one live while buffering the others, then emits the
+  buffered replies in report order, so the answer reads as one message.
+
+Branches get the check for their report in their instruction, so they run
+without tools: one model call each, and a multi-report turn takes about as
+long as its slowest report.
+"""
+
+from __future__ import annotations
+
+import asyncio
+from collections import Counter
+from typing import Any, AsyncGenerator, Dict, List, Optional
+
+from google.adk.agents import BaseAgent, LlmAgent
+from google.adk.agents.invocation_context import InvocationContext
+from google.adk.agents.readonly_context import ReadonlyContext
+from google.adk.events.event import Event
+from google.adk.utils.context_utils import Aclosing
+from pydantic import Field
+
+from .enrichment import enrich_turn
+from .prompt_compiler import compact_value
+from .router import STATUS_ROUTES, current_plan, find_reports
+from .state import get_session_state
+
+# Multi-report turns answered by fan-out and the branches they ran.
+FANOUT_STATS: Counter[str] = Counter()
+
+_SEPARATOR = "\n\n"
+
+
+def _focused(instruction: Any, report: str, check: Dict[str, Any]) -> Any:
+    """``instruction`` narrowed to one report of a multi-report question."""
+
+    async def provider(ctx: ReadonlyContext) -> str:
+        base = instruction(ctx) if callable(instruction) else instruction
+        if asyncio.iscoroutine(base):
+            base = await base
+        return (
+            f"{base}\n\nThe user asked about several reports; other replies cover the rest. "
+            f"Answer only about {report}: entitlement_check={compact_value(check)}"
+        )
+
+    provider.__name__ = "focused_instruction"
+    return provider
+
+
+def _separate(event: Event, first_text: bool) -> bool:
+    """Prefix a paragraph break to a later branch's reply; True once text was seen.
+
+    Both the first partial and the final aggregated event get the prefix, so
+    the final still starts with everything the partials streamed.
+    """
+    parts = event.content.parts if event.content and event.content.parts else []
+    part = next((p for p in parts if p.text and not p.thought), None)
+    if part is None:
+        return first_text
+    if first_text or not event.partial:
+        part.text = _SEPARATOR + (part.text or "")
+    return False
+
+
+class FanOutAgent(BaseAgent):
+    """Answers a multi-report question with one concurrent branch per report."""
+
+    routes: Dict[str, str] = Field(default_factory=lambda: dict(STATUS_ROUTES))
+
+    async def _checks(self, ctx: InvocationContext) -> List[Dict[str, Any]]:
+        """This turn's per-report checks, computed now if enrichment missed them."""
+        session_id = ctx.session.id
+        message = ""
+        if ctx.user_content and ctx.user_content.parts:
+            message = ctx.user_content.parts[0].text or ""
+        reports = find_reports(message)
+        state = get_session_state(session_id)
+        checks = state.get("entitlement_checks") or []
+        plan = current_plan(state)
+        if [c.get("report") for c in checks] != reports or any(
+            c.get("current_plan") != plan for c in checks
+        ):
+            checks = (await enrich_turn(session_id, message)).get(
+                "entitlement_checks", []
+            )
+        return checks
+
+    def _branch(
+        self, ctx: InvocationContext, index: int, check: Dict[str, Any]
+    ) -> Optional[Any]:
+        target = self.root_agent.find_agent(
+            self.routes.get(str(check.get("status")), "")
+        )
+        if not isinstance(target, LlmAgent):
+            return None
+        branch_agent = target.clone(
+            update={
+                "instruction": _focused(target.instruction, check["report"], check),
+                "tools": [],
+                "disallow_transfer_to_parent": True,
+                "disallow_transfer_to_peers": True,
+            }
+        )
+        # Keep the tree's global instruction; the clone is never transferred to.
+        branch_agent.parent_agent = self
+        branch_ctx = ctx.model_copy()
+        suffix = f"{self.name}.{index}"
+        branch_ctx.branch = f"{ctx.branch}.{suffix}" if ctx.branch else suffix
+        return branch_agent.run_async(branch_ctx)
+
+    async def _run_async_impl(
+        self, ctx: InvocationContext
+    ) -> AsyncGenerator[Event, None]:
+        checks = await self._checks(ctx)
+        runs = [
+            run
+            for i, check in enumerate(checks)
+            if (run := self._branch(ctx, i, check))
+        ]
+        if not runs:
+            return
+        FANOUT_STATS["turns"] += 1
+        FANOUT_STATS["branches"] += len(runs)
+
+        queues: List[asyncio.Queue] = [asyncio.Queue() for _ in runs]
+
+        async def drain(run: Any, queue: asyncio.Queue) -> None:
+            try:
+                async with Aclosing(run) as events:
+                    async for event in events:
+                        await queue.put(event)
+            finally:
+                await queue.put(None)
+
+        tasks = [
+            asyncio.create_task(drain(run, queue))
+            for run, queue in zip(runs, queues, strict=True)
+        ]
+        try:
+            for index, queue in enumerate(queues):
+                first_text = True
+                while (event := await queue.get()) is not None:
+                    if index:
+                        first_text = _separate(event, first_text)
+                    yield event
+                    if event.error_code:
+                        return  # the turn is over; the other branches are cancelled
+            for task in tasks:
+                task.result()  # surface a branch that crashed
+        finally:
+            for task in tasks:
+                task.cancel()
+            await asyncio.gather(*tasks, return_exceptions=True)
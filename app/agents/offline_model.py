@@ -0,0 +1,304 @@
+"""Offline model backends: deterministic replay and session recording.
+
+``ReplayLlm`` stands in for Gemini in every agent so the web server, runner,
+tools and SSE path can be exercised without network access. Responses come
+from a JSONL fixture file; each line is one model call::
+
+    {"agent": "root_agent", "prompt": "can i get present day?", "step": 0,
+     "responses": [<LlmResponse JSON>, ...]}
+
+``prompt`` is the user's message for the turn (normalized; ``"*"`` matches
+any message) and ``step`` counts the function responses the agent has already
+received in that turn, so a tool call, the follow-up answer and a
+``transfer_to_agent`` hop are separate entries. Unmatched calls get a
+deterministic echo reply.
+
+``RecordingLlm`` wraps a real model and appends every call in the same
+format, which is how fixtures are captured from live sessions.
+
+Latency, token rate and error injection are controlled by a
+``ReplayProfile``.
+"""
+
+from __future__ import annotations
+
+import asyncio
+import json
+import logging
+import random
+import threading
+from dataclasses import dataclass, replace
+from pathlib import Path
+from typing import Any, AsyncGenerator, Dict, List, Optional, Tuple
+
+from google.adk.models.base_llm import BaseLlm
+from google.adk.models.llm_request import LlmRequest
+from google.adk.models.llm_response import LlmResponse
+from google.genai import errors as genai_errors
+from google.genai import types as genai_types
+from pydantic import PrivateAttr
+
+logger = logging.getLogger(__name__)
+
+DEFAULT_FIXTURES = (
+    Path(__file__).resolve().parents[2] / "tests" / "fixtures" / "offline_llm.jsonl"
+)
+
+_CONTEXT_PREFIX = "For context:"
+
+
+@dataclass(frozen=True)
+class ReplayProfile:
+    """Timing and failure behaviour of the fake model."""
+
+    ttft_ms: float = 0.0
+    tokens_per_s: float = 0.0  # 0 streams everything at once
+    chunk_tokens: int = 8
+    error_rate: float = 0.0
+    error_code: int = 429
+    retry_after_s: Optional[float] = None  # RetryInfo hint on injected errors
+    fail_first: int = 0  # the first N calls always fail
+    stall_first: int = 0  # the first N calls wait an extra stall_ms
+    stall_ms: float = 0.0
+    seed: Optional[int] = None
+
+
+PROFILES: Dict[str, ReplayProfile] = {
+    "instant": ReplayProfile(),
+    "flash": ReplayProfile(ttft_ms=350, tokens_per_s=180),
+    "pro": ReplayProfile(ttft_ms=1800, tokens_per_s=70),
+    "flaky": ReplayProfile(
+        ttft_ms=350, tokens_per_s=180, error_rate=0.2, error_code=429
+    ),
+    "overloaded": ReplayProfile(ttft_ms=50, error_rate=0.9, error_code=503),
+}
+
+
+def resolve_profile(spec: Optional[str]) -> ReplayProfile:
+    """Parse a profile name, a JSON object, or ``name`` plus JSON overrides.
+
+    Examples: ``"flash"``, ``'{"ttft_ms": 200}'``, ``'flaky:{"error_rate": 0.5}'``.
+    """
+    if not spec:
+        return PROFILES["instant"]
+    name, _, overrides = spec.partition(":")
+    if name.lstrip().startswith("{"):
+        return ReplayProfile(**json.loads(spec))
+    if name not in PROFILES:
+        raise ValueError(
+            f"Unknown replay profile {name!r}; choose from {sorted(PROFILES)}"
+        )
+    profile = PROFILES[name]
+    return replace(profile, **json.loads(overrides)) if overrides else profile
+
+
+def _normalize_prompt(text: str) -> str:
+    return " ".join(text.strip().lower().split())
+
+
+def request_key(llm_request: LlmRequest) -> Tuple[str, int]:
+    """Return ``(user prompt, step)`` identifying a model call within a turn."""
+    contents = llm_request.contents or []
+    for index in range(len(contents) - 1, -1, -1):
+        content = contents[index]
+        if content.role != "user" or not content.parts:
+            continue
+        first = content.parts[0]
+        if first.text and not first.text.startswith(_CONTEXT_PREFIX):
+            step = sum(
+                1
+                for later in contents[index + 1 :]
+                for part in later.parts or []
+                if part.function_response is not None
+            )
+            return _normalize_prompt(first.text), step
+    return "", 0
+
+
+def load_fixtures(path: Path | str) -> Dict[Tuple[str, str, int], List[LlmResponse]]:
+    """Index a fixture file by ``(agent, prompt, step)``; later lines win."""
+    fixtures: Dict[Tuple[str, str, int], List[LlmResponse]] = {}
+    path = Path(path)
+    if not path.exists():
+        return fixtures
+    with path.open(encoding="utf-8") as fh:
+        for line in fh:
+            if not line.strip():
+                continue
+            record = json.loads(line)
+            key = (
+                record["agent"],
+                _normalize_prompt(record["prompt"]),
+                int(record.get("step", 0)),
+            )
+            fixtures[key] = [LlmResponse.model_validate(r) for r in record["responses"]]
+    return fixtures
+
+
+def _text_of(response: LlmResponse) -> str:
+    parts = (
+        response.content.parts if response.content and response.content.parts else []
+    )
+    return "".join(p.text for p in parts if p.text and not p.thought)
+
+
+class ReplayLlm(BaseLlm):
+    """Deterministic fake model that replays recorded responses."""
+
+    agent_name: str
+    fixtures_path: str = str(DEFAULT_FIXTURES)
+    profile: ReplayProfile = ReplayProfile()
+
+    _fixtures: Optional[Dict[Tuple[str, str, int], List[LlmResponse]]] = PrivateAttr(
+        default=None
+    )
+    _rng: random.Random = PrivateAttr(default_factory=random.Random)
+    _calls: int = PrivateAttr(default=0)
+
+    def model_post_init(self, __context: Any) -> None:
+        self._rng = random.Random(self.profile.seed)
+
+    @property
+    def calls(self) -> int:
+        """Number of model calls served."""
+        return self._calls
+
+    def _lookup(self, prompt: str, step: int) -> List[LlmResponse]:
+        if self._fixtures is None:
+            self._fixtures = load_fixtures(self.fixtures_path)
+        for key in ((self.agent_name, prompt, step), (self.agent_name, "*", step)):
+            if key in self._fixtures:
+                return [r.model_copy(deep=True) for r in self._fixtures[key]]
+        reply = f"[offline {self.agent_name}] {prompt}" if prompt else "[offline]"
+        return [
+            LlmResponse(
+                content=genai_types.Content(
+                    role="model", parts=[genai_types.Part(text=reply)]
+                )
+            )
+        ]
+
+    def _usage(
+        self, request_tokens: int, text: str
+    ) -> genai_types.GenerateContentResponseUsageMetadata:
+        candidates = max(1, len(text) // 4)
+        return genai_types.GenerateContentResponseUsageMetadata(
+            prompt_token_count=request_tokens,
+            candidates_token_count=candidates,
+            total_token_count=request_tokens + candidates,
+        )
+
+    async def generate_content_async(
+        self, llm_request: LlmRequest, stream: bool = False
+    ) -> AsyncGenerator[LlmResponse, None]:
+        self._calls += 1
+        call = self._calls
+        profile = self.profile
+        delay_ms = profile.ttft_ms + (
+            profile.stall_ms if call <= profile.stall_first else 0.0
+        )
+        if delay_ms:
+            await asyncio.sleep(delay_ms / 1000)
+        if call <= profile.fail_first or (
+            profile.error_rate and self._rng.random() < profile.error_rate
+        ):
+            raise self._injected_error()
+
+        prompt, step = request_key(llm_request)
+        # Like the live API, the prompt count includes the system instruction,
+        # so prompt variants differ offline too.
+        system = llm_request.config.system_instruction if llm_request.config else None
+        request_tokens = (
+            sum(len(p.text or "") for c in llm_request.contents for p in c.parts or [])
+            + (len(system) if isinstance(system, str) else 0)
+        ) // 4
+        for response in self._lookup(prompt, step):
+            text = _text_of(response)
+            response.usage_metadata = response.usage_metadata or self._usage(
+                request_tokens, text
+            )
+            response.model_version = response.model_version or f"replay:{self.model}"
+            parts = (
+                response.content.parts
+                if response.content and response.content.parts
+                else []
+            )
+            has_calls = any(p.function_call for p in parts)
+            if stream and text and not has_calls:
+                async for chunk in self._stream_text(text):
+                    yield chunk
+            response.partial = False
+            yield response
+
+    def _injected_error(self) -> genai_errors.APIError:
+        profile = self.profile
+        status = "RESOURCE_EXHAUSTED" if profile.error_code == 429 else "UNAVAILABLE"
+        error: Dict[str, Any] = {
+            "code": profile.error_code,
+            "message": "Injected by ReplayLlm",
+            "status": status,
+        }
+        if profile.retry_after_s is not None:
+            error["details"] = [
+                {
+                    "@type": "type.googleapis.com/google.rpc.RetryInfo",
+                    "retryDelay": f"{profile.retry_after_s}s",
+                }
+            ]
+        if profile.error_code < 500:
+            return genai_errors.ClientError(profile.error_code, {"error": error})
+        return genai_errors.ServerError(profile.error_code, {"error": error})
+
+    async def _stream_text(self, text: str) -> AsyncGenerator[LlmResponse, None]:
+        chunk_chars = max(1, self.profile.chunk_tokens * 4)
+        delay = (
+            self.profile.chunk_tokens / self.profile.tokens_per_s
+            if self.profile.tokens_per_s
+            else 0.0
+        )
+        for start in range(0, len(text), chunk_chars):
+            if delay and start:
+                await asyncio.sleep(delay)
+            yield LlmResponse(
+                content=genai_types.Content(
+                    role="model",
+                    parts=[genai_types.Part(text=text[start : start + chunk_chars])],
+                ),
+                partial=True,
+            )
+
+
+class RecordingLlm(BaseLlm):
+    """Wraps a real model and appends each call to a fixture file."""
+
+    agent_name: str
+    inner: BaseLlm
+    fixtures_path: str
+
+    _lock: threading.Lock = PrivateAttr(default_factory=threading.Lock)
+
+    async def generate_content_async(
+        self, llm_request: LlmRequest, stream: bool = False
+    ) -> AsyncGenerator[LlmResponse, None]:
+        prompt, step = request_key(llm_request)
+        final: List[LlmResponse] = []
+        async for response in self.inner.generate_content_async(
+            llm_request, stream=stream
+        ):
+            if not response.partial:
+                final.append(response)
+            yield response
+        record = {
+            "agent": self.agent_name,
+            "prompt": prompt,
+            "step": step,
+            "responses": [
+                r.model_dump(mode="json", exclude_none=True, exclude={"usage_metadata"})
+                for r in final
+            ],
+        }
+        line = json.dumps(record, ensure_ascii=False)
+        with self._lock:
+            Path(self.fixtures_path).parent.mkdir(parents=True, exist_ok=True)
+            with open(self.fixtures_path, "a", encoding="utf-8") as fh:
+                fh.write(line + "\n")
@@ -0,0 +1,56 @@
+"""Speculative reply preamble for streamed turns.
+
+``GLOBAL_INSTRUCTION`` has every answer greet the user by name, so replies
+open with text the server already knows. With ``SPECULATIVE_PREAMBLE`` on,
+the web server streams that opening itself the moment a ``/chat/stream``
+turn starts: a greeting from the user profile and, when the message names
+catalog reports, which ones are being checked against which plan, e.g.
+"Hi Alice! Let me check Present Day on your GOLD plan."
+
+The preamble only restates the request; the entitlement answer still comes
+from the agents. It is kept in session state for the turn, and the global
+instruction then tells every agent the reply already starts with it, so the
+model continues instead of greeting again.
+"""
+
+from __future__ import annotations
+
+from typing import Any, List, Mapping, Optional
+
+from .router import current_plan, find_reports
+
+# Session state key holding the current turn's preamble, or None.
+PREAMBLE_KEY = "reply_preamble"
+
+
+def _join(names: List[str]) -> str:
+    return names[0] if len(names) == 1 else ", ".join(names[:-1]) + " and " + names[-1]
+
+
+def build_preamble(
+    profile: Optional[Mapping[str, Any]], message: str, state: Mapping[str, Any]
+) -> Optional[str]:
+    """The reply's opening for ``message``, or None when there is nothing to say."""
+    name = str((profile or {}).get("user_name") or "").strip().title()
+    reports = find_reports(message)
+    lines = []
+    if name:
+        lines.append(f"Hi {name}!")
+    if reports:
+        plan = current_plan(state)
+        lines.append(
+            f"Let me check {_join(reports)}"
+            + (f" on your {plan} plan." if plan else ".")
+        )
+    return " ".join(lines) + "\n\n" if lines else None
+
+
+def preamble_note(state: Mapping[str, Any]) -> str:
+    """Instruction line for a turn whose reply already began with a preamble."""
+    preamble = state.get(PREAMBLE_KEY)
+    if not preamble:
+        return ""
+    return (
+        f'The user already sees the start of your reply: "{preamble.strip()}" '
+        "Continue right after it; do not greet the user again or repeat it."
+    )
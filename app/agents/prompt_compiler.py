@@ -0,0 +1,492 @@
+"""Prompt compiler and token accounting for the agent graph.
+
+The raw prompt templates reference ``{session_state.<path>?}`` placeholders,
+which ADK cannot resolve (dotted names are left verbatim), while the web
+server attaches the *whole* session state, catalog included, as JSON to every
+user message. The catalog therefore grows the history by one copy per turn.
+
+The compiler renders each template against the session state, dedupes lines
+an agent instruction shares with the global instruction, and moves the static
+catalog (pricing and plan entitlements) into a compact block in the system
+prompt, so user messages only carry the per-session fields.
+
+Run ``python -m app.agents.prompt_compiler`` for a per-agent / per-turn token
+report, or add ``--check`` to fail when a budget is exceeded.
+"""
+
+from __future__ import annotations
+
+import argparse
+import json
+import math
+import re
+import sys
+from dataclasses import asdict, dataclass
+from typing import Any, Callable, Dict, Iterable, List, Mapping, Optional, Tuple
+
+from google.adk.agents.readonly_context import ReadonlyContext
+
+from .entitlement_tools import check_entitlement
+from .preamble import PREAMBLE_KEY, preamble_note
+from .prompt_sets import load_prompt_set
+from .state import get_session_state, new_session_state
+from .user_registry import get_user_profile
+
+# Session state keys that are identical for every session and live in the
+# system prompt instead of in each user message.
+STATIC_STATE_KEYS = ("pricing", "entitlements")
+
+# Bookkeeping for the context window (see context_window.py); the summary is
+# sent once as its own message, not inside every user message.
+CONTEXT_STATE_KEYS = ("conversation_summary", "summarized_turns")
+
+# Server bookkeeping the model never needs in the message (see
+# prompt_variants.py); the preamble reaches it through the global instruction.
+SERVER_STATE_KEYS = ("prompt_variant", PREAMBLE_KEY)
+
+PLAN_ORDER = ("BRONZE", "SILVER", "GOLD")
+
+# Which prompt constant each agent uses as its instruction.
+AGENT_PROMPTS: Dict[str, str] = {
+    "root_agent": "ORCHESTRATOR_INSTRUCTION",
+    "action_agent": "ACTION_INSTRUCTION",
+    "recommendation_agent": "RECOMMENDATION_INSTRUCTION",
+    "service_agent": "SERVICE_INSTRUCTION",
+}
+
+# Estimated input-token budgets for the compiled prompts. ``system`` bounds the
+# per-agent system prompt, ``turn`` the input of turn ``--turn`` (default 5).
+DEFAULT_BUDGETS: Dict[str, Dict[str, int]] = {
+    "root_agent": {"system": 1400, "turn": 2900},
+    # Sub-agents are scoped: no catalog, only the previous exchange.
+    "action_agent": {"system": 700, "turn": 800},
+    "recommendation_agent": {"system": 650, "turn": 750},
+    "service_agent": {"system": 550, "turn": 650},
+}
+
+# Rough size of an assistant reply kept in history, for turn estimates.
+ASSISTANT_REPLY_TOKENS = 150
+
+_PLACEHOLDER = re.compile(r"\{(?:session_state\.)?([A-Za-z_][A-Za-z0-9_.]*)(\?)?\}")
+
+
+def estimate_tokens(text: str) -> int:
+    """Approximate Gemini token count (about four characters per token)."""
+    return math.ceil(len(text) / 4) if text else 0
+
+
+def compact_value(value: Any) -> str:
+    """Encode a state value for a prompt with as few tokens as possible."""
+    if isinstance(value, str):
+        return value
+    if isinstance(value, (list, tuple)) and all(isinstance(v, str) for v in value):
+        return "; ".join(value)
+    return json.dumps(value, separators=(",", ":"), default=str)
+
+
+def _lookup(state: Mapping[str, Any], path: str) -> Any:
+    node: Any = state
+    for key in path.split("."):
+        if not isinstance(node, Mapping) or key not in node:
+            return None
+        node = node[key]
+    return node
+
+
+def render_template(
+    template: str, state: Mapping[str, Any], *, catalog_refs: bool = False
+) -> str:
+    """Resolve ``{session_state.a.b?}`` / ``{name?}`` placeholders from state.
+
+    Missing optional values render empty; missing required ones are left as
+    written so the model still sees what was meant. With ``catalog_refs``,
+    catalog lists are replaced by a pointer to the reference data block
+    instead of being repeated.
+    """
+
+    def _sub(match: re.Match[str]) -> str:
+        path = match.group(1)
+        value = _lookup(state, path)
+        if value is None:
+            return "" if match.group(2) else match.group(0)
+        if (
+            catalog_refs
+            and path.split(".", 1)[0] in STATIC_STATE_KEYS
+            and isinstance(value, (list, dict))
+        ):
+            return f"see reference data ({path.replace('.', ' ')})"
+        return compact_value(value)
+
+    return _PLACEHOLDER.sub(_sub, template)
+
+
+def _norm_line(line: str) -> str:
+    return " ".join(line.strip().lstrip("-*0123456789.) ").lower().split())
+
+
+def dedupe_lines(text: str, shared: str) -> str:
+    """Drop lines of ``text`` that already appear in ``shared``."""
+    seen = {_norm_line(line) for line in shared.splitlines() if _norm_line(line)}
+    kept = [line for line in text.splitlines() if _norm_line(line) not in seen]
+    return re.sub(r"\n{3,}", "\n\n", "\n".join(kept)).strip()
+
+
+def _encode_bucket(
+    plan_data: Dict[str, Dict[str, List[str]]], bucket: str
+) -> List[str]:
+    lines: List[str] = []
+    previous: Optional[str] = None
+    for plan in PLAN_ORDER:
+        items = plan_data.get(plan, {}).get(bucket, [])
+        prior = plan_data.get(previous, {}).get(bucket, []) if previous else []
+        if prior and set(prior) <= set(items):
+            extras = [i for i in items if i not in prior]
+            body = (
+                f"all of {previous} + " + "; ".join(extras)
+                if extras
+                else f"same as {previous}"
+            )
+        else:
+            body = "; ".join(items)
+        lines.append(f"- {plan} {bucket}: {body}")
+        previous = plan
+    return lines
+
+
+def catalog_block(state: Mapping[str, Any]) -> str:
+    """Compact, deduplicated rendering of pricing and plan entitlements.
+
+    Each tier is written as a delta over the tier below it, which is how the
+    catalog is actually structured.
+    """
+    pricing = state.get("pricing") or {}
+    entitlements = state.get("entitlements") or {}
+    lines = [
+        "Reference data (session_state.pricing and session_state.entitlements):",
+        "- Monthly price USD: "
+        + ", ".join(f"{p} ${pricing[p]}" for p in reversed(PLAN_ORDER) if p in pricing),
+    ]
+    lines += _encode_bucket(entitlements, "included")
+    lines += _encode_bucket(entitlements, "optional")
+    paid = entitlements.get("PAID", {}).get("reports", [])
+    if paid:
+        lines.append("- PAID add-ons only: " + "; ".join(paid))
+    return "\n".join(lines)
+
+
+# Per-turn fields a sub-agent needs to answer without re-running tools.
+TURN_FACT_KEYS = (
+    "current_plan",
+    "report_name",
+    "product_name",
+    "entitlement_check",
+    "entitlement_checks",
+)
+
+
+def turn_facts_block(state: Mapping[str, Any]) -> str:
+    """Latest routing facts, so sub-agents reuse the check instead of redoing it."""
+    facts = [f"{k}={compact_value(state[k])}" for k in TURN_FACT_KEYS if state.get(k)]
+    return "Current turn (session_state): " + "; ".join(facts) if facts else ""
+
+
+# State fields a sub-agent sees when its context is scoped (see
+# scoped_context.py). Scoped agents get these in the system prompt instead of
+# the reference catalog and the conversation history; the user profile is
+# already part of the global instruction.
+SCOPED_STATE_KEYS: Dict[str, Tuple[str, ...]] = {
+    "service_agent": (
+        "current_plan",
+        "report_name",
+        "product_name",
+        "entitlement_check",
+    ),
+    "recommendation_agent": (
+        "current_plan",
+        "report_name",
+        "product_name",
+        "entitlement_check",
+        "entitlement_checks",
+        "pricing",
+    ),
+    "action_agent": ("current_plan", "pricing"),
+}
+
+
+def scoped_state_block(agent_name: str, state: Mapping[str, Any]) -> str:
+    """The session state fields ``agent_name`` needs for this turn."""
+    keys = SCOPED_STATE_KEYS.get(agent_name, ())
+    facts = [f"{k}={compact_value(state[k])}" for k in keys if state.get(k)]
+    return "Context (session_state): " + "; ".join(facts) if facts else ""
+
+
+def dynamic_state(state: Mapping[str, Any]) -> Dict[str, Any]:
+    """The per-session part of the state that is sent with each user message."""
+    return {
+        k: v
+        for k, v in state.items()
+        if k not in STATIC_STATE_KEYS
+        and k not in CONTEXT_STATE_KEYS
+        and k not in SERVER_STATE_KEYS
+    }
+
+
+def _state_with_defaults(state: Mapping[str, Any]) -> Dict[str, Any]:
+    defaults = new_session_state()
+    return {**{k: defaults[k] for k in STATIC_STATE_KEYS}, **state}
+
+
+def compile_global_instruction(
+    template: str, state: Mapping[str, Any], *, catalog: bool = True
+) -> str:
+    state = _state_with_defaults(state)
+    rendered = render_template(template, state).strip()
+    note = preamble_note(state)
+    if note:
+        rendered += "\n" + note
+    return rendered + "\n\n" + catalog_block(state) if catalog else rendered
+
+
+def compile_agent_instruction(
+    template: str,
+    state: Mapping[str, Any],
+    *,
+    shared: str = "",
+    turn_facts: bool = False,
+    scope: Optional[str] = None,
+) -> str:
+    rendered = render_template(template, _state_with_defaults(state), catalog_refs=True)
+    text = dedupe_lines(rendered, shared) if shared else rendered.strip()
+    if scope:
+        facts = scoped_state_block(scope, _state_with_defaults(state))
+    else:
+        facts = turn_facts_block(state) if turn_facts else ""
+    return f"{text}\n\n{facts}" if facts else text
+
+
+def instruction_provider(
+    template: str,
+    *,
+    shared: str = "",
+    is_global: bool = False,
+    turn_facts: bool = False,
+    scoped: bool = False,
+) -> Callable[[ReadonlyContext], str]:
+    """ADK instruction provider that compiles ``template`` per session.
+
+    ``turn_facts`` appends the latest routing facts from session state; the
+    user message only carries the state as it was when the turn started.
+    With ``scoped``, agents listed in ``SCOPED_STATE_KEYS`` get their scoped
+    state block instead, and no reference catalog.
+    """
+
+    def provider(ctx: ReadonlyContext) -> str:
+        state = get_session_state(ctx.session.id)
+        scope = (
+            ctx.agent_name if scoped and ctx.agent_name in SCOPED_STATE_KEYS else None
+        )
+        if is_global:
+            return compile_global_instruction(template, state, catalog=scope is None)
+        return compile_agent_instruction(
+            template, state, shared=shared, turn_facts=turn_facts, scope=scope
+        )
+
+    provider.__name__ = "compiled_instruction"
+    return provider
+
+
+def message_payload(
+    text: str, state: Mapping[str, Any], *, compiled: bool = True
+) -> str:
+    """Text of one user message as the web server sends it to the runner."""
+    session_state = dynamic_state(state) if compiled else dict(state)
+    return text + json.dumps({"session_state": session_state}, default=str)
+
+
+# ---------------------------------------------------------------------------
+# Reporting
+# ---------------------------------------------------------------------------
+
+
+@dataclass
+class PromptReport:
+    """Estimated input tokens for one agent."""
+
+    agent: str
+    system_tokens: int
+    message_tokens: int
+    first_turn_tokens: int
+    turn_tokens: int
+
+
+def sample_state(
+    user_name: str = "alice", report: str = "Present Day"
+) -> Dict[str, Any]:
+    """A realistic mid-conversation session state."""
+    state = new_session_state()
+    profile = get_user_profile(user_name) or {}
+    plan = profile.get("data_plan", "GOLD")
+    state.update(
+        user_profile=profile,
+        current_plan=plan,
+        report_name=report,
+        product_name=report,
+        entitlement_check=check_entitlement(report=report, plan=plan),
+        last_updated_at=state["created_at"],
+    )
+    return state
+
+
+def _turn_tokens(system: int, message: int, turn: int) -> int:
+    return system + turn * message + (turn - 1) * ASSISTANT_REPLY_TOKENS
+
+
+def build_report(
+    *,
+    prompt_set: str = "default",
+    compiled: bool = True,
+    state: Optional[Mapping[str, Any]] = None,
+    message: str = "Can I download the Present Day report?",
+    turn: int = 5,
+    scoped: bool = True,
+) -> List[PromptReport]:
+    """Per-agent token estimates for the first turn and for ``turn``.
+
+    With ``compiled=False`` the numbers reflect the raw templates and the full
+    state JSON on every user message. Scoped sub-agents only see the previous
+    exchange and the current message, so their input stops growing after the
+    second turn.
+    """
+    prompts = load_prompt_set(prompt_set)
+    state = sample_state() if state is None else state
+    global_template = prompts["GLOBAL_INSTRUCTION"]
+    if compiled:
+        global_text = compile_global_instruction(global_template, state)
+    else:
+        global_text = global_template
+    message_tokens = estimate_tokens(message_payload(message, state, compiled=compiled))
+
+    reports = []
+    for agent, key in AGENT_PROMPTS.items():
+        scope = agent if compiled and scoped and agent in SCOPED_STATE_KEYS else None
+        if compiled:
+            instruction = compile_agent_instruction(
+                prompts[key],
+                state,
+                shared=global_template,
+                turn_facts=agent != "root_agent",
+                scope=scope,
+            )
+        else:
+            instruction = prompts[key]
+        agent_global = (
+            compile_global_instruction(global_template, state, catalog=False)
+            if scope
+            else global_text
+        )
+        system = estimate_tokens(agent_global) + estimate_tokens(instruction)
+        agent_message = estimate_tokens(message) if scope else message_tokens
+        first_turn = _turn_tokens(system, agent_message, 1)
+        reports.append(
+            PromptReport(
+                agent=agent,
+                system_tokens=system,
+                message_tokens=agent_message,
+                first_turn_tokens=first_turn,
+                turn_tokens=_turn_tokens(
+                    system, agent_message, min(turn, 2) if scope else turn
+                ),
+            )
+        )
+    return reports
+
+
+def check_budgets(
+    reports: Iterable[PromptReport], budgets: Mapping[str, Mapping[str, int]]
+) -> List[str]:
+    """Return a human-readable line per exceeded budget."""
+    failures = []
+    for r in reports:
+        budget = budgets.get(r.agent, {})
+        if "system" in budget and r.system_tokens > budget["system"]:
+            failures.append(f"{r.agent}: system {r.system_tokens} > {budget['system']}")
+        if "turn" in budget and r.turn_tokens > budget["turn"]:
+            failures.append(f"{r.agent}: turn {r.turn_tokens} > {budget['turn']}")
+    return failures
+
+
+def main(argv: Optional[List[str]] = None) -> int:
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--prompt-set", default="default")
+    parser.add_argument("--raw", action="store_true", help="report uncompiled prompts")
+    parser.add_argument("--turn", type=int, default=5, help="turn to project input for")
+    parser.add_argument("--budgets", help="JSON file of per-agent budgets")
+    parser.add_argument("--check", action="store_true", help="exit 1 on budget overrun")
+    parser.add_argument("--json", action="store_true", help="emit the report as JSON")
+    parser.add_argument(
+        "--show", metavar="AGENT", help="print an agent's compiled prompt"
+    )
+    parser.add_argument(
+        "--full-context",
+        action="store_true",
+        help="report sub-agents without context scoping",
+    )
+    args = parser.parse_args(argv)
+
+    if args.show:
+        prompts = load_prompt_set(args.prompt_set)
+        state = sample_state()
+        scope = (
+            None
+            if args.full_context or args.show not in SCOPED_STATE_KEYS
+            else args.show
+        )
+        print(
+            compile_global_instruction(
+                prompts["GLOBAL_INSTRUCTION"], state, catalog=scope is None
+            )
+        )
+        print()
+        print(
+            compile_agent_instruction(
+                prompts[AGENT_PROMPTS[args.show]],
+                state,
+                shared=prompts["GLOBAL_INSTRUCTION"],
+                turn_facts=args.show != "root_agent",
+                scope=scope,
+            )
+        )
+        return 0
+
+    reports = build_report(
+        prompt_set=args.prompt_set,
+        compiled=not args.raw,
+        turn=args.turn,
+        scoped=not args.full_context,
+    )
+    if args.json:
+        print(json.dumps([asdict(r) for r in reports], indent=2))
+    else:
+        print(
+            f"{'agent':<22}{'system':>8}{'message':>9}{'turn 1':>8}{f'turn {args.turn}':>9}"
+        )
+        for r in reports:
+            print(
+                f"{r.agent:<22}{r.system_tokens:>8}{r.message_tokens:>9}"
+                f"{r.first_turn_tokens:>8}{r.turn_tokens:>9}"
+            )
+
+    if args.check:
+        budgets = DEFAULT_BUDGETS
+        if args.budgets:
+            with open(args.budgets, encoding="utf-8") as fh:
+                budgets = json.load(fh)
+        failures = check_budgets(reports, budgets)
+        for failure in failures:
+            print(f"over budget: {failure}", file=sys.stderr)
+        return 1 if failures else 0
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,50 @@
+"""Named prompt sets for the agent graph.
+
+``prompts.py`` is the default set. Alternative sets live next to it as
+``prompts-<name>.py``; their file names are not importable module names, so
+they are loaded by path.
+"""
+
+from __future__ import annotations
+
+import importlib.util
+from functools import lru_cache
+from pathlib import Path
+from typing import Dict
+
+PROMPT_KEYS = (
+    "GLOBAL_INSTRUCTION",
+    "ORCHESTRATOR_INSTRUCTION",
+    "RECOMMENDATION_INSTRUCTION",
+    "SERVICE_INSTRUCTION",
+    "ACTION_INSTRUCTION",
+)
+
+_PROMPTS_DIR = Path(__file__).parent
+
+
+def available_prompt_sets() -> list[str]:
+    """Names of the prompt sets on disk; ``default`` is ``prompts.py``."""
+    names = ["default"]
+    names += sorted(
+        p.stem[len("prompts-") :] for p in _PROMPTS_DIR.glob("prompts-*.py")
+    )
+    return names
+
+
+@lru_cache(maxsize=None)
+def load_prompt_set(name: str = "default") -> Dict[str, str]:
+    """Return the prompt constants of the named set."""
+    filename = "prompts.py" if name == "default" else f"prompts-{name}.py"
+    path = _PROMPTS_DIR / filename
+    if not path.exists():
+        raise ValueError(
+            f"Unknown prompt set {name!r}; available: {available_prompt_sets()}"
+        )
+    spec = importlib.util.spec_from_file_location(
+        f"app.agents._prompt_set_{name}", path
+    )
+    assert spec and spec.loader
+    module = importlib.util.module_from_spec(spec)
+    spec.loader.exec_module(module)
+    return {key: getattr(module, key) for key in PROMPT_KEYS}
@@ -0,0 +1,251 @@
+"""Prompt variants: named prompt sets assigned per session, with metrics.
+
+``PROMPT_VARIANTS`` lists the prompt sets (see prompt_sets.py) live traffic
+runs on, with optional relative weights: ``default`` or
+``default:90,updated-1:10``. Every new session is assigned one variant and
+keeps it for the whole conversation; the agents' instruction providers
+compile that variant's templates. The split can be changed at runtime
+(``POST /admin/prompt-variants``); it applies to new sessions.
+
+Each turn's tokens, TTFT, model calls and tool calls are recorded per
+variant, and ``VariantMetrics.report`` compares every variant with the
+baseline (the first one listed), so prompt changes are judged on data.
+"""
+
+from __future__ import annotations
+
+import random
+import statistics
+import threading
+from collections import Counter, deque
+from functools import lru_cache
+from typing import Any, Callable, Deque, Dict, Mapping, Optional
+
+from google.adk.agents.readonly_context import ReadonlyContext
+
+from .config import PROMPT_VARIANTS
+from .prompt_compiler import instruction_provider
+from .prompt_sets import available_prompt_sets, load_prompt_set
+from .state import get_session_state, update_session_state
+
+# Session state key holding the session's variant.
+VARIANT_KEY = "prompt_variant"
+
+
+def parse_split(spec: str) -> Dict[str, float]:
+    """``{variant: weight}`` for a spec like ``default:90,updated-1:10``.
+
+    A variant without a weight counts 1, so ``default,updated-1`` is 50/50.
+    """
+    split: Dict[str, float] = {}
+    for entry in spec.split(","):
+        if not entry.strip():
+            continue
+        name, _, weight = entry.partition(":")
+        split[name.strip()] = float(weight) if weight.strip() else 1.0
+    return validate_split(split)
+
+
+def validate_split(split: Mapping[str, float]) -> Dict[str, float]:
+    known = available_prompt_sets()
+    unknown = [name for name in split if name not in known]
+    if unknown:
+        raise ValueError(f"Unknown prompt set(s) {unknown}; available: {known}")
+    if not split or any(w < 0 for w in split.values()) or sum(split.values()) <= 0:
+        raise ValueError(f"Invalid prompt variant weights: {dict(split)}")
+    return dict(split)
+
+
+class PromptVariants:
+    """The live traffic split and each session's assigned variant."""
+
+    def __init__(self, split: Mapping[str, float], *, seed: Optional[int] = None):
+        self._lock = threading.Lock()
+        self._rng = random.Random(seed)
+        self._split = validate_split(split)
+
+    @property
+    def split(self) -> Dict[str, float]:
+        with self._lock:
+            return dict(self._split)
+
+    @property
+    def baseline(self) -> str:
+        """The variant others are compared with; also the unassigned default."""
+        with self._lock:
+            return next(iter(self._split))
+
+    def set_split(self, split: Mapping[str, float]) -> None:
+        """Replace the split; sessions already assigned keep their variant."""
+        split = validate_split(split)
+        with self._lock:
+            self._split = split
+
+    def assign(self, session_id: str, variant: Optional[str] = None) -> str:
+        """Pick (or force) the variant of a new session and remember it."""
+        if variant is None:
+            with self._lock:
+                names, weights = zip(*self._split.items(), strict=True)
+                variant = self._rng.choices(names, weights)[0]
+        elif variant not in available_prompt_sets():
+            raise ValueError(f"Unknown prompt set {variant!r}")
+        update_session_state(session_id, **{VARIANT_KEY: variant})
+        return variant
+
+    def variant_for(self, session_id: str) -> str:
+        return get_session_state(session_id).get(VARIANT_KEY) or self.baseline
+
+
+prompt_variants = PromptVariants(parse_split(PROMPT_VARIANTS))
+
+
+@lru_cache(maxsize=None)
+def _compiled(
+    variant: str, prompt_key: str, flags: tuple
+) -> Callable[[ReadonlyContext], str]:
+    prompts = load_prompt_set(variant)
+    options = dict(flags)
+    shared = "" if options.get("is_global") else prompts["GLOBAL_INSTRUCTION"]
+    return instruction_provider(prompts[prompt_key], shared=shared, **options)
+
+
+def variant_instruction(
+    prompt_key: str, **options: bool
+) -> Callable[[ReadonlyContext], str]:
+    """``instruction_provider`` over ``prompt_key`` of the session's variant.
+
+    ``options`` are passed through (``is_global``, ``turn_facts``, ``scoped``);
+    agent instructions are deduped against their variant's global instruction.
+    """
+    flags = tuple(sorted(options.items()))
+
+    def provider(ctx: ReadonlyContext) -> str:
+        variant = prompt_variants.variant_for(ctx.session.id)
+        return _compiled(variant, prompt_key, flags)(ctx)
+
+    provider.__name__ = "variant_instruction"
+    return provider
+
+
+def _percentile(values: Deque[float], pct: float) -> Optional[float]:
+    if not values:
+        return None
+    ordered = sorted(values)
+    return ordered[min(len(ordered) - 1, max(0, round(pct / 100 * len(ordered)) - 1))]
+
+
+# Compared against the baseline; lower is better for all of them.
+_COMPARED = (
+    "tokens_per_turn",
+    "model_calls_per_turn",
+    "tool_calls_per_turn",
+    "ttft_p50_ms",
+    "latency_p50_ms",
+)
+
+
+class VariantMetrics:
+    """Per-variant turn counters and recent TTFT / latency samples."""
+
+    def __init__(self, samples: int = 2048):
+        self._lock = threading.Lock()
+        self._samples = samples
+        self._totals: Dict[str, Counter[str]] = {}
+        self._ttft: Dict[str, Deque[float]] = {}
+        self._latency: Dict[str, Deque[float]] = {}
+
+    def record(
+        self,
+        variant: str,
+        *,
+        tokens: Mapping[str, int],
+        model_calls: int,
+        tool_calls: int,
+        latency_ms: float,
+        ttft_ms: Optional[float] = None,
+        error: bool = False,
+    ) -> None:
+        with self._lock:
+            totals = self._totals.setdefault(variant, Counter())
+            totals["turns"] += 1
+            totals["errors"] += int(error)
+            totals["model_calls"] += model_calls
+            totals["tool_calls"] += tool_calls
+            for key, count in tokens.items():
+                totals[f"{key}_tokens"] += count
+            if error:
+                return
+            self._latency.setdefault(variant, deque(maxlen=self._samples)).append(
+                latency_ms
+            )
+            if ttft_ms is not None:
+                self._ttft.setdefault(variant, deque(maxlen=self._samples)).append(
+                    ttft_ms
+                )
+
+    def reset(self) -> None:
+        with self._lock:
+            self._totals.clear()
+            self._ttft.clear()
+            self._latency.clear()
+
+    def report(self, baseline: Optional[str] = None) -> Dict[str, Dict[str, Any]]:
+        """Per-variant means and percentiles; ``vs_baseline`` holds relative deltas."""
+        with self._lock:
+            rows: Dict[str, Dict[str, Any]] = {}
+            for variant, totals in self._totals.items():
+                turns = totals["turns"]
+                tokens = {
+                    key: totals[f"{key}_tokens"] / turns
+                    for key in ("prompt", "candidates", "thoughts")
+                }
+                latency = self._latency.get(variant, deque())
+                rows[variant] = {
+                    "turns": turns,
+                    "error_rate": totals["errors"] / turns,
+                    **{
+                        f"{key}_tokens_per_turn": value for key, value in tokens.items()
+                    },
+                    "tokens_per_turn": sum(tokens.values()),
+                    "model_calls_per_turn": totals["model_calls"] / turns,
+                    "tool_calls_per_turn": totals["tool_calls"] / turns,
+                    "ttft_p50_ms": _percentile(self._ttft.get(variant, deque()), 50),
+                    "ttft_p95_ms": _percentile(self._ttft.get(variant, deque()), 95),
+                    "latency_p50_ms": _percentile(latency, 50),
+                    "latency_mean_ms": statistics.fmean(latency) if latency else None,
+                }
+        base = rows.get(baseline or "")
+        for variant, row in rows.items():
+            if base is None or variant == baseline:
+                continue
+            row["vs_baseline"] = {
+                key: row[key] / base[key] - 1
+                for key in _COMPARED
+                if row[key] is not None and base[key]
+            }
+        return rows
+
+
+VARIANT_METRICS = VariantMetrics()
+
+
+def format_report(report: Mapping[str, Mapping[str, Any]]) -> str:
+    """A text table of ``VariantMetrics.report`` output."""
+    lines = [
+        f"{'variant':<14}{'turns':>7}{'tokens':>9}{'model':>7}{'tools':>7}"
+        f"{'ttft p50':>10}{'lat p50':>10}  vs baseline"
+    ]
+
+    def fmt(value: Optional[float], spec: str) -> str:
+        return "-" if value is None else format(value, spec)
+
+    for variant, row in report.items():
+        delta = ", ".join(
+            f"{k} {v:+.1%}" for k, v in row.get("vs_baseline", {}).items()
+        )
+        lines.append(
+            f"{variant:<14}{row['turns']:>7}{row['tokens_per_turn']:>9.1f}"
+            f"{row['model_calls_per_turn']:>7.2f}{row['tool_calls_per_turn']:>7.2f}"
+            f"{fmt(row['ttft_p50_ms'], '.1f'):>10}{fmt(row['latency_p50_ms'], '.1f'):>10}  {delta}"
+        )
+    return "\n".join(lines)
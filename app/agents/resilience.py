@@ -0,0 +1,384 @@
+"""Retries, hedging and circuit breaking around agent model calls.
+
+``ResilientLlm`` wraps any ``BaseLlm``:
+
+* Retryable failures (429, 5xx, timeouts, dropped connections) are retried
+  with full-jitter exponential backoff, waiting at least as long as the
+  server's ``Retry-After`` / ``RetryInfo`` hint. Only failures before the
+  first response are retried; once text has been streamed the turn cannot be
+  replayed without duplicating it.
+* With ``hedge_after_s`` set, a second identical request is started when the
+  first has produced nothing after that delay, and whichever answers first
+  wins. The loser is cancelled.
+* A per-model ``CircuitBreaker`` opens after consecutive failures and fails
+  fast until its cooldown expires, then lets a single probe through.
+
+When the call cannot be served, the wrapper yields an ``LlmResponse`` with
+``error_code`` set instead of raising, so ADK ends the turn with an error
+event that the web server turns into a clean error frame. Counters live in
+``RESILIENCE_STATS``; ``resilience_snapshot()`` adds the breaker states.
+"""
+
+from __future__ import annotations
+
+import asyncio
+import contextlib
+import logging
+import random
+import re
+import threading
+import time
+from collections import Counter
+from dataclasses import dataclass
+from typing import Any, AsyncGenerator, Callable, Dict, Optional, Tuple
+
+import httpx
+from google.adk.models.base_llm import BaseLlm
+from google.adk.models.llm_request import LlmRequest
+from google.adk.models.llm_response import LlmResponse
+from google.genai import errors as genai_errors
+from pydantic import PrivateAttr
+
+logger = logging.getLogger(__name__)
+
+RETRYABLE_CODES = frozenset({408, 429, 500, 502, 503, 504})
+
+# calls, retries, gave_up, hedges, hedge_wins, short_circuits, breaker_opened.
+RESILIENCE_STATS: Counter[str] = Counter()
+
+
+@dataclass(frozen=True)
+class RetryPolicy:
+    """How often and how patiently a failed model call is retried."""
+
+    max_attempts: int = 3
+    base_delay_s: float = 0.5
+    max_delay_s: float = 8.0
+
+
+class CircuitOpenError(Exception):
+    """Raised by ``CircuitBreaker.check`` while the breaker is open."""
+
+    def __init__(self, name: str, retry_after_s: float):
+        super().__init__(f"Circuit for {name} is open; retry in {retry_after_s:.1f}s")
+        self.retry_after_s = retry_after_s
+
+
+def error_status(exc: BaseException) -> Optional[int]:
+    """HTTP-like status of a model failure, or None when it has none."""
+    if isinstance(exc, genai_errors.APIError):
+        return exc.code
+    if isinstance(exc, CircuitOpenError):
+        return 503
+    if isinstance(exc, (asyncio.TimeoutError, httpx.TimeoutException)):
+        return 408
+    return None
+
+
+def is_retryable(exc: BaseException) -> bool:
+    """Whether ``exc`` is a transient failure worth retrying."""
+    if isinstance(exc, (httpx.TransportError, ConnectionError)):
+        return True
+    return error_status(exc) in RETRYABLE_CODES
+
+
+_DURATION = re.compile(r"^\s*([\d.]+)s\s*$")
+
+
+def retry_after_s(exc: BaseException) -> Optional[float]:
+    """Server-requested wait from a ``Retry-After`` header or ``RetryInfo``."""
+    if isinstance(exc, CircuitOpenError):
+        return exc.retry_after_s
+    response = getattr(exc, "response", None)
+    headers = getattr(response, "headers", None) or {}
+    header = headers.get("retry-after") if hasattr(headers, "get") else None
+    if header:
+        with contextlib.suppress(ValueError):
+            return max(0.0, float(header))
+    details = getattr(exc, "details", None)
+    error = details.get("error", details) if isinstance(details, dict) else None
+    for detail in (error or {}).get("details") or []:
+        if isinstance(detail, dict) and str(detail.get("@type", "")).endswith(
+            "RetryInfo"
+        ):
+            match = _DURATION.match(str(detail.get("retryDelay", "")))
+            if match:
+                return float(match.group(1))
+    return None
+
+
+def backoff_delay(
+    attempt: int, policy: RetryPolicy, hint: Optional[float], rng: random.Random
+) -> Optional[float]:
+    """Delay before retry number ``attempt`` (1-based), or None to give up.
+
+    Full jitter over an exponential ceiling, never shorter than the server's
+    hint. A hint longer than ``max_delay_s`` means waiting would blow the
+    turn's latency budget, so the call gives up instead.
+    """
+    if hint is not None and hint > policy.max_delay_s:
+        return None
+    ceiling = min(policy.max_delay_s, policy.base_delay_s * 2 ** (attempt - 1))
+    return max(hint or 0.0, rng.uniform(0, ceiling))
+
+
+class CircuitBreaker:
+    """Consecutive-failure breaker shared by every caller of one model.
+
+    Closed: calls pass. After ``failure_threshold`` consecutive failures it
+    opens and ``check`` raises ``CircuitOpenError`` for ``cooldown_s``. Then
+    it is half-open: one probe is let through, and its outcome closes or
+    re-opens the breaker. Each runner turn has its own event loop thread, so
+    the state is guarded by a thread lock.
+    """
+
+    def __init__(
+        self,
+        name: str,
+        *,
+        failure_threshold: int = 5,
+        cooldown_s: float = 30.0,
+        clock: Callable[[], float] = time.monotonic,
+    ):
+        self.name = name
+        self.failure_threshold = failure_threshold
+        self.cooldown_s = cooldown_s
+        self._clock = clock
+        self._lock = threading.Lock()
+        self._failures = 0
+        self._opened_at: Optional[float] = None
+        self._probing = False
+
+    @property
+    def state(self) -> str:
+        with self._lock:
+            return self._state()
+
+    def _state(self) -> str:
+        if self._opened_at is None:
+            return "closed"
+        if self._clock() - self._opened_at < self.cooldown_s:
+            return "open"
+        return "half_open"
+
+    def check(self) -> bool:
+        """Raise ``CircuitOpenError`` unless a call may proceed now.
+
+        Returns True when the call is the half-open probe; a probe that ends
+        without an outcome must be given back with ``release_probe``.
+        """
+        with self._lock:
+            state = self._state()
+            if state == "closed":
+                return False
+            if state == "half_open" and not self._probing:
+                self._probing = True
+                return True
+            remaining = self.cooldown_s - (self._clock() - (self._opened_at or 0.0))
+            raise CircuitOpenError(self.name, max(remaining, 1.0))
+
+    def record_success(self) -> None:
+        with self._lock:
+            if self._opened_at is not None:
+                logger.info("Circuit for %s closed", self.name)
+            self._failures = 0
+            self._opened_at = None
+            self._probing = False
+
+    def release_probe(self) -> None:
+        """Give up a half-open probe that ended without an outcome (cancelled).
+
+        The breaker stays half-open, so the next call probes instead.
+        """
+        with self._lock:
+            self._probing = False
+
+    def record_failure(self) -> None:
+        with self._lock:
+            self._failures += 1
+            reopen = self._probing
+            self._probing = False
+            if reopen or (
+                self._opened_at is None and self._failures >= self.failure_threshold
+            ):
+                self._opened_at = self._clock()
+                RESILIENCE_STATS["breaker_opened"] += 1
+                logger.warning(
+                    "Circuit for %s opened after %d failures", self.name, self._failures
+                )
+
+    def snapshot(self) -> Dict[str, Any]:
+        with self._lock:
+            return {"state": self._state(), "consecutive_failures": self._failures}
+
+
+_BREAKERS: Dict[str, CircuitBreaker] = {}
+_BREAKERS_LOCK = threading.Lock()
+
+
+def breaker_for(model: str, **kwargs: Any) -> CircuitBreaker:
+    """The shared breaker for ``model``; ``kwargs`` apply on first use."""
+    with _BREAKERS_LOCK:
+        if model not in _BREAKERS:
+            _BREAKERS[model] = CircuitBreaker(model, **kwargs)
+        return _BREAKERS[model]
+
+
+def resilience_snapshot() -> Dict[str, Any]:
+    """Counters plus the state of every breaker, for health endpoints."""
+    with _BREAKERS_LOCK:
+        breakers = dict(_BREAKERS)
+    return {
+        "stats": dict(RESILIENCE_STATS),
+        "breakers": {name: b.snapshot() for name, b in breakers.items()},
+    }
+
+
+def error_response(exc: BaseException) -> LlmResponse:
+    """The terminal response yielded when a call cannot be served."""
+    status = error_status(exc) or 503
+    metadata: Dict[str, Any] = {"status": status}
+    hint = retry_after_s(exc)
+    if hint is not None:
+        metadata["retry_after_s"] = round(hint, 1)
+    return LlmResponse(
+        error_code="RESOURCE_EXHAUSTED" if status == 429 else "UNAVAILABLE",
+        error_message="The assistant is busy right now. Please try again shortly.",
+        custom_metadata=metadata,
+    )
+
+
+Stream = AsyncGenerator[LlmResponse, None]
+
+
+async def _first(stream: Stream) -> Optional[LlmResponse]:
+    async for response in stream:
+        return response
+    return None
+
+
+async def _discard(task: "asyncio.Task[Any]", stream: Stream) -> None:
+    task.cancel()
+    with contextlib.suppress(BaseException):
+        await task
+    with contextlib.suppress(BaseException):
+        await stream.aclose()
+
+
+class ResilientLlm(BaseLlm):
+    """Wraps ``inner`` with retries, optional hedging and a circuit breaker."""
+
+    inner: BaseLlm
+    policy: RetryPolicy = RetryPolicy()
+    hedge_after_s: Optional[float] = None
+    breaker: Optional[CircuitBreaker] = None
+    seed: Optional[int] = None
+
+    _rng: random.Random = PrivateAttr(default_factory=random.Random)
+
+    def model_post_init(self, __context: Any) -> None:
+        self._rng = random.Random(self.seed)
+        if self.breaker is None:
+            self.breaker = breaker_for(self.model)
+
+    async def _attempt(
+        self, llm_request: LlmRequest, stream: bool
+    ) -> Tuple[Optional[LlmResponse], Stream]:
+        """Start one call, hedged if configured; return its first response."""
+        primary = self.inner.generate_content_async(
+            llm_request.model_copy(deep=True), stream=stream
+        )
+        first = asyncio.ensure_future(_first(primary))
+        if self.hedge_after_s is None:
+            return await first, primary
+
+        done, _ = await asyncio.wait({first}, timeout=self.hedge_after_s)
+        if done:
+            return first.result(), primary
+
+        RESILIENCE_STATS["hedges"] += 1
+        backup = self.inner.generate_content_async(
+            llm_request.model_copy(deep=True), stream=stream
+        )
+        second = asyncio.ensure_future(_first(backup))
+        streams = {first: primary, second: backup}
+        pending = set(streams)
+        failure: Optional[BaseException] = None
+        try:
+            while pending:
+                done, pending = await asyncio.wait(
+                    pending, return_when=asyncio.FIRST_COMPLETED
+                )
+                for task in done:
+                    if task.exception() is None:
+                        if task is second:
+                            RESILIENCE_STATS["hedge_wins"] += 1
+                        for loser in pending:
+                            await _discard(loser, streams[loser])
+                        pending = set()
+                        return task.result(), streams[task]
+                    failure = task.exception()
+        finally:
+            for task in pending:
+                await _discard(task, streams[task])
+        assert failure is not None
+        raise failure
+
+    async def generate_content_async(
+        self, llm_request: LlmRequest, stream: bool = False
+    ) -> AsyncGenerator[LlmResponse, None]:
+        assert self.breaker is not None
+        RESILIENCE_STATS["calls"] += 1
+        attempt = 0
+        while True:
+            attempt += 1
+            try:
+                probe = self.breaker.check()
+            except CircuitOpenError as exc:
+                RESILIENCE_STATS["short_circuits"] += 1
+                yield error_response(exc)
+                return
+            try:
+                first, responses = await self._attempt(llm_request, stream)
+            except Exception as exc:
+                if not is_retryable(exc):
+                    self.breaker.record_success()  # the backend answered
+                    raise
+                self.breaker.record_failure()
+                delay = (
+                    backoff_delay(attempt, self.policy, retry_after_s(exc), self._rng)
+                    if attempt < self.policy.max_attempts
+                    else None
+                )
+                if delay is None:
+                    RESILIENCE_STATS["gave_up"] += 1
+                    logger.warning(
+                        "Model %s failed after %d attempts: %s",
+                        self.model,
+                        attempt,
+                        exc,
+                    )
+                    yield error_response(exc)
+                    return
+                RESILIENCE_STATS["retries"] += 1
+                logger.info(
+                    "Retrying %s in %.2fs (attempt %d): %s",
+                    self.model,
+                    delay,
+                    attempt,
+                    exc,
+                )
+                await asyncio.sleep(delay)
+                continue
+            except BaseException:
+                # Cancelled (client disconnect, losing hedge): no outcome.
+                if probe:
+                    self.breaker.release_probe()
+                raise
+            self.breaker.record_success()
+            break
+
+        if first is not None:
+            yield first
+        async for response in responses:
+            yield response
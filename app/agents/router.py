@@ -0,0 +1,232 @@
+"""Deterministic orchestrator routing.
+
+Per ``ORCHESTRATOR_INSTRUCTION`` routing is a pure function of the request:
+an upgrade request goes to ``action_agent``; otherwise ``check_entitlement``
+decides (``included`` -> ``service_agent``, ``optional``/``paid`` ->
+``recommendation_agent``). When the report and plan can be read directly
+from the message and session state, ``route_before_model`` runs the check in
+code and answers the root agent's model call with a ``transfer_to_agent``
+call, so the orchestrator LLM is skipped. Several reports go to
+``fanout_agent`` when fan-out is on (see app/agents/fan_out.py). Anything
+ambiguous (no report, unknown plan, a report no agent handles) falls through
+to the LLM.
+"""
+
+from __future__ import annotations
+
+import logging
+import re
+from collections import Counter
+from dataclasses import dataclass, field
+from functools import lru_cache
+from typing import Any, Dict, List, Mapping, Optional, Tuple
+
+from google.adk.agents.callback_context import CallbackContext
+from google.adk.models.llm_request import LlmRequest
+from google.adk.models.llm_response import LlmResponse
+from google.genai import types as genai_types
+
+from .config import MULTI_REPORT_FANOUT, MULTI_REPORT_MAX
+from .entitlement_tools import _normalize, check_entitlement
+from .entitlements import PLAN_ENTITLEMENTS
+from .state import get_session_state, update_session_state
+
+logger = logging.getLogger(__name__)
+
+PLANS = ("BRONZE", "SILVER", "GOLD")
+
+STATUS_ROUTES = {
+    "included": "service_agent",
+    "optional": "recommendation_agent",
+    "paid": "recommendation_agent",
+}
+
+# Only explicit plan-change requests (ORCHESTRATOR_INSTRUCTION rule 5): the
+# message must open with the verb, optionally after a confirmation ("yes,"),
+# "please", "I want/would like to", "let's" or "can/could you". Questions such as
+# "should I switch to GOLD?" mention the verb later and go to the LLM.
+_UPGRADE_INTENT = re.compile(
+    r"^\s*(?:(?:yes|ok(?:ay)?|sure)\b[\s,.!]*)?(?:please\s+)?"
+    r"(?:(?:i\s+(?:want|need|wish)\s+to|i(?:\s+would|'d|\u2019d)\s+like\s+to|let's)\s+"
+    r"|(?:can|could|would|will)\s+you\s+(?:please\s+)?)?"
+    r"(?:upgrade|downgrade|switch|change|move)\b[^.?!]*\b(?:plan|gold|silver|bronze)\b",
+    re.IGNORECASE,
+)
+
+# Sub-agent for multi-report turns (app/agents/fan_out.py).
+FANOUT_AGENT = "fanout_agent"
+
+# How many turns were routed in code vs. handed to the LLM orchestrator.
+ROUTER_STATS: Counter[str] = Counter()
+
+
+@dataclass(frozen=True)
+class RouteDecision:
+    """Where a turn goes and the state facts that justified it."""
+
+    agent_name: str
+    reason: str
+    state_updates: Dict[str, Any] = field(default_factory=dict)
+
+
+@lru_cache(maxsize=1)
+def _catalog() -> Tuple[Tuple[str, str], ...]:
+    """(normalized name, display name) for every report, longest first."""
+    names: Dict[str, str] = {}
+    for plan_data in PLAN_ENTITLEMENTS.values():
+        for bucket in ("included", "optional", "reports"):
+            for item in plan_data.get(bucket, []):
+                names.setdefault(_normalize(item), item)
+    return tuple(sorted(names.items(), key=lambda kv: len(kv[0]), reverse=True))
+
+
+def find_reports(message: str) -> List[str]:
+    """Catalog report names mentioned in ``message``, in order of appearance.
+
+    Matching is on normalized text with word boundaries; longer names win so
+    "Image (view and print images ...)" is not also reported as "Image".
+    """
+    text = _normalize(message)
+    taken: List[Tuple[int, int]] = []
+    found: List[Tuple[int, str]] = []
+    for key, name in _catalog():
+        for match in re.finditer(rf"(?<!\w){re.escape(key)}(?!\w)", text):
+            start, end = match.span()
+            if any(start < e and s < end for s, e in taken):
+                continue
+            taken.append((start, end))
+            found.append((start, name))
+            break
+    return [name for _, name in sorted(found)]
+
+
+def current_plan(state: Mapping[str, Any]) -> Optional[str]:
+    """The session's plan, from state or the user profile."""
+    plan = state.get("current_plan") or (state.get("user_profile") or {}).get(
+        "data_plan"
+    )
+    plan = str(plan).upper() if plan else None
+    return plan if plan in PLANS else None
+
+
+def _fan_out(
+    reports: List[str], plan: str, state: Mapping[str, Any]
+) -> Optional[RouteDecision]:
+    """Send a multi-report turn to ``fanout_agent`` if every report has a route."""
+    checks = state.get("entitlement_checks") or []
+    if [c.get("report") for c in checks] != reports or any(
+        c.get("current_plan") != plan for c in checks
+    ):
+        checks = [
+            {"report": report, **check_entitlement(report=report, plan=plan)}  # type: ignore[arg-type]
+            for report in reports
+        ]
+    if any(str(c["status"]) not in STATUS_ROUTES for c in checks):
+        return None
+    return RouteDecision(
+        FANOUT_AGENT,
+        f"{len(reports)} reports",
+        {
+            "current_plan": plan,
+            "report_name": reports[0],
+            "product_name": reports[0],
+            "entitlement_check": {k: v for k, v in checks[0].items() if k != "report"},
+            "entitlement_checks": checks,
+        },
+    )
+
+
+def route(
+    message: str, state: Mapping[str, Any], *, fan_out: bool = False
+) -> Optional[RouteDecision]:
+    """Decide the sub-agent for ``message``, or None when it is ambiguous.
+
+    With ``fan_out``, two to ``MULTI_REPORT_MAX`` reports go to
+    ``fanout_agent``; otherwise several reports are left to the LLM.
+    """
+    plan = current_plan(state)
+    if _UPGRADE_INTENT.search(message):
+        return RouteDecision(
+            "action_agent", "upgrade intent", {"current_plan": plan} if plan else {}
+        )
+
+    reports = find_reports(message)
+    if plan is None or not reports:
+        return None
+    if len(reports) > 1:
+        if fan_out and len(reports) <= MULTI_REPORT_MAX:
+            return _fan_out(reports, plan, state)
+        return None
+    report = reports[0]
+    check = state.get("entitlement_check") or {}
+    if (
+        check.get("canonical_report") != _normalize(report)
+        or check.get("current_plan") != plan
+    ):
+        check = check_entitlement(report=report, plan=plan)  # type: ignore[arg-type]
+    agent_name = STATUS_ROUTES.get(str(check["status"]))
+    if agent_name is None:
+        return None
+    return RouteDecision(
+        agent_name,
+        f"entitlement status {check['status']}",
+        {
+            "current_plan": plan,
+            "report_name": report,
+            "product_name": report,
+            "entitlement_check": check,
+        },
+    )
+
+
+def _turn_message(llm_request: LlmRequest) -> Optional[str]:
+    """The user's text if this is the root agent's first call of the turn."""
+    if not llm_request.contents:
+        return None
+    last = llm_request.contents[-1]
+    if last.role != "user" or not last.parts:
+        return None
+    first = last.parts[0]
+    if not first.text or first.text.startswith("For context:"):
+        return None
+    return first.text
+
+
+def transfer_response(agent_name: str) -> LlmResponse:
+    """A model response that hands the turn to ``agent_name``."""
+    return LlmResponse(
+        content=genai_types.Content(
+            role="model",
+            parts=[
+                genai_types.Part(
+                    function_call=genai_types.FunctionCall(
+                        name="transfer_to_agent", args={"agent_name": agent_name}
+                    )
+                )
+            ],
+        )
+    )
+
+
+def route_before_model(
+    callback_context: CallbackContext, llm_request: LlmRequest
+) -> Optional[LlmResponse]:
+    """``before_model_callback`` for ``root_agent`` that skips the LLM hop."""
+    message = _turn_message(llm_request)
+    if message is None:
+        return None
+    session_id = callback_context.session.id
+    decision = route(
+        message, get_session_state(session_id), fan_out=MULTI_REPORT_FANOUT
+    )
+    if decision is None:
+        ROUTER_STATS["fallback"] += 1
+        return None
+
+    ROUTER_STATS[decision.agent_name] += 1
+    if decision.state_updates:
+        update_session_state(session_id, **decision.state_updates)
+    logger.debug(
+        "Routed session %s to %s (%s)", session_id, decision.agent_name, decision.reason
+    )
+    return transfer_response(decision.agent_name)
@@ -0,0 +1,158 @@
+"""Scoped model context for the sub-agents.
+
+After a transfer, ADK hands a sub-agent the whole shared history: every
+earlier turn, the state JSON attached to each user message and the
+orchestrator's tool calls rendered as ``For context:`` text. A sub-agent only
+needs the previous exchange, the current request, the session state fields
+listed in ``SCOPED_STATE_KEYS`` (compiled into its system prompt by
+``instruction_provider(..., scoped=True)``) and the latest tool result.
+
+``scope_before_model`` is a sub-agent ``before_model_callback`` that replaces
+the request contents with exactly that:
+
+* the previous turn's user message and final reply, as text. ADK sends a
+  follow-up turn straight to the last active sub-agent, so a "yes" must still
+  see the question it answers (e.g. action_agent's upgrade confirmation);
+* the user's message for this turn, without the state blob;
+* the most recent tool result another agent produced this turn;
+* the agent's own calls and tool responses in this turn, so its tool loop
+  still works.
+
+``recall_conversation`` is a tool that returns older turns when the user
+refers back to them, so the full history is only paid for when asked for.
+"""
+
+from __future__ import annotations
+
+from typing import Any, Dict, List, Optional, Sequence
+
+from google.adk.agents.callback_context import CallbackContext
+from google.adk.models.llm_request import LlmRequest
+from google.adk.models.llm_response import LlmResponse
+from google.adk.tools.tool_context import ToolContext
+from google.genai import types as genai_types
+
+from .context_window import split_turns
+from .state import get_session_state
+
+_CONTEXT_PREFIX = "For context:"
+_STATE_PREFIX = '{"session_state"'
+_TOOL_RESULT = "` tool returned result:"
+_SAID = "] said: "
+
+
+def _latest_tool_result(turn: Sequence[genai_types.Content]) -> Optional[str]:
+    """The last tool result another agent produced in ``turn``, as text."""
+    latest = None
+    for content in turn:
+        parts = content.parts or []
+        if not parts or parts[0].text != _CONTEXT_PREFIX:
+            continue
+        for part in parts[1:]:
+            if (
+                part.text
+                and _TOOL_RESULT in part.text
+                and "`transfer_to_agent`" not in part.text
+            ):
+                latest = part.text
+    return latest
+
+
+def _previous_exchange(
+    turn: Sequence[genai_types.Content],
+) -> List[genai_types.Content]:
+    """``turn``'s user message and final reply, without state or tool traffic."""
+    parts = turn[0].parts or []
+    request = parts[0].text if parts else None
+    if not request or request.startswith(_CONTEXT_PREFIX):
+        return []
+    reply = None
+    for content in turn[1:]:
+        texts = [p.text for p in content.parts or [] if p.text and not p.thought]
+        if content.role == "model":
+            reply = "".join(texts) or reply
+            continue
+        for text in texts:
+            if _SAID in text:
+                # Another agent's reply, rendered by ADK as "[agent] said: ...".
+                reply = text.split(_SAID, 1)[1]
+    exchange = [
+        genai_types.Content(role="user", parts=[genai_types.Part(text=request)])
+    ]
+    if reply:
+        exchange.append(
+            genai_types.Content(role="model", parts=[genai_types.Part(text=reply)])
+        )
+    return exchange
+
+
+def scoped_contents(
+    contents: Sequence[genai_types.Content],
+) -> List[genai_types.Content]:
+    """Minimal contents for a sub-agent call: the previous exchange, this turn's
+    request and its tool loop."""
+    turns = split_turns(contents)
+    if not turns:
+        return []
+    turn = turns[-1]
+    first = turn[0].parts[0] if turn[0].parts else None
+    if first is None or not first.text or first.text.startswith(_CONTEXT_PREFIX):
+        return list(turn)
+    previous = _previous_exchange(turns[-2]) if len(turns) > 1 else []
+
+    parts = [genai_types.Part(text=first.text)]
+    tool_result = _latest_tool_result(turn)
+    if tool_result:
+        parts.append(genai_types.Part(text=f"{_CONTEXT_PREFIX} {tool_result}"))
+    own = [
+        content
+        for content in turn[1:]
+        if not (content.parts and content.parts[0].text == _CONTEXT_PREFIX)
+    ]
+    return [*previous, genai_types.Content(role="user", parts=parts), *own]
+
+
+def scope_before_model(
+    callback_context: CallbackContext, llm_request: LlmRequest
+) -> Optional[LlmResponse]:
+    """``before_model_callback`` that scopes a sub-agent's contents."""
+    llm_request.contents = scoped_contents(llm_request.contents)
+    return None
+
+
+def _event_text(event: Any) -> str:
+    parts = event.content.parts if event.content and event.content.parts else []
+    texts = [p.text for p in parts if p.text and not p.thought]
+    if event.author == "user":
+        texts = [t for t in texts[:1] if not t.startswith(_STATE_PREFIX)]
+    return " ".join(texts).strip()
+
+
+def recall_conversation(tool_context: ToolContext, turns: int = 5) -> Dict[str, Any]:
+    """Tool: Return earlier turns of this conversation.
+
+    Use only when the user refers to something said earlier that is not in
+    the current request, e.g. "the report I asked about before".
+
+    Args:
+        turns: How many of the most recent earlier turns to return.
+    """
+    session = tool_context.session
+    exchanges: List[Dict[str, str]] = []
+    for event in session.events:
+        if event.partial:
+            continue
+        text = _event_text(event)
+        if not text:
+            continue
+        if event.author == "user":
+            exchanges.append({"user": text})
+        elif exchanges:
+            exchanges[-1]["assistant"] = text
+    # The last exchange is the turn being answered.
+    earlier = exchanges[:-1][-max(1, turns) :]
+    state = get_session_state(session.id)
+    return {
+        "summary": state.get("conversation_summary") or "",
+        "turns": earlier,
+    }
@@ -0,0 +1,291 @@
+"""Pooled async access to the user registry, report catalog and audit log.
+
+The agent tools used to read module-level dicts. These stores put the same
+data behind a small connection pool so the tools can be ``async``: a query
+runs on a worker thread with a pooled connection while the runner's event
+loop carries on with other tool calls, model streams and turns.
+
+SQLite is the local stand-in for the real backends. ``open_backends`` seeds
+it from the built-in registry and ``PLAN_ENTITLEMENTS`` (existing rows are
+kept, so plan changes survive restarts). WAL mode and a busy timeout let
+pooled connections read while one writes.
+
+The pool hands connections out from a thread-safe queue rather than an
+``asyncio`` one: ``Runner.run`` gives every turn its own event loop, and the
+stores are shared by all of them.
+"""
+
+from __future__ import annotations
+
+import asyncio
+import queue
+import sqlite3
+import threading
+from dataclasses import dataclass
+from datetime import datetime, timezone
+from pathlib import Path
+from typing import Any, Callable, Dict, List, Optional, Tuple, TypeVar
+
+from .config import TOOL_STORE, TOOL_STORE_POOL_SIZE
+from .entitlement_tools import _PAID, _REVERSE_INDEX
+from .user_registry import list_users
+
+T = TypeVar("T")
+
+PLANS = ("BRONZE", "SILVER", "GOLD")
+
+_SCHEMA = """
+CREATE TABLE IF NOT EXISTS users (
+    uid TEXT PRIMARY KEY,
+    user_key TEXT NOT NULL UNIQUE,
+    user_name TEXT NOT NULL,
+    company_name TEXT NOT NULL,
+    data_plan TEXT NOT NULL,
+    email TEXT NOT NULL,
+    last_date_modified TEXT NOT NULL
+);
+CREATE TABLE IF NOT EXISTS catalog (
+    report_key TEXT PRIMARY KEY,
+    lowest_plan TEXT,
+    paid_only INTEGER NOT NULL
+);
+CREATE TABLE IF NOT EXISTS audit (
+    id INTEGER PRIMARY KEY AUTOINCREMENT,
+    at TEXT NOT NULL,
+    uid TEXT NOT NULL,
+    action TEXT NOT NULL,
+    old_value TEXT,
+    new_value TEXT,
+    session_id TEXT
+);
+"""
+
+
+class ConnectionPool:
+    """A fixed set of SQLite connections shared across threads and loops."""
+
+    def __init__(self, path: str | Path, size: int = 4, timeout_s: float = 5.0):
+        self.path = str(path)
+        if self.path == ":memory:":
+            size = 1  # every connection would get its own empty database
+        else:
+            Path(self.path).parent.mkdir(parents=True, exist_ok=True)
+        self.size = size
+        self._idle: "queue.Queue[sqlite3.Connection]" = queue.Queue()
+        self._all: List[sqlite3.Connection] = []
+        self._lock = threading.Lock()
+        for _ in range(max(1, self.size)):
+            conn = sqlite3.connect(
+                self.path,
+                timeout=timeout_s,
+                check_same_thread=False,
+                isolation_level=None,
+            )
+            conn.row_factory = sqlite3.Row
+            conn.execute("PRAGMA journal_mode=WAL")
+            conn.execute(f"PRAGMA busy_timeout={int(timeout_s * 1000)}")
+            self._all.append(conn)
+            self._idle.put(conn)
+
+    def run_sync(self, fn: Callable[[sqlite3.Connection], T]) -> T:
+        """Run ``fn`` with a pooled connection on the calling thread."""
+        conn = self._idle.get()
+        try:
+            return fn(conn)
+        finally:
+            self._idle.put(conn)
+
+    async def run(self, fn: Callable[[sqlite3.Connection], T]) -> T:
+        """Run ``fn`` with a pooled connection on a worker thread."""
+        return await asyncio.to_thread(self.run_sync, fn)
+
+    def close(self) -> None:
+        with self._lock:
+            for conn in self._all:
+                conn.close()
+            self._all.clear()
+
+
+def _now() -> str:
+    return datetime.now(timezone.utc).isoformat()
+
+
+class RegistryStore:
+    """User profiles and their data plans."""
+
+    def __init__(self, pool: ConnectionPool):
+        self.pool = pool
+
+    @staticmethod
+    def _profile(row: Optional[sqlite3.Row]) -> Optional[Dict[str, Any]]:
+        if row is None:
+            return None
+        return {
+            "company_name": row["company_name"],
+            "user_name": row["user_name"],
+            "data_plan": row["data_plan"],
+            "email": row["email"],
+            "uid": row["uid"],
+            "last_date_modified": row["last_date_modified"],
+        }
+
+    async def get_profile(self, user_name: str) -> Optional[Dict[str, Any]]:
+        """Profile by user name (case-insensitive), or None."""
+        row = await self.pool.run(
+            lambda c: c.execute(
+                "SELECT * FROM users WHERE user_key = ?", (user_name.lower(),)
+            ).fetchone()
+        )
+        return self._profile(row)
+
+    async def set_plan(self, uid: str, plan: str) -> Tuple[bool, Optional[str]]:
+        """Set ``uid``'s plan; returns ``(updated, previous plan)``.
+
+        Mirrors ``user_registry.set_user_plan``: unknown users and plans fail,
+        and setting the current plan succeeds without a write.
+        """
+        plan = plan.upper()
+        if plan not in PLANS:
+            return False, None
+
+        def update(conn: sqlite3.Connection) -> Tuple[bool, Optional[str]]:
+            conn.execute("BEGIN IMMEDIATE")
+            try:
+                row = conn.execute(
+                    "SELECT data_plan FROM users WHERE uid = ?", (uid,)
+                ).fetchone()
+                if row is not None and row["data_plan"] != plan:
+                    conn.execute(
+                        "UPDATE users SET data_plan = ?, last_date_modified = ? WHERE uid = ?",
+                        (plan, _now(), uid),
+                    )
+            except BaseException:
+                conn.execute("ROLLBACK")
+                raise
+            conn.execute("COMMIT")
+            return (False, None) if row is None else (True, row["data_plan"])
+
+        return await self.pool.run(update)
+
+
+class CatalogStore:
+    """Report catalog: lowest plan covering each report and paid-only reports."""
+
+    def __init__(self, pool: ConnectionPool):
+        self.pool = pool
+
+    async def lookup(self, report_key: str) -> Tuple[Optional[str], bool]:
+        """``(lowest plan, paid only)`` for a normalized report name."""
+        row = await self.pool.run(
+            lambda c: c.execute(
+                "SELECT lowest_plan, paid_only FROM catalog WHERE report_key = ?",
+                (report_key,),
+            ).fetchone()
+        )
+        if row is None:
+            return None, False
+        return row["lowest_plan"], bool(row["paid_only"])
+
+
+class AuditStore:
+    """Append-only record of changes the tools made."""
+
+    def __init__(self, pool: ConnectionPool):
+        self.pool = pool
+
+    async def record(
+        self,
+        uid: str,
+        action: str,
+        old_value: Optional[str],
+        new_value: Optional[str],
+        session_id: Optional[str] = None,
+    ) -> None:
+        await self.pool.run(
+            lambda c: c.execute(
+                "INSERT INTO audit (at, uid, action, old_value, new_value, session_id) "
+                "VALUES (?, ?, ?, ?, ?, ?)",
+                (_now(), uid, action, old_value, new_value, session_id),
+            )
+        )
+
+    async def entries(self, uid: Optional[str] = None) -> List[Dict[str, Any]]:
+        """Audit rows, oldest first, optionally for one user."""
+        sql = "SELECT at, uid, action, old_value, new_value, session_id FROM audit"
+        params: Tuple[Any, ...] = ()
+        if uid is not None:
+            sql, params = sql + " WHERE uid = ?", (uid,)
+        rows = await self.pool.run(
+            lambda c: c.execute(sql + " ORDER BY id", params).fetchall()
+        )
+        return [dict(row) for row in rows]
+
+
+@dataclass
+class ToolBackends:
+    """The stores behind the async agent tools."""
+
+    pool: ConnectionPool
+    registry: RegistryStore
+    catalog: CatalogStore
+    audit: AuditStore
+
+    def close(self) -> None:
+        self.pool.close()
+
+
+def _seed(conn: sqlite3.Connection) -> None:
+    conn.executescript(_SCHEMA)
+    conn.execute("BEGIN")
+    conn.executemany(
+        "INSERT OR IGNORE INTO users VALUES (?, ?, ?, ?, ?, ?, ?)",
+        [
+            (
+                u["uid"],
+                u["user_name"].lower(),
+                u["user_name"],
+                u["company_name"],
+                u["data_plan"],
+                u["email"],
+                u["last_date_modified"],
+            )
+            for u in list_users()
+        ],
+    )
+    # The catalog is reference data: refresh it from PLAN_ENTITLEMENTS.
+    conn.execute("DELETE FROM catalog")
+    conn.executemany(
+        "INSERT INTO catalog VALUES (?, ?, ?)",
+        [(key, plan, 0) for key, plan in _REVERSE_INDEX.items() if key not in _PAID]
+        + [(key, None, 1) for key in _PAID],
+    )
+    conn.execute("COMMIT")
+
+
+def open_backends(path: str | Path, *, pool_size: int = 4) -> ToolBackends:
+    """Open (and seed) the SQLite stand-in at ``path``."""
+    pool = ConnectionPool(path, size=pool_size)
+    pool.run_sync(_seed)
+    return ToolBackends(pool, RegistryStore(pool), CatalogStore(pool), AuditStore(pool))
+
+
+_backends: Optional[ToolBackends] = None
+_backends_lock = threading.Lock()
+
+
+def get_backends() -> ToolBackends:
+    """Process-wide backends configured by ``TOOL_STORE``, opened on first use."""
+    global _backends
+    with _backends_lock:
+        if _backends is None:
+            _backends = open_backends(TOOL_STORE, pool_size=TOOL_STORE_POOL_SIZE)
+        return _backends
+
+
+def close_backends() -> None:
+    """Close the process-wide backends if they were opened."""
+    global _backends
+    with _backends_lock:
+        if _backends is not None:
+            _backends.close()
+            _backends = None
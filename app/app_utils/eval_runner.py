@@ -0,0 +1,491 @@
+"""Command-line regression evaluation over a JSONL dataset of conversations.
+
+Each line of the dataset is one case, a conversation of one or more turns::
+
+    {"id": "wire-silver", "user": "bob",
+     "turns": [{"message": "Do I have Wire tracking detail?",
+                "expect": {"agent": "recommendation_agent", "status": "optional"}}]}
+
+``expect`` is optional per turn. ``agent`` is the sub-agent the turn should be
+handed to; ``status`` is the entitlement status (a list when the turn names
+several reports). Cases run in-process on the web server's session setup,
+pre-turn enrichment and runner, so the configured model backend, routing and
+tools are exactly what ``/chat`` uses.
+
+Cases run concurrently, at most ``--concurrency`` at a time. Every turn records
+the agent it was routed to, the entitlement statuses it was answered from, its
+latency, time to first text, token counts and tool calls. The report scores
+routing and entitlement accuracy against the expectations.
+
+Every session runs on one prompt variant (see app/agents/prompt_variants.py),
+the baseline of ``PROMPT_VARIANTS`` unless ``--prompt-variant`` names one.
+Naming several runs the dataset once per variant and adds a comparison of
+their tokens, model and tool calls, TTFT and latency.
+
+Results are cached per case in ``--cache``, keyed by the case's messages, the
+prompt set, the model settings and the catalog version. A rerun executes only
+the cases whose key changed; ``--no-cache`` forces a full run.
+
+Usage::
+
+    python -m app.app_utils.eval_runner tests/eval/conversations.jsonl
+    python -m app.app_utils.eval_runner cases.jsonl --concurrency 16 --output .data/eval.json
+    python -m app.app_utils.eval_runner cases.jsonl --prompt-variant default --prompt-variant updated-1
+
+With ``--min-accuracy`` the run exits non-zero when routing or entitlement
+accuracy is below the threshold.
+
+The conversation journal, the tool store and the interaction log go to
+``--data-dir`` (a fresh temporary directory by default), so an evaluation
+never writes conversations or plan upgrades into the server's ``.data``.
+"""
+
+from __future__ import annotations
+
+import argparse
+import asyncio
+import hashlib
+import json
+import os
+import statistics
+import sys
+import tempfile
+import time
+from pathlib import Path
+from typing import Any, Dict, Iterable, List, Optional
+
+DEFAULT_CACHE = ".data/eval_cache.json"
+
+_CHECK = "check_entitlement"
+
+
+def load_cases(path: str | Path) -> List[Dict[str, Any]]:
+    """Cases from a JSONL file; blank lines are skipped."""
+    cases = []
+    with open(path, encoding="utf-8") as fh:
+        for number, line in enumerate(fh, 1):
+            if not line.strip():
+                continue
+            case = json.loads(line)
+            if not case.get("turns"):
+                raise ValueError(f"{path}:{number}: case has no turns")
+            case.setdefault("id", f"case-{number}")
+            case.setdefault("user", "alice")
+            cases.append(case)
+    return cases
+
+
+def _digest(value: Any) -> str:
+    blob = json.dumps(value, sort_keys=True, default=str).encode("utf-8")
+    return hashlib.sha256(blob).hexdigest()[:16]
+
+
+def catalog_version() -> str:
+    """Digest of the plan entitlements the tools and router read."""
+    from app.agents.entitlements import PLAN_ENTITLEMENTS
+
+    return _digest(PLAN_ENTITLEMENTS)
+
+
+def fingerprint(variant: str) -> Dict[str, Any]:
+    """Everything besides the case itself that a cached result depends on."""
+    from app.agents.config import DEFAULT_AGENT_SETTINGS, LLM_BACKEND, agent_settings
+    from app.agents.prompt_sets import load_prompt_set
+
+    return {
+        "catalog": catalog_version(),
+        "prompts": _digest(load_prompt_set(variant)),
+        "backend": LLM_BACKEND,
+        "models": {name: agent_settings(name).model for name in DEFAULT_AGENT_SETTINGS},
+    }
+
+
+def case_key(case: Dict[str, Any], fp: Dict[str, Any]) -> str:
+    """Cache key of ``case`` under fingerprint ``fp``."""
+    turns = [turn["message"] for turn in case["turns"]]
+    return _digest({"user": case["user"], "turns": turns, **fp})
+
+
+def _statuses(
+    turn: Dict[str, Any], tool_statuses: List[str], session_id: str
+) -> List[str]:
+    """Entitlement statuses a turn was answered from.
+
+    Tool results win; otherwise the checks that routing or pre-turn
+    enrichment left in the session state for the reports this turn names.
+    """
+    from app.agents.router import find_reports
+    from app.agents.state import get_session_state
+
+    if tool_statuses:
+        return tool_statuses
+    reports = find_reports(turn["message"])
+    if not reports:
+        return []
+    state = get_session_state(session_id)
+    checks = state.get("entitlement_checks") or []
+    if [c.get("report") for c in checks] == reports:
+        return [str(c["status"]) for c in checks]
+    check = state.get("entitlement_check") or {}
+    return [str(check["status"])] if "status" in check else []
+
+
+async def _run_turn(session_id: str, user: str, turn: Dict[str, Any]) -> Dict[str, Any]:
+    from google.adk.agents.run_config import RunConfig, StreamingMode
+
+    from app import web_server
+    from app.app_utils.turn_events import TurnEvents
+
+    start = time.perf_counter()
+    events = TurnEvents()
+    transfers: List[str] = []
+    tools: List[str] = []
+    tool_statuses: List[str] = []
+
+    message = await web_server._turn_message(session_id, turn["message"])
+    async for event in web_server._runner().run_async(
+        user_id=user,
+        session_id=session_id,
+        new_message=message,
+        run_config=RunConfig(streaming_mode=StreamingMode.SSE),
+    ):
+        for frame in events.feed(event):
+            if "transfer" in frame:
+                transfers.append(frame["transfer"])
+            elif "tool" in frame:
+                tools.append(frame["tool"])
+        for response in event.get_function_responses():
+            if response.name == _CHECK and isinstance(response.response, dict):
+                tool_statuses.append(str(response.response.get("status")))
+        if events.error:
+            break
+    end = time.perf_counter()
+    first_text = events.first_text_at
+
+    return {
+        "message": turn["message"],
+        "expect": turn.get("expect") or {},
+        "agent": transfers[-1] if transfers else events.agent,
+        "statuses": _statuses(turn, tool_statuses, session_id),
+        "answer": events.answer,
+        "error": events.error,
+        "latency_ms": (end - start) * 1000,
+        "ttft_ms": (first_text - start) * 1000 if first_text is not None else None,
+        "tokens": dict(events.tokens),
+        "model_calls": events.model_calls,
+        "tool_calls": tools,
+    }
+
+
+async def run_case(case: Dict[str, Any], variant: str) -> Dict[str, Any]:
+    """Run every turn of ``case`` in a fresh ``variant`` session; stops at the first error."""
+    from app import web_server
+    from app.agents.prompt_variants import prompt_variants
+
+    session = await web_server.create_session(
+        web_server.CreateSessionRequest(user_id=case["user"])
+    )
+    prompt_variants.assign(session["session_id"], variant)
+    turns = []
+    for turn in case["turns"]:
+        result = await _run_turn(session["session_id"], case["user"], turn)
+        turns.append(result)
+        if result["error"]:
+            break
+    return {"id": case["id"], "user": case["user"], "turns": turns}
+
+
+def _load_cache(path: Optional[str]) -> Dict[str, Any]:
+    if not path or not os.path.exists(path):
+        return {}
+    with open(path, encoding="utf-8") as fh:
+        return json.load(fh)
+
+
+def _save_cache(path: str, cache: Dict[str, Any]) -> None:
+    Path(path).parent.mkdir(parents=True, exist_ok=True)
+    tmp = f"{path}.tmp"
+    with open(tmp, "w", encoding="utf-8") as fh:
+        json.dump(cache, fh)
+    os.replace(tmp, path)
+
+
+async def run_eval(
+    cases: Iterable[Dict[str, Any]],
+    *,
+    concurrency: int = 8,
+    cache_path: Optional[str] = DEFAULT_CACHE,
+    variant: Optional[str] = None,
+) -> List[Dict[str, Any]]:
+    """Results for ``cases`` in dataset order, from the cache where possible.
+
+    Cases that raised or ended in a model error are reported but not cached.
+    """
+    from app.agents.prompt_variants import prompt_variants
+
+    variant = variant or prompt_variants.baseline
+    fp = fingerprint(variant)
+    cache = _load_cache(cache_path)
+    gate = asyncio.Semaphore(max(1, concurrency))
+
+    async def one(case: Dict[str, Any]) -> Dict[str, Any]:
+        key = case_key(case, fp)
+        if key in cache:
+            return {**cache[key], "id": case["id"], "cached": True}
+        async with gate:
+            try:
+                result = await run_case(case, variant)
+            except Exception as exc:
+                return {
+                    "id": case["id"],
+                    "user": case["user"],
+                    "turns": [],
+                    "error": repr(exc),
+                }
+        if not any(turn["error"] for turn in result["turns"]):
+            cache[key] = result
+        return {**result, "cached": False}
+
+    results = await asyncio.gather(*(one(case) for case in cases))
+    if cache_path:
+        _save_cache(cache_path, cache)
+    return list(results)
+
+
+def _percentile(values: List[float], pct: float) -> float:
+    ordered = sorted(values)
+    index = min(len(ordered) - 1, max(0, round(pct / 100 * len(ordered)) - 1))
+    return ordered[index]
+
+
+def _accuracy(hits: int, total: int) -> Optional[float]:
+    return hits / total if total else None
+
+
+def score_turn(turn: Dict[str, Any]) -> Dict[str, bool]:
+    """Hit or miss per expectation the turn has (``agent``, ``status``)."""
+    expect = turn["expect"]
+    scores = {}
+    if "agent" in expect:
+        scores["agent"] = not turn["error"] and expect["agent"] == turn["agent"]
+    if "status" in expect:
+        wanted = expect["status"]
+        wanted = [wanted] if isinstance(wanted, str) else list(wanted)
+        scores["status"] = not turn["error"] and wanted == turn["statuses"]
+    return scores
+
+
+def summarize(results: List[Dict[str, Any]]) -> Dict[str, Any]:
+    """Accuracy, latency and token totals over ``results``, plus every miss."""
+    turns = [turn for result in results for turn in result["turns"]]
+    scores = [score_turn(turn) for turn in turns]
+    misses = []
+    for result in results:
+        if result.get("error"):
+            misses.append({"id": result["id"], "error": result["error"]})
+        for index, turn in enumerate(result["turns"]):
+            if turn["error"]:
+                misses.append(
+                    {"id": result["id"], "turn": index, "error": turn["error"]}
+                )
+            elif not all(score_turn(turn).values()):
+                got = {"agent": turn["agent"], "status": turn["statuses"]}
+                misses.append(
+                    {
+                        "id": result["id"],
+                        "turn": index,
+                        "expected": turn["expect"],
+                        "got": got,
+                    }
+                )
+
+    def accuracy(field: str) -> Optional[float]:
+        scored = [s[field] for s in scores if field in s]
+        return _accuracy(sum(scored), len(scored))
+
+    latencies = [t["latency_ms"] for t in turns if not t["error"]]
+    ttfts = [t["ttft_ms"] for t in turns if t["ttft_ms"] is not None]
+    tokens = {"prompt": 0, "candidates": 0, "thoughts": 0}
+    for turn in turns:
+        for key, count in turn["tokens"].items():
+            tokens[key] += count
+    return {
+        "cases": len(results),
+        "executed": sum(1 for r in results if not r.get("cached")),
+        "cached": sum(1 for r in results if r.get("cached")),
+        "turns": len(turns),
+        "routing_accuracy": accuracy("agent"),
+        "entitlement_accuracy": accuracy("status"),
+        "latency_p50_ms": _percentile(latencies, 50) if latencies else None,
+        "latency_p95_ms": _percentile(latencies, 95) if latencies else None,
+        "ttft_p50_ms": _percentile(ttfts, 50) if ttfts else None,
+        "tokens": tokens,
+        "tokens_per_turn": statistics.fmean(sum(t["tokens"].values()) for t in turns)
+        if turns
+        else 0,
+        "misses": misses,
+    }
+
+
+def _fmt(value: Optional[float], spec: str = ".1f") -> str:
+    return "-" if value is None else format(value, spec)
+
+
+def print_report(results: List[Dict[str, Any]], summary: Dict[str, Any]) -> None:
+    print(
+        f"{'case':<28}{'turn':>5}  {'agent':<22}{'status':<20}{'ms':>8}{'ttft':>8}{'tokens':>8}"
+    )
+    for result in results:
+        marker = " (cached)" if result.get("cached") else ""
+        for index, turn in enumerate(result["turns"]):
+            print(
+                f"{result['id'][:27]:<28}{index:>5}  {str(turn['agent'])[:21]:<22}"
+                f"{','.join(turn['statuses'])[:19]:<20}{turn['latency_ms']:>8.1f}"
+                f"{_fmt(turn['ttft_ms']):>8}{sum(turn['tokens'].values()):>8}{marker}"
+            )
+    print()
+    print(
+        f"cases {summary['cases']} ({summary['executed']} run, {summary['cached']} cached), "
+        f"turns {summary['turns']}"
+    )
+    print(
+        f"routing accuracy {_fmt(summary['routing_accuracy'], '.1%')}, "
+        f"entitlement accuracy {_fmt(summary['entitlement_accuracy'], '.1%')}"
+    )
+    print(
+        f"latency p50 {_fmt(summary['latency_p50_ms'])} ms, p95 {_fmt(summary['latency_p95_ms'])} ms, "
+        f"ttft p50 {_fmt(summary['ttft_p50_ms'])} ms, tokens {summary['tokens']}"
+    )
+    for miss in summary["misses"]:
+        print(f"MISS {json.dumps(miss)}", file=sys.stderr)
+
+
+def compare_variants(
+    runs: Dict[str, List[Dict[str, Any]]],
+) -> Dict[str, Dict[str, Any]]:
+    """``VariantMetrics`` report over each variant's results; the first is the baseline."""
+    from app.agents.prompt_variants import VariantMetrics
+
+    metrics = VariantMetrics()
+    for variant, results in runs.items():
+        for turn in (t for result in results for t in result["turns"]):
+            metrics.record(
+                variant,
+                tokens=turn["tokens"],
+                model_calls=turn["model_calls"],
+                tool_calls=len(turn["tool_calls"]),
+                latency_ms=turn["latency_ms"],
+                ttft_ms=turn["ttft_ms"],
+                error=turn["error"] is not None,
+            )
+    return metrics.report(next(iter(runs), None))
+
+
+def isolate_data(data_dir: str | Path) -> None:
+    """Point the journal, tool store and interaction log at ``data_dir``.
+
+    ``app.web_server`` opens them from the config at import time, so this
+    must run before it is first imported.
+    """
+    if "app.web_server" in sys.modules:
+        raise RuntimeError("isolate_data must run before app.web_server is imported")
+    from app.agents import config, stores
+
+    data_dir = Path(data_dir)
+    data_dir.mkdir(parents=True, exist_ok=True)
+    if config.CONVERSATION_JOURNAL:
+        config.CONVERSATION_JOURNAL = str(data_dir / "conversations.journal")
+    # stores imported TOOL_STORE by value; it opens the store on first use.
+    config.TOOL_STORE = stores.TOOL_STORE = str(data_dir / "tools.sqlite")
+    config.INTERACTION_LOG_DIR = str(data_dir / "interactions")
+    if config.INTERACTION_LOG not in ("", "jsonl", "parquet"):
+        config.INTERACTION_LOG = "jsonl"  # never ship eval turns to a remote sink
+
+
+def main(argv: Optional[List[str]] = None) -> int:
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("dataset", help="JSONL file of cases")
+    parser.add_argument(
+        "--concurrency", type=int, default=8, help="cases in flight at once"
+    )
+    parser.add_argument("--cache", default=DEFAULT_CACHE, help="per-case result cache")
+    parser.add_argument("--no-cache", action="store_true", help="run every case")
+    parser.add_argument("--output", help="write results and summary JSON here")
+    parser.add_argument(
+        "--data-dir",
+        help="journal, tool store and interaction log (default: a temp dir)",
+    )
+    parser.add_argument(
+        "--prompt-variant",
+        action="append",
+        help="prompt set to run on; repeat to compare variants (default: the baseline)",
+    )
+    parser.add_argument(
+        "--min-accuracy",
+        type=float,
+        help="exit 1 when an accuracy is below this fraction",
+    )
+    args = parser.parse_args(argv)
+
+    isolate_data(args.data_dir or tempfile.mkdtemp(prefix="eval-"))
+    from app.agents.prompt_variants import format_report, prompt_variants
+
+    cases = load_cases(args.dataset)
+    variants = args.prompt_variant or [prompt_variants.baseline]
+    runs: Dict[str, List[Dict[str, Any]]] = {}
+    summaries: Dict[str, Dict[str, Any]] = {}
+    # One untimed case first, so imports, fixture loading and store setup do
+    # not land in the first variant's latencies.
+    asyncio.run(run_case(cases[0], variants[0]))
+    for variant in variants:
+        runs[variant] = asyncio.run(
+            run_eval(
+                cases,
+                concurrency=args.concurrency,
+                cache_path=None if args.no_cache else args.cache,
+                variant=variant,
+            )
+        )
+        summaries[variant] = summarize(runs[variant])
+        if len(variants) > 1:
+            print(f"== prompt variant {variant}")
+        print_report(runs[variant], summaries[variant])
+        print()
+    comparison = compare_variants(runs)
+    if len(variants) > 1:
+        print(format_report(comparison))
+
+    if args.output:
+        Path(args.output).parent.mkdir(parents=True, exist_ok=True)
+        report = {
+            "runs": {
+                variant: {
+                    "fingerprint": fingerprint(variant),
+                    "summary": summaries[variant],
+                    "results": runs[variant],
+                }
+                for variant in variants
+            },
+            "comparison": comparison,
+        }
+        Path(args.output).write_text(json.dumps(report, indent=2) + "\n")
+
+    if args.min_accuracy is not None:
+        below = [
+            name
+            for summary in summaries.values()
+            for name in ("routing_accuracy", "entitlement_accuracy")
+            if summary[name] is not None and summary[name] < args.min_accuracy
+        ]
+        errors = [
+            m
+            for summary in summaries.values()
+            for m in summary["misses"]
+            if "error" in m
+        ]
+        return 1 if below or errors else 0
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,315 @@
+"""Batched, asynchronous interaction log (feedback, turn summaries).
+
+``InteractionLog.emit`` only appends a record to a bounded in-memory queue;
+a background thread hands the queue to a sink in batches of at most
+``batch_size`` records, at the latest ``flush_interval_s`` after the oldest
+one arrived. Nothing on the request path waits on I/O.
+
+Backpressure: when ``max_queue`` records are waiting (a slow or failing
+sink), ``emit`` drops the record, counts it and returns False instead of
+blocking. A batch the sink fails to take is retried ``max_retries`` times
+with backoff, then dropped and counted.
+
+Sinks take a list of JSON-serializable dicts:
+
+* ``RotatingJsonlSink``: ``<dir>/interactions.jsonl``, rotated by size;
+* ``ParquetSink``: ``<dir>/interactions-<n>.parquet`` (needs pyarrow);
+* ``CloudLoggingSink``: one Cloud Logging batch per flush;
+* any object with ``write(records)`` and ``close()``, named as
+  ``"package.module:factory"`` in ``INTERACTION_LOG``.
+"""
+
+from __future__ import annotations
+
+import importlib
+import json
+import logging
+import os
+import threading
+import time
+from collections import Counter, deque
+from pathlib import Path
+from typing import Any, Deque, Dict, List, Optional, Protocol
+
+logger = logging.getLogger(__name__)
+
+
+class Sink(Protocol):
+    def write(self, records: List[Dict[str, Any]]) -> None: ...
+
+    def close(self) -> None: ...
+
+
+class RotatingJsonlSink:
+    """Appends JSON lines to one file, rotated like ``RotatingFileHandler``."""
+
+    def __init__(
+        self, directory: str | Path, *, max_bytes: int = 64 << 20, backups: int = 5
+    ):
+        self.path = Path(directory) / "interactions.jsonl"
+        self.path.parent.mkdir(parents=True, exist_ok=True)
+        self.max_bytes = max_bytes
+        self.backups = backups
+        self._file = open(self.path, "ab")
+
+    def write(self, records: List[Dict[str, Any]]) -> None:
+        data = b"".join(
+            json.dumps(
+                r, ensure_ascii=False, separators=(",", ":"), default=str
+            ).encode()
+            + b"\n"
+            for r in records
+        )
+        if (
+            self.max_bytes
+            and self._file.tell()
+            and self._file.tell() + len(data) > self.max_bytes
+        ):
+            self._rotate()
+        self._file.write(data)
+        self._file.flush()
+
+    def _rotate(self) -> None:
+        self._file.close()
+        for n in range(self.backups - 1, 0, -1):
+            older = self.path.with_name(f"{self.path.name}.{n}")
+            if older.exists():
+                os.replace(older, self.path.with_name(f"{self.path.name}.{n + 1}"))
+        if self.backups:
+            os.replace(self.path, self.path.with_name(f"{self.path.name}.1"))
+        else:
+            self.path.unlink()
+        self._file = open(self.path, "ab")
+
+    def close(self) -> None:
+        self._file.close()
+
+
+class ParquetSink:
+    """Writes row groups to numbered Parquet files, starting a new one by size.
+
+    Records have different shapes, so each row keeps the common fields as
+    columns and the whole record as a JSON ``payload`` column.
+    """
+
+    COLUMNS = ("ts", "type", "session_id", "user_id")
+
+    def __init__(
+        self, directory: str | Path, *, max_bytes: int = 64 << 20, backups: int = 5
+    ):
+        import pyarrow as pa
+
+        self._pa = pa
+        self.directory = Path(directory)
+        self.directory.mkdir(parents=True, exist_ok=True)
+        self.max_bytes = max_bytes
+        self.backups = backups
+        self.schema = pa.schema(
+            [
+                ("ts", pa.float64()),
+                ("type", pa.string()),
+                ("session_id", pa.string()),
+                ("user_id", pa.string()),
+                ("payload", pa.string()),
+            ]
+        )
+        existing = sorted(self.directory.glob("interactions-*.parquet"))
+        self._seq = int(existing[-1].stem.rpartition("-")[2]) + 1 if existing else 0
+        self._writer: Any = None
+        self._path: Optional[Path] = None
+
+    def write(self, records: List[Dict[str, Any]]) -> None:
+        import pyarrow.parquet as pq
+
+        columns: Dict[str, List[Any]] = {
+            name: [r.get(name) for r in records] for name in self.COLUMNS
+        }
+        columns["payload"] = [
+            json.dumps(r, ensure_ascii=False, default=str) for r in records
+        ]
+        if self._writer is None:
+            self._path = self.directory / f"interactions-{self._seq:06d}.parquet"
+            self._writer = pq.ParquetWriter(self._path, self.schema)
+            self._seq += 1
+        self._writer.write_table(self._pa.table(columns, schema=self.schema))
+        if (
+            self.max_bytes
+            and self._path
+            and self._path.stat().st_size >= self.max_bytes
+        ):
+            self.close()
+            for old in sorted(self.directory.glob("interactions-*.parquet"))[
+                : -self.backups or None
+            ]:
+                old.unlink()
+
+    def close(self) -> None:
+        if self._writer is not None:
+            self._writer.close()
+            self._writer = None
+
+
+class CloudLoggingSink:
+    """Sends each batch to Cloud Logging as structured entries in one request."""
+
+    def __init__(self, log_name: str = "interactions"):
+        from google.cloud import logging as cloud_logging
+
+        self._logger = cloud_logging.Client().logger(log_name)
+
+    def write(self, records: List[Dict[str, Any]]) -> None:
+        batch = self._logger.batch()
+        for record in records:
+            batch.log_struct(
+                json.loads(json.dumps(record, default=str)), severity="INFO"
+            )
+        batch.commit()
+
+    def close(self) -> None:
+        pass
+
+
+def make_sink(name: str, directory: str | Path) -> Sink:
+    """The sink configured as ``INTERACTION_LOG``."""
+    if name == "jsonl":
+        return RotatingJsonlSink(directory)
+    if name == "parquet":
+        return ParquetSink(directory)
+    if name == "gcp":
+        return CloudLoggingSink()
+    if ":" in name:
+        module, _, factory = name.partition(":")
+        return getattr(importlib.import_module(module), factory)()
+    raise ValueError(
+        f"Unknown INTERACTION_LOG {name!r} (jsonl, parquet, gcp or package.module:factory)"
+    )
+
+
+class InteractionLog:
+    """Bounded queue drained to a sink in size- and time-bounded batches."""
+
+    def __init__(
+        self,
+        sink: Sink,
+        *,
+        max_queue: int = 10000,
+        batch_size: int = 500,
+        flush_interval_s: float = 1.0,
+        max_retries: int = 3,
+        retry_backoff_s: float = 0.5,
+    ):
+        self.sink = sink
+        self.max_queue = max_queue
+        self.batch_size = batch_size
+        self.flush_interval_s = flush_interval_s
+        self.max_retries = max_retries
+        self.retry_backoff_s = retry_backoff_s
+        self.stats: Counter[str] = Counter()
+
+        self._lock = threading.Lock()
+        self._wakeup = threading.Condition(self._lock)
+        self._queue: Deque[Dict[str, Any]] = deque()
+        self._oldest = 0.0  # time.monotonic() of the oldest queued record
+        self._in_flight = 0
+        self._flush_requested = False
+        self._closed = False
+        self._writer = threading.Thread(
+            target=self._write_loop, name="interaction-log", daemon=True
+        )
+        self._writer.start()
+
+    def emit(self, record: Dict[str, Any]) -> bool:
+        """Queue ``record``; False (and counted) when the queue is full."""
+        with self._lock:
+            if self._closed or len(self._queue) >= self.max_queue:
+                self.stats["dropped_full"] += 1
+                return False
+            if not self._queue:
+                self._oldest = time.monotonic()
+            self._queue.append({"ts": time.time(), **record})
+            self.stats["accepted"] += 1
+            if len(self._queue) > self.stats["queue_high_water"]:
+                self.stats["queue_high_water"] = len(self._queue)
+            if len(self._queue) in (1, self.batch_size):
+                self._wakeup.notify()  # start the flush timer, or write a full batch
+        return True
+
+    def flush(self, timeout: Optional[float] = None) -> bool:
+        """Block until every queued record has been handed to the sink."""
+        deadline = None if timeout is None else time.monotonic() + timeout
+        with self._lock:
+            self._flush_requested = True
+            self._wakeup.notify_all()
+            while self._queue or self._in_flight:
+                remaining = None if deadline is None else deadline - time.monotonic()
+                if remaining is not None and remaining <= 0:
+                    return False
+                self._wakeup.wait(remaining)
+            self._flush_requested = False
+        return True
+
+    def close(self) -> None:
+        """Write what is queued, stop the writer and close the sink."""
+        with self._lock:
+            if self._closed:
+                return
+            self._closed = True
+            self._wakeup.notify_all()
+        self._writer.join()
+        self.sink.close()
+
+    def snapshot(self) -> Dict[str, Any]:
+        with self._lock:
+            return {
+                **self.stats,
+                "queued": len(self._queue),
+                "max_queue": self.max_queue,
+            }
+
+    def _next_batch(self) -> Optional[List[Dict[str, Any]]]:
+        with self._lock:
+            while True:
+                if self._queue and (
+                    self._closed
+                    or self._flush_requested
+                    or len(self._queue) >= self.batch_size
+                    or time.monotonic() - self._oldest >= self.flush_interval_s
+                ):
+                    break
+                if self._closed:
+                    return None
+                timeout = (
+                    self._oldest + self.flush_interval_s - time.monotonic()
+                    if self._queue
+                    else None
+                )
+                self._wakeup.wait(timeout)
+            batch = [
+                self._queue.popleft()
+                for _ in range(min(self.batch_size, len(self._queue)))
+            ]
+            self._oldest = time.monotonic()
+            self._in_flight = len(batch)
+            return batch
+
+    def _write_loop(self) -> None:
+        while (batch := self._next_batch()) is not None:
+            for attempt in range(self.max_retries + 1):
+                try:
+                    self.sink.write(batch)
+                except Exception:
+                    self.stats["sink_errors"] += 1
+                    if attempt < self.max_retries and not self._closed:
+                        time.sleep(self.retry_backoff_s * 2**attempt)
+                        continue
+                    logger.exception(
+                        "Interaction log sink failed; dropping %d records", len(batch)
+                    )
+                    self.stats["dropped_sink"] += len(batch)
+                else:
+                    self.stats["written"] += len(batch)
+                    self.stats["batches"] += 1
+                break
+            with self._lock:
+                self._in_flight = 0
+                self._wakeup.notify_all()
@@ -0,0 +1,355 @@
+"""Durable conversation history: a write-behind, append-only journal.
+
+Every user and assistant message is appended to one journal file as a
+length-prefixed record::
+
+    <u32 payload length><u32 crc32(session id + payload)><u16 session id length>
+    <session id bytes><payload: the message as JSON>
+
+``append`` only encodes the message and queues it; a background thread
+writes whatever has queued up in one batch and fsyncs once per batch (group
+commit), so no disk I/O happens on the event loop or the streaming path.
+Messages still in the queue are served from memory, so reads always see
+every append.
+
+An in-memory index maps each session to the ``(offset, length)`` of its
+payloads. ``history_json`` slices those payloads out of a read-only ``mmap``
+and splices them into the response body without decoding them; ``message``
+decodes just the one payload at a position.
+
+Recovery loads the last index checkpoint (``<journal>.idx``) and scans and
+checksums only the records written after it (at most ``checkpoint_every``
+plus one batch). A torn or corrupt tail, e.g. from a crash mid-write, is
+truncated away.
+"""
+
+from __future__ import annotations
+
+import json
+import logging
+import mmap
+import os
+import struct
+import threading
+import time
+import zlib
+from array import array
+from collections import Counter, deque
+from pathlib import Path
+from typing import Any, Deque, Dict, List, Optional, Tuple
+
+logger = logging.getLogger(__name__)
+
+_HEADER = struct.Struct("<IIH")
+
+
+class ConversationJournal:
+    """Append-only, write-behind conversation store backed by one file."""
+
+    def __init__(
+        self,
+        path: str | Path,
+        *,
+        sync_interval_s: float = 0.05,
+        checkpoint_every: int = 1000,
+    ):
+        self.path = Path(path)
+        self.index_path = self.path.with_name(self.path.name + ".idx")
+        self.sync_interval_s = sync_interval_s
+        self.checkpoint_every = checkpoint_every
+        self.stats: Counter[str] = Counter()
+
+        self._lock = threading.Lock()
+        self._wakeup = threading.Condition(self._lock)
+        self._index: Dict[str, array] = {}
+        self._pending: Dict[str, List[bytes]] = {}
+        self._queue: Deque[Tuple[str, bytes]] = deque()
+        self._in_flight = 0
+        self._closed = False
+        self._map: Optional[mmap.mmap] = None
+        self._since_checkpoint = 0
+
+        self.path.parent.mkdir(parents=True, exist_ok=True)
+        self.path.touch(exist_ok=True)
+        self._end = self._recover()
+        self._file = open(self.path, "ab")
+        self._reader = open(self.path, "rb")
+        self._writer = threading.Thread(
+            target=self._write_loop, name="journal-writer", daemon=True
+        )
+        self._writer.start()
+
+    # -- public API ---------------------------------------------------------
+
+    def create(self, session_id: str) -> None:
+        """Register a session with no messages yet."""
+        with self._lock:
+            self._index.setdefault(session_id, array("Q"))
+
+    def __contains__(self, session_id: object) -> bool:
+        with self._lock:
+            return session_id in self._index
+
+    def append(self, session_id: str, message: Dict[str, Any]) -> None:
+        """Queue ``message`` for ``session_id``; returns without touching disk."""
+        payload = json.dumps(
+            message, ensure_ascii=False, separators=(",", ":")
+        ).encode()
+        with self._lock:
+            if self._closed:
+                raise RuntimeError("journal is closed")
+            self._index.setdefault(session_id, array("Q"))
+            self._pending.setdefault(session_id, []).append(payload)
+            self._queue.append((session_id, payload))
+            self._wakeup.notify()
+
+    def history_json(self, session_id: str) -> bytes:
+        """``{"messages": [...]}`` for ``session_id`` as raw JSON bytes."""
+        return b'{"messages":[' + b",".join(self._payloads(session_id)) + b"]}"
+
+    def messages(self, session_id: str) -> List[Dict[str, Any]]:
+        """Decoded messages for ``session_id``, oldest first."""
+        return [json.loads(p) for p in self._payloads(session_id)]
+
+    __getitem__ = messages
+
+    def message(self, session_id: str, position: int) -> Dict[str, Any]:
+        """The message at ``position`` in ``session_id``; decodes only that one."""
+        if position < 0:
+            raise IndexError(position)
+        with self._lock:
+            if session_id not in self._index:
+                raise KeyError(session_id)
+            spans = self._index[session_id]
+            written = len(spans) // 2
+            if position < written:
+                offset, length = spans[2 * position], spans[2 * position + 1]
+                payload = self._view(spans)[offset : offset + length]
+            else:
+                payload = self._pending.get(session_id, [])[position - written]
+        return json.loads(payload)
+
+    def sessions(self) -> List[str]:
+        """Every session id, in the order the sessions were created."""
+        with self._lock:
+            return list(self._index)
+
+    def flush(self, timeout: Optional[float] = None) -> bool:
+        """Block until everything appended so far is on disk."""
+        deadline = None if timeout is None else time.monotonic() + timeout
+        with self._lock:
+            while self._queue or self._in_flight:
+                remaining = None if deadline is None else deadline - time.monotonic()
+                if remaining is not None and remaining <= 0:
+                    return False
+                self._wakeup.wait(remaining)
+        return True
+
+    def close(self) -> None:
+        """Flush, checkpoint the index and stop the writer."""
+        with self._lock:
+            if self._closed:
+                return
+            self._closed = True
+            self._wakeup.notify_all()
+        self._writer.join()
+        self._checkpoint()
+        self._file.close()
+        with self._lock:
+            if self._map is not None:
+                self._map.close()
+                self._map = None
+        self._reader.close()
+
+    # -- reads --------------------------------------------------------------
+
+    def _payloads(self, session_id: str) -> List[bytes]:
+        with self._lock:
+            if session_id not in self._index:
+                raise KeyError(session_id)
+            spans = self._index[session_id]
+            view = self._view(spans)
+            written = [
+                view[spans[i] : spans[i] + spans[i + 1]]
+                for i in range(0, len(spans), 2)
+            ]
+            return written + list(self._pending.get(session_id, ()))
+
+    def _view(self, spans: array) -> Any:
+        """A read-only map covering every span in ``spans``; caller holds the lock."""
+        if not spans:
+            return b""
+        needed = spans[-2] + spans[-1]
+        if self._map is None or len(self._map) < needed:
+            if self._map is not None:
+                self._map.close()
+            self._map = mmap.mmap(self._reader.fileno(), 0, access=mmap.ACCESS_READ)
+            self.stats["remaps"] += 1
+        return self._map
+
+    # -- writes -------------------------------------------------------------
+
+    def _write_loop(self) -> None:
+        while True:
+            with self._lock:
+                while not self._queue and not self._closed:
+                    self._wakeup.wait()
+                if not self._queue and self._closed:
+                    return
+                batch = list(self._queue)
+                self._queue.clear()
+                self._in_flight = len(batch)
+            try:
+                spans = self._write_batch(batch)
+            except OSError:
+                logger.exception(
+                    "Journal write failed; retrying %d records", len(batch)
+                )
+                self.stats["write_errors"] += 1
+                try:
+                    self._file.truncate(self._end)  # drop a partial batch
+                except OSError:
+                    pass
+                with self._lock:
+                    self._queue.extendleft(reversed(batch))
+                    self._in_flight = 0
+                time.sleep(0.5)
+                continue
+            with self._lock:
+                for (session_id, _), span in zip(batch, spans, strict=True):
+                    self._index[session_id].extend(span)
+                    self._pending[session_id].pop(0)
+                    if not self._pending[session_id]:
+                        del self._pending[session_id]
+                self._in_flight = 0
+                self._wakeup.notify_all()
+            self._since_checkpoint += len(batch)
+            if self._since_checkpoint >= self.checkpoint_every:
+                self._checkpoint()
+            if self.sync_interval_s and not self._closed:
+                time.sleep(self.sync_interval_s)  # let the next batch accumulate
+
+    def _write_batch(self, batch: List[Tuple[str, bytes]]) -> List[Tuple[int, int]]:
+        chunks: List[bytes] = []
+        spans: List[Tuple[int, int]] = []
+        offset = self._end
+        for session_id, payload in batch:
+            sid = session_id.encode()
+            header = _HEADER.pack(
+                len(payload), zlib.crc32(payload, zlib.crc32(sid)), len(sid)
+            )
+            chunks += (header, sid, payload)
+            offset += len(header) + len(sid)
+            spans.append((offset, len(payload)))
+            offset += len(payload)
+        self._file.write(b"".join(chunks))
+        self._file.flush()
+        os.fsync(self._file.fileno())
+        self._end = offset
+        self.stats["records"] += len(batch)
+        self.stats["batches"] += 1
+        self.stats["fsyncs"] += 1
+        return spans
+
+    def _checkpoint(self) -> None:
+        with self._lock:
+            snapshot = {
+                "end": self._end,
+                "sessions": {sid: list(spans) for sid, spans in self._index.items()},
+            }
+        tmp = self.index_path.with_suffix(".tmp")
+        tmp.write_text(json.dumps(snapshot, separators=(",", ":")))
+        os.replace(tmp, self.index_path)
+        self._since_checkpoint = 0
+        self.stats["checkpoints"] += 1
+
+    # -- recovery -----------------------------------------------------------
+
+    def _load_checkpoint(self, size: int) -> int:
+        try:
+            snapshot = json.loads(self.index_path.read_text())
+            end = int(snapshot["end"])
+            index = {
+                sid: array("Q", spans) for sid, spans in snapshot["sessions"].items()
+            }
+        except (OSError, ValueError, KeyError, TypeError):
+            return 0
+        if end > size:
+            return 0  # journal shorter than the checkpoint: rescan everything
+        self._index = index
+        return end
+
+    def _recover(self) -> int:
+        """Rebuild the index; return the offset where the next record goes."""
+        started = time.perf_counter()
+        size = self.path.stat().st_size
+        offset = self._load_checkpoint(size)
+        scanned = 0
+        with open(self.path, "rb") as fh:
+            while offset < size:
+                fh.seek(offset)
+                header = fh.read(_HEADER.size)
+                if len(header) < _HEADER.size:
+                    break
+                length, crc, sid_len = _HEADER.unpack(header)
+                sid = fh.read(sid_len)
+                start = offset + _HEADER.size + sid_len
+                if len(sid) < sid_len or start + length > size:
+                    break
+                if zlib.crc32(fh.read(length), zlib.crc32(sid)) != crc:
+                    break
+                self._index.setdefault(sid.decode(), array("Q")).extend((start, length))
+                offset = start + length
+                scanned += 1
+        if offset < size:
+            logger.warning("Truncating %d bytes of torn journal tail", size - offset)
+            with open(self.path, "r+b") as fh:
+                fh.truncate(offset)
+            self.stats["truncated_bytes"] += size - offset
+        self.stats["recovered_records"] = scanned
+        logger.info(
+            "Journal %s recovered: %d sessions, %d records scanned in %.1f ms",
+            self.path,
+            len(self._index),
+            scanned,
+            (time.perf_counter() - started) * 1000,
+        )
+        return offset
+
+
+class MemoryConversationStore:
+    """Non-durable store with the journal's interface, for when it is off."""
+
+    def __init__(self) -> None:
+        self._sessions: Dict[str, List[Dict[str, Any]]] = {}
+
+    def create(self, session_id: str) -> None:
+        self._sessions.setdefault(session_id, [])
+
+    def __contains__(self, session_id: object) -> bool:
+        return session_id in self._sessions
+
+    def append(self, session_id: str, message: Dict[str, Any]) -> None:
+        self._sessions.setdefault(session_id, []).append(message)
+
+    def messages(self, session_id: str) -> List[Dict[str, Any]]:
+        return list(self._sessions[session_id])
+
+    __getitem__ = messages
+
+    def message(self, session_id: str, position: int) -> Dict[str, Any]:
+        if position < 0:
+            raise IndexError(position)
+        return self._sessions[session_id][position]
+
+    def sessions(self) -> List[str]:
+        return list(self._sessions)
+
+    def history_json(self, session_id: str) -> bytes:
+        return json.dumps({"messages": self._sessions[session_id]}).encode()
+
+    def flush(self, timeout: Optional[float] = None) -> bool:
+        return True
+
+    def close(self) -> None:
+        pass
@@ -0,0 +1,209 @@
+"""Opt-in sampling profiler for ``/chat`` turns.
+
+Profiling is off unless ``PROFILING`` is set, and even then a turn is only
+profiled when it is armed: ``POST /admin/profile`` profiles the next N turns
+and/or a sampled fraction of them, and a request can ask for itself with the
+``X-Profile: 1`` header. When nothing is armed the per-turn cost is one
+attribute check.
+
+A profiled turn starts a sampler thread that snapshots every thread's stack
+with ``sys._current_frames()`` every ``interval_s``, so the event loop, the
+executor thread driving the runner and ADK's own runner thread all show up.
+Other requests running at the same time are sampled too; thread names in the
+root frame tell them apart. Results are kept in memory (the last
+``max_profiles``) and exported as collapsed stacks (for flamegraph.pl /
+speedscope) or speedscope JSON.
+"""
+
+from __future__ import annotations
+
+import itertools
+import os
+import random
+import sys
+import threading
+import time
+from collections import Counter, deque
+from contextlib import contextmanager
+from dataclasses import dataclass, field
+from types import FrameType
+from typing import Any, Deque, Dict, Iterator, List, Optional, Tuple
+
+Stack = Tuple[str, ...]
+
+
+def _frame_label(frame: Any) -> str:
+    code = frame.f_code
+    return (
+        f"{code.co_name} ({os.path.basename(code.co_filename)}:{code.co_firstlineno})"
+    )
+
+
+class SamplingProfiler:
+    """Samples the stacks of all other threads until stopped."""
+
+    def __init__(self, interval_s: float = 0.005, max_depth: int = 128):
+        self.interval_s = interval_s
+        self.max_depth = max_depth
+        self.samples: Counter[Stack] = Counter()
+        self._stop = threading.Event()
+        self._thread: Optional[threading.Thread] = None
+
+    def start(self) -> None:
+        self._thread = threading.Thread(target=self._run, name="profiler", daemon=True)
+        self._thread.start()
+
+    def stop(self) -> Counter[Stack]:
+        self._stop.set()
+        if self._thread is not None:
+            self._thread.join()
+        return self.samples
+
+    def _run(self) -> None:
+        me = threading.get_ident()
+        while not self._stop.wait(self.interval_s):
+            names = {t.ident: t.name for t in threading.enumerate()}
+            for ident, top in sys._current_frames().items():
+                if ident == me:
+                    continue
+                stack: List[str] = []
+                frame: Optional[FrameType] = top
+                while frame is not None and len(stack) < self.max_depth:
+                    stack.append(_frame_label(frame))
+                    frame = frame.f_back
+                stack.append(names.get(ident, f"thread-{ident}"))
+                self.samples[tuple(reversed(stack))] += 1
+
+
+@dataclass
+class Profile:
+    """One profiled turn."""
+
+    id: str
+    session_id: str
+    started_at: float
+    interval_s: float
+    duration_ms: float = 0.0
+    samples: Counter = field(default_factory=Counter)
+
+    def summary(self) -> Dict[str, Any]:
+        return {
+            "id": self.id,
+            "session_id": self.session_id,
+            "started_at": self.started_at,
+            "duration_ms": round(self.duration_ms, 1),
+            "samples": sum(self.samples.values()),
+        }
+
+    def collapsed(self) -> str:
+        """Brendan Gregg's collapsed format: ``frame;frame;frame count``."""
+        return "".join(
+            f"{';'.join(stack)} {count}\n"
+            for stack, count in self.samples.most_common()
+        )
+
+    def speedscope(self) -> Dict[str, Any]:
+        """A speedscope "sampled" profile; weights are milliseconds."""
+        frames: Dict[str, int] = {}
+        samples, weights = [], []
+        for stack, count in self.samples.items():
+            samples.append([frames.setdefault(name, len(frames)) for name in stack])
+            weights.append(count * self.interval_s * 1000)
+        return {
+            "$schema": "https://www.speedscope.app/file-format-schema.json",
+            "name": f"turn {self.id} (session {self.session_id})",
+            "exporter": "app.app_utils.profiling",
+            "shared": {"frames": [{"name": name} for name in frames]},
+            "profiles": [
+                {
+                    "type": "sampled",
+                    "name": self.id,
+                    "unit": "milliseconds",
+                    "startValue": 0,
+                    "endValue": sum(weights),
+                    "samples": samples,
+                    "weights": weights,
+                }
+            ],
+        }
+
+
+class TurnProfiler:
+    """Decides which turns to profile and keeps their results."""
+
+    def __init__(
+        self,
+        *,
+        enabled: bool = False,
+        interval_s: float = 0.005,
+        max_profiles: int = 20,
+    ):
+        self.enabled = enabled
+        self.interval_s = interval_s
+        self._lock = threading.Lock()
+        self._remaining = 0
+        self._sample_rate = 0.0
+        self._active = False
+        self._ids = itertools.count(1)
+        self._profiles: Deque[Profile] = deque(maxlen=max_profiles)
+
+    @property
+    def armed(self) -> bool:
+        return self.enabled and (self._remaining > 0 or self._sample_rate > 0)
+
+    def arm(self, turns: int = 0, sample_rate: float = 0.0) -> Dict[str, Any]:
+        """Profile the next ``turns`` turns and/or a ``sample_rate`` fraction."""
+        with self._lock:
+            self._remaining = max(0, turns)
+            self._sample_rate = min(1.0, max(0.0, sample_rate))
+            return {"turns": self._remaining, "sample_rate": self._sample_rate}
+
+    def _claim(self, requested: bool) -> bool:
+        with self._lock:
+            if self._active:
+                return False  # one sampler at a time keeps the overhead bounded
+            if not requested:
+                if self._remaining > 0:
+                    self._remaining -= 1
+                elif not (self._sample_rate and random.random() < self._sample_rate):
+                    return False
+            self._active = True
+            return True
+
+    @contextmanager
+    def turn(
+        self, session_id: str, *, requested: bool = False
+    ) -> Iterator[Optional[Profile]]:
+        """Profile the enclosed turn if it is selected; yields the profile or None."""
+        if (
+            not self.enabled
+            or not (requested or self.armed)
+            or not self._claim(requested)
+        ):
+            yield None
+            return
+        profile = Profile(
+            id=f"p{next(self._ids)}",
+            session_id=session_id,
+            started_at=time.time(),
+            interval_s=self.interval_s,
+        )
+        sampler = SamplingProfiler(self.interval_s)
+        start = time.perf_counter()
+        sampler.start()
+        try:
+            yield profile
+        finally:
+            profile.samples = sampler.stop()
+            profile.duration_ms = (time.perf_counter() - start) * 1000
+            with self._lock:
+                self._active = False
+                self._profiles.append(profile)
+
+    def profiles(self) -> List[Dict[str, Any]]:
+        with self._lock:
+            return [p.summary() for p in self._profiles]
+
+    def get(self, profile_id: str) -> Optional[Profile]:
+        with self._lock:
+            return next((p for p in self._profiles if p.id == profile_id), None)
@@ -0,0 +1,362 @@
+"""Replay captured turns and compare latency distributions between builds.
+
+Re-drives a trace written by turn capture (app/app_utils/turn_capture.py):
+every captured session is recreated for the same user and its turns are
+sent in order, on the endpoint they originally used. ``--speed`` sets the
+pacing: 1 keeps the original gaps between turns, 10 compresses them
+tenfold, 0 sends each turn as soon as the previous one in its session
+finished. Sessions run concurrently, as they did in production.
+
+By default turns run in-process on this checkout's web server with a
+stubbed model: the trace's recorded model responses are served as offline
+fixtures (app/agents/offline_model.py) after the median recorded time to
+first token, so the numbers measure the server, not the model (the
+settings are read when the app is imported, so the tool re-executes itself
+with them). Each session's captured state is restored before each turn.
+``--live-model`` keeps the configured backend; ``--target URL`` drives a
+running server over HTTP instead. Turn capture is off while replaying.
+
+The report compares replayed latency and TTFT percentiles with the
+captured ones. With ``--baseline`` (the ``--output`` of a run on another
+build) it compares the two runs and exits non-zero when p50 or p90 got
+slower by more than ``--tolerance``.
+
+Usage::
+
+    python -m app.app_utils.replay .data/turns.jsonl.gz --speed 10 --output .data/replay-main.json
+    python -m app.app_utils.replay .data/turns.jsonl.gz --speed 10 --baseline .data/replay-main.json
+    python -m app.app_utils.replay .data/turns.jsonl.gz --target http://localhost:8000
+"""
+
+from __future__ import annotations
+
+import argparse
+import asyncio
+import json
+import os
+import statistics
+import sys
+import time
+from pathlib import Path
+from typing import Any, Dict, List, Optional
+
+import httpx
+
+from app.app_utils.turn_capture import read_trace
+
+_METRICS = ("latency_ms", "ttft_ms")
+_GATED = ("p50", "p90")
+
+
+def model_fixtures(turns: List[Dict[str, Any]]) -> List[Dict[str, Any]]:
+    """The trace's model calls as offline fixture records."""
+    return [
+        {key: call[key] for key in ("agent", "prompt", "step", "responses")}
+        for turn in turns
+        for call in turn.get("model_calls", [])
+        if call.get("responses")
+    ]
+
+
+def stub_environment(
+    turns: List[Dict[str, Any]], fixtures_path: str | Path
+) -> Dict[str, str]:
+    """Settings serving the trace's model responses from ``fixtures_path``."""
+    from app.agents.offline_model import DEFAULT_FIXTURES
+
+    lines = Path(DEFAULT_FIXTURES).read_text(encoding="utf-8").splitlines()
+    lines += [
+        json.dumps(record, ensure_ascii=False) for record in model_fixtures(turns)
+    ]
+    Path(fixtures_path).write_text("\n".join(lines) + "\n", encoding="utf-8")
+    ttfts = [
+        c["ttft_ms"] for t in turns for c in t.get("model_calls", []) if "ttft_ms" in c
+    ]
+    return {
+        "LLM_BACKEND": "replay",
+        "LLM_FIXTURES": str(fixtures_path),
+        "LLM_REPLAY_PROFILE": json.dumps(
+            {"ttft_ms": statistics.median(ttfts) if ttfts else 0}
+        ),
+    }
+
+
+def _sessions(turns: List[Dict[str, Any]]) -> Dict[str, List[Dict[str, Any]]]:
+    sessions: Dict[str, List[Dict[str, Any]]] = {}
+    for turn in sorted(turns, key=lambda t: (t["started_at"], t["turn"])):
+        sessions.setdefault(turn["session_id"], []).append(turn)
+    return sessions
+
+
+async def _send(
+    client: httpx.AsyncClient, session_id: str, turn: Dict[str, Any]
+) -> Dict[str, Any]:
+    started = time.perf_counter()
+    ttft: Optional[float] = None
+    error: Optional[Any] = None
+    if turn["endpoint"] == "chat_stream":
+        params = {
+            "session_id": session_id,
+            "user_id": turn["user_id"],
+            "q": turn["message"],
+        }
+        async with client.stream("GET", "/chat/stream", params=params) as resp:
+            async for line in resp.aiter_lines():
+                if not line.startswith("data: "):
+                    continue
+                frame = json.loads(line[6:])
+                if "delta" in frame and ttft is None:
+                    ttft = time.perf_counter()
+                if "error" in frame:
+                    error = frame.get("code", frame["error"])
+                if "final" in frame or "error" in frame:
+                    break
+    else:
+        resp = await client.post(
+            "/chat",
+            json={
+                "session_id": session_id,
+                "user_id": turn["user_id"],
+                "message": turn["message"],
+            },
+        )
+        if resp.status_code != 200:
+            error = resp.status_code
+    finished = time.perf_counter()
+    timings = turn.get("timings", {})
+    streamed = turn["endpoint"] == "chat_stream"  # /chat only measures TTFT server-side
+    return {
+        "session_id": turn["session_id"],
+        "turn": turn["turn"],
+        "endpoint": turn["endpoint"],
+        "latency_ms": (finished - started) * 1000,
+        "ttft_ms": (ttft - started) * 1000 if ttft is not None else None,
+        "error": error,
+        "original": {
+            "latency_ms": timings.get("total_ms"),
+            "ttft_ms": timings.get("ttft_ms") if streamed else None,
+        },
+    }
+
+
+async def replay(
+    turns: List[Dict[str, Any]],
+    client: httpx.AsyncClient,
+    *,
+    speed: float = 1.0,
+    restore_state: bool = False,
+) -> List[Dict[str, Any]]:
+    """Send every captured turn through ``client``; one result per turn."""
+    if not turns:
+        return []
+    origin = min(t["started_at"] for t in turns)
+    clock = time.perf_counter()
+
+    async def run_session(captured: List[Dict[str, Any]]) -> List[Dict[str, Any]]:
+        results = []
+        resp = await client.post("/session", json={"user_id": captured[0]["user_id"]})
+        session_id = resp.json()["session_id"]
+        for turn in captured:
+            if speed > 0:
+                due = clock + (turn["started_at"] - origin) / speed
+                await asyncio.sleep(max(0.0, due - time.perf_counter()))
+            if restore_state:
+                from app.agents.state import update_session_state
+
+                update_session_state(session_id, **turn.get("state", {}))
+            results.append(await _send(client, session_id, turn))
+        return results
+
+    runs = await asyncio.gather(*(run_session(s) for s in _sessions(turns).values()))
+    return [result for run in runs for result in run]
+
+
+def distribution(values: List[float]) -> Dict[str, Optional[float]]:
+    """Count, mean and percentiles of ``values``."""
+    if not values:
+        return {
+            "count": 0,
+            "mean": None,
+            "p50": None,
+            "p90": None,
+            "p99": None,
+            "max": None,
+        }
+    ordered = sorted(values)
+
+    def pct(p: float) -> float:
+        return ordered[min(len(ordered) - 1, max(0, round(p / 100 * len(ordered)) - 1))]
+
+    return {
+        "count": len(ordered),
+        "mean": statistics.fmean(ordered),
+        "p50": pct(50),
+        "p90": pct(90),
+        "p99": pct(99),
+        "max": ordered[-1],
+    }
+
+
+def ks_statistic(a: List[float], b: List[float]) -> Optional[float]:
+    """Two-sample Kolmogorov-Smirnov distance: 0 same shape, 1 disjoint."""
+    if not a or not b:
+        return None
+    a, b = sorted(a), sorted(b)
+    i = j = 0
+    distance = 0.0
+    while i < len(a) and j < len(b):
+        value = min(a[i], b[j])
+        while i < len(a) and a[i] == value:
+            i += 1
+        while j < len(b) and b[j] == value:
+            j += 1
+        distance = max(distance, abs(i / len(a) - j / len(b)))
+    return distance
+
+
+def _values(
+    results: List[Dict[str, Any]], metric: str, original: bool = False
+) -> List[float]:
+    rows = (r["original"] if original else r for r in results if r["error"] is None)
+    return [row[metric] for row in rows if row.get(metric) is not None]
+
+
+def summarize(results: List[Dict[str, Any]]) -> Dict[str, Any]:
+    """Replayed and captured distributions per metric, and the error count."""
+    return {
+        "turns": len(results),
+        "errors": sum(1 for r in results if r["error"] is not None),
+        **{metric: distribution(_values(results, metric)) for metric in _METRICS},
+        "original": {
+            metric: distribution(_values(results, metric, True)) for metric in _METRICS
+        },
+    }
+
+
+def compare(
+    current: List[Dict[str, Any]], baseline: List[Dict[str, Any]], tolerance: float
+) -> Dict[str, Any]:
+    """Percentile deltas and KS distance per metric; ``regressions`` past ``tolerance``."""
+    report: Dict[str, Any] = {"regressions": []}
+    for metric in _METRICS:
+        now, before = _values(current, metric), _values(baseline, metric)
+        dist_now, dist_before = distribution(now), distribution(before)
+        rows = {}
+        for key in ("mean", *_GATED, "p99"):
+            value, base = dist_now[key], dist_before[key]
+            if value is None or not base:
+                continue
+            change = value / base - 1
+            rows[key] = {"baseline": base, "current": value, "change": change}
+            if key in _GATED and change > tolerance:
+                report["regressions"].append(f"{metric} {key} {change:+.1%}")
+        report[metric] = {**rows, "ks": ks_statistic(now, before)}
+    return report
+
+
+def print_report(
+    summary: Dict[str, Any], comparison: Optional[Dict[str, Any]] = None
+) -> None:
+    def fmt(value: Optional[float]) -> str:
+        return "-" if value is None else f"{value:.1f}"
+
+    print(f"turns {summary['turns']}, errors {summary['errors']}")
+    print(f"{'metric':<22}{'count':>7}{'mean':>9}{'p50':>9}{'p90':>9}{'p99':>9}")
+    for label, dists in (("replayed", summary), ("captured", summary["original"])):
+        for metric in _METRICS:
+            d = dists[metric]
+            print(
+                f"{label + ' ' + metric:<22}{d['count']:>7}{fmt(d['mean']):>9}"
+                f"{fmt(d['p50']):>9}{fmt(d['p90']):>9}{fmt(d['p99']):>9}"
+            )
+    if comparison is None:
+        return
+    print("\nvs baseline run:")
+    for metric in _METRICS:
+        rows = comparison[metric]
+        deltas = ", ".join(
+            f"{key} {row['change']:+.1%}" for key, row in rows.items() if key != "ks"
+        )
+        ks = rows["ks"]
+        print(f"  {metric:<12} {deltas}  (KS {'-' if ks is None else f'{ks:.2f}'})")
+    if comparison["regressions"]:
+        print("REGRESSIONS: " + "; ".join(comparison["regressions"]))
+
+
+def main(argv: Optional[List[str]] = None) -> int:
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("trace", help="trace file written by TURN_CAPTURE")
+    parser.add_argument(
+        "--target", help="base URL of a running server (default: in-process)"
+    )
+    parser.add_argument(
+        "--speed",
+        type=float,
+        default=1.0,
+        help="pacing: 1 original, N times faster, 0 back to back",
+    )
+    parser.add_argument(
+        "--live-model",
+        action="store_true",
+        help="in-process: keep the configured model backend",
+    )
+    parser.add_argument("--output", help="write results and summary JSON here")
+    parser.add_argument(
+        "--baseline", help="--output of a run on another build to compare with"
+    )
+    parser.add_argument(
+        "--tolerance", type=float, default=0.25, help="allowed p50/p90 slowdown"
+    )
+    args = parser.parse_args(argv)
+
+    turns = read_trace(args.trace)
+    if args.target:
+        client = httpx.AsyncClient(base_url=args.target, timeout=None)
+    else:
+        env = {"TURN_CAPTURE": ""}
+        if not args.live_model:
+            env.update(stub_environment(turns, f"{args.trace}.fixtures.jsonl"))
+        if any(os.environ.get(key) != value for key, value in env.items()):
+            argv = sys.argv[1:] if argv is None else argv
+            os.execve(
+                sys.executable,
+                [sys.executable, "-m", __spec__.name, *argv],
+                {**os.environ, **env},
+            )
+        from app import web_server
+
+        transport = httpx.ASGITransport(app=web_server.app)
+        client = httpx.AsyncClient(
+            transport=transport, base_url="http://replay", timeout=None
+        )
+
+    async def run() -> List[Dict[str, Any]]:
+        async with client:
+            return await replay(
+                turns, client, speed=args.speed, restore_state=not args.target
+            )
+
+    results = asyncio.run(run())
+    summary = summarize(results)
+    comparison = None
+    if args.baseline:
+        baseline = json.loads(Path(args.baseline).read_text())["results"]
+        comparison = compare(results, baseline, args.tolerance)
+    print_report(summary, comparison)
+
+    if args.output:
+        Path(args.output).parent.mkdir(parents=True, exist_ok=True)
+        report = {
+            "trace": args.trace,
+            "speed": args.speed,
+            "summary": summary,
+            "results": results,
+        }
+        if comparison is not None:
+            report["comparison"] = comparison
+        Path(args.output).write_text(json.dumps(report, indent=2) + "\n")
+    return 1 if comparison and comparison["regressions"] else 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,279 @@
+"""Incremental full-text index over conversation messages.
+
+Every appended message gets the next message id. Its terms (the
+``_normalize`` form of the text split into words, as entitlement lookups
+see it) go into an inverted index: term -> ascending message ids plus
+per-message term counts, all in compact ``array`` columns. Per message the
+index keeps the session, position in the session, role, plan and time;
+messages arrive in time order, so a time filter is two binary searches
+over ids.
+
+A query matches messages containing every query term. Matches are scored
+with BM25, starting from the rarest term and probing the other postings by
+binary search, so cost follows the rarest term in the time window rather
+than the number of stored messages. Sessions rank by the sum of their
+matching messages' scores.
+
+The index lives in memory; message text stays in the conversation store.
+``load`` rebuilds it from the stored messages at startup, using the ``ts``,
+``plan`` and ``user_id`` fields the web server journals with each message.
+"""
+
+from __future__ import annotations
+
+import math
+import re
+import threading
+import time
+from array import array
+from bisect import bisect_left, bisect_right
+from collections import defaultdict
+from heapq import merge
+from typing import (
+    Any,
+    Callable,
+    Dict,
+    Iterable,
+    List,
+    Mapping,
+    Optional,
+    Sequence,
+    Tuple,
+)
+
+from app.agents.entitlement_tools import _normalize
+from app.agents.router import PLANS
+
+_WORD = re.compile(r"[a-z0-9]+")
+_ROLES = ("user", "assistant")
+# BM25 parameters.
+_K1 = 1.2
+_B = 0.75
+
+
+def tokenize(text: str) -> List[str]:
+    """Index terms of ``text``: its ``_normalize`` form split into words."""
+    return _WORD.findall(_normalize(text))
+
+
+class ConversationIndex:
+    """Inverted index of messages with session, user, plan and time filters."""
+
+    def __init__(self, clock: Callable[[], float] = time.time):
+        self._clock = clock
+        self._lock = threading.Lock()
+        self._postings: Dict[str, array] = {}  # term -> message ids
+        self._counts: Dict[str, array] = {}  # term -> count per posting
+        # Per message, indexed by message id.
+        self._session = array("I")
+        self._position = array("I")
+        self._ts = array("d")
+        self._length = array("I")
+        self._role = array("B")
+        self._plan = array("B")  # 0 unknown, else 1 + PLANS index
+        self._total_length = 0
+        # Per session.
+        self._session_ids: List[str] = []
+        self._session_index: Dict[str, int] = {}
+        self._session_user: List[Optional[str]] = []
+        self._session_messages = array("I")
+        self._user_sessions: Dict[str, set] = defaultdict(set)
+
+    def __len__(self) -> int:
+        return len(self._ts)
+
+    def _session_for(self, session_id: str) -> int:
+        """Index of ``session_id``, adding it if new; caller holds the lock."""
+        index = self._session_index.get(session_id)
+        if index is None:
+            index = len(self._session_ids)
+            self._session_index[session_id] = index
+            self._session_ids.append(session_id)
+            self._session_user.append(None)
+            self._session_messages.append(0)
+        return index
+
+    def register(self, session_id: str, user_id: str) -> None:
+        """Record the user a session belongs to."""
+        with self._lock:
+            index = self._session_for(session_id)
+            self._session_user[index] = user_id
+            self._user_sessions[user_id].add(index)
+
+    def add(
+        self,
+        session_id: str,
+        role: str,
+        text: str,
+        *,
+        plan: Optional[str] = None,
+        ts: Optional[float] = None,
+    ) -> int:
+        """Index one appended message; returns its message id.
+
+        ``ts`` defaults to now.
+        """
+        terms: Dict[str, int] = defaultdict(int)
+        words = tokenize(text)
+        for word in words:
+            terms[word] += 1
+        with self._lock:
+            session = self._session_for(session_id)
+            message_id = len(self._ts)
+            # Keep times non-decreasing so time filters can bisect ids.
+            now = self._clock() if ts is None else ts
+            self._ts.append(max(now, self._ts[-1] if self._ts else 0.0))
+            self._session.append(session)
+            self._position.append(self._session_messages[session])
+            self._session_messages[session] += 1
+            self._length.append(len(words))
+            self._role.append(_ROLES.index(role) if role in _ROLES else len(_ROLES))
+            self._plan.append(PLANS.index(plan) + 1 if plan in PLANS else 0)
+            self._total_length += len(words)
+            for term, count in terms.items():
+                if term not in self._postings:
+                    self._postings[term] = array("Q")
+                    self._counts[term] = array("H")
+                self._postings[term].append(message_id)
+                self._counts[term].append(min(count, 0xFFFF))
+        return message_id
+
+    def load(
+        self, conversations: Iterable[Tuple[str, Sequence[Mapping[str, Any]]]]
+    ) -> int:
+        """Index stored ``(session_id, messages)``; returns the message count.
+
+        Sessions are merged by message time, so time filters still bisect;
+        each session keeps its own order, so positions match the store.
+        """
+        streams = []
+        for session_id, messages in conversations:
+            user_id = next((m["user_id"] for m in messages if m.get("user_id")), None)
+            if user_id is not None:
+                self.register(session_id, user_id)
+            streams.append([(m.get("ts") or 0.0, session_id, m) for m in messages])
+        loaded = 0
+        for ts, session_id, message in merge(*streams, key=lambda item: item[0]):
+            self.add(
+                session_id,
+                message.get("role", ""),
+                message.get("content") or "",
+                plan=message.get("plan"),
+                ts=ts,
+            )
+            loaded += 1
+        return loaded
+
+    def search(
+        self,
+        query: str,
+        *,
+        user_id: Optional[str] = None,
+        plan: Optional[str] = None,
+        role: Optional[str] = None,
+        since: Optional[float] = None,
+        until: Optional[float] = None,
+        limit: int = 20,
+        per_session: int = 3,
+    ) -> Dict[str, Any]:
+        """Sessions with messages containing every term of ``query``, best first.
+
+        Each session lists its ``per_session`` best message hits as
+        ``(session_id, position)`` plus role, plan, time and score.
+        """
+        terms = sorted(set(tokenize(query)))
+        empty: Dict[str, Any] = {
+            "terms": terms,
+            "messages": 0,
+            "session_count": 0,
+            "sessions": [],
+        }
+        if not terms:
+            return empty
+        plan_code = PLANS.index(plan) + 1 if plan in PLANS else None
+        role_code = _ROLES.index(role) if role in _ROLES else None
+        if (plan is not None and plan_code is None) or (
+            role is not None and role_code is None
+        ):
+            return empty
+        with self._lock:
+            # Searching runs outside the lock, over what was indexed until now:
+            # arrays only ever grow, so appends never block on a long query.
+            if any(t not in self._postings for t in terms):
+                return empty
+            total = len(self._ts)
+            postings = [(self._postings[t], self._counts[t]) for t in terms]
+            sessions = (
+                set(self._user_sessions.get(user_id, ()))
+                if user_id is not None
+                else None
+            )
+            total_length = self._total_length
+        postings.sort(key=lambda p: len(p[0]))
+        lo = bisect_left(self._ts, since, 0, total) if since is not None else 0
+        hi = bisect_right(self._ts, until, 0, total) if until is not None else total
+        idf = [
+            math.log(1 + (total - len(ids) + 0.5) / (len(ids) + 0.5))
+            for ids, _ in postings
+        ]
+        avg_length = total_length / total if total else 1.0
+
+        hits: Dict[int, List[Tuple[float, int]]] = defaultdict(list)
+        rare_ids, rare_counts = postings[0]
+        for i in range(bisect_left(rare_ids, lo), bisect_left(rare_ids, hi)):
+            message = rare_ids[i]
+            if sessions is not None and self._session[message] not in sessions:
+                continue
+            if plan_code is not None and self._plan[message] != plan_code:
+                continue
+            if role_code is not None and self._role[message] != role_code:
+                continue
+            counts = [rare_counts[i]]
+            for ids, term_counts in postings[1:]:
+                j = bisect_left(ids, message)
+                if j == len(ids) or ids[j] != message:
+                    break
+                counts.append(term_counts[j])
+            else:
+                norm = _K1 * (1 - _B + _B * self._length[message] / avg_length)
+                score = sum(
+                    w * c * (_K1 + 1) / (c + norm)
+                    for w, c in zip(idf, counts, strict=True)
+                )
+                hits[self._session[message]].append((score, message))
+
+        ranked = sorted(
+            hits.items(),
+            key=lambda item: (-sum(s for s, _ in item[1]), -item[1][-1][1]),
+        )[:limit]
+        return {
+            "terms": terms,
+            "messages": sum(len(m) for m in hits.values()),
+            "session_count": len(hits),
+            "sessions": [
+                {
+                    "session_id": self._session_ids[session],
+                    "user_id": self._session_user[session],
+                    "score": round(sum(s for s, _ in matches), 4),
+                    "hits": len(matches),
+                    "messages": [
+                        self._message(message, score)
+                        for score, message in sorted(matches, key=lambda m: -m[0])[
+                            :per_session
+                        ]
+                    ],
+                }
+                for session, matches in ranked
+            ],
+        }
+
+    def _message(self, message: int, score: float) -> Dict[str, Any]:
+        plan = self._plan[message]
+        role = self._role[message]
+        return {
+            "position": self._position[message],
+            "role": _ROLES[role] if role < len(_ROLES) else None,
+            "plan": PLANS[plan - 1] if plan else None,
+            "ts": self._ts[message],
+            "score": round(score, 4),
+        }
@@ -0,0 +1,26 @@
+"""Per-session turn serialization for the web server.
+
+Turns for the same ``session_id`` must run strictly in order: they share the
+conversation history and the session state, and ADK appends events to the same
+session. Different sessions keep running fully in parallel.
+"""
+
+from __future__ import annotations
+
+import asyncio
+import weakref
+
+# Locks are only referenced while a turn holds or waits on them, so idle
+# sessions do not keep an entry alive.
+_TURN_LOCKS: weakref.WeakValueDictionary[str, asyncio.Lock] = (
+    weakref.WeakValueDictionary()
+)
+
+
+def session_turn_lock(session_id: str) -> asyncio.Lock:
+    """Return the lock that serializes turns for ``session_id``."""
+    lock = _TURN_LOCKS.get(session_id)
+    if lock is None:
+        lock = asyncio.Lock()
+        _TURN_LOCKS[session_id] = lock
+    return lock
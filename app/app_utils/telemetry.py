@@ -12,8 +12,27 @@
 # See the License for the specific language governing permissions and
 # limitations under the License.
 
+import functools
+import inspect
 import logging
 import os
+from contextlib import contextmanager
+from typing import Any, Callable, Dict, Iterator, Optional, TypeVar
+
+from google.adk.runners import Runner
+from google.adk.utils.context_utils import Aclosing
+from opentelemetry import context as otel_context
+from opentelemetry import trace
+
+# Application spans. Until a provider is installed (``setup_tracing`` or
+# ``in_memory_exporter``) this is OpenTelemetry's no-op proxy tracer.
+tracer = trace.get_tracer("app")
+
+F = TypeVar("F", bound=Callable[..., Any])
+
+# Tool arguments recorded on ``tool`` spans. Spans are exported to Cloud Trace,
+# so identifying arguments (uid, session_id, user names) stay off them.
+_TOOL_SPAN_ARGS = frozenset({"report", "plan"})
 
 
 def setup_telemetry() -> str | None:
@@ -50,3 +69,161 @@ def setup_telemetry() -> str | None:
         )
 
     return bucket
+
+
+def _attributes(attributes: Dict[str, Any]) -> Dict[str, Any]:
+    """``session_id=...`` -> ``{"session.id": ...}``; drops None and non-scalars."""
+    return {
+        key.replace("_", "."): value
+        for key, value in attributes.items()
+        if isinstance(value, (str, bool, int, float))
+    }
+
+
+@contextmanager
+def span(name: str, **attributes: Any) -> Iterator[trace.Span]:
+    """Start ``name`` as the current span; keyword names map ``_`` to ``.``."""
+    with tracer.start_as_current_span(
+        name, attributes=_attributes(attributes)
+    ) as current:
+        yield current
+
+
+def start_span(name: str, **attributes: Any) -> trace.Span:
+    """Start ``name`` without making it current; the caller ends it.
+
+    For spans that outlive a ``with`` block, e.g. one held across the yields
+    of a streaming response.
+    """
+    return tracer.start_span(name, attributes=_attributes(attributes))
+
+
+def wait_span(name: str, since_ns: int, **attributes: Any) -> None:
+    """Record a span covering time spent waiting since ``since_ns``.
+
+    Used for queue waits (executor, SSE) where the wait has already happened
+    by the time we are running again.
+    """
+    tracer.start_span(
+        name, start_time=since_ns, attributes=_attributes(attributes)
+    ).end()
+
+
+def _record_status(current: trace.Span, result: Any) -> None:
+    if isinstance(result, dict) and "status" in result:
+        current.set_attribute("tool.status", str(result["status"]))
+
+
+def traced_tool(fn: F) -> F:
+    """Wrap a tool in a ``tool <name>`` span with its allow-listed arguments.
+
+    ``functools.wraps`` keeps the name, docstring and signature ADK builds the
+    function declaration from; async tools get an async wrapper so ADK still
+    awaits them. A dict result's ``status`` is recorded too.
+    """
+
+    def attributes(kwargs: Dict[str, Any]) -> Dict[str, Any]:
+        allowed = {k: v for k, v in kwargs.items() if k in _TOOL_SPAN_ARGS}
+        return {"tool_name": fn.__name__, **allowed}
+
+    if inspect.iscoroutinefunction(fn):
+
+        @functools.wraps(fn)
+        async def async_wrapper(*args: Any, **kwargs: Any) -> Any:
+            with span(f"tool {fn.__name__}", **attributes(kwargs)) as current:
+                result = await fn(*args, **kwargs)
+                _record_status(current, result)
+                return result
+
+        return async_wrapper  # type: ignore[return-value]
+
+    @functools.wraps(fn)
+    def wrapper(*args: Any, **kwargs: Any) -> Any:
+        with span(f"tool {fn.__name__}", **attributes(kwargs)) as current:
+            result = fn(*args, **kwargs)
+            _record_status(current, result)
+            return result
+
+    return wrapper  # type: ignore[return-value]
+
+
+class TracedRunner(Runner):
+    """Runner whose ``run`` keeps the caller's trace context.
+
+    ``Runner.run`` drives ``run_async`` on a plain thread with a fresh
+    context, so ADK's agent, model and tool spans would start new traces.
+    This carries the calling thread's context over so one turn is one trace.
+    """
+
+    _trace_context: Optional[otel_context.Context] = None
+
+    def run(self, **kwargs: Any) -> Any:
+        self._trace_context = otel_context.get_current()
+        return super().run(**kwargs)
+
+    async def run_async(self, **kwargs: Any) -> Any:
+        if self._trace_context is not None:
+            # The runner thread's asyncio task owns this context and ends with it.
+            otel_context.attach(self._trace_context)
+        async with Aclosing(super().run_async(**kwargs)) as events:
+            async for event in events:
+                yield event
+
+
+def _exporter(name: str) -> Any:
+    if name == "console":
+        from opentelemetry.sdk.trace.export import ConsoleSpanExporter
+
+        return ConsoleSpanExporter()
+    if name == "otlp":
+        from opentelemetry.exporter.otlp.proto.http.trace_exporter import (
+            OTLPSpanExporter,
+        )
+
+        return OTLPSpanExporter()
+    if name == "gcp":
+        from opentelemetry.exporter.cloud_trace import CloudTraceSpanExporter
+
+        return CloudTraceSpanExporter()
+    raise ValueError(f"Unknown TRACE_EXPORTER {name!r} (console, otlp or gcp)")
+
+
+def _sdk_provider() -> Any:
+    """The installed SDK tracer provider, installing one if needed."""
+    from opentelemetry.sdk.trace import TracerProvider
+
+    provider = trace.get_tracer_provider()
+    if not isinstance(provider, TracerProvider):
+        provider = TracerProvider()
+        trace.set_tracer_provider(provider)
+    return provider
+
+
+def setup_tracing(exporter: str) -> None:
+    """Export application spans to ``exporter`` ("" leaves tracing as is)."""
+    if not exporter:
+        return
+    from opentelemetry.sdk.trace.export import BatchSpanProcessor
+
+    _sdk_provider().add_span_processor(BatchSpanProcessor(_exporter(exporter)))
+    logging.info("Exporting application spans to %s", exporter)
+
+
+_memory_exporter: Any = None
+
+
+def in_memory_exporter() -> Any:
+    """An ``InMemorySpanExporter`` receiving every span, for tests.
+
+    Installed once per process; call ``clear()`` on it between tests.
+    """
+    global _memory_exporter
+    if _memory_exporter is None:
+        from opentelemetry.sdk.trace.export import SimpleSpanProcessor
+        from opentelemetry.sdk.trace.export.in_memory_span_exporter import (
+            InMemorySpanExporter,
+        )
+
+        _memory_exporter = InMemorySpanExporter()
+        _sdk_provider().add_span_processor(SimpleSpanProcessor(_memory_exporter))
+    return _memory_exporter
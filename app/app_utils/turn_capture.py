@@ -0,0 +1,311 @@
+"""Opt-in capture of production turns for replay.
+
+With ``TURN_CAPTURE`` set, the web server records a sample of turns
+(``TURN_CAPTURE_SAMPLE``) to a gzip-compressed JSONL trace file. One line
+holds one turn::
+
+    {"v": 1, "endpoint": "chat_stream", "session_id": ..., "user_id": ...,
+     "turn": 0, "started_at": <epoch s>, "message": ..., "state": {...},
+     "frames": [[t_ms, frame], ...], "tool_calls": [...],
+     "model_calls": [{"agent", "prompt", "step", "t_ms", "ttft_ms",
+                      "latency_ms", "responses": [...]}, ...],
+     "timings": {"preamble_ms", "prepare_ms", "queue_wait_ms", "ttft_ms",
+                 "total_ms"},
+     "tokens": {...}, "answer": ..., "error": ...}
+
+``state`` is the session's per-turn state before the turn. ``frames`` are the
+frames sent to the client; ``model_calls`` use the offline fixture format
+(app/agents/offline_model.py), so a trace doubles as fixtures for a model
+stub. ``app/app_utils/replay.py`` re-drives traces.
+
+Records go through an ``InteractionLog``, so the request path only queues
+them. Redaction runs in the writer thread: every string in a record passes
+through the ``TURN_CAPTURE_REDACT`` hooks (``redact_pii`` by default,
+``package.module:function`` for custom ones, ``none`` to keep everything).
+"""
+
+from __future__ import annotations
+
+import gzip
+import importlib
+import json
+import random
+import re
+import threading
+import time
+from pathlib import Path
+from typing import Any, Callable, Dict, List, Optional, Sequence, Tuple
+
+from google.adk.agents.callback_context import CallbackContext
+from google.adk.models.llm_request import LlmRequest
+from google.adk.models.llm_response import LlmResponse
+from google.adk.plugins.base_plugin import BasePlugin
+
+from app.agents.offline_model import request_key
+from app.agents.prompt_compiler import dynamic_state
+from app.agents.state import get_session_state
+
+from .interaction_log import InteractionLog
+from .turn_events import TurnEvents
+
+TRACE_VERSION = 1
+
+Redactor = Callable[[str], str]
+
+_PII = (
+    (re.compile(r"[\w.+-]+@[\w-]+(?:\.[\w-]+)+"), "[EMAIL]"),
+    (re.compile(r"\+?\d[\d ().-]{7,}\d"), "[NUMBER]"),
+)
+
+
+def redact_pii(text: str) -> str:
+    """Mask e-mail addresses and long digit runs (phone, account numbers)."""
+    for pattern, mask in _PII:
+        text = pattern.sub(mask, text)
+    return text
+
+
+def load_redactors(spec: str) -> List[Redactor]:
+    """Redaction hooks for a comma-separated ``TURN_CAPTURE_REDACT`` value."""
+    redactors: List[Redactor] = []
+    for name in filter(None, (n.strip() for n in spec.split(","))):
+        if name == "none":
+            continue
+        if name == "default":
+            redactors.append(redact_pii)
+            continue
+        module, _, attr = name.partition(":")
+        if not attr:
+            raise ValueError(
+                f"Unknown redactor {name!r} (default, none or package.module:function)"
+            )
+        redactors.append(getattr(importlib.import_module(module), attr))
+    return redactors
+
+
+def _redact(value: Any, redactors: Sequence[Redactor]) -> Any:
+    if isinstance(value, str):
+        for redactor in redactors:
+            value = redactor(value)
+        return value
+    if isinstance(value, dict):
+        return {k: _redact(v, redactors) for k, v in value.items()}
+    if isinstance(value, (list, tuple)):
+        return [_redact(v, redactors) for v in value]
+    return value
+
+
+class TraceFileSink:
+    """Appends each batch as one gzip member of JSON lines, after redaction."""
+
+    def __init__(self, path: str | Path, redactors: Sequence[Redactor] = ()):
+        self.path = Path(path)
+        self.path.parent.mkdir(parents=True, exist_ok=True)
+        self.redactors = list(redactors)
+        self._file = open(self.path, "ab")
+
+    def write(self, records: List[Dict[str, Any]]) -> None:
+        lines = (
+            json.dumps(
+                _redact(r, self.redactors),
+                ensure_ascii=False,
+                separators=(",", ":"),
+                default=str,
+            )
+            for r in records
+        )
+        self._file.write(gzip.compress(("\n".join(lines) + "\n").encode()))
+        self._file.flush()
+
+    def close(self) -> None:
+        self._file.close()
+
+
+def read_trace(path: str | Path) -> List[Dict[str, Any]]:
+    """Turn records of a trace file (gzip or plain JSONL), in file order."""
+    raw = Path(path).read_bytes()
+    if raw[:2] == b"\x1f\x8b":
+        raw = gzip.decompress(raw)
+    return [json.loads(line) for line in raw.decode().splitlines() if line.strip()]
+
+
+class TurnRecorder:
+    """What one captured turn did, with times relative to its start."""
+
+    def __init__(
+        self, endpoint: str, session_id: str, user_id: str, message: str, turn: int
+    ):
+        self._t0 = time.perf_counter()
+        self._lock = threading.Lock()
+        self._calls: Dict[
+            Tuple[str, str], Dict[str, Any]
+        ] = {}  # (branch, agent) -> open call
+        self.record: Dict[str, Any] = {
+            "v": TRACE_VERSION,
+            "endpoint": endpoint,
+            "session_id": session_id,
+            "user_id": user_id,
+            "turn": turn,
+            "started_at": time.time(),
+            "message": message,
+            "state": json.loads(
+                json.dumps(dynamic_state(get_session_state(session_id)), default=str)
+            ),
+            "frames": [],
+            "tool_calls": [],
+            "model_calls": [],
+            "timings": {},
+        }
+
+    def elapsed_ms(self, at: Optional[float] = None) -> float:
+        """Milliseconds from the turn's start to ``at`` (a ``perf_counter``), or now."""
+        return round(((time.perf_counter() if at is None else at) - self._t0) * 1000, 3)
+
+    def mark(self, stage: str) -> None:
+        self.record["timings"][stage] = self.elapsed_ms()
+
+    def event(self, event: Any, frames: List[Dict[str, Any]]) -> None:
+        """Note a runner event and the frames it produced."""
+        now = self.elapsed_ms()
+        self.record["frames"].extend([now, frame] for frame in frames)
+        content = getattr(event, "content", None)
+        for part in getattr(content, "parts", None) or []:
+            call = getattr(part, "function_call", None)
+            if call is not None:
+                self.record["tool_calls"].append(
+                    {
+                        "t_ms": now,
+                        "agent": event.author,
+                        "name": call.name,
+                        "args": call.args or {},
+                    }
+                )
+
+    def model_started(self, key: Tuple[str, str], llm_request: LlmRequest) -> None:
+        prompt, step = request_key(llm_request)
+        call = {
+            "agent": key[1],
+            "prompt": prompt,
+            "step": step,
+            "t_ms": self.elapsed_ms(),
+        }
+        with self._lock:
+            if key in self._calls:
+                self.record["model_calls"].append(self._calls.pop(key))
+            self._calls[key] = {**call, "responses": []}
+
+    def model_response(self, key: Tuple[str, str], llm_response: LlmResponse) -> None:
+        with self._lock:
+            call = self._calls.get(key)
+            if call is None:
+                return
+            waited = round(self.elapsed_ms() - call["t_ms"], 3)
+            call.setdefault("ttft_ms", waited)
+            if not llm_response.partial:
+                call["latency_ms"] = waited
+                call["responses"].append(
+                    llm_response.model_dump(
+                        mode="json", exclude_none=True, exclude={"usage_metadata"}
+                    )
+                )
+
+    def close(self) -> None:
+        """Move calls still open into ``model_calls``, in start order.
+
+        Calls without a response never reached the model: a callback (e.g.
+        deterministic routing) answered them.
+        """
+        with self._lock:
+            calls = self.record["model_calls"] + list(self._calls.values())
+            self._calls.clear()
+            self.record["model_calls"] = sorted(
+                (call for call in calls if call["responses"]),
+                key=lambda call: call["t_ms"],
+            )
+
+
+class TurnCapture:
+    """Samples turns into ``TurnRecorder``s and writes them through ``log``."""
+
+    def __init__(
+        self,
+        log: InteractionLog,
+        *,
+        sample_rate: float = 1.0,
+        seed: Optional[int] = None,
+    ):
+        self.log = log
+        self.sample_rate = sample_rate
+        self._rng = random.Random(seed)
+        self._lock = threading.Lock()
+        self._active: Dict[str, TurnRecorder] = {}
+        self._turns: Dict[str, int] = {}
+
+    def begin(
+        self, endpoint: str, session_id: str, user_id: str, message: str
+    ) -> Optional[TurnRecorder]:
+        """A recorder for this turn, or None when it is not sampled."""
+        with self._lock:
+            turn = self._turns.get(session_id, 0)
+            self._turns[session_id] = turn + 1
+            if self.sample_rate < 1 and self._rng.random() >= self.sample_rate:
+                return None
+        recorder = TurnRecorder(endpoint, session_id, user_id, message, turn)
+        with self._lock:
+            self._active[session_id] = recorder
+        return recorder
+
+    def active(self, session_id: str) -> Optional[TurnRecorder]:
+        with self._lock:
+            return self._active.get(session_id)
+
+    def finish(
+        self, recorder: TurnRecorder, events: TurnEvents, usage: Dict[str, Any]
+    ) -> None:
+        """Queue the finished turn for the trace file."""
+        with self._lock:
+            self._active.pop(recorder.record["session_id"], None)
+        recorder.close()
+        record = recorder.record
+        timings = record["timings"]
+        timings["total_ms"] = recorder.elapsed_ms()
+        if events.preamble_at is not None:
+            timings["preamble_ms"] = recorder.elapsed_ms(events.preamble_at)
+        if events.first_text_at is not None:
+            timings["ttft_ms"] = recorder.elapsed_ms(events.first_text_at)
+        record.update(tokens=usage, answer=events.answer, error=events.error)
+        self.log.emit(record)
+
+    def close(self) -> None:
+        self.log.close()
+
+
+class CapturePlugin(BasePlugin):
+    """Runner plugin adding model calls to the active turn's recorder."""
+
+    def __init__(self, capture: TurnCapture):
+        super().__init__(name="turn_capture")
+        self.capture = capture
+
+    @staticmethod
+    def _key(callback_context: CallbackContext) -> Tuple[str, str]:
+        return (
+            callback_context._invocation_context.branch or "",
+            callback_context.agent_name,
+        )
+
+    async def before_model_callback(
+        self, *, callback_context: CallbackContext, llm_request: LlmRequest
+    ) -> Optional[LlmResponse]:
+        recorder = self.capture.active(callback_context.session.id)
+        if recorder is not None:
+            recorder.model_started(self._key(callback_context), llm_request)
+        return None
+
+    async def after_model_callback(
+        self, *, callback_context: CallbackContext, llm_response: LlmResponse
+    ) -> Optional[LlmResponse]:
+        recorder = self.capture.active(callback_context.session.id)
+        if recorder is not None:
+            recorder.model_response(self._key(callback_context), llm_response)
+        return None
@@ -0,0 +1,153 @@
+"""Turn ADK runner events into client frames.
+
+With ``StreamingMode.SSE`` a model reply arrives as partial events carrying
+increments, then one final event that carries the whole text again (plus
+any function calls). ``TurnEvents`` tracks what each author has already
+streamed so only true increments go out, and the assembled answer holds
+every word once. Non-streaming replies (no partials) come through whole.
+
+Function calls become compact frames instead of being dropped:
+
+* ``{"tool": "check_entitlement", "agent": "root_agent"}``
+* ``{"transfer": "service_agent", "agent": "root_agent"}``
+
+Thought parts and function responses are never forwarded. A speculative
+preamble (app/agents/preamble.py) is fed in as text without an author. Along the way
+``TurnEvents`` counts the turn's tokens (in total and per agent), model
+calls and tool calls and notes when the preamble and the first model text
+arrived.
+"""
+
+from __future__ import annotations
+
+import time
+from typing import Any, Dict, List, Optional
+
+_TRANSFER = "transfer_to_agent"
+
+
+def event_text(event: Any) -> str:
+    """Concatenated non-thought text of ``event``."""
+    # A plain loop: this runs for every streamed chunk, and a generator with
+    # repeated getattr calls was twice as slow (micro.extract_text).
+    content = getattr(event, "content", None)
+    chunks: List[str] = []
+    for part in getattr(content, "parts", None) or ():
+        text = getattr(part, "text", None)
+        if text and not getattr(part, "thought", None):
+            chunks.append(text)
+    return "".join(chunks)
+
+
+def event_error(event: Any) -> Optional[Dict[str, Any]]:
+    """Error frame for a model event that ended the turn with an error."""
+    code = getattr(event, "error_code", None)
+    if not code:
+        return None
+    metadata = getattr(event, "custom_metadata", None) or {}
+    frame: Dict[str, Any] = {
+        "error": getattr(event, "error_message", None) or code,
+        "code": metadata.get("status", 503),
+    }
+    if "retry_after_s" in metadata:
+        frame["retry_after_s"] = metadata["retry_after_s"]
+    return frame
+
+
+def event_usage(event: Any) -> Optional[Dict[str, int]]:
+    """Token counts of a complete model response, or None.
+
+    Partial events are skipped: the final event reports the whole call.
+    """
+    usage = getattr(event, "usage_metadata", None)
+    if usage is None or getattr(event, "partial", None):
+        return None
+    return {
+        "prompt": usage.prompt_token_count or 0,
+        "candidates": usage.candidates_token_count or 0,
+        "thoughts": usage.thoughts_token_count or 0,
+    }
+
+
+def _call_frames(event: Any, author: str) -> List[Dict[str, Any]]:
+    content = getattr(event, "content", None)
+    frames: List[Dict[str, Any]] = []
+    for part in getattr(content, "parts", None) or []:
+        call = getattr(part, "function_call", None)
+        if call is None:
+            continue
+        if call.name == _TRANSFER:
+            frames.append(
+                {"transfer": (call.args or {}).get("agent_name"), "agent": author}
+            )
+        else:
+            frames.append({"tool": call.name, "agent": author})
+    return frames
+
+
+class TurnEvents:
+    """Frames and the assembled answer for one turn's events."""
+
+    def __init__(self) -> None:
+        self.error: Optional[Dict[str, Any]] = None
+        self.agent: Optional[str] = None  # last author that produced text
+        self.tokens: Dict[str, int] = {"prompt": 0, "candidates": 0, "thoughts": 0}
+        self.agent_tokens: Dict[str, Dict[str, int]] = {}  # author -> token counts
+        self.model_calls = 0
+        self.tool_calls = 0
+        self.first_text_at: Optional[float] = None  # time.perf_counter(), model text
+        self.preamble_at: Optional[float] = None  # time.perf_counter()
+        self._parts: List[str] = []
+        self._streamed: Dict[str, str] = {}  # author -> partial text of the open reply
+
+    @property
+    def answer(self) -> str:
+        return "".join(self._parts)
+
+    def feed(self, event: Any) -> List[Dict[str, Any]]:
+        """Frames for ``event``; an error frame means the turn is over."""
+        error = event_error(event)
+        if error:
+            self.error = error
+            return [error]
+        author = getattr(event, "author", None) or ""
+        usage = event_usage(event)
+        if usage:
+            self.model_calls += 1
+            per_agent = self.agent_tokens.setdefault(author, dict.fromkeys(usage, 0))
+            for key, count in usage.items():
+                self.tokens[key] += count
+                per_agent[key] += count
+        text = event_text(event)
+        if getattr(event, "partial", None):
+            if not text:
+                return []
+            self._streamed[author] = self._streamed.get(author, "") + text
+            return self._delta(author, text)
+
+        streamed = self._streamed.pop(author, "")
+        if streamed:
+            # The final event repeats what the partials sent; keep only a tail
+            # the partials missed. A final that disagrees is dropped: the
+            # client already has the streamed version.
+            text = text[len(streamed) :] if text.startswith(streamed) else ""
+        frames = self._delta(author, text) if text else []
+        calls = _call_frames(event, author)
+        self.tool_calls += sum(1 for frame in calls if "tool" in frame)
+        return frames + calls
+
+    def preamble(self, text: str) -> List[Dict[str, Any]]:
+        """Frames for text the server sends ahead of the agents' reply.
+
+        It is timed separately: ``first_text_at`` stays the model's TTFT.
+        """
+        self.preamble_at = time.perf_counter()
+        return self._delta("", text)
+
+    def _delta(self, author: str, text: str) -> List[Dict[str, Any]]:
+        if author:
+            if self.first_text_at is None:
+                self.first_text_at = time.perf_counter()
+            self.agent = author
+        self._parts.append(text)
+        return [{"delta": text}]
@@ -0,0 +1,122 @@
+"""Replay buffers that make ``/chat/stream`` turns resumable.
+
+Each streamed turn gets an id and its SSE frames are numbered
+``<turn id>:<seq>``. The producer publishes every frame into the turn's
+buffer instead of straight to the connection, and connections read from the
+buffer. When ``EventSource`` reconnects after a network blip it sends the
+last id it saw in ``Last-Event-ID``; the server replays the frames after it
+and follows the rest of the turn live, without running the agent again or
+appending the user message a second time.
+
+Buffers live on the event loop thread (the producer hands frames over with
+``call_soon_threadsafe``) and are dropped ``ttl_s`` after their turn ends.
+"""
+
+from __future__ import annotations
+
+import asyncio
+import itertools
+import time
+import uuid
+from collections import Counter
+from typing import AsyncIterator, Dict, List, Optional, Tuple
+
+
+class TurnStream:
+    """Frames of one streamed turn, in order."""
+
+    def __init__(self, turn_id: str, session_id: str):
+        self.turn_id = turn_id
+        self.session_id = session_id
+        self.frames: List[Tuple[str, int]] = []  # (JSON payload, published at ns)
+        self.done = False
+        self.finished_at: Optional[float] = None
+        self._changed = asyncio.Event()
+
+    def publish(self, payload: str, *, last: bool = False) -> None:
+        """Append a frame; ``last`` marks the end of the turn. Loop thread only."""
+        if self.done:
+            return
+        self.frames.append((payload, time.time_ns()))
+        if last:
+            self.done = True
+            self.finished_at = time.monotonic()
+        self._changed.set()
+        self._changed = asyncio.Event()
+
+    def event_id(self, seq: int) -> str:
+        return f"{self.turn_id}:{seq}"
+
+    async def follow(self, after: int = 0) -> AsyncIterator[Tuple[int, str, int]]:
+        """Yield ``(seq, payload, published_ns)`` after ``after`` until the turn ends."""
+        seq = after
+        while True:
+            changed = self._changed
+            while seq < len(self.frames):
+                payload, published = self.frames[seq]
+                seq += 1
+                yield seq, payload, published
+            if self.done:
+                return
+            await changed.wait()
+
+
+def parse_event_id(event_id: Optional[str]) -> Optional[Tuple[str, int]]:
+    """``"<turn id>:<seq>"`` -> ``(turn id, seq)``; None if malformed."""
+    if not event_id:
+        return None
+    turn_id, _, seq = event_id.strip().rpartition(":")
+    if not turn_id or not seq.isdigit():
+        return None
+    return turn_id, int(seq)
+
+
+class TurnStreams:
+    """Registry of live and recently finished turn buffers."""
+
+    def __init__(self, *, ttl_s: float = 120.0, max_turns: int = 1000):
+        self.ttl_s = ttl_s
+        self.max_turns = max_turns
+        self.stats: Counter[str] = Counter()
+        self._streams: Dict[str, TurnStream] = {}
+        self._ids = itertools.count(1)
+        self._prefix = uuid.uuid4().hex[:8]
+
+    def open(self, session_id: str) -> TurnStream:
+        """Start a buffer for a new turn."""
+        self._evict()
+        stream = TurnStream(f"{self._prefix}-{next(self._ids)}", session_id)
+        self._streams[stream.turn_id] = stream
+        self.stats["turns"] += 1
+        return stream
+
+    def get(self, turn_id: str, session_id: str) -> Optional[TurnStream]:
+        """The buffer for ``turn_id`` if it belongs to ``session_id`` and is live."""
+        self._evict()
+        stream = self._streams.get(turn_id)
+        if stream is None or stream.session_id != session_id:
+            return None
+        return stream
+
+    def __len__(self) -> int:
+        return len(self._streams)
+
+    def _evict(self) -> None:
+        now = time.monotonic()
+        expired = [
+            turn_id
+            for turn_id, stream in self._streams.items()
+            if stream.finished_at is not None and now - stream.finished_at >= self.ttl_s
+        ]
+        # Past the cap, drop the oldest finished turns early; live ones stay.
+        overflow = len(self._streams) - len(expired) - self.max_turns
+        if overflow > 0:
+            finished = [
+                turn_id
+                for turn_id, stream in self._streams.items()
+                if stream.done and turn_id not in expired
+            ]
+            expired += finished[:overflow]
+        for turn_id in expired:
+            del self._streams[turn_id]
+        self.stats["expired"] += len(expired)
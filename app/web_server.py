@@ -1,22 +1,110 @@
-from typing import Any, Dict, List, Optional
-import json
-import uuid
-from fastapi import FastAPI, HTTPException, Query
 import asyncio
+import contextvars
+import functools
+import json
+import logging
+import os
+import time
+from contextlib import asynccontextmanager
+from datetime import datetime
+from typing import Any, AsyncIterator, Dict, Optional, Set
+
+from fastapi import FastAPI, Header, HTTPException, Query
 from fastapi.middleware.cors import CORSMiddleware
-from fastapi.responses import StreamingResponse, FileResponse
+from fastapi.responses import FileResponse, Response, StreamingResponse
 from fastapi.staticfiles import StaticFiles
-from pydantic import BaseModel
-from google.adk.sessions import InMemorySessionService
-from google.adk.runners import Runner
 from google.adk.agents.run_config import RunConfig, StreamingMode
+from google.adk.apps.app import App
+from google.adk.runners import Runner
+from google.adk.sessions import InMemorySessionService
 from google.genai import types as genai_types
+from opentelemetry import trace
+from pydantic import BaseModel
 
-from app.agent import root_agent  # uses your existing agent graph
+from app.agent import plugins as agent_plugins
+from app.agent import (
+    root_agent,  # uses your existing agent graph
+    token_budget,
+)
+from app.agents.budgets import BUDGET_STATS, TOKEN_USAGE
+from app.agents.config import (
+    CONVERSATION_JOURNAL,
+    INTERACTION_LOG,
+    INTERACTION_LOG_BATCH_SIZE,
+    INTERACTION_LOG_DIR,
+    INTERACTION_LOG_FLUSH_S,
+    INTERACTION_LOG_MAX_QUEUE,
+    JOURNAL_SYNC_INTERVAL_S,
+    PRETURN_ENRICHMENT,
+    PROFILING,
+    PROFILING_INTERVAL_MS,
+    SPECULATIVE_PREAMBLE,
+    STREAM_REPLAY_TTL_S,
+    TOOL_BACKEND,
+    TRACE_EXPORTER,
+    TURN_CAPTURE,
+    TURN_CAPTURE_REDACT,
+    TURN_CAPTURE_SAMPLE,
+)
+from app.agents.enrichment import enrich_turn
+from app.agents.preamble import PREAMBLE_KEY, build_preamble
+from app.agents.prompt_compiler import dynamic_state
+from app.agents.prompt_variants import VARIANT_METRICS, format_report, prompt_variants
+from app.agents.resilience import resilience_snapshot
+from app.agents.router import current_plan
+from app.agents.state import get_session_state, init_session_state, update_session_state
+from app.agents.stores import close_backends, get_backends
 from app.agents.user_registry import get_user_profile
-from app.agents.state import init_session_state, get_session_state
+from app.app_utils.interaction_log import InteractionLog, make_sink
+from app.app_utils.journal import ConversationJournal, MemoryConversationStore
+from app.app_utils.profiling import TurnProfiler
+from app.app_utils.search_index import ConversationIndex
+from app.app_utils.session_locks import session_turn_lock
+from app.app_utils.telemetry import (
+    TracedRunner,
+    setup_tracing,
+    span,
+    start_span,
+    wait_span,
+)
+from app.app_utils.turn_capture import (
+    CapturePlugin,
+    TraceFileSink,
+    TurnCapture,
+    TurnRecorder,
+    load_redactors,
+)
+from app.app_utils.turn_events import TurnEvents
+from app.app_utils.turn_streams import TurnStream, TurnStreams, parse_event_id
+from app.app_utils.typing import Feedback
+
+logger = logging.getLogger(__name__)
+setup_tracing(TRACE_EXPORTER)
+
+
+@asynccontextmanager
+async def lifespan(_: FastAPI) -> AsyncIterator[None]:
+    # The search index is in memory only; rebuild it from the recovered history.
+    started = time.perf_counter()
+    loaded = conversation_index.load(
+        (session_id, conversation_store.messages(session_id))
+        for session_id in conversation_store.sessions()
+    )
+    logger.info(
+        "Search index rebuilt: %d messages in %.1f ms",
+        loaded,
+        (time.perf_counter() - started) * 1000,
+    )
+    yield
+    conversation_store.close()
+    if interaction_log is not None:
+        interaction_log.close()
+    if turn_capture is not None:
+        turn_capture.close()
+    close_backends()
+
 
-app = FastAPI(title="ADK Web App")
+app = FastAPI(title="ADK Web App", lifespan=lifespan)
 app.add_middleware(
     CORSMiddleware,
     allow_origins=["*"],  # tighten in production
@@ -26,11 +114,55 @@ app.add_middleware(
 )
 
 # Serve frontend static files
-app.mount("/assets", StaticFiles(directory="frontend/dist/assets"), name="assets")
+FRONTEND_DIST = os.environ.get("FRONTEND_DIST", "frontend/dist")
+app.mount(
+    "/assets",
+    StaticFiles(directory=f"{FRONTEND_DIST}/assets", check_dir=False),
+    name="assets",
+)
 
 session_service = InMemorySessionService()
-conversation_store: Dict[str, List[Dict[str, Any]]] = {}
+turn_profiler = TurnProfiler(enabled=PROFILING, interval_s=PROFILING_INTERVAL_MS / 1000)
+# Opt-in capture of sampled turns to a trace file, for app/app_utils/replay.py.
+turn_capture: Optional[TurnCapture] = (
+    TurnCapture(
+        InteractionLog(
+            TraceFileSink(TURN_CAPTURE, load_redactors(TURN_CAPTURE_REDACT))
+        ),
+        sample_rate=TURN_CAPTURE_SAMPLE,
+    )
+    if TURN_CAPTURE
+    else None
+)
+adk_app = App(
+    name="web",
+    root_agent=root_agent,
+    plugins=[*agent_plugins, *([CapturePlugin(turn_capture)] if turn_capture else [])],
+)
+# Durable, write-behind history; appends never block on disk.
+conversation_store: ConversationJournal | MemoryConversationStore = (
+    ConversationJournal(CONVERSATION_JOURNAL, sync_interval_s=JOURNAL_SYNC_INTERVAL_S)
+    if CONVERSATION_JOURNAL
+    else MemoryConversationStore()
+)
+# Full-text search over every appended message, for /search.
+conversation_index = ConversationIndex()
+# Feedback and per-turn summaries, written in batches off the request path.
+interaction_log: Optional[InteractionLog] = (
+    InteractionLog(
+        make_sink(INTERACTION_LOG, INTERACTION_LOG_DIR),
+        max_queue=INTERACTION_LOG_MAX_QUEUE,
+        batch_size=INTERACTION_LOG_BATCH_SIZE,
+        flush_interval_s=INTERACTION_LOG_FLUSH_S,
+    )
+    if INTERACTION_LOG
+    else None
+)
 session_user_profile: Dict[str, Dict[str, Any]] = {}
+# Per-turn SSE replay buffers, so EventSource reconnects resume a turn.
+turn_streams = TurnStreams(ttl_s=STREAM_REPLAY_TTL_S)
+# Streamed turns still preparing their message; the loop only keeps weak refs.
+_turn_tasks: Set["asyncio.Task[None]"] = set()
 
 
 class CreateSessionRequest(BaseModel):
@@ -44,66 +176,258 @@ class ChatRequest(BaseModel):
     metadata: Optional[Dict[str, Any]] = None
 
 
+class ProfileRequest(BaseModel):
+    turns: int = 1
+    sample_rate: float = 0.0
+
+
+class PromptSplitRequest(BaseModel):
+    split: Dict[str, float]
+
+
 def _runner() -> Runner:
-    return Runner(agent=root_agent, session_service=session_service, app_name="web")
+    return TracedRunner(app=adk_app, session_service=session_service)
+
+
+async def _turn_message(session_id: str, text: str) -> genai_types.Content:
+    """Run pre-turn enrichment and build the message handed to the runner."""
+    if PRETURN_ENRICHMENT:
+        with span("turn.enrich", session_id=session_id):
+            await enrich_turn(session_id, text)
+    with span("state.serialize", session_id=session_id) as current:
+        state = get_session_state(session_id)
+        blob = json.dumps({"session_state": dynamic_state(state)})
+        current.set_attribute("state.bytes", len(blob))
+    plan = current_plan(state)
+    if plan:
+        trace.get_current_span().set_attribute("plan", plan)
+    trace.get_current_span().set_attribute(
+        "prompt.variant", prompt_variants.variant_for(session_id)
+    )
+    return genai_types.Content(
+        role="user",
+        parts=[
+            genai_types.Part.from_text(text=text),
+            genai_types.Part.from_text(text=blob),
+        ],
+    )
+
 
+def _speculate(session_id: str, text: str, *, streamed: bool) -> Optional[str]:
+    """This turn's preamble, noted in session state so the agents continue after it.
 
-def _extract_text(event: Any) -> str:
-    text_chunks: List[str] = []
-    content = getattr(event, "content", None)
-    if content and getattr(content, "parts", None):
-        for part in content.parts:
-            val = getattr(part, "text", None)
-            if val:
-                text_chunks.append(val)
-    return "".join(text_chunks)
+    Only streamed turns get one: a /chat reply arrives whole either way.
+    """
+    if not SPECULATIVE_PREAMBLE:
+        return None
+    with span("turn.preamble", session_id=session_id) as current:
+        preamble = (
+            build_preamble(
+                session_user_profile.get(session_id),
+                text,
+                get_session_state(session_id),
+            )
+            if streamed
+            else None
+        )
+        update_session_state(session_id, **{PREAMBLE_KEY: preamble})
+        current.set_attribute("preamble", preamble is not None)
+    return preamble
+
+
+def _begin_capture(
+    endpoint: str, session_id: str, user_id: str, message: str
+) -> Optional[TurnRecorder]:
+    """A recorder for this turn when capture is on and the turn is sampled."""
+    if turn_capture is None:
+        return None
+    return turn_capture.begin(endpoint, session_id, user_id, message)
+
+
+def _record_turn(
+    session_id: str,
+    user_id: str,
+    events: TurnEvents,
+    started: float,
+    capture: Optional[TurnRecorder] = None,
+) -> Dict[str, Any]:
+    """Add a finished turn to token usage, variant metrics and the interaction log.
+
+    Returns the turn's token usage, stored with the assistant message.
+    """
+    ttft = events.first_text_at
+    variant = prompt_variants.variant_for(session_id)
+    latency_ms = (time.perf_counter() - started) * 1000
+    ttft_ms = (ttft - started) * 1000 if ttft is not None else None
+    preamble = events.preamble_at
+    VARIANT_METRICS.record(
+        variant,
+        tokens=events.tokens,
+        model_calls=events.model_calls,
+        tool_calls=events.tool_calls,
+        latency_ms=latency_ms,
+        ttft_ms=ttft_ms,
+        error=events.error is not None,
+    )
+    usage = TOKEN_USAGE.record(session_id, user_id, events.agent_tokens)
+    if interaction_log is not None:
+        interaction_log.emit(
+            {
+                "type": "turn",
+                "session_id": session_id,
+                "user_id": user_id,
+                "agent": events.agent,
+                "prompt_variant": variant,
+                "latency_ms": latency_ms,
+                "ttft_ms": ttft_ms,
+                "preamble_ms": (
+                    (preamble - started) * 1000 if preamble is not None else None
+                ),
+                "model_calls": events.model_calls,
+                "tool_calls": events.tool_calls,
+                "tokens": usage,
+                "error": events.error and events.error["code"],
+            }
+        )
+    if capture is not None and turn_capture is not None:
+        turn_capture.finish(capture, events, usage)
+    return usage
+
+
+def _append_history(
+    session_id: str,
+    role: str,
+    content: str,
+    usage: Optional[Dict[str, Any]] = None,
+    *,
+    user_id: Optional[str] = None,
+) -> None:
+    # ts, plan and user_id let the search index be rebuilt from the journal.
+    message: Dict[str, Any] = {"role": role, "content": content, "ts": time.time()}
+    plan = current_plan(get_session_state(session_id))
+    if plan:
+        message["plan"] = plan
+    if user_id:
+        message["user_id"] = user_id
+    if usage is not None:
+        message["usage"] = usage
+    with span("history.append", session_id=session_id, role=role):
+        conversation_store.append(session_id, message)
+        conversation_index.add(session_id, role, content, plan=plan, ts=message["ts"])
+
+
+def _sse_frame(item: str, event_id: Optional[str] = None) -> str:
+    """Encode one JSON payload as a server-sent event frame."""
+    if event_id:
+        return f"id: {event_id}\ndata: {item}\n\n"
+    return f"data: {item}\n\n"
 
 
 @app.post("/session")
 async def create_session(req: CreateSessionRequest) -> Dict[str, str]:
-    sess = await session_service.create_session(user_id=req.user_id, app_name="web")
-    conversation_store[sess.id] = []
-    profile = get_user_profile(req.user_id)
-    if profile:
-        session_user_profile[sess.id] = profile
-        init_session_state(sess.id, user_profile=profile)
+    with span("session.create", user_id=req.user_id) as current:
+        sess = await session_service.create_session(user_id=req.user_id, app_name="web")
+        current.set_attribute("session.id", sess.id)
+        conversation_store.create(sess.id)
+        conversation_index.register(sess.id, req.user_id)
+        with span("user_profile.lookup", user_id=req.user_id) as lookup:
+            if TOOL_BACKEND == "sqlite":
+                profile = await get_backends().registry.get_profile(req.user_id)
+            else:
+                profile = get_user_profile(req.user_id)
+            lookup.set_attribute("profile.found", profile is not None)
+        if profile:
+            current.set_attribute("plan", profile["data_plan"])
+            session_user_profile[sess.id] = profile
+            init_session_state(sess.id, user_profile=profile)
+        current.set_attribute("prompt.variant", prompt_variants.assign(sess.id))
     return {"session_id": sess.id}
 
 
-@app.post("/chat")
-async def chat(req: ChatRequest) -> Dict[str, Any]:
-    if req.session_id not in conversation_store:
-        raise HTTPException(status_code=404, detail="Unknown session_id")
+def _require_live_session(session_id: str, user_id: str) -> None:
+    """404 for unknown sessions, 410 for ones only the journal remembers.
 
-    conversation_store[req.session_id].append({"role": "user", "content": req.message})
+    ADK sessions live in memory, so after a restart a journal-recovered
+    session still has its history but can no longer run turns.
+    """
+    if session_id not in conversation_store:
+        raise HTTPException(status_code=404, detail="Unknown session_id")
+    # A membership check: session_service.get_session would deep-copy the events.
+    if session_id not in session_service.sessions.get("web", {}).get(user_id, {}):
+        raise HTTPException(
+            status_code=410,
+            detail="Session can no longer continue; its history is read-only",
+        )
 
-    message = genai_types.Content(
-        role="user",
-        parts=[
-            genai_types.Part.from_text(text=req.message),
-            genai_types.Part.from_text(
-                text=json.dumps({
-                    "session_state": get_session_state(req.session_id)
-                })
-            ),
-        ]
-    )
 
-    def _blocking_run() -> str:
-        parts: List[str] = []
+@app.post("/chat")
+async def chat(
+    req: ChatRequest,
+    response: Response,
+    x_profile: Optional[str] = Header(default=None),
+) -> Dict[str, Any]:
+    _require_live_session(req.session_id, req.user_id)
+
+    with span("chat.turn", session_id=req.session_id, user_id=req.user_id):
+        waiting = time.time_ns()
+        async with session_turn_lock(req.session_id):
+            wait_span("session.lock_wait", waiting, session_id=req.session_id)
+            if not (turn_profiler.armed or x_profile == "1"):
+                return await _chat_turn(req)
+            with turn_profiler.turn(
+                req.session_id, requested=x_profile == "1"
+            ) as profile:
+                if profile is not None:
+                    response.headers["X-Profile-Id"] = profile.id
+                return await _chat_turn(req)
+
+
+async def _chat_turn(req: ChatRequest) -> Dict[str, Any]:
+    """Run one /chat turn; the caller holds the session's turn lock."""
+    started = time.perf_counter()
+    capture = _begin_capture("chat", req.session_id, req.user_id, req.message)
+    _append_history(req.session_id, "user", req.message, user_id=req.user_id)
+    _speculate(req.session_id, req.message, streamed=False)
+
+    message = await _turn_message(req.session_id, req.message)
+    if capture:
+        capture.mark("prepare_ms")
+    submitted = time.time_ns()
+
+    def _blocking_run() -> tuple[str, Optional[Dict[str, Any]], Dict[str, Any]]:
+        wait_span("executor.queue_wait", submitted, session_id=req.session_id)
+        if capture:
+            capture.mark("queue_wait_ms")
+        turn = trace.get_current_span()
+        events = TurnEvents()
         for event in _runner().run(
             new_message=message,
             user_id=req.user_id,
             session_id=req.session_id,
             run_config=RunConfig(streaming_mode=StreamingMode.SSE),
         ):
-            delta = _extract_text(event)
-            if delta:
-                parts.append(delta)
-        return "".join(parts)
-
-    answer = await asyncio.to_thread(_blocking_run)
-    conversation_store[req.session_id].append({"role": "assistant", "content": answer})
+            frames = events.feed(event)
+            if capture:
+                capture.event(event, frames)
+            if events.error:
+                turn.set_attribute("error.code", events.error["code"])
+                break
+        usage = _record_turn(req.session_id, req.user_id, events, started, capture)
+        if events.agent:
+            turn.set_attribute("agent.name", events.agent)
+        return events.answer, events.error, usage
+
+    answer, error, usage = await asyncio.to_thread(_blocking_run)
+    if error:
+        headers = (
+            {"Retry-After": str(max(1, round(error["retry_after_s"])))}
+            if "retry_after_s" in error
+            else None
+        )
+        raise HTTPException(
+            status_code=error["code"], detail=error["error"], headers=headers
+        )
+    _append_history(req.session_id, "assistant", answer, usage)
     return {"answer": answer}
 
 
@@ -112,69 +436,335 @@ async def chat_stream(
     session_id: str = Query(...),
     user_id: str = Query(...),
     q: str = Query(..., description="User message"),
-):
-    if session_id not in conversation_store:
-        raise HTTPException(status_code=404, detail="Unknown session_id")
-
-    conversation_store[session_id].append({"role": "user", "content": q})
-    message = genai_types.Content(
-        role="user",
-        parts=[
-            genai_types.Part.from_text(text=q),
-            genai_types.Part.from_text(
-                text=json.dumps({
-                    "session_state": get_session_state(session_id)
-                })
-            ),
-        ]
-    )
+    last_event_id: Optional[str] = Header(default=None),
+) -> StreamingResponse:
+    _require_live_session(session_id, user_id)
+
+    resume = parse_event_id(last_event_id)
+    if resume is not None:
+        # A reconnect: replay the rest of the turn, never run it again.
+        stream = turn_streams.get(resume[0], session_id)
+        if stream is None:
+            turn_streams.stats["resume_misses"] += 1
+            gone = json.dumps(
+                {"error": "This reply is no longer available", "code": 410}
+            )
+            return StreamingResponse(
+                iter([_sse_frame(gone)]), media_type="text/event-stream"
+            )
+        turn_streams.stats["resumes"] += 1
+        stream_span = start_span(
+            "chat.stream.resume",
+            session_id=session_id,
+            user_id=user_id,
+            turn_id=stream.turn_id,
+        )
+        stream_span.set_attribute("sse.resumed.after", resume[1])
+        return StreamingResponse(
+            _relay(stream, resume[1], stream_span), media_type="text/event-stream"
+        )
 
     async def sse() -> Any:
-        queue: asyncio.Queue[str] = asyncio.Queue()
-
         loop = asyncio.get_running_loop()
 
-        def producer() -> None:
-            parts: List[str] = []
-            for event in _runner().run(
-                new_message=message,
-                user_id=user_id,
-                session_id=session_id,
-                run_config=RunConfig(streaming_mode=StreamingMode.SSE),
-            ):
-                delta = _extract_text(event)
-                if delta:
-                    parts.append(delta)
-                    asyncio.run_coroutine_threadsafe(
-                        queue.put(json.dumps({"delta": delta})), loop
-                    )
-            final_answer = "".join(parts)
-            conversation_store[session_id].append(
-                {"role": "assistant", "content": final_answer}
-            )
-            asyncio.run_coroutine_threadsafe(
-                queue.put(json.dumps({"final": final_answer})), loop
+        # Only made current around code that does not yield: the generator can
+        # be resumed, or closed on disconnect, from another context.
+        stream_span = start_span("chat.stream", session_id=session_id, user_id=user_id)
+
+        # Held until the producer finishes, even if the client disconnects, so
+        # the next turn for this session never overlaps a running one.
+        lock = session_turn_lock(session_id)
+        waiting = time.time_ns()
+        await lock.acquire()
+        started = time.perf_counter()
+        try:
+            with trace.use_span(stream_span):
+                wait_span("session.lock_wait", waiting, session_id=session_id)
+                capture = _begin_capture("chat_stream", session_id, user_id, q)
+                _append_history(session_id, "user", q, user_id=user_id)
+                preamble = _speculate(session_id, q, streamed=True)
+        except BaseException:
+            lock.release()
+            stream_span.end()
+            raise
+
+        stream = turn_streams.open(session_id)
+        stream_span.set_attribute("turn.id", stream.turn_id)
+        stream.publish(json.dumps({"turn_id": stream.turn_id}))
+        events = TurnEvents()
+        if preamble:
+            # Sent before enrichment and the runner; the model's reply continues it.
+            frames = events.preamble(preamble)
+            if capture:
+                capture.event(None, frames)
+            for frame in frames:
+                stream.publish(json.dumps(frame))
+
+        def emit(payload: Dict[str, Any], last: bool = False) -> None:
+            loop.call_soon_threadsafe(
+                functools.partial(stream.publish, json.dumps(payload), last=last)
             )
 
-        # Start the blocking producer in a thread without awaiting, so we can stream concurrently.
-        _ = loop.run_in_executor(None, producer)
+        def producer(message: genai_types.Content, submitted: int) -> None:
+            wait_span("executor.queue_wait", submitted, session_id=session_id)
+            if capture:
+                capture.mark("queue_wait_ms")
+            try:
+                for event in _runner().run(
+                    new_message=message,
+                    user_id=user_id,
+                    session_id=session_id,
+                    run_config=RunConfig(streaming_mode=StreamingMode.SSE),
+                ):
+                    frames = events.feed(event)
+                    if capture:
+                        capture.event(event, frames)
+                    for frame in frames:
+                        emit(frame, last=frame is events.error)
+                    if events.error:
+                        stream_span.set_attribute("error.code", events.error["code"])
+                        return
+            except Exception:
+                logger.exception("Stream producer failed for session %s", session_id)
+                events.error = {"error": "Internal error", "code": 500}
+                emit(events.error, last=True)
+                return
+            finally:
+                usage = _record_turn(session_id, user_id, events, started, capture)
+            if events.agent:
+                stream_span.set_attribute("agent.name", events.agent)
+            _append_history(session_id, "assistant", events.answer, usage)
+            emit({"final": events.answer}, last=True)
+
+        def finished(_: Any) -> None:
+            lock.release()
+            # No-op unless the producer died without ending the turn.
+            stream.publish(
+                json.dumps({"error": "Internal error", "code": 500}), last=True
+            )
 
-        while True:
-            item = await queue.get()
-            yield f"data: {item}\n\n"
-            if item and json.loads(item).get("final") is not None:
-                break
+        async def run_turn() -> None:
+            # Enrichment runs while the client already has the preamble. The
+            # producer then runs to completion in a thread whether or not
+            # anyone is connected, in the stream span's trace context;
+            # connections only read the turn's buffer.
+            try:
+                with trace.use_span(stream_span):
+                    message = await _turn_message(session_id, q)
+                    if capture:
+                        capture.mark("prepare_ms")
+                    future = loop.run_in_executor(
+                        None,
+                        contextvars.copy_context().run,
+                        producer,
+                        message,
+                        time.time_ns(),
+                    )
+            except Exception:
+                logger.exception("Turn preparation failed for session %s", session_id)
+                finished(None)
+                return
+            except BaseException:
+                finished(None)
+                raise
+            future.add_done_callback(finished)
+
+        # Referenced from a module set, not this generator: the turn outlives a
+        # disconnect.
+        task = asyncio.create_task(run_turn())
+        _turn_tasks.add(task)
+        task.add_done_callback(_turn_tasks.discard)
+        async for chunk in _relay(stream, 0, stream_span):
+            yield chunk
 
     return StreamingResponse(sse(), media_type="text/event-stream")
 
 
+async def _relay(
+    stream: TurnStream, after: int, stream_span: trace.Span
+) -> AsyncIterator[str]:
+    """Send ``stream``'s frames after ``after`` as numbered SSE events; ends
+    ``stream_span``."""
+    frames = 0
+    try:
+        async for seq, payload, published in stream.follow(after):
+            sending = time.time_ns()
+            yield _sse_frame(payload, stream.event_id(seq))
+            frames += 1
+            stream_span.add_event(
+                "sse.flush",
+                {
+                    "seq": seq,
+                    "queue_wait_ms": (sending - published) / 1e6,
+                    "send_ms": (time.time_ns() - sending) / 1e6,
+                },
+            )
+    finally:
+        stream_span.set_attribute("sse.frames", frames)
+        stream_span.end()
+
+
+@app.post("/feedback", status_code=202)
+async def collect_feedback(feedback: Feedback) -> Dict[str, str]:
+    """Queue user feedback for the interaction log; 503 when it cannot keep up."""
+    if interaction_log is None:
+        raise HTTPException(status_code=503, detail="Interaction log is disabled")
+    if not interaction_log.emit({"type": "feedback", **feedback.model_dump()}):
+        raise HTTPException(
+            status_code=503,
+            detail="Feedback queue is full",
+            headers={"Retry-After": "1"},
+        )
+    return {"status": "accepted"}
+
+
+@app.get("/admin/interaction-log")
+async def interaction_log_stats() -> Dict[str, Any]:
+    """Queue depth, batches written and records dropped by the interaction log."""
+    if interaction_log is None:
+        return {"enabled": False}
+    return {"enabled": True, "sink": INTERACTION_LOG, **interaction_log.snapshot()}
+
+
+@app.get("/admin/model-health")
+async def model_health() -> Dict[str, Any]:
+    """Retry, hedge and circuit-breaker counters for the model backends."""
+    return resilience_snapshot()
+
+
+def _require_profiling() -> None:
+    if not turn_profiler.enabled:
+        raise HTTPException(
+            status_code=404, detail="Profiling is disabled (set PROFILING=true)"
+        )
+
+
+@app.post("/admin/profile")
+async def arm_profiler(req: ProfileRequest) -> Dict[str, Any]:
+    """Profile the next ``turns`` /chat turns and/or a ``sample_rate`` fraction."""
+    _require_profiling()
+    return turn_profiler.arm(turns=req.turns, sample_rate=req.sample_rate)
+
+
+@app.get("/admin/profiles")
+async def list_profiles() -> Dict[str, Any]:
+    _require_profiling()
+    return {"profiles": turn_profiler.profiles()}
+
+
+@app.get("/admin/profiles/{profile_id}")
+async def get_profile(
+    profile_id: str,
+    format: str = Query("speedscope", pattern="^(speedscope|collapsed)$"),
+) -> Any:
+    _require_profiling()
+    profile = turn_profiler.get(profile_id)
+    if profile is None:
+        raise HTTPException(status_code=404, detail="Unknown profile_id")
+    if format == "collapsed":
+        return Response(profile.collapsed(), media_type="text/plain")
+    return profile.speedscope()
+
+
+@app.get("/admin/prompt-variants")
+async def prompt_variant_report(
+    format: str = Query("json", pattern="^(json|text)$"),
+) -> Any:
+    """The live prompt split and per-variant turn metrics against the baseline."""
+    report = VARIANT_METRICS.report(prompt_variants.baseline)
+    if format == "text":
+        return Response(format_report(report), media_type="text/plain")
+    return {
+        "split": prompt_variants.split,
+        "baseline": prompt_variants.baseline,
+        "variants": report,
+    }
+
+
+@app.post("/admin/prompt-variants")
+async def set_prompt_split(req: PromptSplitRequest) -> Dict[str, Any]:
+    """Change the prompt split for new sessions, e.g. {"split": {"default": 50, "updated-1": 50}}."""
+    try:
+        prompt_variants.set_split(req.split)
+    except ValueError as exc:
+        raise HTTPException(status_code=400, detail=str(exc)) from exc
+    return {"split": prompt_variants.split, "baseline": prompt_variants.baseline}
+
+
+@app.get("/usage")
+async def usage(
+    session_id: Optional[str] = None, user_id: Optional[str] = None
+) -> Dict[str, Any]:
+    """Token usage of one session (with its agents) or one user, and their budgets."""
+    if (session_id is None) == (user_id is None):
+        raise HTTPException(
+            status_code=400, detail="Pass exactly one of session_id or user_id"
+        )
+    if session_id is not None:
+        report = TOKEN_USAGE.session(session_id)
+        if report is None:
+            raise HTTPException(status_code=404, detail="No usage for session_id")
+        budget = token_budget.status(
+            TOKEN_USAGE, user_id=report["user_id"], session_id=session_id
+        )
+    else:
+        assert user_id is not None  # exactly one of the two was passed
+        report = TOKEN_USAGE.user(user_id)
+        if report is None:
+            raise HTTPException(status_code=404, detail="No usage for user_id")
+        budget = token_budget.status(TOKEN_USAGE, user_id=user_id)
+    return {**report, "budget": budget}
+
+
+@app.get("/admin/usage")
+async def usage_report(top: int = Query(10, ge=1, le=1000)) -> Dict[str, Any]:
+    """Tokens per agent, the heaviest users and over-budget call counters."""
+    return {
+        "agents": TOKEN_USAGE.agents(),
+        "top_users": TOKEN_USAGE.top_users(top),
+        "budget": dict(BUDGET_STATS),
+    }
+
+
+@app.get("/search")
+async def search(
+    q: str = Query(..., min_length=1, description="Words every hit must contain"),
+    user_id: Optional[str] = None,
+    plan: Optional[str] = Query(None, pattern="^(BRONZE|SILVER|GOLD)$"),
+    role: Optional[str] = Query(None, pattern="^(user|assistant)$"),
+    since: Optional[datetime] = None,
+    until: Optional[datetime] = None,
+    limit: int = Query(20, ge=1, le=200),
+) -> Dict[str, Any]:
+    """Sessions whose messages mention every word of ``q``, ranked, with the best hits."""
+    started = time.perf_counter()
+    with span("history.search", query=q) as current:
+        result = conversation_index.search(
+            q,
+            user_id=user_id,
+            plan=plan,
+            role=role,
+            since=since.timestamp() if since else None,
+            until=until.timestamp() if until else None,
+            limit=limit,
+        )
+        current.set_attribute("search.messages", result["messages"])
+    for session in result["sessions"]:
+        for hit in session["messages"]:
+            message = conversation_store.message(session["session_id"], hit["position"])
+            hit["content"] = message["content"]
+    return {**result, "took_ms": round((time.perf_counter() - started) * 1000, 3)}
+
+
 @app.get("/history")
-async def history(session_id: str) -> Dict[str, Any]:
+async def history(session_id: str) -> Response:
     if session_id not in conversation_store:
         raise HTTPException(status_code=404, detail="Unknown session_id")
-    return {"messages": conversation_store[session_id]}
+    return Response(
+        conversation_store.history_json(session_id), media_type="application/json"
+    )
 
 
 @app.get("/")
-async def read_index():
-    return FileResponse("frontend/dist/index.html")
+async def read_index() -> FileResponse:
+    return FileResponse(f"{FRONTEND_DIST}/index.html")
@@ -24,6 +24,10 @@ export async function createSession(userId: string): Promise<string> {
   return data.session_id;
 }
 
+// Reconnects in a row before a stream is given up on. The browser retries a
+// dropped EventSource forever; without a cap a lost turn spins silently.
+const MAX_RECONNECTS = 3;
+
 export function streamChat(
   sessionId: string,
   userId: string,
@@ -37,26 +41,48 @@ export function streamChat(
   )}&user_id=${encodeURIComponent(userId)}&q=${encodeURIComponent(message)}`;
   
   const eventSource = new EventSource(url);
+  let reconnects = 0;
 
+  const fail = (error: any) => {
+    eventSource.close();
+    onError(error);
+  };
+
+  eventSource.onopen = () => {
+    reconnects = 0;
+  };
+
+  // Events carry ids, so after a network blip EventSource reconnects with
+  // Last-Event-ID and the server resumes the same turn from its buffer.
   eventSource.onmessage = (event) => {
     try {
       const data = JSON.parse(event.data);
+      if (data.error) {
+        fail(new Error(data.error));
+        return;
+      }
       if (data.delta) {
         onDelta(data.delta);
       }
-      if (data.final) {
-        onFinal(data.final);
+      // The final frame ends the turn even when the answer is empty;
+      // otherwise the browser would reconnect and replay it.
+      if ("final" in data) {
         eventSource.close();
+        onFinal(data.final ?? "");
       }
     } catch (e) {
-      onError(e);
-      eventSource.close();
+      fail(e);
     }
   };
 
   eventSource.onerror = (err) => {
-    onError(err);
-    eventSource.close();
+    // While CONNECTING the browser is retrying; give up once it has, or
+    // after MAX_RECONNECTS attempts in a row.
+    if (eventSource.readyState === EventSource.CLOSED) {
+      onError(err);
+    } else if (++reconnects > MAX_RECONNECTS) {
+      fail(new Error("Lost the connection to the chat stream"));
+    }
   };
 
   return eventSource;
@@ -151,7 +151,10 @@ export const ChatInterface: React.FC<ChatInterfaceProps> = ({ user }) => {
                     msg.id === botMessageId
                         ? {
                             ...msg,
-                            content: "Sorry, I encountered an error. Please try again.",
+                            // Server error frames carry a user-facing reason.
+                            content: error instanceof Error && error.message
+                                ? error.message
+                                : "Sorry, I encountered an error. Please try again.",
                             timestamp: new Date(),
                         }
                         : msg
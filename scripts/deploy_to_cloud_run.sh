@@ -7,6 +7,7 @@
 #   REPOSITORY     - Artifact Registry repo name (defaults to app-images)
 #   ALLOWED_ORIGINS- Comma-separated CORS origins (defaults to *)
 #   USE_CLOUD_BUILD- Set to 1 to use gcloud builds submit instead of docker CLI
+#   TOOL_BACKEND   - Agent tool backend, memory or sqlite (unset keeps the app default, memory)
 
 set -euo pipefail
 
@@ -19,6 +20,7 @@ ALLOWED_ORIGINS="${ALLOWED_ORIGINS:-*}"
 USE_CLOUD_BUILD="${USE_CLOUD_BUILD:-0}"
 API_MODEL="${API_MODEL:-}"
 API_KEY="${API_KEY:-}"
+TOOL_BACKEND="${TOOL_BACKEND:-}"
 
 log() {
   printf "\033[1;34m[deploy]\033[0m %s\n" "$*"
@@ -93,6 +95,9 @@ deploy_cloud_run() {
   if [[ -n "$API_KEY" ]]; then
     env_vars+="\,API_KEY=$API_KEY"
   fi
+  if [[ -n "$TOOL_BACKEND" ]]; then
+    env_vars+="\,TOOL_BACKEND=$TOOL_BACKEND"
+  fi
   log "Deploying Cloud Run service $SERVICE_NAME"
   gcloud run deploy "$SERVICE_NAME" \
     --image "$image" \
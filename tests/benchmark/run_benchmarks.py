@@ -0,0 +1,312 @@
+"""Micro- and macro-benchmarks for the serving hot paths.
+
+Microbenchmarks time the pure-Python helpers on every request path.
+End-to-end benchmarks drive ``/session``, ``/chat`` and ``/chat/stream``
+through an in-process ASGI client with the offline replay model, so the
+numbers measure our own server overhead rather than Gemini.
+
+Usage::
+
+    python tests/benchmark/run_benchmarks.py --output tests/benchmark/.results/latest.json
+    python tests/benchmark/run_benchmarks.py --baseline tests/benchmark/baseline.json
+
+With ``--baseline`` the run exits non-zero when any metric is slower than the
+baseline by more than ``--tolerance`` (a fraction, default 0.5). Journal,
+tool store and interaction log go to a temporary ``BENCH_DATA_DIR``.
+"""
+
+from __future__ import annotations
+
+import argparse
+import asyncio
+import json
+import os
+import platform
+import statistics
+import sys
+import tempfile
+import time
+import timeit
+from pathlib import Path
+from types import SimpleNamespace
+from typing import Any, Awaitable, Callable, Dict, List
+
+import httpx
+
+# The agent graph reads its backend and data paths at import time; benchmark
+# runs never touch the real .data directory.
+os.environ.setdefault("LLM_BACKEND", "replay")
+os.environ.setdefault("LLM_REPLAY_PROFILE", "instant")
+os.environ.setdefault("BENCH_DATA_DIR", tempfile.mkdtemp())
+os.environ.setdefault(
+    "CONVERSATION_JOURNAL",
+    os.path.join(os.environ["BENCH_DATA_DIR"], "conversations.journal"),
+)
+os.environ.setdefault("TOOL_BACKEND", "sqlite")  # as served by make serve/deploy
+os.environ.setdefault(
+    "TOOL_STORE", os.path.join(os.environ["BENCH_DATA_DIR"], "tools.sqlite")
+)
+os.environ.setdefault(
+    "INTERACTION_LOG_DIR", os.path.join(os.environ["BENCH_DATA_DIR"], "interactions")
+)
+sys.path.insert(0, str(Path(__file__).resolve().parents[2]))
+
+from app import web_server
+from app.agents import entitlement_tools
+from app.agents.state import get_session_state, init_session_state
+from app.agents.user_registry import get_user_profile
+from app.app_utils import turn_events
+
+MicroBench = Callable[[], Callable[[], Any]]
+MacroBench = Callable[[httpx.AsyncClient, int], Awaitable[List[float]]]
+
+MICRO: Dict[str, MicroBench] = {}
+MACRO: Dict[str, MacroBench] = {}
+
+
+def micro(name: str) -> Callable[[MicroBench], MicroBench]:
+    """Register a setup function returning the zero-arg callable to time."""
+
+    def register(fn: MicroBench) -> MicroBench:
+        MICRO[name] = fn
+        return fn
+
+    return register
+
+
+def macro(name: str) -> Callable[[MacroBench], MacroBench]:
+    """Register an async benchmark returning per-request latencies in seconds."""
+
+    def register(fn: MacroBench) -> MacroBench:
+        MACRO[name] = fn
+        return fn
+
+    return register
+
+
+# ---------------------------------------------------------------------------
+# Microbenchmarks
+# ---------------------------------------------------------------------------
+
+
+@micro("check_entitlement")
+def _bench_check_entitlement() -> Callable[[], Any]:
+    return lambda: entitlement_tools.check_entitlement(
+        report="ACH Inbound detail", plan="SILVER"
+    )
+
+
+@micro("normalize")
+def _bench_normalize() -> Callable[[], Any]:
+    text = "  Image (view and print images for checks and deposits)  "
+    return lambda: entitlement_tools._normalize(text)
+
+
+@micro("index_entitlements")
+def _bench_index_entitlements() -> Callable[[], Any]:
+    return entitlement_tools._index_entitlements
+
+
+@micro("user_profile_to_dict")
+def _bench_user_profile() -> Callable[[], Any]:
+    return lambda: get_user_profile("USR-Cosmosia")
+
+
+@micro("session_state_serialize")
+def _bench_session_state() -> Callable[[], Any]:
+    session_id = "bench-session"
+    init_session_state(session_id, user_profile=get_user_profile("alice"))
+    return lambda: json.dumps({"session_state": get_session_state(session_id)})
+
+
+@micro("extract_text")
+def _bench_extract_text() -> Callable[[], Any]:
+    parts = [SimpleNamespace(text="Present Day is included in your GOLD plan. ")] * 4
+    event = SimpleNamespace(content=SimpleNamespace(parts=parts))
+    return lambda: turn_events.event_text(event)
+
+
+@micro("sse_frame")
+def _bench_sse_frame() -> Callable[[], Any]:
+    delta = "In the portal, open Reports > Balance Reporting > Present Day."
+    return lambda: web_server._sse_frame(json.dumps({"delta": delta}))
+
+
+@micro("history_json")
+def _bench_history_json() -> Callable[[], Any]:
+    session_id = "bench-history"
+    store = web_server.conversation_store
+    store.create(session_id)
+    for i in range(20):
+        store.append(session_id, {"role": "user", "content": f"question {i}"})
+        store.append(
+            session_id,
+            {"role": "assistant", "content": "Present Day is included. " * 8},
+        )
+    store.flush()
+    return lambda: store.history_json(session_id)
+
+
+def run_micro(fn: Callable[[], Any], repeats: int = 5) -> Dict[str, float]:
+    timer = timeit.Timer(fn)
+    number, _ = timer.autorange()
+    samples = [t / number * 1e9 for t in timer.repeat(repeat=repeats, number=number)]
+    return {"ns_per_op": min(samples), "ns_per_op_median": statistics.median(samples)}
+
+
+# ---------------------------------------------------------------------------
+# End-to-end benchmarks
+# ---------------------------------------------------------------------------
+
+PROMPT = "Can I download the Present Day report?"
+
+
+async def _new_session(client: httpx.AsyncClient) -> str:
+    resp = await client.post("/session", json={"user_id": "alice"})
+    resp.raise_for_status()
+    return resp.json()["session_id"]
+
+
+@macro("session")
+async def _bench_session(client: httpx.AsyncClient, n: int) -> List[float]:
+    latencies = []
+    for _ in range(n):
+        start = time.perf_counter()
+        await _new_session(client)
+        latencies.append(time.perf_counter() - start)
+    return latencies
+
+
+@macro("chat")
+async def _bench_chat(client: httpx.AsyncClient, n: int) -> List[float]:
+    latencies = []
+    for _ in range(n):
+        session_id = await _new_session(client)
+        start = time.perf_counter()
+        resp = await client.post(
+            "/chat",
+            json={"session_id": session_id, "user_id": "alice", "message": PROMPT},
+        )
+        resp.raise_for_status()
+        latencies.append(time.perf_counter() - start)
+    return latencies
+
+
+@macro("chat_stream")
+async def _bench_chat_stream(client: httpx.AsyncClient, n: int) -> List[float]:
+    latencies = []
+    for _ in range(n):
+        session_id = await _new_session(client)
+        start = time.perf_counter()
+        async with client.stream(
+            "GET",
+            "/chat/stream",
+            params={"session_id": session_id, "user_id": "alice", "q": PROMPT},
+        ) as resp:
+            resp.raise_for_status()
+            async for _ in resp.aiter_lines():
+                pass
+        latencies.append(time.perf_counter() - start)
+    return latencies
+
+
+def _percentile(values: List[float], pct: float) -> float:
+    ordered = sorted(values)
+    index = min(len(ordered) - 1, max(0, round(pct / 100 * len(ordered)) - 1))
+    return ordered[index]
+
+
+async def run_macro(bench: MacroBench, n: int) -> Dict[str, float]:
+    transport = httpx.ASGITransport(app=web_server.app)
+    async with httpx.AsyncClient(
+        transport=transport, base_url="http://bench"
+    ) as client:
+        await bench(client, max(1, n // 10))  # warm-up
+        latencies = await bench(client, n)
+    return {
+        "p50_ms": _percentile(latencies, 50) * 1000,
+        "p95_ms": _percentile(latencies, 95) * 1000,
+        "mean_ms": statistics.fmean(latencies) * 1000,
+    }
+
+
+# ---------------------------------------------------------------------------
+# Driver
+# ---------------------------------------------------------------------------
+
+
+def run_all(
+    *, macro_requests: int = 50, only: List[str] | None = None
+) -> Dict[str, Any]:
+    results: Dict[str, Dict[str, float]] = {}
+    for name, setup in MICRO.items():
+        if not only or name in only:
+            results[f"micro.{name}"] = run_micro(setup())
+    for name, bench in MACRO.items():
+        if not only or name in only:
+            results[f"e2e.{name}"] = asyncio.run(run_macro(bench, macro_requests))
+    return {
+        "meta": {
+            "python": platform.python_version(),
+            "machine": platform.machine(),
+            "created_at": time.strftime("%Y-%m-%dT%H:%M:%SZ", time.gmtime()),
+        },
+        "results": results,
+    }
+
+
+# Only these metrics gate regressions; medians and means are informational.
+GATED_METRICS = ("ns_per_op", "p50_ms", "p95_ms")
+
+
+def compare(
+    current: Dict[str, Any], baseline: Dict[str, Any], tolerance: float
+) -> List[str]:
+    """Return one line per gated metric that regressed past ``tolerance``."""
+    regressions = []
+    for bench, metrics in baseline.get("results", {}).items():
+        now = current.get("results", {}).get(bench)
+        if now is None:
+            continue
+        for metric in GATED_METRICS:
+            if metric in metrics and metric in now:
+                limit = metrics[metric] * (1 + tolerance)
+                if now[metric] > limit:
+                    regressions.append(
+                        f"{bench}.{metric}: {now[metric]:.1f} > {limit:.1f} "
+                        f"(baseline {metrics[metric]:.1f})"
+                    )
+    return regressions
+
+
+def main(argv: List[str] | None = None) -> int:
+    parser = argparse.ArgumentParser(description="Run serving benchmarks.")
+    parser.add_argument("--output", help="write results JSON here")
+    parser.add_argument("--baseline", help="compare against this results JSON")
+    parser.add_argument("--tolerance", type=float, default=0.5)
+    parser.add_argument(
+        "--requests", type=int, default=50, help="requests per e2e benchmark"
+    )
+    parser.add_argument("--only", nargs="*", help="benchmark names to run")
+    args = parser.parse_args(argv)
+
+    report = run_all(macro_requests=args.requests, only=args.only)
+    for bench, metrics in report["results"].items():
+        summary = ", ".join(f"{k}={v:.1f}" for k, v in metrics.items())
+        print(f"{bench:<34} {summary}")
+
+    if args.output:
+        Path(args.output).parent.mkdir(parents=True, exist_ok=True)
+        Path(args.output).write_text(json.dumps(report, indent=2) + "\n")
+
+    if args.baseline:
+        baseline = json.loads(Path(args.baseline).read_text())
+        regressions = compare(report, baseline, args.tolerance)
+        for line in regressions:
+            print(f"REGRESSION {line}", file=sys.stderr)
+        return 1 if regressions else 0
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
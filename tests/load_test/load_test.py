@@ -12,12 +12,36 @@
 # See the License for the specific language governing permissions and
 # limitations under the License.
 
+"""Streaming-aware load test for the chat API.
+
+Each simulated user logs in as one of the users from ``user_registry``, opens
+a session and sends a weighted mix of entitlement, service and upgrade
+prompts over the GET ``/chat/stream`` SSE endpoint. For every turn it
+records time to first token (TTFT), the gaps between deltas and the full
+turn time. Locust reports them as ``/chat/stream ttft``, ``... inter-delta``
+and ``... turn``; a JSON report with p50/p95/p99 per metric and per prompt
+category is written when the test stops.
+
+Environment:
+    CLOUD_RUN_BASE_URL  target base URL (default http://localhost:8000)
+    LOAD_PROFILE        ramp | soak | spike (unset: use locust -u/-r/-t)
+    LOAD_USERS          peak users for the profile (default 20)
+    LOAD_DURATION       profile length in seconds (default 300)
+    LOAD_TEST_REPORT    JSON report path (default tests/load_test/.results/stream_report.json)
+"""
+
+import importlib.util
 import json
 import logging
 import os
+import random
+import sys
 import time
+from collections import defaultdict
+from pathlib import Path
+from typing import Any, Optional
 
-from locust import HttpUser, between, task
+from locust import HttpUser, LoadTestShape, between, events, task
 
 # Configure logging
 logging.basicConfig(
@@ -27,97 +51,242 @@ logger = logging.getLogger(__name__)
 
 base_url = os.environ.get("CLOUD_RUN_BASE_URL", "http://localhost:8000")
 stream_path = "/chat/stream"
+report_path = Path(
+    os.environ.get(
+        "LOAD_TEST_REPORT",
+        Path(__file__).parent / ".results" / "stream_report.json",
+    )
+)
 
 logger.info("Using Cloud Run base URL: %s", base_url)
 
 
+def _load_user_names() -> list[str]:
+    # Load the registry by path: the locust environment does not install the
+    # app's dependencies, and importing the ``app`` package pulls in ADK.
+    path = Path(__file__).resolve().parents[2] / "app" / "agents" / "user_registry.py"
+    spec = importlib.util.spec_from_file_location("_load_test_user_registry", path)
+    assert spec is not None and spec.loader is not None
+    module = importlib.util.module_from_spec(spec)
+    sys.modules[spec.name] = module  # dataclasses resolve annotations through it
+    spec.loader.exec_module(module)
+    return [user["user_name"] for user in module.list_users()]
+
+
+USER_NAMES = _load_user_names()
+
+# (category, weight, prompts). The prompts match the offline replay fixtures
+# so the same mix works against `make serve-offline`.
+PROMPT_MIX = [
+    (
+        "entitlement",
+        5,
+        ["Do I have ACH Inbound detail?", "Can I get Sweep Account Position?"],
+    ),
+    ("service", 4, ["Can I download the Present Day report?"]),
+    ("upgrade", 1, ["Please upgrade my plan to GOLD."]),
+]
+
+
+def _pick_prompt() -> tuple[str, str]:
+    category, _, prompts = random.choices(
+        PROMPT_MIX, weights=[weight for _, weight, _ in PROMPT_MIX]
+    )[0]
+    return category, random.choice(prompts)
+
+
+# metric -> category -> samples (ms), aggregated for the JSON report.
+_samples: dict[str, dict[str, list[float]]] = defaultdict(lambda: defaultdict(list))
+_counters: dict[str, int] = defaultdict(int)
+
+
+def _percentiles(values: list[float]) -> dict[str, float]:
+    ordered = sorted(values)
+
+    def pick(pct: float) -> float:
+        return ordered[
+            min(len(ordered) - 1, max(0, round(pct / 100 * len(ordered)) - 1))
+        ]
+
+    return {
+        "count": len(ordered),
+        "p50": pick(50),
+        "p95": pick(95),
+        "p99": pick(99),
+        "max": ordered[-1],
+    }
+
+
+@events.test_stop.add_listener
+def _write_report(environment: Any, **_kwargs: Any) -> None:
+    report = {
+        "base_url": base_url,
+        "profile": os.environ.get("LOAD_PROFILE"),
+        "counters": dict(_counters),
+        "metrics_ms": {
+            metric: {
+                category: _percentiles(values)
+                for category, values in by_category.items()
+                if values
+            }
+            for metric, by_category in _samples.items()
+        },
+    }
+    report_path.parent.mkdir(parents=True, exist_ok=True)
+    report_path.write_text(json.dumps(report, indent=2))
+    logger.info("Wrote streaming report to %s", report_path)
+
+
 class ChatStreamUser(HttpUser):
-    """Simulates a user interacting with the Cloud Run chat API."""
+    """Simulates a registered user chatting over the SSE endpoint."""
 
     wait_time = between(1, 3)
     host = base_url
 
     def on_start(self) -> None:
         self.session_id = None
-        payload = {"user_id": "test-user"}
-        response = self.client.post("/session", json=payload)
+        self.user_id = random.choice(USER_NAMES)
+        response = self.client.post("/session", json={"user_id": self.user_id})
         if response.ok:
             self.session_id = response.json().get("session_id")
-            logger.info("Started session %s", self.session_id)
+            logger.info("Started session %s for %s", self.session_id, self.user_id)
         else:
             logger.error("Failed to create session: %s", response.text)
 
+    def _record(self, name: str, category: str, value_ms: float, response: Any) -> None:
+        _samples[name][category].append(value_ms)
+        _samples[name]["all"].append(value_ms)
+        self.environment.events.request.fire(
+            request_type="SSE",
+            name=f"{stream_path} {name}",
+            response_time=value_ms,
+            response_length=0,
+            response=response,
+            context={"category": category},
+        )
+
+    def _fail(self, response: Any, category: str, reason: str) -> None:
+        _counters["errors"] += 1
+        _counters[f"errors_{category}"] += 1
+        response.failure(reason)
+
     @task
     def chat_stream(self) -> None:
         if not self.session_id:
             return
 
-        headers = {"Content-Type": "application/json"}
-        data = {
-            "session_id": self.session_id,
-            "user_id": "test-user",
-            "message": "Hi!",
-        }
+        category, prompt = _pick_prompt()
+        params = {"session_id": self.session_id, "user_id": self.user_id, "q": prompt}
+        _counters["turns"] += 1
 
-        start_time = time.time()
-        with self.client.post(
+        start = time.perf_counter()
+        first_delta: Optional[float] = None
+        last_delta: Optional[float] = None
+        final_seen = False
+        with self.client.get(
             stream_path,
-            headers=headers,
-            json=data,
+            params=params,
+            headers={"Accept": "text/event-stream"},
             catch_response=True,
-            name="/chat/stream",
+            name=stream_path,
             stream=True,
         ) as response:
-            if response.status_code == 200:
-                events = []
-                has_error = False
-                for line in response.iter_lines():
-                    if line:
-                        line_str = line.decode("utf-8")
-                        events.append(line_str)
-
-                        if "429 Too Many Requests" in line_str:
-                            self.environment.events.request.fire(
-                                request_type="POST",
-                                name=f"{url_path} rate_limited 429s",
-                                response_time=0,
-                                response_length=len(line),
-                                response=response,
-                                context={},
-                            )
-
-                        # Check for error responses in the JSON payload
-                        try:
-                            event_data = json.loads(line_str)
-                            if isinstance(event_data, dict) and "code" in event_data:
-                                # Flag any non-2xx codes as errors
-                                if event_data["code"] >= 400:
-                                    has_error = True
-                                    error_msg = event_data.get(
-                                        "message", "Unknown error"
-                                    )
-                                    response.failure(f"Error in response: {error_msg}")
-                                    logger.error(
-                                        "Received error response: code=%s, message=%s",
-                                        event_data["code"],
-                                        error_msg,
-                                    )
-                        except json.JSONDecodeError:
-                            # If it's not valid JSON, continue processing
-                            pass
-
-                end_time = time.time()
-                total_time = end_time - start_time
-
-                # Only fire success event if no errors were found
-                if not has_error:
-                    self.environment.events.request.fire(
-                        request_type="POST",
-                        name="/chat/stream end",
-                        response_time=total_time * 1000,
-                        response_length=len(events),
-                        response=response,
-                        context={},
-                    )
+            if response.status_code != 200:
+                if response.status_code == 429:
+                    _counters["rate_limited"] += 1
+                self._fail(
+                    response,
+                    category,
+                    f"Unexpected status code: {response.status_code}",
+                )
+                return
+
+            for line in response.iter_lines(chunk_size=None, decode_unicode=True):
+                if not line or not line.startswith("data:"):
+                    continue
+                now = time.perf_counter()
+                payload = line[len("data:") :].strip()
+                if (
+                    "429 Too Many Requests" in payload
+                    or "RESOURCE_EXHAUSTED" in payload
+                ):
+                    _counters["rate_limited"] += 1
+                    self._fail(response, category, "Model rate limited (429)")
+                    return
+                try:
+                    frame = json.loads(payload)
+                except json.JSONDecodeError:
+                    continue
+                if not isinstance(frame, dict):
+                    continue
+                if frame.get("error") or frame.get("code", 0) >= 400:
+                    # The server retries model 429/503s itself; an error frame
+                    # means retries were exhausted or the circuit is open.
+                    if frame.get("code") in (429, 503):
+                        _counters["rate_limited"] += 1
+                    self._fail(response, category, f"Error frame: {frame}")
+                    return
+                if frame.get("delta"):
+                    if first_delta is None or last_delta is None:
+                        first_delta = now
+                        self._record("ttft", category, (now - start) * 1000, response)
+                    else:
+                        self._record(
+                            "inter-delta", category, (now - last_delta) * 1000, response
+                        )
+                    last_delta = now
+                if frame.get("final") is not None:
+                    final_seen = True
+                    if first_delta is None:
+                        # Whole answer arrived in the final frame.
+                        self._record("ttft", category, (now - start) * 1000, response)
+                    self._record("turn", category, (now - start) * 1000, response)
+                    break
+
+            if final_seen:
+                response.success()
             else:
-                response.failure(f"Unexpected status code: {response.status_code}")
+                self._fail(response, category, "Stream ended without a final frame")
+
+
+# ---------------------------------------------------------------------------
+# Load profiles. Locust only picks up a shape class when one is defined, so
+# without LOAD_PROFILE the usual -u/-r/-t flags apply.
+# ---------------------------------------------------------------------------
+
+LOAD_PROFILE = os.environ.get("LOAD_PROFILE", "").lower()
+LOAD_USERS = int(os.environ.get("LOAD_USERS", "20"))
+LOAD_DURATION = int(os.environ.get("LOAD_DURATION", "300"))
+
+
+def profile_users(
+    profile: str, elapsed: float, peak: int, duration: float
+) -> int | None:
+    """Target user count at ``elapsed`` seconds, or None once the profile ends."""
+    if elapsed >= duration:
+        return None
+    if profile == "ramp":
+        return max(1, round(peak * elapsed / duration))
+    if profile == "soak":
+        warmup = min(60.0, duration * 0.1)
+        return max(1, round(peak * min(1.0, elapsed / warmup)))
+    if profile == "spike":
+        base = max(1, peak // 5)
+        in_spike = duration * 0.4 <= elapsed < duration * 0.6
+        return peak if in_spike else base
+    raise ValueError(f"Unknown LOAD_PROFILE {profile!r}; use ramp, soak or spike")
+
+
+if LOAD_PROFILE:
+    profile_users(LOAD_PROFILE, 0, LOAD_USERS, LOAD_DURATION)  # validate early
+
+    class ProfileShape(LoadTestShape):
+        """Ramp, soak or spike profile selected by LOAD_PROFILE."""
+
+        def tick(self) -> Optional[tuple[int, int]]:
+            users = profile_users(
+                LOAD_PROFILE, self.get_run_time(), LOAD_USERS, LOAD_DURATION
+            )
+            if users is None:
+                return None
+            return users, max(1, LOAD_USERS // 10)
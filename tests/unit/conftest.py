@@ -0,0 +1,20 @@
+"""Shared fixtures for unit tests.
+
+Unit tests never talk to Gemini: the agents run on the offline replay
+backend, and a placeholder key lets ``app.agent`` import without Application
+Default Credentials. The conversation journal, the tool store and the
+interaction log go to a temporary directory.
+"""
+
+import os
+import tempfile
+
+os.environ.setdefault("API_KEY", "unit-test-key")
+os.environ.setdefault("LLM_BACKEND", "replay")
+_data = tempfile.mkdtemp()
+os.environ.setdefault(
+    "CONVERSATION_JOURNAL", os.path.join(_data, "conversations.journal")
+)
+os.environ.setdefault("TOOL_BACKEND", "sqlite")
+os.environ.setdefault("TOOL_STORE", os.path.join(_data, "tools.sqlite"))
+os.environ.setdefault("INTERACTION_LOG_DIR", os.path.join(_data, "interactions"))
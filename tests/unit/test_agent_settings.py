@@ -0,0 +1,159 @@
+"""Tests for per-agent model settings and adaptive routing."""
+
+import json
+from pathlib import Path
+from typing import AsyncGenerator, ClassVar
+
+import pytest
+from google.adk.models.base_llm import BaseLlm
+from google.adk.models.llm_request import LlmRequest
+from google.adk.models.llm_response import LlmResponse
+from google.adk.models.registry import LLMRegistry
+from google.genai import types
+
+from app.agents.adaptive_model import AdaptiveRoutingLlm
+from app.agents.config import agent_settings
+
+
+def test_router_defaults_to_small_model_with_budget() -> None:
+    settings = agent_settings("root_agent", environ={})
+    config = settings.generate_content_config()
+    assert settings.model == "gemini-2.5-flash"
+    assert config is not None and config.thinking_config is not None
+    assert config.max_output_tokens == 1024
+    assert config.thinking_config.thinking_budget == 0
+
+
+def test_env_overrides_file_overrides_defaults(tmp_path: Path) -> None:
+    path = tmp_path / "agents.json"
+    path.write_text(
+        json.dumps({"service_agent": {"model": "file-model", "temperature": 0.3}})
+    )
+    settings = agent_settings(
+        "service_agent",
+        environ={
+            "SERVICE_AGENT_TEMPERATURE": "0.1",
+            "SERVICE_AGENT_MAX_OUTPUT_TOKENS": "256",
+        },
+        settings_file=str(path),
+    )
+    assert settings.model == "file-model"
+    assert settings.temperature == 0.1
+    assert settings.max_output_tokens == 256
+    assert settings.thinking_budget is None
+
+
+def test_none_clears_default_budget() -> None:
+    settings = agent_settings(
+        "root_agent", environ={"ROOT_AGENT_THINKING_BUDGET": "none"}
+    )
+    assert settings.thinking_budget is None
+
+
+def test_unknown_setting_in_file_is_rejected(tmp_path: Path) -> None:
+    path = tmp_path / "agents.json"
+    path.write_text(json.dumps({"root_agent": {"top_k": 3}}))
+    with pytest.raises(ValueError):
+        agent_settings("root_agent", environ={}, settings_file=str(path))
+
+
+class _ScriptedLlm(BaseLlm):
+    calls: ClassVar[list[str]] = []
+    configs: ClassVar[list[types.GenerateContentConfig]] = []
+    logprobs: ClassVar[dict[str, float]] = {}
+
+    @classmethod
+    def supported_models(cls) -> list[str]:
+        return [r"scripted-.*"]
+
+    async def generate_content_async(
+        self, llm_request: LlmRequest, stream: bool = False
+    ) -> AsyncGenerator[LlmResponse, None]:
+        type(self).calls.append(self.model)
+        type(self).configs.append(llm_request.config)
+        yield LlmResponse(
+            content=types.Content(role="model", parts=[types.Part(text=self.model)]),
+            avg_logprobs=type(self).logprobs.get(self.model),
+        )
+
+
+@pytest.fixture
+def scripted_llm() -> type[_ScriptedLlm]:
+    LLMRegistry.register(_ScriptedLlm)
+    _ScriptedLlm.calls = []
+    _ScriptedLlm.configs = []
+    _ScriptedLlm.logprobs = {}
+    return _ScriptedLlm
+
+
+async def _texts(llm: BaseLlm) -> list[str]:
+    request = LlmRequest(
+        contents=[types.Content(role="user", parts=[types.Part(text="hi")])]
+    )
+    return [
+        r.content.parts[0].text or ""
+        async for r in llm.generate_content_async(request)
+        if r.content and r.content.parts
+    ]
+
+
+@pytest.mark.asyncio
+async def test_confident_router_is_not_escalated(
+    scripted_llm: type[_ScriptedLlm],
+) -> None:
+    scripted_llm.logprobs = {"scripted-small": -0.05}
+    llm = AdaptiveRoutingLlm(model="scripted-small", escalation_model="scripted-large")
+    assert await _texts(llm) == ["scripted-small"]
+    assert scripted_llm.calls == ["scripted-small"]
+    assert llm.escalations == 0
+
+
+@pytest.mark.asyncio
+async def test_low_confidence_router_escalates(
+    scripted_llm: type[_ScriptedLlm],
+) -> None:
+    scripted_llm.logprobs = {"scripted-small": -2.0}
+    llm = AdaptiveRoutingLlm(model="scripted-small", escalation_model="scripted-large")
+    assert await _texts(llm) == ["scripted-large"]
+    assert scripted_llm.calls == ["scripted-small", "scripted-large"]
+    assert llm.escalations == 1
+
+
+@pytest.mark.asyncio
+async def test_escalation_uses_escalation_model_settings(
+    scripted_llm: type[_ScriptedLlm],
+) -> None:
+    scripted_llm.logprobs = {"scripted-small": -2.0}
+    router = agent_settings("root_agent", environ={})
+    escalation = agent_settings(
+        "router_escalation",
+        environ={
+            "ROUTER_ESCALATION_MODEL": "scripted-large",
+            "ROUTER_ESCALATION_MAX_OUTPUT_TOKENS": "4096",
+        },
+    )
+    llm = AdaptiveRoutingLlm(
+        model="scripted-small",
+        escalation_model=escalation.model,
+        escalation_config=escalation.generate_content_config(),
+    )
+    config = router.generate_content_config()
+    assert config is not None
+    config.system_instruction = "Route the user."
+    request = LlmRequest(
+        contents=[types.Content(role="user", parts=[types.Part(text="hi")])],
+        config=config,
+    )
+    _ = [r async for r in llm.generate_content_async(request)]
+
+    primary, escalated = scripted_llm.configs
+    assert primary.thinking_config is not None
+    assert primary.thinking_config.thinking_budget == 0
+    assert primary.max_output_tokens == 1024
+    assert escalated.thinking_config is None
+    assert escalated.max_output_tokens == 4096
+    assert escalated.temperature is None
+    assert escalated.system_instruction == "Route the user."
+    # The caller's request is left untouched.
+    assert config.thinking_config is not None
+    assert config.thinking_config.thinking_budget == 0
@@ -0,0 +1,173 @@
+"""Tests for token accounting and per-user budgets."""
+
+from types import SimpleNamespace
+from typing import Any
+
+import httpx
+import pytest
+from google.adk.models.llm_request import LlmRequest
+from google.genai import types as genai_types
+
+from app import web_server
+from app.agents.budgets import BudgetPlugin, BudgetPolicy, UsageLedger
+from app.agents.state import update_session_state
+
+
+def test_ledger_aggregates_turns_and_rolls_user_windows() -> None:
+    now = [0.0]
+    ledger = UsageLedger(window_s=100, clock=lambda: now[0])
+    turn = ledger.record(
+        "s1",
+        "bob",
+        {
+            "root_agent": {"prompt": 10, "candidates": 2, "thoughts": 0},
+            "service_agent": {"prompt": 20, "candidates": 5, "thoughts": 3},
+        },
+    )
+    ledger.record(
+        "s2", "bob", {"service_agent": {"prompt": 7, "candidates": 1, "thoughts": 0}}
+    )
+
+    assert turn["total"] == 40 and turn["agents"]["service_agent"]["total"] == 28
+    session = ledger.session("s1")
+    assert session is not None
+    assert session["agents"]["root_agent"] == {
+        "prompt": 10,
+        "candidates": 2,
+        "thoughts": 0,
+        "total": 12,
+    }
+    assert ledger.user("bob") == {
+        "user_id": "bob",
+        "turns": 2,
+        "sessions": 2,
+        "tokens": {"prompt": 37, "candidates": 8, "thoughts": 3, "total": 48},
+    }
+    assert ledger.agents()["service_agent"]["total"] == 36
+
+    policy = BudgetPolicy(user_budget=1000, user_budgets={"bob": 45}, session_budget=30)
+    assert policy.exceeded(ledger, user_id="bob") == "user"
+    assert policy.exceeded(ledger, user_id="alice", session_id="s1") == "session"
+    now[0] = 150.0  # next window: bob's window spend resets, lifetime totals do not
+    assert ledger.window_tokens("bob") == 0
+    assert policy.exceeded(ledger, user_id="bob", session_id="s2") is None
+    assert policy.status(ledger, user_id="bob")["user_remaining"] == 45
+
+
+@pytest.mark.asyncio
+async def test_plugin_downgrades_or_answers_from_the_check() -> None:
+    ledger = UsageLedger()
+    ledger.record("s1", "bob", {"service_agent": {"prompt": 50}})
+    update_session_state(
+        "s1",
+        report_name="Present Day",
+        entitlement_check={
+            "status": "included",
+            "current_plan": "SILVER",
+            "lowest_plan": "BRONZE",
+        },
+    )
+
+    def context(agent_name: str, user_id: str = "bob") -> Any:
+        return SimpleNamespace(
+            session=SimpleNamespace(id="s1"),
+            user_id=user_id,
+            agent_name=agent_name,
+            _invocation_context=SimpleNamespace(branch=None),
+        )
+
+    def request() -> LlmRequest:
+        return LlmRequest(
+            model="gemini-2.5-pro",
+            config=genai_types.GenerateContentConfig(
+                thinking_config=genai_types.ThinkingConfig(thinking_budget=512)
+            ),
+        )
+
+    downgrade = BudgetPlugin(BudgetPolicy(user_budget=40, model="cheap-model"), ledger)
+    under = request()
+    assert (
+        await downgrade.before_model_callback(
+            callback_context=context("service_agent", "alice"), llm_request=under
+        )
+        is None
+    )
+    assert under.model == "gemini-2.5-pro"
+    over = request()
+    await downgrade.before_model_callback(
+        callback_context=context("service_agent"), llm_request=over
+    )
+    assert over.model == "cheap-model" and over.config.thinking_config is None
+
+    deterministic = BudgetPlugin(
+        BudgetPolicy(session_budget=40, action="deterministic"), ledger
+    )
+    reply = await deterministic.before_model_callback(
+        callback_context=context("service_agent"), llm_request=request()
+    )
+    assert reply is not None and reply.content and reply.content.parts
+    assert (reply.content.parts[0].text or "").startswith(
+        "Present Day is included in your SILVER plan"
+    )
+    # The router still decides; a mismatched agent falls back to the downgrade.
+    routed = request()
+    await deterministic.before_model_callback(
+        callback_context=context("root_agent"), llm_request=routed
+    )
+    assert routed.model == "gemini-2.5-flash-lite"
+
+
+@pytest.mark.asyncio
+async def test_turn_usage_in_history_and_usage_endpoints(
+    monkeypatch: pytest.MonkeyPatch,
+) -> None:
+    policy = BudgetPolicy(session_budget=1, action="deterministic")
+    monkeypatch.setattr(web_server, "token_budget", policy)
+    monkeypatch.setattr(web_server.adk_app, "plugins", [BudgetPlugin(policy)])
+    transport = httpx.ASGITransport(app=web_server.app)
+    async with httpx.AsyncClient(transport=transport, base_url="http://test") as client:
+        session_id = (await client.post("/session", json={"user_id": "bob"})).json()[
+            "session_id"
+        ]
+
+        async def turn(message: str) -> str:
+            resp = await client.post(
+                "/chat",
+                json={"session_id": session_id, "user_id": "bob", "message": message},
+            )
+            assert resp.status_code == 200
+            return resp.json()["answer"]
+
+        await turn("Do I have Wire tracking detail?")
+        # Over the session budget: answered from the entitlement check.
+        second = await turn("What about ACH Inbound detail?")
+        history = (
+            await client.get("/history", params={"session_id": session_id})
+        ).json()
+        session_usage = (
+            await client.get("/usage", params={"session_id": session_id})
+        ).json()
+        user_usage = (await client.get("/usage", params={"user_id": "bob"})).json()
+        assert (await client.get("/usage")).status_code == 400
+        assert (
+            await client.get("/usage", params={"session_id": "nope"})
+        ).status_code == 404
+        admin = (await client.get("/admin/usage")).json()
+
+    assert second.startswith("ACH Inbound detail is not included in your SILVER plan")
+    first_usage, second_usage = [
+        m["usage"] for m in history["messages"] if m["role"] == "assistant"
+    ]
+    assert first_usage["total"] > 0 and "recommendation_agent" in first_usage["agents"]
+    assert (
+        second_usage["agents"].get("recommendation_agent", {"total": 0})["total"] == 0
+    )
+    assert session_usage["turns"] == 2
+    assert (
+        session_usage["tokens"]["total"] == first_usage["total"] + second_usage["total"]
+    )
+    assert session_usage["budget"]["over"] == "session"
+    assert session_usage["budget"]["session_remaining"] == 0
+    assert user_usage["tokens"]["total"] >= session_usage["tokens"]["total"]
+    assert admin["budget"]["deterministic"] >= 1
+    assert "recommendation_agent" in admin["agents"]
@@ -0,0 +1,147 @@
+"""Tests for conversation windowing and the rolling summary."""
+
+import json
+from typing import Sequence
+
+import httpx
+import pytest
+from google.genai import types
+
+from app import web_server
+from app.agents.context_window import (
+    ContextPolicy,
+    content_tokens,
+    split_turns,
+    window_contents,
+)
+from app.agents.state import get_session_state, init_session_state
+
+
+def _user(text: str) -> types.Content:
+    blob = json.dumps({"session_state": {"current_plan": "GOLD", "notes": "x" * 400}})
+    return types.Content(
+        role="user", parts=[types.Part(text=text), types.Part(text=blob)]
+    )
+
+
+def _turn(i: int) -> list[types.Content]:
+    return [
+        _user(f"question {i}"),
+        types.Content(
+            role="model",
+            parts=[
+                types.Part(
+                    function_call=types.FunctionCall(
+                        name="check_entitlement", args={"report": "Present Day"}
+                    )
+                )
+            ],
+        ),
+        types.Content(
+            role="user",
+            parts=[
+                types.Part(
+                    function_response=types.FunctionResponse(
+                        name="check_entitlement",
+                        response={"status": "included", "detail": "y" * 400},
+                    )
+                )
+            ],
+        ),
+        types.Content(
+            role="user",
+            parts=[
+                types.Part(text="For context:"),
+                types.Part(
+                    text="[root_agent] called tool `transfer_to_agent` with parameters: {}"
+                ),
+                types.Part(text=f"[service_agent] said: answer {i}"),
+            ],
+        ),
+    ]
+
+
+def _conversation(turns: int) -> list[types.Content]:
+    return [c for i in range(turns) for c in _turn(i)]
+
+
+def _texts(contents: Sequence[types.Content]) -> list[str]:
+    return [p.text for c in contents for p in c.parts or [] if p.text]
+
+
+def test_split_turns_starts_at_user_messages() -> None:
+    turns = split_turns(_conversation(3))
+    assert len(turns) == 3
+    assert all(_texts(t)[0].startswith("question") for t in turns)
+
+
+def test_window_keeps_recent_turns_and_summarizes_the_rest() -> None:
+    session_id = "ctx-window"
+    init_session_state(session_id)
+    contents = _conversation(10)
+    windowed = window_contents(session_id, contents, ContextPolicy(max_turns=2))
+
+    texts = _texts(windowed)
+    assert texts[1].startswith("Summary of earlier conversation:")
+    assert "- User: question 0 / Assistant: answer 0" in texts[1]
+    assert "question 8" in texts and "question 9" in texts
+    assert "question 6" not in texts
+    # Finished turns lose state blobs and tool payloads; the current turn keeps them.
+    current = split_turns(windowed)[-1]
+    assert current == split_turns(contents)[-1]
+    finished = windowed[1 : -len(current)]
+    assert not any(
+        p.function_call or p.function_response for c in finished for p in c.parts or []
+    )
+    assert not any(t.startswith('{"session_state"') for t in _texts(finished))
+
+    state = get_session_state(session_id)
+    assert state["summarized_turns"] == 7
+    assert "question 6" in state["conversation_summary"]
+
+
+def test_token_budget_folds_extra_turns_and_stays_bounded() -> None:
+    policy = ContextPolicy(max_turns=6, max_input_tokens=600, summary_tokens=120)
+    sizes = []
+    for turns in (5, 20, 80):
+        session_id = f"ctx-budget-{turns}"
+        init_session_state(session_id)
+        windowed = window_contents(session_id, _conversation(turns), policy)
+        sizes.append(content_tokens(windowed))
+    full = content_tokens(_conversation(80))
+    assert max(sizes) <= 600 < full
+    assert sizes[1] == pytest.approx(sizes[2], rel=0.2)
+
+
+def test_summary_is_rolling_across_calls() -> None:
+    session_id = "ctx-rolling"
+    init_session_state(session_id)
+    policy = ContextPolicy(max_turns=1)
+    window_contents(session_id, _conversation(4), policy)
+    assert get_session_state(session_id)["summarized_turns"] == 2
+    window_contents(session_id, _conversation(6), policy)
+    state = get_session_state(session_id)
+    assert state["summarized_turns"] == 4
+    assert state["conversation_summary"].count("- User:") == 4
+
+
+@pytest.mark.asyncio
+async def test_long_chat_gets_summarized() -> None:
+    transport = httpx.ASGITransport(app=web_server.app)
+    async with httpx.AsyncClient(transport=transport, base_url="http://test") as client:
+        session_id = (await client.post("/session", json={"user_id": "alice"})).json()[
+            "session_id"
+        ]
+        for i in range(7):
+            resp = await client.post(
+                "/chat",
+                json={
+                    "session_id": session_id,
+                    "user_id": "alice",
+                    "message": f"hello {i}",
+                },
+            )
+            assert resp.status_code == 200
+    state = get_session_state(session_id)
+    assert state["summarized_turns"] >= 2
+    assert "conversation_summary" not in web_server.dynamic_state(state)
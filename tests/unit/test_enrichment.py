@@ -0,0 +1,94 @@
+"""Tests for pre-turn entitlement enrichment."""
+
+import json
+from types import SimpleNamespace
+from typing import Any, Iterator
+
+import httpx
+import pytest
+
+from app import web_server
+from app.agents import enrichment, stores
+from app.agents.enrichment import enrich_turn
+from app.agents.state import get_session_state, init_session_state
+from app.agents.user_registry import get_user_profile
+
+
+@pytest.mark.asyncio
+async def test_enrichment_checks_every_named_report() -> None:
+    init_session_state("enrich-multi", user_profile=get_user_profile("bob"))
+    updates = await enrich_turn(
+        "enrich-multi",
+        "Do I get ACH Inbound detail, Wire tracking detail and Present Day?",
+    )
+    checks = {c["report"]: c["status"] for c in updates["entitlement_checks"]}
+    assert checks == {
+        "ACH Inbound detail": "optional",
+        "Wire tracking detail": "optional",
+        "Present Day": "optional",
+    }
+    state = get_session_state("enrich-multi")
+    assert state["entitlement_check"]["canonical_report"] == "ach inbound detail"
+    assert state["current_plan"] == "SILVER"
+
+
+@pytest.mark.asyncio
+async def test_turn_without_report_keeps_previous_facts() -> None:
+    init_session_state("enrich-keep", user_profile=get_user_profile("alice"))
+    await enrich_turn("enrich-keep", "Can I download the Present Day report?")
+    assert await enrich_turn("enrich-keep", "How much does it cost?") == {}
+    assert get_session_state("enrich-keep")["report_name"] == "Present Day"
+
+
+@pytest.mark.asyncio
+async def test_enrichment_reads_the_tools_catalog(
+    monkeypatch: pytest.MonkeyPatch,
+) -> None:
+    init_session_state("enrich-store", user_profile=get_user_profile("charlie"))
+    pool = stores.get_backends().pool
+    pool.run_sync(
+        lambda c: c.execute(
+            "UPDATE catalog SET lowest_plan = 'GOLD' WHERE report_key = 'track'"
+        )
+    )
+    try:
+        monkeypatch.setattr(enrichment, "TOOL_BACKEND", "sqlite")
+        updates = await enrich_turn("enrich-store", "Is Track included?")
+        assert updates["entitlement_check"]["lowest_plan"] == "GOLD"
+        monkeypatch.setattr(enrichment, "TOOL_BACKEND", "memory")
+        updates = await enrich_turn("enrich-store", "Is Track included?")
+        assert updates["entitlement_check"]["lowest_plan"] == "BRONZE"
+    finally:
+        pool.run_sync(stores._seed)
+
+
+@pytest.mark.asyncio
+async def test_runner_receives_precomputed_check(
+    monkeypatch: pytest.MonkeyPatch,
+) -> None:
+    seen: list[dict[str, Any]] = []
+
+    class _CapturingRunner:
+        def run(self, *, new_message: Any, **_: Any) -> Iterator[Any]:
+            seen.append(json.loads(new_message.parts[1].text)["session_state"])
+            yield SimpleNamespace(
+                content=SimpleNamespace(parts=[SimpleNamespace(text="ok")])
+            )
+
+    monkeypatch.setattr(web_server, "_runner", _CapturingRunner)
+    transport = httpx.ASGITransport(app=web_server.app)
+    async with httpx.AsyncClient(transport=transport, base_url="http://test") as client:
+        session_id = (
+            await client.post("/session", json={"user_id": "charlie"})
+        ).json()["session_id"]
+        await client.post(
+            "/chat",
+            json={
+                "session_id": session_id,
+                "user_id": "charlie",
+                "message": "Is Track included?",
+            },
+        )
+
+    assert seen[0]["entitlement_check"]["status"] == "included"
+    assert seen[0]["report_name"] == "Track"
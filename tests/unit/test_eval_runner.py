@@ -0,0 +1,126 @@
+"""Tests for the command-line evaluation runner."""
+
+import json
+import os
+import subprocess
+import sys
+from pathlib import Path
+
+import pytest
+
+from app.app_utils import eval_runner
+
+CASES = [
+    {
+        "id": "wire-silver",
+        "user": "bob",
+        "turns": [
+            {
+                "message": "Do I have Wire tracking detail?",
+                "expect": {"agent": "recommendation_agent", "status": "optional"},
+            }
+        ],
+    },
+    {
+        "id": "multi-report",
+        "user": "bob",
+        "turns": [
+            {
+                "message": "Do I get ACH Inbound detail and Track?",
+                "expect": {"agent": "fanout_agent", "status": ["optional", "included"]},
+            }
+        ],
+    },
+    {
+        "id": "wrong-expectation",
+        "user": "alice",
+        "turns": [
+            {
+                "message": "Do I have Wire tracking detail?",
+                "expect": {"agent": "action_agent"},
+            },
+            {"message": "And Present Day?", "expect": {"status": "included"}},
+        ],
+    },
+]
+
+
+@pytest.mark.asyncio
+async def test_run_scores_routing_and_entitlements(tmp_path: Path) -> None:
+    dataset = tmp_path / "cases.jsonl"
+    dataset.write_text("\n".join(json.dumps(case) for case in CASES) + "\n\n")
+    results = await eval_runner.run_eval(
+        eval_runner.load_cases(dataset),
+        concurrency=2,
+        cache_path=str(tmp_path / "cache.json"),
+    )
+    summary = eval_runner.summarize(results)
+
+    assert [r["id"] for r in results] == [
+        "wire-silver",
+        "multi-report",
+        "wrong-expectation",
+    ]
+    assert summary["routing_accuracy"] == pytest.approx(2 / 3)
+    assert summary["entitlement_accuracy"] == 1.0
+    assert summary["misses"] == [
+        {
+            "id": "wrong-expectation",
+            "turn": 0,
+            "expected": {"agent": "action_agent"},
+            "got": {"agent": "service_agent", "status": ["included"]},
+        }
+    ]
+    turn = results[0]["turns"][0]
+    assert turn["model_calls"] >= 1 and turn["tokens"]["prompt"] > 0
+    assert turn["latency_ms"] >= turn["ttft_ms"] > 0
+
+
+@pytest.mark.asyncio
+async def test_unchanged_cases_come_from_the_cache(
+    tmp_path: Path, monkeypatch: pytest.MonkeyPatch
+) -> None:
+    cache = str(tmp_path / "cache.json")
+    first = await eval_runner.run_eval(CASES[:2], cache_path=cache)
+    assert not any(r["cached"] for r in first)
+
+    edited = [
+        CASES[0],
+        {**CASES[1], "turns": [{"message": "Do I get Track and Image?"}]},
+    ]
+    second = await eval_runner.run_eval(edited, cache_path=cache)
+    assert [r["cached"] for r in second] == [True, False]
+    assert second[0]["turns"] == first[0]["turns"]
+
+    monkeypatch.setattr(eval_runner, "catalog_version", lambda: "new-catalog")
+    third = await eval_runner.run_eval(edited, cache_path=cache)
+    assert not any(r["cached"] for r in third)
+
+
+def test_cli_keeps_its_data_out_of_the_server_paths(tmp_path: Path) -> None:
+    dataset = tmp_path / "cases.jsonl"
+    dataset.write_text(json.dumps(CASES[0]) + "\n")
+    server, isolated = tmp_path / "server", tmp_path / "eval"
+    env = {
+        **os.environ,
+        "CONVERSATION_JOURNAL": str(server / "conversations.journal"),
+        "TOOL_STORE": str(server / "tools.sqlite"),
+        "INTERACTION_LOG_DIR": str(server / "interactions"),
+    }
+    subprocess.run(
+        [
+            sys.executable,
+            "-m",
+            "app.app_utils.eval_runner",
+            str(dataset),
+            "--no-cache",
+            "--data-dir",
+            str(isolated),
+        ],
+        env=env,
+        check=True,
+        capture_output=True,
+    )
+    assert not server.exists()
+    assert (isolated / "tools.sqlite").exists()
+    assert (isolated / "conversations.journal").exists()
@@ -0,0 +1,89 @@
+"""Tests for concurrent multi-report answers."""
+
+import time
+from typing import AsyncGenerator, List
+
+import httpx
+import pytest
+from google.adk.models.llm_request import LlmRequest
+from google.adk.models.llm_response import LlmResponse
+from pydantic import PrivateAttr
+
+from app import agent as agent_module
+from app import web_server
+from app.agents.offline_model import ReplayLlm, ReplayProfile
+from app.agents.router import FANOUT_AGENT, route
+from app.agents.user_registry import get_user_profile
+
+MULTI = "Do I get ACH Inbound detail, Wire tracking detail and Present Day?"
+
+
+class SlowLlm(ReplayLlm):
+    """Replay model that keeps the system prompt of every call."""
+
+    _systems: List[str] = PrivateAttr(default_factory=list)
+
+    async def generate_content_async(
+        self, llm_request: LlmRequest, stream: bool = False
+    ) -> AsyncGenerator[LlmResponse, None]:
+        assert llm_request.config is not None
+        self._systems.append(str(llm_request.config.system_instruction))
+        async for response in super().generate_content_async(
+            llm_request, stream=stream
+        ):
+            yield response
+
+
+def test_multi_report_turn_routes_to_fan_out_with_every_check() -> None:
+    decision = route(MULTI, {"user_profile": get_user_profile("charlie")}, fan_out=True)
+    assert decision is not None and decision.agent_name == FANOUT_AGENT
+    checks = decision.state_updates["entitlement_checks"]
+    assert [c["report"] for c in checks] == [
+        "ACH Inbound detail",
+        "Wire tracking detail",
+        "Present Day",
+    ]
+    assert all(c["current_plan"] == "BRONZE" for c in checks)
+    assert route(MULTI, {"user_profile": get_user_profile("charlie")}) is None
+
+
+@pytest.mark.asyncio
+async def test_reports_are_answered_concurrently_in_one_reply(
+    monkeypatch: pytest.MonkeyPatch,
+) -> None:
+    delay = ReplayProfile(ttft_ms=300)
+    models = {
+        name: SlowLlm(model="replay", agent_name=name, profile=delay)
+        for name in ("service_agent", "recommendation_agent")
+    }
+    for name, model in models.items():
+        monkeypatch.setattr(getattr(agent_module, name), "model", model)
+
+    async def ask(client: httpx.AsyncClient, user: str, message: str) -> tuple:
+        session_id = (await client.post("/session", json={"user_id": user})).json()[
+            "session_id"
+        ]
+        start = time.perf_counter()
+        resp = await client.post(
+            "/chat",
+            json={"session_id": session_id, "user_id": user, "message": message},
+        )
+        return resp.json()["answer"], time.perf_counter() - start
+
+    transport = httpx.ASGITransport(app=web_server.app)
+    async with httpx.AsyncClient(transport=transport, base_url="http://test") as client:
+        _, single = await ask(client, "bob", "Do I have Wire tracking detail?")
+        answer, multi = await ask(client, "bob", MULTI)
+
+    replies = answer.split("\n\n")
+    assert len(replies) == 3
+    assert all(r.startswith("[offline ") for r in replies)
+    assert multi < single + 0.25  # three 300 ms branches, not 900 ms in sequence
+    focused = [
+        s for m in models.values() for s in m._systems if "Answer only about" in s
+    ]
+    assert sorted(s.split("Answer only about ")[1].split(":")[0] for s in focused) == [
+        "ACH Inbound detail",
+        "Present Day",
+        "Wire tracking detail",
+    ]
@@ -0,0 +1,140 @@
+"""Tests for the batched interaction log and the feedback endpoint."""
+
+import json
+import threading
+import time
+from pathlib import Path
+from typing import Any, Dict, List
+
+import httpx
+import pyarrow.parquet as pq
+import pytest
+
+from app import web_server
+from app.app_utils.interaction_log import (
+    InteractionLog,
+    ParquetSink,
+    RotatingJsonlSink,
+)
+
+
+class RecordingSink:
+    def __init__(self, fail: int = 0) -> None:
+        self.batches: List[List[Dict[str, Any]]] = []
+        self.fail = fail
+        self.gate = threading.Event()
+        self.gate.set()
+
+    def write(self, records: List[Dict[str, Any]]) -> None:
+        self.gate.wait()
+        if self.fail:
+            self.fail -= 1
+            raise ConnectionError("remote sink unavailable")
+        self.batches.append(records)
+
+    def close(self) -> None:
+        pass
+
+
+def test_batches_are_bounded_by_size_and_time() -> None:
+    sink = RecordingSink()
+    log = InteractionLog(sink, batch_size=3, flush_interval_s=0.05)
+    for i in range(7):
+        assert log.emit({"type": "turn", "n": i})
+    assert log.flush(timeout=2)
+    assert [len(b) for b in sink.batches] == [3, 3, 1]
+    assert [r["n"] for b in sink.batches for r in b] == list(range(7))
+
+    log.emit({"type": "turn", "n": 7})
+    time.sleep(0.3)  # under the batch size: written once the interval passes
+    assert [r["n"] for r in sink.batches[-1]] == [7]
+    log.close()
+    assert log.snapshot()["written"] == 8
+
+
+def test_full_queue_drops_instead_of_blocking() -> None:
+    sink = RecordingSink(fail=1)
+    sink.gate.clear()  # the sink is stuck
+    log = InteractionLog(
+        sink, max_queue=4, batch_size=2, flush_interval_s=0, retry_backoff_s=0
+    )
+    accepted = [log.emit({"type": "turn", "n": i}) for i in range(10)]
+    assert accepted.count(False) >= 4
+    sink.gate.set()
+    assert log.flush(timeout=2)
+    stats = log.snapshot()
+    assert stats["dropped_full"] == accepted.count(False)
+    assert stats["sink_errors"] == 1  # the first batch was retried, not lost
+    assert stats["written"] == accepted.count(True)
+    log.close()
+
+
+def test_rotating_sinks(tmp_path: Path) -> None:
+    jsonl = RotatingJsonlSink(tmp_path / "jsonl", max_bytes=200, backups=2)
+    for i in range(10):
+        jsonl.write([{"type": "turn", "n": i, "pad": "x" * 40}])
+    jsonl.close()
+    files = sorted(p.name for p in (tmp_path / "jsonl").iterdir())
+    assert files == [
+        "interactions.jsonl",
+        "interactions.jsonl.1",
+        "interactions.jsonl.2",
+    ]
+    last = (tmp_path / "jsonl" / "interactions.jsonl").read_text().splitlines()
+    assert json.loads(last[-1])["n"] == 9
+
+    parquet = ParquetSink(tmp_path / "parquet", max_bytes=1, backups=2)
+    for i in range(3):
+        parquet.write([{"ts": 1.0, "type": "feedback", "session_id": "s", "n": i}])
+    parquet.close()
+    parquet_files = sorted((tmp_path / "parquet").glob("*.parquet"))
+    assert [p.name for p in parquet_files] == [
+        "interactions-000001.parquet",
+        "interactions-000002.parquet",
+    ]
+    row = pq.read_table(parquet_files[-1]).to_pylist()[0]
+    assert row["type"] == "feedback" and json.loads(row["payload"])["n"] == 2
+
+
+@pytest.mark.asyncio
+async def test_feedback_and_turns_reach_the_log(
+    monkeypatch: pytest.MonkeyPatch,
+) -> None:
+    sink = RecordingSink()
+    log = InteractionLog(sink, flush_interval_s=0.01)
+    monkeypatch.setattr(web_server, "interaction_log", log)
+    transport = httpx.ASGITransport(app=web_server.app)
+    async with httpx.AsyncClient(transport=transport, base_url="http://test") as client:
+        session_id = (await client.post("/session", json={"user_id": "bob"})).json()[
+            "session_id"
+        ]
+        await client.post(
+            "/chat",
+            json={
+                "session_id": session_id,
+                "user_id": "bob",
+                "message": "Do I have Track?",
+            },
+        )
+        resp = await client.post(
+            "/feedback",
+            json={
+                "score": 4,
+                "text": "helpful",
+                "user_id": "bob",
+                "session_id": session_id,
+            },
+        )
+        assert resp.status_code == 202
+        assert (
+            await client.post("/feedback", json={"text": "no score"})
+        ).status_code == 422
+        log.flush(timeout=2)
+        stats = (await client.get("/admin/interaction-log")).json()
+    log.close()
+
+    turn, feedback = [r for b in sink.batches for r in b]
+    assert turn["type"] == "turn" and turn["session_id"] == session_id
+    assert turn["tokens"]["total"] > 0 and turn["agent"] == "service_agent"
+    assert feedback["type"] == "feedback" and feedback["score"] == 4 and feedback["ts"]
+    assert stats["enabled"] and stats["written"] == 2 and stats["queued"] == 0
@@ -0,0 +1,138 @@
+"""Tests for the write-behind conversation journal."""
+
+import json
+import os
+from pathlib import Path
+
+import httpx
+import pytest
+
+from app import web_server
+from app.app_utils.journal import ConversationJournal
+
+
+@pytest.fixture
+def path(tmp_path: Path) -> Path:
+    return tmp_path / "conversations.journal"
+
+
+def _fill(journal: ConversationJournal, sessions: int = 3, turns: int = 4) -> None:
+    for s in range(sessions):
+        journal.create(f"s{s}")
+        for t in range(turns):
+            journal.append(f"s{s}", {"role": "user", "content": f"q{t}"})
+            journal.append(f"s{s}", {"role": "assistant", "content": f"a{t} ünïcode"})
+
+
+def test_reads_see_queued_and_written_messages(path: Path) -> None:
+    journal = ConversationJournal(path, sync_interval_s=0)
+    _fill(journal, sessions=1, turns=1)
+    assert [m["content"] for m in journal["s0"]] == [
+        "q0",
+        "a0 ünïcode",
+    ]  # maybe still queued
+    assert journal.flush(timeout=5)
+    journal.append("s0", {"role": "user", "content": "q1"})
+    assert [m["content"] for m in journal["s0"]] == ["q0", "a0 ünïcode", "q1"]
+    journal.close()
+
+
+def test_history_json_splices_raw_payloads(path: Path) -> None:
+    journal = ConversationJournal(path, sync_interval_s=0)
+    _fill(journal, sessions=2, turns=2)
+    journal.flush()
+    body = json.loads(journal.history_json("s1"))
+    assert body["messages"][0] == {"role": "user", "content": "q0"}
+    assert len(body["messages"]) == 4
+    with pytest.raises(KeyError):
+        journal.history_json("missing")
+    journal.close()
+
+
+def test_batches_writes_and_recovers_after_restart(path: Path) -> None:
+    journal = ConversationJournal(path, sync_interval_s=0.01)
+    _fill(journal, sessions=3, turns=20)
+    journal.flush()
+    assert journal.stats["records"] == 120
+    assert journal.stats["fsyncs"] < 120
+    journal.close()
+
+    reopened = ConversationJournal(path)
+    assert reopened.stats["recovered_records"] == 0  # index came from the checkpoint
+    assert len(reopened["s2"]) == 40
+    reopened.close()
+
+
+def test_recovery_without_checkpoint_truncates_torn_tail(path: Path) -> None:
+    journal = ConversationJournal(path, sync_interval_s=0)
+    _fill(journal, sessions=2, turns=2)
+    journal.flush()
+    # Simulate a crash: never closed (no checkpoint), half a record at the end.
+    size = os.path.getsize(path)
+    with open(path, "ab") as fh:
+        fh.write(b"\x40\x00\x00\x00garbage")
+
+    recovered = ConversationJournal(path)
+    assert recovered.stats["recovered_records"] == 8
+    assert recovered.stats["truncated_bytes"] == 11
+    assert os.path.getsize(path) == size
+    assert [m["content"] for m in recovered["s1"]] == [
+        "q0",
+        "a0 ünïcode",
+        "q1",
+        "a1 ünïcode",
+    ]
+    recovered.append("s1", {"role": "user", "content": "after crash"})
+    recovered.close()
+    assert ConversationJournal(path)["s1"][-1]["content"] == "after crash"
+
+
+@pytest.mark.asyncio
+async def test_history_endpoint_serves_journal() -> None:
+    transport = httpx.ASGITransport(app=web_server.app)
+    async with httpx.AsyncClient(transport=transport, base_url="http://test") as client:
+        session_id = (await client.post("/session", json={"user_id": "alice"})).json()[
+            "session_id"
+        ]
+        await client.post(
+            "/chat",
+            json={"session_id": session_id, "user_id": "alice", "message": "hi!"},
+        )
+        resp = await client.get("/history", params={"session_id": session_id})
+    assert resp.status_code == 200
+    messages = resp.json()["messages"]
+    assert [m["role"] for m in messages] == ["user", "assistant"]
+    assert messages[0]["content"] == "hi!"
+
+
+@pytest.mark.asyncio
+async def test_history_only_session_is_gone_for_new_turns() -> None:
+    transport = httpx.ASGITransport(app=web_server.app)
+    async with httpx.AsyncClient(transport=transport, base_url="http://test") as client:
+        session_id = (await client.post("/session", json={"user_id": "alice"})).json()[
+            "session_id"
+        ]
+        await client.post(
+            "/chat",
+            json={"session_id": session_id, "user_id": "alice", "message": "hi!"},
+        )
+        # A restart keeps the journal but loses the in-memory ADK session.
+        await web_server.session_service.delete_session(
+            app_name="web", user_id="alice", session_id=session_id
+        )
+        chat = await client.post(
+            "/chat",
+            json={"session_id": session_id, "user_id": "alice", "message": "again"},
+        )
+        stream = await client.get(
+            "/chat/stream",
+            params={"session_id": session_id, "user_id": "alice", "q": "again"},
+        )
+        unknown = await client.post(
+            "/chat", json={"session_id": "nope", "user_id": "alice", "message": "hi"}
+        )
+        history = await client.get("/history", params={"session_id": session_id})
+    assert chat.status_code == 410
+    assert stream.status_code == 410
+    assert unknown.status_code == 404
+    assert [m["role"] for m in history.json()["messages"]] == ["user", "assistant"]
@@ -0,0 +1,210 @@
+"""Tests for the offline replay / record model backends."""
+
+import json
+import os
+import subprocess
+import sys
+from pathlib import Path
+from typing import Any
+
+import pytest
+from google.adk.agents import Agent
+from google.adk.agents.run_config import RunConfig, StreamingMode
+from google.adk.models.llm_request import LlmRequest
+from google.adk.runners import Runner
+from google.adk.sessions import InMemorySessionService
+from google.genai import errors, types
+
+from app.agents.entitlement_tools import check_entitlement
+from app.agents.offline_model import (
+    RecordingLlm,
+    ReplayLlm,
+    ReplayProfile,
+    request_key,
+    resolve_profile,
+)
+
+PROMPT = "Do I get Present Day?"
+
+
+def _call(name: str, **args: Any) -> dict:
+    return {
+        "content": {
+            "role": "model",
+            "parts": [{"function_call": {"name": name, "args": args}}],
+        }
+    }
+
+
+def _text(text: str) -> dict:
+    return {"content": {"role": "model", "parts": [{"text": text}]}}
+
+
+@pytest.fixture
+def fixtures(tmp_path: Path) -> str:
+    path = tmp_path / "fixtures.jsonl"
+    records = [
+        (
+            "root_agent",
+            0,
+            [_call("check_entitlement", report="Present Day", plan="GOLD")],
+        ),
+        ("root_agent", 1, [_call("transfer_to_agent", agent_name="service_agent")]),
+        ("service_agent", 0, [_text("Present Day is included in your plan.")]),
+    ]
+    path.write_text(
+        "\n".join(
+            json.dumps({"agent": a, "prompt": PROMPT, "step": s, "responses": r})
+            for a, s, r in records
+        )
+    )
+    return str(path)
+
+
+def _graph(fixtures_path: str, profile: ReplayProfile | None = None) -> Agent:
+    def llm(name: str) -> ReplayLlm:
+        return ReplayLlm(
+            model="replay",
+            agent_name=name,
+            fixtures_path=fixtures_path,
+            profile=profile or ReplayProfile(),
+        )
+
+    service = Agent(
+        name="service_agent", model=llm("service_agent"), tools=[check_entitlement]
+    )
+    return Agent(
+        name="root_agent",
+        model=llm("root_agent"),
+        tools=[check_entitlement],
+        sub_agents=[service],
+    )
+
+
+def _run(agent: Agent, text: str, streaming: bool = False) -> list:
+    service = InMemorySessionService()
+    session = service.create_session_sync(user_id="u", app_name="offline")
+    runner = Runner(agent=agent, session_service=service, app_name="offline")
+    mode = StreamingMode.SSE if streaming else StreamingMode.NONE
+    return list(
+        runner.run(
+            new_message=types.Content(
+                role="user", parts=[types.Part.from_text(text=text)]
+            ),
+            user_id="u",
+            session_id=session.id,
+            run_config=RunConfig(streaming_mode=mode),
+        )
+    )
+
+
+def test_replay_drives_tools_and_transfers(fixtures: str) -> None:
+    events = _run(_graph(fixtures), PROMPT)
+    responses = [
+        p.function_response.response
+        for e in events
+        for p in e.content.parts
+        if p.function_response and p.function_response.name == "check_entitlement"
+    ]
+    assert responses[0]["status"] == "included"
+    assert any(e.actions.transfer_to_agent == "service_agent" for e in events)
+    assert events[-1].author == "service_agent"
+    assert events[-1].content.parts[0].text == "Present Day is included in your plan."
+    assert events[-1].usage_metadata.prompt_token_count > 0
+
+
+def test_unmatched_prompt_gets_deterministic_echo(fixtures: str) -> None:
+    events = _run(_graph(fixtures), "Something else")
+    assert events[-1].content.parts[0].text == "[offline root_agent] something else"
+
+
+def test_streaming_is_chunked_by_token_rate(fixtures: str) -> None:
+    profile = ReplayProfile(chunk_tokens=2, tokens_per_s=10_000)
+    events = _run(_graph(fixtures, profile), PROMPT, streaming=True)
+    service_events = [e for e in events if e.author == "service_agent"]
+    assert sum(1 for e in service_events if e.partial) > 1
+    assert not service_events[-1].partial
+
+
+@pytest.mark.asyncio
+async def test_error_injection_raises_api_errors() -> None:
+    llm = ReplayLlm(
+        model="replay",
+        agent_name="root_agent",
+        profile=resolve_profile('overloaded:{"error_rate": 1.0, "seed": 1}'),
+    )
+    request = LlmRequest(
+        contents=[types.Content(role="user", parts=[types.Part(text="hi")])]
+    )
+    with pytest.raises(errors.ServerError) as excinfo:
+        async for _ in llm.generate_content_async(request):
+            pass
+    assert excinfo.value.code == 503
+
+
+def test_request_key_skips_context_and_counts_steps() -> None:
+    request = LlmRequest(
+        contents=[
+            types.Content(
+                role="user",
+                parts=[
+                    types.Part(text="  Do I get  Present Day? "),
+                    types.Part(text="{}"),
+                ],
+            ),
+            types.Content(
+                role="user",
+                parts=[
+                    types.Part(text="For context:"),
+                    types.Part(text="[root_agent] said: hi"),
+                ],
+            ),
+            types.Content(
+                role="user",
+                parts=[
+                    types.Part.from_function_response(
+                        name="check_entitlement", response={}
+                    )
+                ],
+            ),
+        ]
+    )
+    assert request_key(request) == ("do i get present day?", 1)
+
+
+def test_recording_produces_replayable_fixtures(fixtures: str, tmp_path: Path) -> None:
+    recorded = str(tmp_path / "recorded.jsonl")
+
+    def recorder(name: str) -> RecordingLlm:
+        inner = ReplayLlm(model="replay", agent_name=name, fixtures_path=fixtures)
+        return RecordingLlm(
+            model="replay", agent_name=name, inner=inner, fixtures_path=recorded
+        )
+
+    service = Agent(
+        name="service_agent", model=recorder("service_agent"), tools=[check_entitlement]
+    )
+    root = Agent(
+        name="root_agent",
+        model=recorder("root_agent"),
+        tools=[check_entitlement],
+        sub_agents=[service],
+    )
+    live = _run(root, PROMPT)
+    replayed = _run(_graph(recorded), PROMPT)
+    assert [e.author for e in replayed] == [e.author for e in live]
+    assert replayed[-1].content.parts[0].text == live[-1].content.parts[0].text
+
+
+def test_record_mode_requires_explicit_fixtures_path() -> None:
+    env = {**os.environ, "LLM_BACKEND": "record", "API_KEY": "unit-test-key"}
+    env.pop("LLM_FIXTURES", None)
+    result = subprocess.run(
+        [sys.executable, "-c", "import app.agent"],
+        env=env,
+        capture_output=True,
+        text=True,
+        check=False,
+    )
+    assert result.returncode != 0
+    assert "LLM_BACKEND=record needs LLM_FIXTURES" in result.stderr
@@ -0,0 +1,150 @@
+"""Tests for the speculative reply preamble."""
+
+import json
+from typing import Any, Dict, List
+
+import httpx
+import pytest
+from google.adk.events import Event
+from google.genai import types
+
+from app import web_server
+from app.agents.preamble import PREAMBLE_KEY, build_preamble
+from app.agents.prompt_compiler import compile_global_instruction, dynamic_state
+from app.agents.prompts import GLOBAL_INSTRUCTION
+from app.agents.state import get_session_state
+from app.app_utils.turn_events import TurnEvents
+from app.app_utils.turn_streams import TurnStream
+
+
+def test_build_preamble_greets_and_names_reports() -> None:
+    profile = {"user_name": "alice", "data_plan": "GOLD"}
+    state = {"user_profile": profile}
+    assert build_preamble(profile, "Do I have Present Day?", state) == (
+        "Hi Alice! Let me check Present Day on your GOLD plan.\n\n"
+    )
+    assert build_preamble(profile, "Present Day and Wire tracking detail", state) == (
+        "Hi Alice! Let me check Present Day and Wire tracking detail on your GOLD plan.\n\n"
+    )
+    assert build_preamble(profile, "What's the weather?", state) == "Hi Alice!\n\n"
+    assert (
+        build_preamble(None, "Do I have Present Day?", {})
+        == "Let me check Present Day.\n\n"
+    )
+    assert build_preamble(None, "hello", {}) is None
+
+
+def test_global_instruction_tells_agents_to_continue() -> None:
+    state = {PREAMBLE_KEY: "Hi Alice!\n\n"}
+    instruction = compile_global_instruction(GLOBAL_INSTRUCTION, state, catalog=False)
+    assert 'start of your reply: "Hi Alice!" Continue right after it' in instruction
+    assert PREAMBLE_KEY not in dynamic_state(state)
+    assert "start of your reply" not in compile_global_instruction(
+        GLOBAL_INSTRUCTION, {}, catalog=False
+    )
+
+
+@pytest.mark.asyncio
+async def test_stream_sends_preamble_before_the_reply(
+    monkeypatch: pytest.MonkeyPatch,
+) -> None:
+    monkeypatch.setattr(web_server, "SPECULATIVE_PREAMBLE", True)
+    transport = httpx.ASGITransport(app=web_server.app)
+    async with httpx.AsyncClient(transport=transport, base_url="http://test") as client:
+        session_id = (await client.post("/session", json={"user_id": "bob"})).json()[
+            "session_id"
+        ]
+        params = {
+            "session_id": session_id,
+            "user_id": "bob",
+            "q": "Do I have Wire tracking detail?",
+        }
+        async with client.stream("GET", "/chat/stream", params=params) as resp:
+            frames = [
+                json.loads(line[6:])
+                async for line in resp.aiter_lines()
+                if line.startswith("data: ")
+            ]
+        preamble = "Hi Bob! Let me check Wire tracking detail on your SILVER plan.\n\n"
+        assert "turn_id" in frames[0]
+        assert frames[1] == {"delta": preamble}
+        assert frames[-1]["final"].startswith(preamble) and len(
+            frames[-1]["final"]
+        ) > len(preamble)
+        assert get_session_state(session_id)[PREAMBLE_KEY] == preamble
+
+        # /chat replies arrive whole, so they get no preamble.
+        resp = await client.post(
+            "/chat",
+            json={
+                "session_id": session_id,
+                "user_id": "bob",
+                "message": "Do I have Track?",
+            },
+        )
+        assert not resp.json()["answer"].startswith("Hi Bob!")
+        assert get_session_state(session_id)[PREAMBLE_KEY] is None
+
+
+def test_preamble_does_not_count_as_model_ttft() -> None:
+    events = TurnEvents()
+    events.preamble("Hi Bob!\n\n")
+    after_preamble = events.first_text_at
+    events.feed(
+        Event(
+            author="root_agent",
+            partial=True,
+            content=types.Content(role="model", parts=[types.Part(text="Sure.")]),
+        )
+    )
+    assert after_preamble is None
+    assert events.preamble_at is not None and events.first_text_at is not None
+    assert events.first_text_at > events.preamble_at
+    assert events.answer == "Hi Bob!\n\nSure."
+
+
+@pytest.mark.asyncio
+async def test_preamble_is_published_before_enrichment(
+    monkeypatch: pytest.MonkeyPatch,
+) -> None:
+    monkeypatch.setattr(web_server, "SPECULATIVE_PREAMBLE", True)
+    monkeypatch.setattr(web_server, "PRETURN_ENRICHMENT", True)
+    opened: List[TurnStream] = []
+    open_stream = web_server.turn_streams.open
+
+    def record_open(session_id: str) -> TurnStream:
+        opened.append(open_stream(session_id))
+        return opened[-1]
+
+    seen_by_enrichment: List[List[Dict[str, Any]]] = []
+
+    async def enrich(session_id: str, text: str) -> None:
+        seen_by_enrichment.append([json.loads(p) for p, _ in opened[-1].frames])
+
+    turns: List[TurnEvents] = []
+    record_turn = web_server._record_turn
+
+    def spy_record_turn(*args: Any, **kwargs: Any) -> Dict[str, Any]:
+        turns.append(args[2])
+        return record_turn(*args, **kwargs)
+
+    monkeypatch.setattr(web_server.turn_streams, "open", record_open)
+    monkeypatch.setattr(web_server, "enrich_turn", enrich)
+    monkeypatch.setattr(web_server, "_record_turn", spy_record_turn)
+    transport = httpx.ASGITransport(app=web_server.app)
+    async with httpx.AsyncClient(transport=transport, base_url="http://test") as client:
+        session_id = (await client.post("/session", json={"user_id": "bob"})).json()[
+            "session_id"
+        ]
+        params = {"session_id": session_id, "user_id": "bob", "q": "Do I have Track?"}
+        async with client.stream("GET", "/chat/stream", params=params) as resp:
+            frames = [
+                json.loads(line[6:])
+                async for line in resp.aiter_lines()
+                if line.startswith("data: ")
+            ]
+    assert frames[-1]["final"].startswith("Hi Bob!")
+    assert seen_by_enrichment == [frames[:2]]
+    (events,) = turns
+    assert events.preamble_at is not None and events.first_text_at is not None
+    assert events.first_text_at > events.preamble_at
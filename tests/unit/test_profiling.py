@@ -0,0 +1,75 @@
+"""Tests for opt-in turn profiling."""
+
+import time
+
+import httpx
+import pytest
+
+from app import web_server
+from app.app_utils.profiling import TurnProfiler
+
+
+def _busy(ms: float) -> None:
+    end = time.perf_counter() + ms / 1000
+    while time.perf_counter() < end:
+        pass
+
+
+def test_disabled_profiler_never_samples() -> None:
+    profiler = TurnProfiler(enabled=False)
+    profiler.arm(turns=5)
+    assert not profiler.armed
+    with profiler.turn("s", requested=True) as profile:
+        assert profile is None
+    assert profiler.profiles() == []
+
+
+def test_profiles_next_n_turns_and_exports() -> None:
+    profiler = TurnProfiler(enabled=True, interval_s=0.001)
+    profiler.arm(turns=1)
+    with profiler.turn("s1") as profile:
+        _busy(30)
+    with profiler.turn("s2") as skipped:
+        pass
+    assert profile is not None and skipped is None
+
+    assert [p["session_id"] for p in profiler.profiles()] == ["s1"]
+    fetched = profiler.get(profile.id)
+    assert fetched is not None
+    collapsed = fetched.collapsed()
+    assert "_busy (test_profiling.py" in collapsed
+    speedscope = profile.speedscope()
+    frames = [f["name"] for f in speedscope["shared"]["frames"]]
+    assert any(name.startswith("_busy") for name in frames)
+    sampled = speedscope["profiles"][0]
+    assert len(sampled["samples"]) == len(sampled["weights"]) > 0
+
+
+@pytest.mark.asyncio
+async def test_admin_routes(monkeypatch: pytest.MonkeyPatch) -> None:
+    transport = httpx.ASGITransport(app=web_server.app)
+    async with httpx.AsyncClient(transport=transport, base_url="http://test") as client:
+        assert (await client.get("/admin/profiles")).status_code == 404
+
+        monkeypatch.setattr(
+            web_server, "turn_profiler", TurnProfiler(enabled=True, interval_s=0.001)
+        )
+        assert (await client.post("/admin/profile", json={"turns": 1})).json()[
+            "turns"
+        ] == 1
+        session_id = (await client.post("/session", json={"user_id": "alice"})).json()[
+            "session_id"
+        ]
+        resp = await client.post(
+            "/chat",
+            json={"session_id": session_id, "user_id": "alice", "message": "hi!"},
+        )
+        profile_id = resp.headers["X-Profile-Id"]
+        listed = (await client.get("/admin/profiles")).json()["profiles"]
+        assert [p["id"] for p in listed] == [profile_id]
+        collapsed = await client.get(
+            f"/admin/profiles/{profile_id}", params={"format": "collapsed"}
+        )
+        assert collapsed.status_code == 200
+        speedscope = (await client.get(f"/admin/profiles/{profile_id}")).json()
+        assert speedscope["profiles"][0]["type"] == "sampled"
@@ -0,0 +1,94 @@
+"""Tests for the prompt compiler and its token budget check."""
+
+from pathlib import Path
+from types import SimpleNamespace
+from typing import Any
+
+import pytest
+
+from app.agents.prompt_compiler import (
+    DEFAULT_BUDGETS,
+    build_report,
+    catalog_block,
+    check_budgets,
+    dedupe_lines,
+    dynamic_state,
+    instruction_provider,
+    main,
+    render_template,
+    sample_state,
+)
+from app.agents.prompt_sets import available_prompt_sets
+from app.agents.state import init_session_state
+
+
+def test_render_resolves_dotted_placeholders() -> None:
+    state = {"pricing": {"GOLD": 300}, "user_profile": {"user_name": "alice"}}
+    out = render_template(
+        "Gold ${session_state.pricing.GOLD?}, hi {session_state.user_profile.user_name?} "
+        "{session_state.missing?}| {session_state.required}",
+        state,
+    )
+    assert out == "Gold $300, hi alice | {session_state.required}"
+
+
+def test_catalog_lists_are_referenced_not_repeated() -> None:
+    state = sample_state()
+    out = render_template(
+        "{session_state.entitlements.GOLD.included?}", state, catalog_refs=True
+    )
+    assert out == "see reference data (entitlements GOLD included)"
+
+
+def test_catalog_block_encodes_tiers_as_deltas() -> None:
+    block = catalog_block(sample_state())
+    assert "- SILVER included: all of BRONZE + Previous Day combined" in block
+    assert "- PAID add-ons only: ACH Customer Activity" in block
+    assert block.count("Track") == 1
+
+
+def test_dedupe_drops_lines_shared_with_global() -> None:
+    shared = "General:\n- Be concise, accurate, and professional."
+    text = "Rules:\n- be concise,  accurate, and professional.\n- Route carefully."
+    assert dedupe_lines(text, shared) == "Rules:\n- Route carefully."
+
+
+def test_message_state_drops_static_catalog() -> None:
+    state = dynamic_state(sample_state())
+    assert "entitlements" not in state and "pricing" not in state
+    assert state["entitlement_check"]["canonical_report"] == "present day"
+
+
+def test_compiled_prompts_fit_budgets_and_beat_raw() -> None:
+    compiled = build_report()
+    raw = build_report(compiled=False)
+    assert check_budgets(compiled, DEFAULT_BUDGETS) == []
+    for c, r in zip(compiled, raw, strict=True):
+        assert c.message_tokens < r.message_tokens
+        assert c.turn_tokens < r.turn_tokens
+
+
+def test_every_prompt_set_compiles() -> None:
+    assert {"default", "updated-1"} <= set(available_prompt_sets())
+    for name in available_prompt_sets():
+        assert all(r.system_tokens > 0 for r in build_report(prompt_set=name))
+
+
+def test_instruction_provider_reads_session_state() -> None:
+    init_session_state("prompt-test", user_profile={"user_name": "bob"})
+    provider = instruction_provider(
+        "Hello {session_state.user_profile.user_name?}", is_global=True
+    )
+    context: Any = SimpleNamespace(session=SimpleNamespace(id="prompt-test"))
+    text = provider(context)
+    assert text.startswith("Hello bob\n\nReference data")
+
+
+def test_cli_check_fails_over_budget(
+    tmp_path: Path, capsys: pytest.CaptureFixture[str]
+) -> None:
+    budgets = tmp_path / "budgets.json"
+    budgets.write_text('{"root_agent": {"system": 10}}')
+    assert main(["--check", "--budgets", str(budgets)]) == 1
+    assert "root_agent: system" in capsys.readouterr().err
+    assert main(["--check"]) == 0
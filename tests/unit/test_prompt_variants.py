@@ -0,0 +1,98 @@
+"""Tests for prompt variants and their per-variant metrics."""
+
+from types import SimpleNamespace
+from typing import Any, Iterator
+
+import httpx
+import pytest
+
+from app import agent as agent_module
+from app import web_server
+from app.agents.prompt_sets import load_prompt_set
+from app.agents.prompt_variants import (
+    VARIANT_METRICS,
+    PromptVariants,
+    parse_split,
+    prompt_variants,
+)
+
+
+@pytest.fixture
+def split() -> Iterator[PromptVariants]:
+    saved = prompt_variants.split
+    VARIANT_METRICS.reset()
+    yield prompt_variants
+    prompt_variants.set_split(saved)
+    VARIANT_METRICS.reset()
+
+
+def test_parse_split() -> None:
+    assert parse_split("default:90, updated-1:10") == {
+        "default": 90.0,
+        "updated-1": 10.0,
+    }
+    assert parse_split("default,updated-1") == {"default": 1.0, "updated-1": 1.0}
+    with pytest.raises(ValueError, match="Unknown prompt set"):
+        parse_split("default,nope")
+    with pytest.raises(ValueError, match="weights"):
+        parse_split("default:0")
+
+
+@pytest.mark.asyncio
+async def test_sessions_keep_their_variant_and_turns_are_measured(
+    split: PromptVariants,
+) -> None:
+    transport = httpx.ASGITransport(app=web_server.app)
+    async with httpx.AsyncClient(transport=transport, base_url="http://test") as client:
+
+        async def turn(message: str) -> str:
+            session_id = (
+                await client.post("/session", json={"user_id": "bob"})
+            ).json()["session_id"]
+            resp = await client.post(
+                "/chat",
+                json={"session_id": session_id, "user_id": "bob", "message": message},
+            )
+            assert resp.status_code == 200
+            return session_id
+
+        baseline = await turn("Do I have Wire tracking detail?")
+        resp = await client.post(
+            "/admin/prompt-variants", json={"split": {"updated-1": 1}}
+        )
+        assert resp.json() == {"split": {"updated-1": 1.0}, "baseline": "updated-1"}
+        updated = await turn("Do I have Wire tracking detail?")
+        assert (
+            await client.post("/admin/prompt-variants", json={"split": {"x": 1}})
+        ).status_code == 400
+
+        await client.post(
+            "/admin/prompt-variants", json={"split": {"default": 1, "updated-1": 1}}
+        )
+        report = (await client.get("/admin/prompt-variants")).json()
+        text = (
+            await client.get("/admin/prompt-variants", params={"format": "text"})
+        ).text
+
+    assert prompt_variants.variant_for(baseline) == "default"
+    assert prompt_variants.variant_for(updated) == "updated-1"
+    ctx: Any = SimpleNamespace(
+        session=SimpleNamespace(id=updated), agent_name="root_agent"
+    )
+    provider = agent_module.root_agent.instruction
+    assert callable(provider)
+    instruction = provider(ctx)
+    assert isinstance(instruction, str)
+    assert (
+        load_prompt_set("updated-1")["ORCHESTRATOR_INSTRUCTION"].strip().splitlines()[0]
+        in instruction
+    )
+
+    rows = report["variants"]
+    assert set(rows) == {"default", "updated-1"}
+    assert rows["default"]["turns"] == rows["updated-1"]["turns"] == 1
+    assert rows["default"]["model_calls_per_turn"] >= 1
+    assert rows["default"]["tokens_per_turn"] > 0
+    assert rows["updated-1"]["tokens_per_turn"] != rows["default"]["tokens_per_turn"]
+    assert "tokens_per_turn" in rows["updated-1"]["vs_baseline"]
+    assert text.splitlines()[0].startswith("variant")
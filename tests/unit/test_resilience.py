@@ -0,0 +1,212 @@
+"""Tests for retries, hedging and circuit breaking around model calls."""
+
+import asyncio
+import random
+from typing import Any
+
+import httpx
+import pytest
+from google.adk.models.llm_request import LlmRequest
+from google.genai import errors, types
+
+from app import agent as agent_module
+from app import web_server
+from app.agents.offline_model import ReplayLlm, ReplayProfile
+from app.agents.resilience import (
+    RESILIENCE_STATS,
+    CircuitBreaker,
+    CircuitOpenError,
+    ResilientLlm,
+    RetryPolicy,
+    backoff_delay,
+    retry_after_s,
+)
+
+FAST = RetryPolicy(max_attempts=3, base_delay_s=0.001, max_delay_s=0.05)
+
+
+def _request(text: str = "ping") -> LlmRequest:
+    return LlmRequest(
+        contents=[types.Content(role="user", parts=[types.Part.from_text(text=text)])]
+    )
+
+
+def _wrap(profile: ReplayProfile, **kwargs: Any) -> tuple[ResilientLlm, ReplayLlm]:
+    inner = ReplayLlm(model="replay", agent_name="root_agent", profile=profile)
+    breaker = kwargs.pop("breaker", None) or CircuitBreaker(
+        "replay", failure_threshold=100
+    )
+    return ResilientLlm(
+        model="replay", inner=inner, breaker=breaker, seed=0, **kwargs
+    ), inner
+
+
+async def _collect(llm: ResilientLlm, stream: bool = False) -> list:
+    return [r async for r in llm.generate_content_async(_request(), stream=stream)]
+
+
+@pytest.mark.asyncio
+async def test_retries_transient_errors_then_succeeds() -> None:
+    llm, inner = _wrap(ReplayProfile(fail_first=2, error_code=503), policy=FAST)
+    responses = await _collect(llm)
+    assert inner.calls == 3
+    assert responses[-1].error_code is None
+    assert responses[-1].content.parts[0].text == "[offline root_agent] ping"
+
+
+@pytest.mark.asyncio
+async def test_gives_up_with_error_response_after_max_attempts() -> None:
+    llm, inner = _wrap(ReplayProfile(error_rate=1.0, error_code=429), policy=FAST)
+    responses = await _collect(llm)
+    assert inner.calls == 3
+    assert len(responses) == 1
+    assert responses[0].error_code == "RESOURCE_EXHAUSTED"
+    assert responses[0].custom_metadata["status"] == 429
+
+
+@pytest.mark.asyncio
+async def test_client_errors_are_not_retried() -> None:
+    llm, inner = _wrap(ReplayProfile(fail_first=1, error_code=400), policy=FAST)
+    with pytest.raises(errors.ClientError):
+        await _collect(llm)
+    assert inner.calls == 1
+
+
+@pytest.mark.asyncio
+async def test_retry_after_longer_than_budget_fails_fast() -> None:
+    llm, inner = _wrap(ReplayProfile(fail_first=1, retry_after_s=30), policy=FAST)
+    responses = await _collect(llm)
+    assert inner.calls == 1
+    assert responses[0].custom_metadata["retry_after_s"] == 30
+
+
+def test_backoff_respects_retry_after_and_ceiling() -> None:
+    exc = errors.ClientError(
+        429,
+        {
+            "error": {
+                "code": 429,
+                "status": "RESOURCE_EXHAUSTED",
+                "details": [
+                    {
+                        "@type": "type.googleapis.com/google.rpc.RetryInfo",
+                        "retryDelay": "2s",
+                    }
+                ],
+            }
+        },
+    )
+    assert retry_after_s(exc) == 2.0
+    policy = RetryPolicy(base_delay_s=0.5, max_delay_s=4.0)
+    rng = random.Random(1)
+    assert all((backoff_delay(1, policy, 2.0, rng) or 0) >= 2.0 for _ in range(20))
+    assert all((backoff_delay(10, policy, None, rng) or 0) <= 4.0 for _ in range(20))
+    assert backoff_delay(1, policy, 5.0, rng) is None
+
+
+@pytest.mark.asyncio
+async def test_hedge_wins_when_first_call_stalls() -> None:
+    before = RESILIENCE_STATS["hedge_wins"]
+    llm, inner = _wrap(
+        ReplayProfile(stall_first=1, stall_ms=2000), policy=FAST, hedge_after_s=0.02
+    )
+    responses = await _collect(llm, stream=True)
+    assert inner.calls == 2
+    assert RESILIENCE_STATS["hedge_wins"] == before + 1
+    assert (
+        "".join(r.content.parts[0].text for r in responses if r.partial)
+        == "[offline root_agent] ping"
+    )
+
+
+@pytest.mark.asyncio
+async def test_no_hedge_when_first_response_is_fast() -> None:
+    llm, inner = _wrap(ReplayProfile(), policy=FAST, hedge_after_s=0.5)
+    await _collect(llm)
+    assert inner.calls == 1
+
+
+@pytest.mark.asyncio
+async def test_breaker_opens_fails_fast_and_recovers() -> None:
+    now = [0.0]
+    breaker = CircuitBreaker(
+        "replay", failure_threshold=2, cooldown_s=10, clock=lambda: now[0]
+    )
+    llm, inner = _wrap(
+        ReplayProfile(fail_first=2, error_code=503),
+        policy=RetryPolicy(max_attempts=1),
+        breaker=breaker,
+    )
+    await _collect(llm)
+    await _collect(llm)
+    assert breaker.state == "open"
+
+    responses = await _collect(llm)
+    assert inner.calls == 2  # short-circuited without calling the model
+    assert responses[0].error_code == "UNAVAILABLE"
+    with pytest.raises(CircuitOpenError):
+        breaker.check()
+
+    now[0] = 11.0
+    assert breaker.state == "half_open"
+    responses = await _collect(llm)
+    assert responses[-1].error_code is None
+    assert breaker.state == "closed"
+
+
+@pytest.mark.asyncio
+async def test_cancelled_probe_does_not_wedge_the_breaker() -> None:
+    now = [0.0]
+    breaker = CircuitBreaker(
+        "replay", failure_threshold=1, cooldown_s=10, clock=lambda: now[0]
+    )
+    breaker.record_failure()
+    now[0] = 11.0
+    llm, inner = _wrap(
+        ReplayProfile(stall_first=1, stall_ms=2000),
+        policy=RetryPolicy(max_attempts=1),
+        breaker=breaker,
+    )
+    probe = asyncio.create_task(_collect(llm))
+    await asyncio.sleep(0.05)
+    assert inner.calls == 1
+    probe.cancel()
+    with pytest.raises(asyncio.CancelledError):
+        await probe
+
+    assert breaker.state == "half_open"
+    responses = await _collect(llm)
+    assert inner.calls == 2
+    assert responses[-1].error_code is None
+    assert breaker.state == "closed"
+
+
+@pytest.mark.asyncio
+async def test_stream_and_chat_surface_model_errors(
+    monkeypatch: pytest.MonkeyPatch,
+) -> None:
+    failing, _ = _wrap(
+        ReplayProfile(error_rate=1.0, error_code=503),
+        policy=RetryPolicy(max_attempts=1),
+    )
+    monkeypatch.setattr(agent_module.root_agent, "model", failing)
+
+    transport = httpx.ASGITransport(app=web_server.app)
+    async with httpx.AsyncClient(transport=transport, base_url="http://test") as client:
+        session_id = (await client.post("/session", json={"user_id": "alice"})).json()[
+            "session_id"
+        ]
+        params = {"session_id": session_id, "user_id": "alice", "q": "hi!"}
+        async with client.stream("GET", "/chat/stream", params=params) as resp:
+            frames = [
+                line async for line in resp.aiter_lines() if line.startswith("data:")
+            ]
+        assert '"code": 503' in frames[-1]
+
+        resp = await client.post(
+            "/chat",
+            json={"session_id": session_id, "user_id": "alice", "message": "hi!"},
+        )
+        assert resp.status_code == 503
+        health = (await client.get("/admin/model-health")).json()
+        assert health["stats"]["gave_up"] >= 2
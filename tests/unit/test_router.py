@@ -0,0 +1,118 @@
+"""Tests for deterministic orchestrator routing."""
+
+import pytest
+from google.adk.agents import Agent
+from google.adk.runners import Runner
+from google.adk.sessions import InMemorySessionService
+from google.genai import types
+
+from app.agents.entitlement_tools import check_entitlement
+from app.agents.offline_model import ReplayLlm
+from app.agents.router import find_reports, route, route_before_model
+from app.agents.state import get_session_state, init_session_state
+from app.agents.user_registry import get_user_profile
+
+
+def _state(user: str) -> dict:
+    return {"user_profile": get_user_profile(user)}
+
+
+def test_find_reports_prefers_longest_names() -> None:
+    message = "Where do I get the image (view and print images for checks and deposits) report?"
+    assert find_reports(message) == [
+        "Image (view and print images for checks and deposits)"
+    ]
+    assert find_reports("ACH Inbound detail and Present Day please") == [
+        "ACH Inbound detail",
+        "Present Day",
+    ]
+    assert find_reports("How are you?") == []
+
+
+@pytest.mark.parametrize(
+    ("user", "message", "agent"),
+    [
+        ("alice", "Can I download the Present Day report?", "service_agent"),
+        ("bob", "Do I have ACH Inbound detail?", "recommendation_agent"),
+        ("charlie", "Can I get Sweep Account Position?", "recommendation_agent"),
+        ("charlie", "Please upgrade my plan to GOLD.", "action_agent"),
+        ("charlie", "Yes, upgrade me to SILVER", "action_agent"),
+        ("bob", "I'd like to switch to the GOLD plan", "action_agent"),
+        ("bob", "Can you change my plan to GOLD?", "action_agent"),
+    ],
+)
+def test_route_follows_orchestrator_rules(user: str, message: str, agent: str) -> None:
+    decision = route(message, _state(user))
+    assert decision is not None and decision.agent_name == agent
+
+
+@pytest.mark.parametrize(
+    "message",
+    [
+        "Should I switch to GOLD?",
+        "What happens if I upgrade to GOLD?",
+        "How much does it cost to change my plan?",
+        "Would switching to SILVER help?",
+        "Is it worth it to upgrade to GOLD for ACH Inbound detail?",
+    ],
+)
+def test_questions_about_upgrading_are_not_upgrade_requests(message: str) -> None:
+    decision = route(message, _state("bob"))
+    assert decision is None or decision.agent_name != "action_agent"
+
+
+def test_route_records_entitlement_facts() -> None:
+    decision = route("Do I have ACH Inbound detail?", _state("bob"))
+    assert decision is not None
+    assert decision.state_updates["current_plan"] == "SILVER"
+    assert decision.state_updates["entitlement_check"]["lowest_plan"] == "GOLD"
+
+
+@pytest.mark.parametrize(
+    ("state", "message"),
+    [
+        ({"user_profile": get_user_profile("alice")}, "Hello there"),
+        (
+            {"user_profile": get_user_profile("alice")},
+            "Do I get Present Day and ACH Inbound detail?",
+        ),
+        ({}, "Can I download the Present Day report?"),
+    ],
+)
+def test_ambiguous_turns_fall_back_to_llm(state: dict, message: str) -> None:
+    assert route(message, state) is None
+
+
+def test_routed_turn_skips_the_root_model_call() -> None:
+    root_llm = ReplayLlm(model="replay", agent_name="root_agent")
+    service_llm = ReplayLlm(model="replay", agent_name="service_agent")
+    service = Agent(name="service_agent", model=service_llm, tools=[check_entitlement])
+    root = Agent(
+        name="root_agent",
+        model=root_llm,
+        tools=[check_entitlement],
+        sub_agents=[service],
+        before_model_callback=route_before_model,
+    )
+    sessions = InMemorySessionService()
+    session = sessions.create_session_sync(user_id="alice", app_name="router")
+    init_session_state(session.id, user_profile=get_user_profile("alice"))
+    runner = Runner(agent=root, session_service=sessions, app_name="router")
+
+    events = list(
+        runner.run(
+            new_message=types.Content(
+                role="user",
+                parts=[
+                    types.Part.from_text(text="Can I download the Present Day report?")
+                ],
+            ),
+            user_id="alice",
+            session_id=session.id,
+        )
+    )
+
+    assert root_llm.calls == 0
+    assert service_llm.calls == 1
+    assert events[-1].author == "service_agent"
+    assert get_session_state(session.id)["entitlement_check"]["status"] == "included"
@@ -0,0 +1,219 @@
+"""Tests for scoped sub-agent context."""
+
+import re
+from types import SimpleNamespace
+from typing import Any, AsyncGenerator, List
+
+import httpx
+import pytest
+from google.adk.models.base_llm import BaseLlm
+from google.adk.models.llm_request import LlmRequest
+from google.adk.models.llm_response import LlmResponse
+from google.genai import types
+from pydantic import PrivateAttr
+
+from app import agent as agent_module
+from app import web_server
+from app.agents import async_tools
+from app.agents.offline_model import ReplayLlm
+from app.agents.scoped_context import recall_conversation, scoped_contents
+
+
+def _text(role: str, *texts: str) -> types.Content:
+    return types.Content(role=role, parts=[types.Part(text=t) for t in texts])
+
+
+class CapturingLlm(ReplayLlm):
+    """Replay model that keeps every request it was sent."""
+
+    _requests: List[LlmRequest] = PrivateAttr(default_factory=list)
+
+    async def generate_content_async(
+        self, llm_request: LlmRequest, stream: bool = False
+    ) -> AsyncGenerator[LlmResponse, None]:
+        self._requests.append(llm_request.model_copy(deep=True))
+        async for response in super().generate_content_async(
+            llm_request, stream=stream
+        ):
+            yield response
+
+
+def test_scoped_contents_keep_request_tool_result_and_own_loop() -> None:
+    own_call = types.Content(
+        role="model",
+        parts=[
+            types.Part(
+                function_call=types.FunctionCall(name="check_entitlement", args={})
+            )
+        ],
+    )
+    own_result = types.Content(
+        role="user",
+        parts=[
+            types.Part(
+                function_response=types.FunctionResponse(
+                    name="check_entitlement", response={"status": "paid"}
+                )
+            )
+        ],
+    )
+    contents = [
+        _text("user", "Earlier question", '{"session_state": {}}'),
+        _text("model", "Earlier answer"),
+        _text(
+            "user",
+            "Do I have Sweep Account Position?",
+            '{"session_state": {"current_plan": "GOLD"}}',
+        ),
+        _text(
+            "user",
+            "For context:",
+            "[root_agent] `check_entitlement` tool returned result: {'status': 'paid'}",
+            "[root_agent] `transfer_to_agent` tool returned result: {}",
+        ),
+        own_call,
+        own_result,
+    ]
+    scoped = scoped_contents(contents)
+    assert [(c.role, [p.text for p in c.parts or []]) for c in scoped[:2]] == [
+        ("user", ["Earlier question"]),
+        ("model", ["Earlier answer"]),
+    ]
+    assert [p.text for p in scoped[2].parts or []] == [
+        "Do I have Sweep Account Position?",
+        "For context: [root_agent] `check_entitlement` tool returned result: {'status': 'paid'}",
+    ]
+    assert scoped[3:] == [own_call, own_result]
+
+
+def test_recall_conversation_returns_earlier_turns() -> None:
+    def event(author: str, text: str, partial: bool = False) -> SimpleNamespace:
+        return SimpleNamespace(
+            author=author, partial=partial, content=_text("user", text)
+        )
+
+    events = [
+        event("user", "first question"),
+        event("service_agent", "first", partial=True),
+        event("service_agent", "first answer"),
+        event("user", "second question"),
+        event("service_agent", "second answer"),
+        event("user", "what did I ask first?"),
+    ]
+    ctx: Any = SimpleNamespace(session=SimpleNamespace(id="recall", events=events))
+    result = recall_conversation(ctx, turns=1)
+    assert result["turns"] == [
+        {"user": "second question", "assistant": "second answer"}
+    ]
+
+
+@pytest.mark.asyncio
+async def test_service_agent_sees_only_the_previous_exchange(
+    monkeypatch: pytest.MonkeyPatch,
+) -> None:
+    capturing = CapturingLlm(model="replay", agent_name="service_agent")
+    monkeypatch.setattr(agent_module.service_agent, "model", capturing)
+
+    transport = httpx.ASGITransport(app=web_server.app)
+    async with httpx.AsyncClient(transport=transport, base_url="http://test") as client:
+        session_id = (await client.post("/session", json={"user_id": "alice"})).json()[
+            "session_id"
+        ]
+        for message in ("hi!", "hello?", "Can I download the Present Day report?"):
+            resp = await client.post(
+                "/chat",
+                json={"session_id": session_id, "user_id": "alice", "message": message},
+            )
+            assert resp.status_code == 200
+
+    request = capturing._requests[-1]
+    assert [(c.role, [p.text for p in c.parts or []]) for c in request.contents] == [
+        ("user", ["hello?"]),
+        ("model", ["[offline root_agent] hello?"]),
+        ("user", ["Can I download the Present Day report?"]),
+    ]
+    assert request.config is not None
+    system = str(request.config.system_instruction)
+    assert "Reference data" not in system
+    assert 'entitlement_check={"status":"included"' in system
+    assert "recall_conversation" in request.tools_dict
+
+
+class _ConfirmThenUpgradeLlm(BaseLlm):
+    """action_agent stand-in following ACTION_INSTRUCTION's confirm-then-execute
+    steps, reading the target plan only from the conversation it is sent."""
+
+    _requests: List[LlmRequest] = PrivateAttr(default_factory=list)
+
+    async def generate_content_async(
+        self, llm_request: LlmRequest, stream: bool = False
+    ) -> AsyncGenerator[LlmResponse, None]:
+        self._requests.append(llm_request.model_copy(deep=True))
+        last = llm_request.contents[-1]
+        parts = last.parts or []
+        if parts and parts[0].function_response:
+            yield _reply("Your plan is now GOLD.")
+            return
+        said = " ".join(
+            p.text or "" for c in llm_request.contents for p in c.parts or []
+        )
+        if parts and parts[0].text == "yes":
+            match = re.search(r"upgrade to (GOLD|SILVER|BRONZE)\?", said)
+            if match is None:
+                yield _reply("Which plan would you like?")
+                return
+            call = types.FunctionCall(
+                name="update_user_dataplan",
+                args={"uid": "U1002", "plan": match.group(1)},
+            )
+            yield LlmResponse(
+                content=types.Content(
+                    role="model", parts=[types.Part(function_call=call)]
+                )
+            )
+            return
+        yield _reply("Do you want to upgrade to GOLD?")
+
+
+def _reply(text: str) -> LlmResponse:
+    return LlmResponse(
+        content=types.Content(role="model", parts=[types.Part(text=text)])
+    )
+
+
+@pytest.mark.asyncio
+async def test_confirmation_turn_sees_the_question_it_answers(
+    monkeypatch: pytest.MonkeyPatch,
+) -> None:
+    confirming = _ConfirmThenUpgradeLlm(model="confirm")
+    monkeypatch.setattr(agent_module.action_agent, "model", confirming)
+
+    transport = httpx.ASGITransport(app=web_server.app)
+    async with httpx.AsyncClient(transport=transport, base_url="http://test") as client:
+        session_id = (await client.post("/session", json={"user_id": "bob"})).json()[
+            "session_id"
+        ]
+        answers = []
+        try:
+            for message in ("Please upgrade my plan to GOLD", "yes"):
+                resp = await client.post(
+                    "/chat",
+                    json={
+                        "session_id": session_id,
+                        "user_id": "bob",
+                        "message": message,
+                    },
+                )
+                answers.append(resp.json()["answer"])
+            profile = await async_tools.get_user_profile("bob")
+        finally:
+            await async_tools.set_user_plan("U1002", "SILVER")
+
+    assert answers == ["Do you want to upgrade to GOLD?", "Your plan is now GOLD."]
+    assert profile is not None and profile["data_plan"] == "GOLD"
+    confirm = confirming._requests[1]
+    assert [(c.role, [p.text for p in c.parts or []]) for c in confirm.contents] == [
+        ("user", ["Please upgrade my plan to GOLD"]),
+        ("model", ["Do you want to upgrade to GOLD?"]),
+        ("user", ["yes"]),
+    ]
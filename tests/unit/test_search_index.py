@@ -0,0 +1,167 @@
+"""Tests for the conversation full-text index and /search."""
+
+from pathlib import Path
+from typing import Any, List, Tuple
+
+import httpx
+import pytest
+
+from app import web_server
+from app.app_utils.journal import ConversationJournal
+from app.app_utils.search_index import ConversationIndex, tokenize
+
+
+def test_tokenize_normalizes_like_entitlement_lookups() -> None:
+    assert tokenize("  Do I have   SWEEP Account-Position?") == [
+        "do",
+        "i",
+        "have",
+        "sweep",
+        "account",
+        "position",
+    ]
+
+
+def test_search_ranks_sessions_and_applies_filters() -> None:
+    now = [1000.0]
+    index = ConversationIndex(clock=lambda: now[0])
+    index.register("s1", "alice")
+    index.register("s2", "bob")
+    index.register("s3", "bob")
+    index.add("s1", "user", "Do I have Sweep Account Position?", plan="GOLD")
+    index.add(
+        "s1",
+        "assistant",
+        "Sweep Account Position is included in your GOLD plan.",
+        plan="GOLD",
+    )
+    now[0] = 2000.0
+    index.add("s2", "user", "What about the sweep report?", plan="SILVER")
+    index.add(
+        "s2", "user", "Sweep Account Position, sweep account position!", plan="SILVER"
+    )
+    index.add("s3", "user", "Account position only", plan="BRONZE")
+
+    result = index.search("sweep account position")
+    assert result["terms"] == ["account", "position", "sweep"]
+    # s1 mentions the report twice; s2 once, in a message repeating it.
+    assert [(s["session_id"], s["hits"]) for s in result["sessions"]] == [
+        ("s1", 2),
+        ("s2", 1),
+    ]
+    assert result["messages"] == 3 and result["session_count"] == 2
+    repeated = result["sessions"][1]
+    assert repeated["user_id"] == "bob"
+    assert repeated["messages"] == [
+        {
+            "position": 1,
+            "role": "user",
+            "plan": "SILVER",
+            "ts": 2000.0,
+            "score": repeated["score"],
+        }
+    ]
+    assert repeated["score"] > max(
+        m["score"] for m in result["sessions"][0]["messages"]
+    )
+
+    def sessions(**filters: Any) -> List[Tuple[str, List[int]]]:
+        found = index.search("Sweep account position", **filters)["sessions"]
+        return [
+            (s["session_id"], sorted(m["position"] for m in s["messages"]))
+            for s in found
+        ]
+
+    assert sessions(user_id="alice") == [("s1", [0, 1])]
+    assert sessions(plan="GOLD", role="user") == [("s1", [0])]
+    assert sessions(since=1500) == [("s2", [1])]
+    assert sessions(until=1500, role="assistant") == [("s1", [1])]
+    assert sessions(user_id="carol") == []
+    assert index.search("sweep nonexistentword")["sessions"] == []
+    assert index.search("?!")["sessions"] == []
+
+
+def test_index_is_rebuilt_from_the_journal(tmp_path: Path) -> None:
+    journal = ConversationJournal(tmp_path / "conversations.journal", sync_interval_s=0)
+    journal.create("s1")
+    journal.create("s2")
+    for ts, session_id, message in [
+        (
+            1000.0,
+            "s1",
+            {"role": "user", "content": "Do I have Present Day?", "user_id": "alice"},
+        ),
+        (
+            1500.0,
+            "s2",
+            {"role": "user", "content": "Present Day please", "user_id": "bob"},
+        ),
+        (
+            2000.0,
+            "s1",
+            {
+                "role": "assistant",
+                "content": "Present Day is included.",
+                "plan": "GOLD",
+            },
+        ),
+    ]:
+        journal.append(session_id, {**message, "ts": ts})
+    journal.close()
+
+    reopened = ConversationJournal(tmp_path / "conversations.journal")
+    index = ConversationIndex(clock=lambda: 9999.0)
+    loaded = index.load((s, reopened.messages(s)) for s in reopened.sessions())
+    assert loaded == 3
+
+    def found(**filters: Any) -> List[Tuple[str, List[int]]]:
+        sessions = index.search("present day", **filters)["sessions"]
+        return [
+            (s["session_id"], sorted(m["position"] for m in s["messages"]))
+            for s in sessions
+        ]
+
+    assert found(user_id="alice") == [("s1", [0, 1])]
+    assert found(since=1200, until=1800) == [("s2", [0])]
+    assert found(plan="GOLD") == [("s1", [1])]
+    assert reopened.message("s1", 1)["content"] == "Present Day is included."
+    reopened.append("s1", {"role": "user", "content": "thanks"})
+    assert reopened.message("s1", 2)["content"] == "thanks"  # still queued or written
+    with pytest.raises(IndexError):
+        reopened.message("s2", 1)
+    reopened.close()
+
+
+@pytest.mark.asyncio
+async def test_search_endpoint_finds_chat_messages() -> None:
+    transport = httpx.ASGITransport(app=web_server.app)
+    async with httpx.AsyncClient(transport=transport, base_url="http://test") as client:
+        session_id = (await client.post("/session", json={"user_id": "bob"})).json()[
+            "session_id"
+        ]
+        await client.post(
+            "/chat",
+            json={
+                "session_id": session_id,
+                "user_id": "bob",
+                "message": "Do I have Wire tracking detail?",
+            },
+        )
+        resp = await client.get(
+            "/search",
+            params={
+                "q": "wire TRACKING",
+                "user_id": "bob",
+                "plan": "SILVER",
+                "role": "user",
+            },
+        )
+        assert (
+            await client.get("/search", params={"q": "wire", "plan": "PLATINUM"})
+        ).status_code == 422
+
+    body = resp.json()
+    assert body["took_ms"] >= 0
+    hit = next(s for s in body["sessions"] if s["session_id"] == session_id)
+    assert hit["messages"][0]["content"] == "Do I have Wire tracking detail?"
+    assert hit["messages"][0]["plan"] == "SILVER"
@@ -0,0 +1,134 @@
+"""Stress tests for per-session turn serialization in the web server."""
+
+import asyncio
+import json
+import threading
+import time
+from types import SimpleNamespace
+from typing import Any, ClassVar, Iterator
+
+import httpx
+import pytest
+
+from app import web_server
+from app.agents.state import get_session_state, update_session_state
+
+
+class _EchoRunner:
+    """Runner stand-in that streams an echo of the message and touches state."""
+
+    active: ClassVar[dict[str, int]] = {}
+    overlaps: ClassVar[int] = 0
+    _lock = threading.Lock()
+
+    def run(
+        self, *, new_message: Any, user_id: str, session_id: str, run_config: Any
+    ) -> Iterator[Any]:
+        cls = type(self)
+        with cls._lock:
+            cls.active[session_id] = cls.active.get(session_id, 0) + 1
+            if cls.active[session_id] > 1:
+                cls.overlaps += 1
+        try:
+            text = new_message.parts[0].text
+            for chunk in ("echo:", text):
+                time.sleep(0.002)
+                update_session_state(session_id, report_name=text)
+                yield SimpleNamespace(
+                    content=SimpleNamespace(parts=[SimpleNamespace(text=chunk)])
+                )
+        finally:
+            with cls._lock:
+                cls.active[session_id] -= 1
+
+
+@pytest.fixture
+def echo_runner(monkeypatch: pytest.MonkeyPatch) -> type[_EchoRunner]:
+    _EchoRunner.active = {}
+    _EchoRunner.overlaps = 0
+    monkeypatch.setattr(web_server, "_runner", _EchoRunner)
+    return _EchoRunner
+
+
+def _assert_consistent_history(session_id: str, expected: set[str]) -> None:
+    messages = web_server.conversation_store[session_id]
+    assert len(messages) == 2 * len(expected)
+    seen = set()
+    for user, assistant in zip(messages[::2], messages[1::2], strict=True):
+        assert user["role"] == "user"
+        assert assistant["role"] == "assistant"
+        assert assistant["content"] == f"echo:{user['content']}"
+        seen.add(user["content"])
+    assert seen == expected
+    # The last writer to state must be the last turn in history.
+    assert get_session_state(session_id)["report_name"] == messages[-2]["content"]
+
+
+@pytest.mark.asyncio
+async def test_concurrent_turns_on_one_session_are_serialized(
+    echo_runner: type[_EchoRunner],
+) -> None:
+    transport = httpx.ASGITransport(app=web_server.app)
+    async with httpx.AsyncClient(transport=transport, base_url="http://test") as client:
+        resp = await client.post("/session", json={"user_id": "alice"})
+        session_id = resp.json()["session_id"]
+
+        async def chat(i: int) -> None:
+            r = await client.post(
+                "/chat",
+                json={"session_id": session_id, "user_id": "alice", "message": f"m{i}"},
+            )
+            assert r.json()["answer"] == f"echo:m{i}"
+
+        async def stream(i: int) -> None:
+            r = await client.get(
+                "/chat/stream",
+                params={"session_id": session_id, "user_id": "alice", "q": f"s{i}"},
+            )
+            frames = [
+                json.loads(line[len("data: ") :])
+                for line in r.text.splitlines()
+                if line.startswith("data: ")
+            ]
+            assert frames[-1]["final"] == f"echo:s{i}"
+
+        n = 20
+        await asyncio.gather(
+            *(chat(i) for i in range(n)), *(stream(i) for i in range(n))
+        )
+
+    assert echo_runner.overlaps == 0
+    _assert_consistent_history(
+        session_id, {f"m{i}" for i in range(n)} | {f"s{i}" for i in range(n)}
+    )
+
+
+@pytest.mark.asyncio
+async def test_different_sessions_run_in_parallel(
+    echo_runner: type[_EchoRunner], monkeypatch: pytest.MonkeyPatch
+) -> None:
+    barrier = threading.Barrier(2, timeout=5)
+
+    class _BarrierRunner(_EchoRunner):
+        def run(self, **kwargs: Any) -> Iterator[Any]:
+            barrier.wait()  # deadlocks unless both sessions are in flight together
+            yield from super().run(**kwargs)
+
+    monkeypatch.setattr(web_server, "_runner", _BarrierRunner)
+    transport = httpx.ASGITransport(app=web_server.app)
+    async with httpx.AsyncClient(transport=transport, base_url="http://test") as client:
+        ids = [
+            (await client.post("/session", json={"user_id": "bob"})).json()[
+                "session_id"
+            ]
+            for _ in range(2)
+        ]
+        answers = await asyncio.gather(
+            *(
+                client.post(
+                    "/chat", json={"session_id": sid, "user_id": "bob", "message": "hi"}
+                )
+                for sid in ids
+            )
+        )
+    assert [a.json()["answer"] for a in answers] == ["echo:hi", "echo:hi"]
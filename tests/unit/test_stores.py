@@ -0,0 +1,93 @@
+"""Tests for the pooled tool stores and the async tools."""
+
+import asyncio
+import threading
+from pathlib import Path
+from typing import Any, Dict, Iterator, List, Tuple
+
+import pytest
+
+from app.agents import async_tools, stores
+from app.agents.entitlement_tools import (
+    _PAID,
+    _REVERSE_INDEX,
+    Plan,
+    check_entitlement,
+)
+from app.agents.state import get_session_state, init_session_state
+
+
+@pytest.fixture
+def backends(
+    tmp_path: Path, monkeypatch: pytest.MonkeyPatch
+) -> Iterator[stores.ToolBackends]:
+    opened = stores.open_backends(tmp_path / "tools.sqlite", pool_size=3)
+    monkeypatch.setattr(stores, "_backends", opened)
+    yield opened
+    opened.close()
+
+
+@pytest.mark.asyncio
+async def test_async_check_entitlement_matches_sync_tool(
+    backends: stores.ToolBackends,
+) -> None:
+    reports = [*_REVERSE_INDEX, *_PAID, "No Such Report"]
+    plans: Tuple[Plan, ...] = ("BRONZE", "SILVER", "GOLD")
+    calls = [(report, plan) for report in reports for plan in plans]
+    results = await asyncio.gather(
+        *(async_tools.check_entitlement(report=r.upper(), plan=p) for r, p in calls)
+    )
+    assert results == [check_entitlement(report=r.upper(), plan=p) for r, p in calls]
+
+
+@pytest.mark.asyncio
+async def test_plan_update_is_stored_audited_and_survives_reopen(
+    backends: stores.ToolBackends, tmp_path: Path
+) -> None:
+    init_session_state("stores-test")
+    message = await async_tools.update_user_dataplan(
+        uid="U1003", plan="gold", session_id="stores-test"
+    )
+    assert message == "Plan updated to GOLD for user U1003."
+    assert get_session_state("stores-test")["current_plan"] == "GOLD"
+    assert await async_tools.update_user_dataplan(uid="U1003", plan="PLATINUM") == (
+        "Unable to update plan. Verify UID and plan (GOLD/SILVER/BRONZE)."
+    )
+    assert await async_tools.set_user_plan(
+        "U1003", "GOLD"
+    )  # unchanged: not audited again
+
+    entries = await backends.audit.entries("U1003")
+    assert [(e["old_value"], e["new_value"], e["session_id"]) for e in entries] == [
+        ("BRONZE", "GOLD", "stores-test")
+    ]
+    reopened = stores.open_backends(tmp_path / "tools.sqlite", pool_size=1)
+    try:
+        profile = await reopened.registry.get_profile("CHARLIE")
+        assert profile is not None and profile["data_plan"] == "GOLD"
+    finally:
+        reopened.close()
+
+
+def test_pool_is_shared_across_event_loops(backends: stores.ToolBackends) -> None:
+    # Runner.run gives each turn its own loop; the pool must serve all of them.
+    results: List[Dict[str, Any]] = []
+
+    def turn() -> None:
+        async def lookups() -> List[Dict[str, Any]]:
+            return await asyncio.gather(
+                *(
+                    async_tools.check_entitlement(report="Present Day", plan="GOLD")
+                    for _ in range(10)
+                )
+            )
+
+        results.extend(asyncio.run(lookups()))
+
+    threads = [threading.Thread(target=turn) for _ in range(4)]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+    assert len(results) == 40 and {r["status"] for r in results} == {"included"}
+    assert backends.pool._idle.qsize() == 3
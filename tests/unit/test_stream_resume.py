@@ -0,0 +1,118 @@
+"""Tests for resumable /chat/stream turns."""
+
+import asyncio
+import json
+from types import SimpleNamespace
+from typing import Any, Dict, Iterator, List, Optional, Tuple
+
+import httpx
+import pytest
+
+from app import web_server
+from app.app_utils.turn_streams import TurnStreams, parse_event_id
+
+
+class _CountingRunner:
+    calls = 0
+
+    def run(self, *, new_message: Any, **_: Any) -> Iterator[SimpleNamespace]:
+        type(self).calls += 1
+        for chunk in ("one ", "two ", "three"):
+            yield SimpleNamespace(
+                content=SimpleNamespace(parts=[SimpleNamespace(text=chunk)])
+            )
+
+
+@pytest.fixture
+def counting_runner(monkeypatch: pytest.MonkeyPatch) -> type[_CountingRunner]:
+    _CountingRunner.calls = 0
+    monkeypatch.setattr(web_server, "_runner", _CountingRunner)
+    return _CountingRunner
+
+
+def _events(body: str) -> List[Tuple[Optional[str], Dict[str, Any]]]:
+    events = []
+    for block in body.strip().split("\n\n"):
+        fields = dict(line.split(": ", 1) for line in block.splitlines())
+        events.append((fields.get("id"), json.loads(fields["data"])))
+    return events
+
+
+@pytest.mark.asyncio
+async def test_reconnect_replays_from_buffer_without_rerunning(
+    counting_runner: type[_CountingRunner],
+) -> None:
+    transport = httpx.ASGITransport(app=web_server.app)
+    async with httpx.AsyncClient(transport=transport, base_url="http://test") as client:
+        session_id = (await client.post("/session", json={"user_id": "alice"})).json()[
+            "session_id"
+        ]
+        params = {"session_id": session_id, "user_id": "alice", "q": "count"}
+        first = _events((await client.get("/chat/stream", params=params)).text)
+
+        turn_id = first[0][1]["turn_id"]
+        assert [event_id for event_id, _ in first] == [
+            f"{turn_id}:{i}" for i in range(1, 6)
+        ]
+        assert first[-1][1] == {"final": "one two three"}
+
+        # The connection dropped after the first delta; EventSource resends the URL.
+        last_event_id = first[1][0]
+        assert last_event_id is not None
+        resumed = _events(
+            (
+                await client.get(
+                    "/chat/stream",
+                    params=params,
+                    headers={"Last-Event-ID": last_event_id},
+                )
+            ).text
+        )
+        history = (
+            await client.get("/history", params={"session_id": session_id})
+        ).json()
+
+    assert resumed == first[2:]
+    assert counting_runner.calls == 1
+    assert [m["role"] for m in history["messages"]] == ["user", "assistant"]
+
+
+@pytest.mark.asyncio
+async def test_unknown_turn_is_gone_not_rerun(
+    counting_runner: type[_CountingRunner],
+) -> None:
+    transport = httpx.ASGITransport(app=web_server.app)
+    async with httpx.AsyncClient(transport=transport, base_url="http://test") as client:
+        session_id = (await client.post("/session", json={"user_id": "alice"})).json()[
+            "session_id"
+        ]
+        resp = await client.get(
+            "/chat/stream",
+            params={"session_id": session_id, "user_id": "alice", "q": "count"},
+            headers={"Last-Event-ID": "expired-7:3"},
+        )
+    assert _events(resp.text)[0][1]["code"] == 410
+    assert counting_runner.calls == 0
+    assert web_server.conversation_store[session_id] == []
+
+
+@pytest.mark.asyncio
+async def test_follower_sees_live_frames_and_buffers_expire() -> None:
+    streams = TurnStreams(ttl_s=0)
+    stream = streams.open("s1")
+    stream.publish('{"delta": "a"}')
+
+    async def collect() -> list:
+        return [payload async for _, payload, _ in stream.follow(after=0)]
+
+    follower = asyncio.create_task(collect())
+    await asyncio.sleep(0)
+    stream.publish('{"delta": "b"}')
+    stream.publish('{"final": "ab"}', last=True)
+    stream.publish('{"delta": "late"}')
+    assert await follower == ['{"delta": "a"}', '{"delta": "b"}', '{"final": "ab"}']
+
+    assert streams.get(stream.turn_id, "other-session") is None
+    assert streams.get(stream.turn_id, "s1") is None  # finished and past its TTL
+    assert parse_event_id(stream.event_id(2)) == (stream.turn_id, 2)
+    assert parse_event_id("garbage") is None
@@ -0,0 +1,120 @@
+"""Tests for application tracing spans."""
+
+from typing import Any, Iterator, Sequence
+
+import httpx
+import pytest
+from google.adk.tools.function_tool import FunctionTool
+
+from app import agent as agent_module
+from app import web_server
+from app.app_utils.telemetry import in_memory_exporter, span, traced_tool
+
+
+@pytest.fixture
+def spans() -> Iterator[Any]:
+    exporter = in_memory_exporter()
+    exporter.clear()
+    yield exporter
+    exporter.clear()
+
+
+def _by_name(finished: Sequence[Any]) -> dict[str, Any]:
+    return {s.name: s for s in finished}
+
+
+async def _session(client: httpx.AsyncClient) -> str:
+    return (await client.post("/session", json={"user_id": "alice"})).json()[
+        "session_id"
+    ]
+
+
+@pytest.mark.asyncio
+async def test_chat_turn_is_one_trace(spans: Any) -> None:
+    transport = httpx.ASGITransport(app=web_server.app)
+    async with httpx.AsyncClient(transport=transport, base_url="http://test") as client:
+        session_id = await _session(client)
+        resp = await client.post(
+            "/chat",
+            json={
+                "session_id": session_id,
+                "user_id": "alice",
+                "message": "Upgrade me to GOLD",
+            },
+        )
+        assert resp.status_code == 200
+
+    finished = spans.get_finished_spans()
+    named = _by_name(finished)
+    assert (
+        named["user_profile.lookup"].parent.span_id
+        == named["session.create"].context.span_id
+    )
+    assert named["session.create"].attributes["plan"] == "GOLD"
+
+    turn = named["chat.turn"]
+    assert turn.attributes["session.id"] == session_id
+    assert turn.attributes["plan"] == "GOLD"
+    assert turn.attributes["agent.name"] == "action_agent"
+    in_turn = {s.name for s in finished if s.context.trace_id == turn.context.trace_id}
+    # Our spans and ADK's agent/model spans from the runner thread share the trace.
+    assert {
+        "session.lock_wait",
+        "state.serialize",
+        "executor.queue_wait",
+        "history.append",
+        "invoke_agent root_agent",
+        "invoke_agent action_agent",
+    } <= in_turn
+
+
+@pytest.mark.asyncio
+async def test_stream_records_queue_and_flush(spans: Any) -> None:
+    transport = httpx.ASGITransport(app=web_server.app)
+    async with httpx.AsyncClient(transport=transport, base_url="http://test") as client:
+        session_id = await _session(client)
+        resp = await client.get(
+            "/chat/stream",
+            params={"session_id": session_id, "user_id": "alice", "q": "ping"},
+        )
+        assert resp.status_code == 200
+
+    finished = spans.get_finished_spans()
+    stream = _by_name(finished)["chat.stream"]
+    flushes = [e for e in stream.events if e.name == "sse.flush"]
+    assert stream.attributes["sse.frames"] == len(flushes) >= 2
+    assert all(e.attributes["queue_wait_ms"] >= 0 for e in flushes)
+    children = {
+        s.name
+        for s in finished
+        if s.parent and s.parent.span_id == stream.context.span_id
+    }
+    assert {"executor.queue_wait", "history.append", "invocation"} <= children
+
+
+@pytest.mark.asyncio
+async def test_traced_tool_keeps_declaration_and_records_call(spans: Any) -> None:
+    tool = FunctionTool(agent_module.entitlement_tool)
+    declaration = tool._get_declaration()
+    assert declaration is not None and declaration.parameters is not None
+    assert declaration.name == "check_entitlement"
+    assert set(declaration.parameters.properties or {}) == {"report", "plan"}
+
+    with span("parent"):
+        await agent_module.entitlement_tool(report="Present Day", plan="SILVER")
+    named = _by_name(spans.get_finished_spans())
+    call = named["tool check_entitlement"]
+    assert call.parent.span_id == named["parent"].context.span_id
+    assert call.attributes["plan"] == "SILVER"
+    assert call.attributes["report"] == "Present Day"
+    assert call.attributes["tool.status"] == "optional"
+
+
+def test_traced_tool_keeps_identifying_args_off_the_span(spans: Any) -> None:
+    @traced_tool
+    def probe(*, uid: str, plan: str, session_id: str) -> str:
+        return plan
+
+    assert probe(uid="U1002", plan="GOLD", session_id="s-1") == "GOLD"
+    (call,) = spans.get_finished_spans()
+    assert dict(call.attributes) == {"tool.name": "probe", "plan": "GOLD"}
@@ -0,0 +1,140 @@
+"""Tests for turn capture and trace replay."""
+
+from pathlib import Path
+from typing import Any, Dict, Iterator, List
+
+import httpx
+import pytest
+
+from app import web_server
+from app.app_utils import replay
+from app.app_utils.interaction_log import InteractionLog
+from app.app_utils.turn_capture import (
+    CapturePlugin,
+    TraceFileSink,
+    TurnCapture,
+    load_redactors,
+    read_trace,
+)
+
+
+def _client() -> httpx.AsyncClient:
+    return httpx.AsyncClient(
+        transport=httpx.ASGITransport(app=web_server.app), base_url="http://test"
+    )
+
+
+@pytest.fixture
+def captured(tmp_path: Path, monkeypatch: pytest.MonkeyPatch) -> Iterator[Path]:
+    """Captures turns to a trace file; yields its path."""
+    path = tmp_path / "turns.jsonl.gz"
+    capture = TurnCapture(
+        InteractionLog(
+            TraceFileSink(path, load_redactors("default")), flush_interval_s=0.01
+        )
+    )
+    monkeypatch.setattr(web_server, "turn_capture", capture)
+    monkeypatch.setattr(
+        web_server.adk_app,
+        "plugins",
+        [*web_server.adk_app.plugins, CapturePlugin(capture)],
+    )
+    yield path
+    capture.close()
+
+
+@pytest.mark.asyncio
+async def test_turns_are_captured_with_model_calls_and_redaction(
+    captured: Path,
+) -> None:
+    async with _client() as client:
+        session_id = (await client.post("/session", json={"user_id": "bob"})).json()[
+            "session_id"
+        ]
+        await client.post(
+            "/chat",
+            json={
+                "session_id": session_id,
+                "user_id": "bob",
+                "message": "Do I have Track? Mail me at bob@corp.example",
+            },
+        )
+        params = {
+            "session_id": session_id,
+            "user_id": "bob",
+            "q": "What about Wire tracking detail?",
+        }
+        async with client.stream("GET", "/chat/stream", params=params) as resp:
+            async for _ in resp.aiter_lines():
+                pass
+    assert web_server.turn_capture is not None
+    web_server.turn_capture.log.flush(timeout=2)
+
+    first, second = read_trace(captured)
+    assert [first["endpoint"], second["endpoint"]] == ["chat", "chat_stream"]
+    assert [first["turn"], second["turn"]] == [0, 1]
+    assert first["message"] == "Do I have Track? Mail me at [EMAIL]"
+    assert first["state"]["user_profile"]["email"] == "[EMAIL]"
+    assert "entitlement_check" in second["state"]  # state as of the turn's start
+    assert {"prepare_ms", "queue_wait_ms", "ttft_ms", "total_ms"} <= set(
+        first["timings"]
+    )
+    assert first["tool_calls"][0]["name"] == "transfer_to_agent"
+    assert any("delta" in frame for _, frame in second["frames"])
+    call = first["model_calls"][-1]
+    assert call["agent"] == "service_agent" and call["step"] == 0
+    assert call["prompt"] == "do i have track? mail me at [EMAIL]"
+    assert call["responses"] and call["latency_ms"] >= call["ttft_ms"]
+    assert first["tokens"]["total"] > 0 and first["answer"]
+
+
+@pytest.mark.asyncio
+async def test_replay_redrives_captured_sessions(captured: Path) -> None:
+    async with _client() as client:
+        for user in ("alice", "bob"):
+            session_id = (await client.post("/session", json={"user_id": user})).json()[
+                "session_id"
+            ]
+            await client.post(
+                "/chat",
+                json={
+                    "session_id": session_id,
+                    "user_id": user,
+                    "message": "Do I have Present Day?",
+                },
+            )
+    assert web_server.turn_capture is not None
+    web_server.turn_capture.log.flush(timeout=2)
+    turns = read_trace(captured)
+    assert replay.model_fixtures(turns)[0]["agent"] == "service_agent"
+
+    async with _client() as client:
+        results = await replay.replay(turns, client, speed=0, restore_state=True)
+    assert sorted(r["session_id"] for r in results) == sorted(
+        t["session_id"] for t in turns
+    )
+    assert all(r["error"] is None and r["latency_ms"] > 0 for r in results)
+    summary = replay.summarize(results)
+    assert (
+        summary["latency_ms"]["count"]
+        == summary["original"]["latency_ms"]["count"]
+        == 2
+    )
+
+
+def test_compare_flags_slower_percentiles() -> None:
+    def run(latencies: List[float]) -> List[Dict[str, Any]]:
+        return [{"error": None, "latency_ms": v, "ttft_ms": v / 2} for v in latencies]
+
+    baseline = run([100, 110, 120, 130, 140])
+    same = replay.compare(run([101, 109, 121, 129, 141]), baseline, tolerance=0.25)
+    assert same["regressions"] == []
+    slower = replay.compare(run([150, 165, 180, 195, 210]), baseline, tolerance=0.25)
+    assert slower["regressions"] == [
+        "latency_ms p50 +50.0%",
+        "latency_ms p90 +50.0%",
+        "ttft_ms p50 +50.0%",
+        "ttft_ms p90 +50.0%",
+    ]
+    assert slower["latency_ms"]["ks"] == 1.0  # disjoint
+    assert replay.ks_statistic([1, 2, 3], [1, 2, 3]) == 0.0
@@ -0,0 +1,130 @@
+"""Tests for partial-aware processing of runner events."""
+
+import json
+from pathlib import Path
+from typing import Any, Dict, List, Optional, Sequence, Tuple
+
+import httpx
+import pytest
+from google.adk.events.event import Event
+from google.genai import types
+
+from app import web_server
+from app.app_utils.turn_events import TurnEvents, event_text
+
+# Runner events recorded from the offline backend with StreamingMode.SSE.
+RECORDED = Path(__file__).parents[1] / "fixtures" / "stream_events.jsonl"
+
+
+def _recorded() -> Dict[str, List[Event]]:
+    turns = {}
+    for line in RECORDED.read_text().splitlines():
+        turn = json.loads(line)
+        turns[turn["prompt"]] = [Event.model_validate(e) for e in turn["events"]]
+    return turns
+
+
+def _frames(events: Sequence[Event]) -> Tuple[List[Dict[str, Any]], TurnEvents]:
+    processor = TurnEvents()
+    return [frame for event in events for frame in processor.feed(event)], processor
+
+
+def _event(author: str, *parts: types.Part, partial: Optional[bool] = None) -> Event:
+    return Event(
+        author=author,
+        partial=partial,
+        content=types.Content(role="model", parts=list(parts)),
+    )
+
+
+@pytest.mark.parametrize("prompt", sorted(_recorded()))
+def test_recorded_turn_streams_each_word_once(prompt: str) -> None:
+    events = _recorded()[prompt]
+    final = next(e for e in reversed(events) if e.partial is False and event_text(e))
+    frames, processor = _frames(events)
+
+    deltas = [f["delta"] for f in frames if "delta" in f]
+    assert "".join(deltas) == processor.answer == event_text(final)
+    assert len(deltas) == sum(1 for e in events if e.partial)
+    assert processor.agent == final.author
+    assert [f for f in frames if "delta" not in f] == [
+        {"tool": "check_entitlement", "agent": "root_agent"},
+        {"transfer": final.author, "agent": "root_agent"},
+    ]
+
+
+def test_unstreamed_reply_thoughts_and_tails() -> None:
+    thought = types.Part(text="let me think", thought=True)
+    frames, processor = _frames(
+        [
+            _event("root_agent", thought, types.Part(text="Routing you now. ")),
+            _event("service_agent", types.Part(text="Present Day "), partial=True),
+            _event(
+                "service_agent",
+                thought,
+                types.Part(text="Present Day is included."),
+                partial=False,
+            ),
+        ]
+    )
+    assert frames == [
+        {"delta": "Routing you now. "},
+        {"delta": "Present Day "},
+        {"delta": "is included."},
+    ]
+    assert processor.answer == "Routing you now. Present Day is included."
+
+
+def test_error_event_ends_the_turn() -> None:
+    processor = TurnEvents()
+    error = Event(
+        author="service_agent",
+        error_code="RESOURCE_EXHAUSTED",
+        error_message="busy",
+        custom_metadata={"status": 429, "retry_after_s": 2.0},
+    )
+    assert processor.feed(error) == [
+        {"error": "busy", "code": 429, "retry_after_s": 2.0}
+    ]
+    assert processor.error is not None and processor.error["code"] == 429
+
+
+@pytest.mark.asyncio
+async def test_chat_answer_and_history_are_not_duplicated() -> None:
+    transport = httpx.ASGITransport(app=web_server.app)
+    async with httpx.AsyncClient(transport=transport, base_url="http://test") as client:
+        session_id = (await client.post("/session", json={"user_id": "alice"})).json()[
+            "session_id"
+        ]
+        answer = (
+            await client.post(
+                "/chat",
+                json={
+                    "session_id": session_id,
+                    "user_id": "alice",
+                    "message": "Upgrade me to GOLD",
+                },
+            )
+        ).json()["answer"]
+        body = (
+            await client.get(
+                "/chat/stream",
+                params={
+                    "session_id": session_id,
+                    "user_id": "alice",
+                    "q": "Upgrade me to GOLD",
+                },
+            )
+        ).text
+    frames = [
+        json.loads(line[len("data: ") :])
+        for line in body.splitlines()
+        if line.startswith("data: ")
+    ]
+
+    assert answer == "[offline action_agent] upgrade me to gold"
+    assert "".join(f.get("delta", "") for f in frames) == frames[-1]["final"] == answer
+    assert [m["content"] for m in web_server.conversation_store[session_id]] == [
+        "Upgrade me to GOLD",
+        answer,
+    ] * 2